@@ -0,0 +1,155 @@
+"""Offline trening lokalnego klasyfikatora intencji (NLUService, warstwa przed OpenAI).
+
+Wejście: pliki JSONL z oznaczonymi wiadomościami, np. eksport logów CloudWatch
+z eventem "intent_sample" (NLU_LOG_SAMPLES=true) albo ręcznie poprawiony zbiór.
+Każda linia musi zawierać obiekt JSON z polami:
+  text | body, intent, lang | language_code, opcjonalnie tenant_id i confidence.
+Linie z prefiksem (timestamp/request id z CloudWatch) są obsługiwane.
+
+Użycie:
+  python scripts/train_intent_model.py samples.jsonl --out build/nlu
+  python scripts/train_intent_model.py samples.jsonl --out build/nlu --s3-bucket my-kb-bucket --s3-prefix nlu/
+
+Dla każdej pary (tenant, język) powstaje <out>/<tenant>/intent_<lang>.json,
+a dodatkowo model wspólny <out>/_default/intent_<lang>.json (wszyscy tenanci).
+Do modeli trafiają wszystkie intencje (także faq itd.) – NLUService i tak
+akceptuje lokalnie tylko NLU_LOCAL_INTENTS, reszta idzie do OpenAI.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.common.constants import (  # noqa: E402
+    NLU_LOCAL_INTENTS,
+    NLU_LOCAL_MIN_CONFIDENCE,
+    NLU_MODEL_DEFAULT_TENANT,
+    _VALID_INTENTS,
+)
+from src.services.intent_classifier import LocalIntentModel, model_key  # noqa: E402
+
+
+def iter_samples(paths, min_confidence):
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                start = line.find("{")
+                if start < 0:
+                    continue
+                try:
+                    row = json.loads(line[start:])
+                except ValueError:
+                    continue
+                # eksport powertools: właściwy payload bywa w "message"
+                if isinstance(row.get("message"), dict):
+                    row = row["message"]
+                text = (row.get("text") or row.get("body") or "").strip()
+                intent = (row.get("intent") or "").strip()
+                lang = ((row.get("lang") or row.get("language_code") or "").split("-", 1)[0]).lower()
+                if not text or intent not in _VALID_INTENTS or not lang:
+                    continue
+                try:
+                    conf = float(row.get("confidence", 1.0))
+                except (TypeError, ValueError):
+                    conf = 0.0
+                if conf < min_confidence:
+                    continue
+                yield row.get("tenant_id") or NLU_MODEL_DEFAULT_TENANT, lang, text, intent
+
+
+def evaluate(samples, threshold, target_precision, **train_kwargs):
+    """Hold-out 80/20: kalibracja progów cosine/marginesu, pokrycie i precyzja lokalnej warstwy."""
+    samples = list(samples)
+    random.Random(42).shuffle(samples)
+    cut = max(1, int(len(samples) * 0.8))
+    train, test = samples[:cut], samples[cut:]
+    if not test or len({i for _, i in train}) < 2:
+        return None
+    model = LocalIntentModel.train(train, **train_kwargs)
+    calibration = model.calibrate(test, intents=NLU_LOCAL_INTENTS, target_precision=target_precision)
+    handled = correct = 0
+    for text, intent in test:
+        pred, conf = model.predict(text)
+        if pred in NLU_LOCAL_INTENTS and conf >= threshold:
+            handled += 1
+            correct += int(pred == intent)
+    return {
+        "test": len(test),
+        "handled_locally": handled,
+        "coverage": round(handled / len(test), 3),
+        "precision": round(correct / handled, 3) if handled else None,
+        "calibration": calibration,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("inputs", nargs="+", help="pliki JSONL z oznaczonymi wiadomościami")
+    ap.add_argument("--out", default="build/nlu", help="katalog wyjściowy (NLU_MODEL_DIR)")
+    ap.add_argument("--min-confidence", type=float, default=0.8, help="min. confidence etykiety z OpenAI")
+    ap.add_argument("--min-samples", type=int, default=30, help="min. liczba próbek na model")
+    ap.add_argument("--ngram-min", type=int, default=2)
+    ap.add_argument("--ngram-max", type=int, default=4)
+    ap.add_argument("--temperature", type=float, default=0.05)
+    ap.add_argument("--threshold", type=float, default=NLU_LOCAL_MIN_CONFIDENCE, help="próg do ewaluacji")
+    ap.add_argument("--target-precision", type=float, default=0.95, help="precyzja, pod którą kalibrowane są progi cosine/marginesu")
+    ap.add_argument("--s3-bucket", default="", help="opcjonalnie: wgraj modele do S3")
+    ap.add_argument("--s3-prefix", default="nlu/")
+    args = ap.parse_args()
+
+    groups = defaultdict(list)
+    for tenant_id, lang, text, intent in iter_samples(args.inputs, args.min_confidence):
+        groups[(tenant_id, lang)].append((text, intent))
+        if tenant_id != NLU_MODEL_DEFAULT_TENANT:
+            groups[(NLU_MODEL_DEFAULT_TENANT, lang)].append((text, intent))
+
+    train_kwargs = {
+        "ngram_min": args.ngram_min,
+        "ngram_max": args.ngram_max,
+        "temperature": args.temperature,
+    }
+    s3 = None
+    if args.s3_bucket:
+        import boto3
+        s3 = boto3.client("s3", region_name=os.environ.get("AWS_REGION", "eu-central-1"))
+
+    for (tenant_id, lang), samples in sorted(groups.items()):
+        if len(samples) < args.min_samples:
+            print(f"skip {tenant_id}/{lang}: {len(samples)} samples < {args.min_samples}")
+            continue
+        report = evaluate(samples, args.threshold, args.target_precision, **train_kwargs)
+        model = LocalIntentModel.train(samples, **train_kwargs)
+        # progi z hold-outu przenosimy na model trenowany na całości
+        calibration = (report or {}).get("calibration") or {}
+        if calibration.get("calibrated"):
+            model.min_similarity = calibration["min_similarity"]
+            model.min_margin = calibration["min_margin"]
+        model.meta["eval"] = report
+
+        path = os.path.join(args.out, model_key(tenant_id, lang))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = model.dumps()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        if s3 is not None:
+            s3.put_object(
+                Bucket=args.s3_bucket,
+                Key=model_key(tenant_id, lang, args.s3_prefix),
+                Body=payload.encode("utf-8"),
+                ContentType="application/json",
+            )
+        print(json.dumps({
+            "model": f"{tenant_id}/{lang}",
+            "samples": dict(Counter(i for _, i in samples)),
+            "eval": report,
+            "path": path,
+        }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
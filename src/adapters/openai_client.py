@@ -2,14 +2,19 @@
 Adapter do OpenAI Chat Completions używany jako NLU.
 
 Udostępnia metody:
-- chat / chat_async: surowe wywołanie modelu z mechanizmem retry,
+- chat / chat_async: surowe wywołanie modelu z mechanizmem retry, przycięte do
+  deadline'u invokacji (common.deadline), z opcjonalnym hedgingiem i circuit breakerem,
+- chat_stream: to samo wywołanie w trybie streamingu (kolejne fragmenty treści),
 - classify / classify_async: wygodny wrapper do klasyfikacji intencji.
 """
 
 from __future__ import annotations
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import json
+import threading
 import time
 import random
 import asyncio
@@ -38,13 +43,49 @@ from ..common.constants import (
     SYSTEM_PROMPT_HISTORY,
 )
 
-from openai import OpenAI
-from openai import APIError, APIConnectionError, APIStatusError, RateLimitError
 
+from ..common.circuit_breaker import CircuitBreaker, get_breaker
 from ..common.config import settings
+from ..common.deadline import DeadlineExceeded, bounded_timeout, remaining_s
 from ..common.logging import logger
 from ..common.timing import timed
 
+# SDK openai (z httpx i pydantic) kosztuje ~0.7 s importu – ładujemy go przy
+# pierwszym OpenAIClient, nie przy imporcie modułu (handlery, które nie wołają
+# LLM, w ogóle go nie importują). Nazwy zostają atrybutami modułu, więc
+# podmiany w testach (monkeypatch) działają jak dotąd.
+OpenAI: Any = None
+APIError: Any = None
+APIConnectionError: Any = None
+APIStatusError: Any = None
+RateLimitError: Any = None
+_SDK_NAMES = ("OpenAI", "APIError", "APIConnectionError", "APIStatusError", "RateLimitError")
+
+
+def _load_sdk() -> None:
+    g = globals()
+    if all(g[name] is not None for name in _SDK_NAMES):
+        return
+    import openai
+
+    for name in _SDK_NAMES:
+        if g[name] is None:
+            g[name] = getattr(openai, name)
+
+_HEDGE_EXECUTOR: ThreadPoolExecutor | None = None
+_HEDGE_EXECUTOR_LOCK = threading.Lock()
+
+
+def _hedge_executor() -> ThreadPoolExecutor:
+    # osobna pula: chat() bywa wołane z innych pul wątków, zagnieżdżony submit
+    # do tej samej ograniczonej puli mógłby się zakleszczyć
+    global _HEDGE_EXECUTOR
+    if _HEDGE_EXECUTOR is None:
+        with _HEDGE_EXECUTOR_LOCK:
+            if _HEDGE_EXECUTOR is None:
+                _HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="openai")
+    return _HEDGE_EXECUTOR
+
 
 class OpenAIClient:
     """
@@ -54,14 +95,21 @@ class OpenAIClient:
     gdy API jest niedostępne lub źle skonfigurowane.
     """
 
-    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
         """
         Inicjalizuje klienta na podstawie przekazanego API key lub globalnych ustawień.
 
         Args:
             api_key: opcjonalny klucz do OpenAI; jeżeli brak, używa settings.openai_api_key
             model: nazwa modelu, np. "gpt-4o-mini"; jeżeli brak, używa settings.llm_model
+            breaker: circuit breaker; domyślnie wspólny dla procesu breaker "openai"
         """
+        _load_sdk()
         self.api_key = api_key or getattr(settings, "openai_api_key", None)
         self.enabled = bool(self.api_key)
         self.model = model or getattr(settings, "llm_model", "gpt-4o-mini")
@@ -83,11 +131,22 @@ class OpenAIClient:
         self._embed_cache_max = int(os.getenv("OPENAI_EMBED_CACHE_MAX", "2000") or 2000)
         self._embed_cache: dict[tuple[str, int | None, str], tuple[float, list[float]]] = {}
 
+        self.breaker = breaker or get_breaker("openai")
+        # czasy udanych wywołań (s) – p95 wyznacza opóźnienie hedgingu
+        self._latencies: deque[float] = deque(maxlen=200)
+        self._latencies_lock = threading.Lock()
+
+    @property
+    def circuit_open(self) -> bool:
+        """True, gdy breaker blokuje wywołania – wołający powinien od razu użyć fallbacku."""
+        return self.enabled and self.breaker.state == "open"
+
     def _chat_once(
         self,
         messages: list[dict],
         model: Optional[str] = None,
         max_tokens: int = 256,
+        timeout_s: Optional[float] = None,
     ) -> str:
         """
         Jednokrotne (bez retry) wywołanie Chat Completions.
@@ -116,12 +175,14 @@ class OpenAIClient:
             )
 
         mdl = model or self.model
+        timeout_s = timeout_s or self._timeout_s
 
+        t0 = time.perf_counter()
         with timed(
             "openai_chat_once",
             logger=logger, 
             component="openai_client",
-            extra={"model": mdl, "max_tokens": max_tokens, "timeout_s": self._timeout_s},
+            extra={"model": mdl, "max_tokens": max_tokens, "timeout_s": round(timeout_s, 3)},
         ):
             resp = self.client.chat.completions.create(
                 model=mdl,
@@ -129,7 +190,20 @@ class OpenAIClient:
                 response_format={"type": "json_object"},
                 temperature=0.0,
                 max_tokens=max_tokens,
-                timeout=self._timeout_s,
+                timeout=timeout_s,
+            )
+        with self._latencies_lock:
+            self._latencies.append(time.perf_counter() - t0)
+        usage = getattr(resp, "usage", None)
+        if usage is not None:
+            logger.info(
+                {
+                    "component": "openai_client",
+                    "event": "chat_usage",
+                    "model": mdl,
+                    "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                    "completion_tokens": getattr(usage, "completion_tokens", None),
+                }
             )
         return resp.choices[0].message.content or "{}"
 
@@ -149,6 +223,9 @@ class OpenAIClient:
 
         Błędy konfiguracyjne (np. brak uprawnień, zły model) nie są retryowane,
         tylko powodują szybki powrót z fallbackiem.
+
+        Timeouty i backoff są przycinane do deadline'u invokacji (common.deadline);
+        gdy breaker "openai" jest otwarty, fallback wraca bez wywołania API.
         """
         # prompt_size: cheap, token-agnostic approximation (chars).
         try:
@@ -160,75 +237,119 @@ class OpenAIClient:
 
         last_api_error: Optional[APIError] = None
         max_attempts = 2
-        for attempt in range(max_attempts):
-            try:
-                with timed(
-                    "openai_chat_attempt",
-                    logger=logger, 
-                    component="openai_client",
-                    extra={"attempt": attempt + 1, "max_attempts": max_attempts},
-                ):
-                    return self._chat_once(messages, model=model, max_tokens=max_tokens)
-            except RateLimitError:
-                sleep_s = min(0.5 * (2**attempt), 1.5) + random.uniform(0, 0.1)
-                with timed("openai_retry_sleep", logger=logger, component="openai_client", extra={"reason": "rate_limit", "sleep_s": round(sleep_s, 3)}):
-                    time.sleep(sleep_s)
-            except APIStatusError as e:
-                # 429/5xx -> retry, inne statusy -> nie ma sensu retry
-                status = getattr(e, "status_code", 0)
-                if status in (429, 500, 502, 503):
+        min_call_s = float(getattr(settings, "openai_min_call_s", 0.5) or 0.5)
+
+        # deadline sprawdzamy przed breakerem – w half-open allow() rezerwuje próbne wywołanie
+        left = remaining_s()
+        if left is not None and left < min_call_s:
+            logger.warning({"component": "openai_client", "event": "deadline_exceeded", "remaining_s": round(left, 3)})
+            return self._fallback_json("LLM unavailable (deadline exceeded)")
+        if self.enabled and not self.breaker.allow():
+            logger.warning({"component": "openai_client", "event": "circuit_open", "breaker": self.breaker.name})
+            return self._fallback_json("LLM unavailable (circuit open)")
+        try:
+            for attempt in range(max_attempts):
+                try:
+                    timeout_s = bounded_timeout(self._timeout_s, min_s=min_call_s)
+                except DeadlineExceeded as e:
+                    logger.warning(
+                        {
+                            "component": "openai_client",
+                            "event": "deadline_exceeded",
+                            "attempt": attempt + 1,
+                            "message": str(e),
+                        }
+                    )
+                    break
+                try:
+                    with timed(
+                        "openai_chat_attempt",
+                        logger=logger, 
+                        component="openai_client",
+                        extra={"attempt": attempt + 1, "max_attempts": max_attempts},
+                    ):
+                        content = self._chat_hedged(messages, model=model, max_tokens=max_tokens, timeout_s=timeout_s)
+                    self.breaker.record(True)
+                    return content
+                except RateLimitError:
+                    self.breaker.record(False)
                     sleep_s = min(0.5 * (2**attempt), 1.5) + random.uniform(0, 0.1)
+                    if not self._can_retry_after(sleep_s, min_call_s):
+                        break
+                    with timed("openai_retry_sleep", logger=logger, component="openai_client", extra={"reason": "rate_limit", "sleep_s": round(sleep_s, 3)}):
+                        time.sleep(sleep_s)
+                except APIStatusError as e:
+                    # 429/5xx -> retry, inne statusy -> nie ma sensu retry
+                    status = getattr(e, "status_code", 0)
+                    if status in (429, 500, 502, 503):
+                        self.breaker.record(False)
+                        sleep_s = min(0.5 * (2**attempt), 1.5) + random.uniform(0, 0.1)
+                        if not self._can_retry_after(sleep_s, min_call_s):
+                            break
+                        logger.warning(
+                            {
+                                "component": "openai_client",
+                                "event": "retry_sleep",
+                                "reason": "api_status",
+                                "status_code": status,
+                                "attempt": attempt + 1,
+                                "max_attempts": max_attempts,
+                                "sleep_s": round(sleep_s, 3),
+                            }
+                        )
+                        time.sleep(sleep_s)
+                    else:
+                        # API odpowiada – błąd po naszej stronie, nie awaria OpenAI
+                        self.breaker.record(True)
+                        last_api_error = e
+                        logger.error(
+                            {
+                                "component": "openai_client",
+                                "event": "non_retryable_status",
+                                "status_code": status,
+                                "attempt": attempt + 1,
+                                "max_attempts": max_attempts,
+                            }
+                        )
+                        break
+                except APIConnectionError:
+                    # problemy sieciowe (także timeout) — próbujemy jeszcze raz, ale nie czekamy długo
+                    self.breaker.record(False)
+                    sleep_s = 0.3 + random.uniform(0, 0.1)
+                    if not self._can_retry_after(sleep_s, min_call_s):
+                        break
                     logger.warning(
                         {
                             "component": "openai_client",
                             "event": "retry_sleep",
-                            "reason": "api_status",
-                            "status_code": status,
+                            "reason": "connection_error",
                             "attempt": attempt + 1,
                             "max_attempts": max_attempts,
                             "sleep_s": round(sleep_s, 3),
                         }
                     )
                     time.sleep(sleep_s)
-                else:
+                except APIError as e:
+                    # „logiczny” błąd API — raczej nie ustąpi po retry
+                    self.breaker.record(True)
                     last_api_error = e
                     logger.error(
                         {
                             "component": "openai_client",
-                            "event": "non_retryable_status",
-                            "status_code": status,
-                            "attempt": attempt + 1,
-                            "max_attempts": max_attempts,
+                            "event": "api_error",
+                            "error_type": type(e).__name__,
+                            "message": str(e),
                         }
                     )
                     break
-            except APIConnectionError:
-                # problemy sieciowe — próbujemy jeszcze raz, ale nie czekamy długo
-                sleep_s = 0.3 + random.uniform(0, 0.1)
-                logger.warning(
-                    {
-                        "component": "openai_client",
-                        "event": "retry_sleep",
-                        "reason": "connection_error",
-                        "attempt": attempt + 1,
-                        "max_attempts": max_attempts,
-                        "sleep_s": round(sleep_s, 3),
-                    }
-                )
-                time.sleep(sleep_s)
-            except APIError as e:
-                # „logiczny” błąd API — raczej nie ustąpi po retry
-                last_api_error = e
-                logger.error(
-                    {
-                        "component": "openai_client",
-                        "event": "api_error",
-                        "error_type": type(e).__name__,
-                        "message": str(e),
-                    }
-                )
-                break
-        
+        except BaseException:
+            # wyjątek spoza obsługiwanych błędów API (np. pusta odpowiedź, executor)
+            self.breaker.record(False)
+            raise
+        finally:
+            # próba half-open bez zapisanego wyniku (np. deadline przed wywołaniem)
+            self.breaker.release_probe()
+
         # ostateczny fallback (json, żeby parser po drugiej stronie nie padł)
         logger.error(
             {
@@ -241,7 +362,9 @@ class OpenAIClient:
         note = "LLM unavailable (retries exhausted)"
         if last_api_error is not None:
             note = f"LLM error: {type(last_api_error).__name__}: {last_api_error}"
+        return self._fallback_json(note)
 
+    def _fallback_json(self, note: str) -> str:
         return json.dumps(
             {
                 "intent": INTENT_CLARIFY,
@@ -250,6 +373,209 @@ class OpenAIClient:
             }
         )
 
+    def _can_retry_after(self, sleep_s: float, min_call_s: float) -> bool:
+        """Czy po backoffie zostanie jeszcze czas na sensowne wywołanie."""
+        left = remaining_s()
+        if left is None or left >= sleep_s + min_call_s:
+            return True
+        logger.warning(
+            {
+                "component": "openai_client",
+                "event": "retry_skipped_deadline",
+                "remaining_s": round(left, 3),
+                "sleep_s": round(sleep_s, 3),
+            }
+        )
+        return False
+
+    def _hedge_delay_s(self) -> float:
+        """p95 ostatnich udanych wywołań (albo OPENAI_HEDGE_DELAY_MS przy małej próbce)."""
+        with self._latencies_lock:
+            samples = sorted(self._latencies)
+        min_samples = int(getattr(settings, "openai_hedge_min_samples", 20) or 20)
+        if len(samples) < max(1, min_samples):
+            return float(getattr(settings, "openai_hedge_delay_ms", 1500) or 1500) / 1000.0
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def _chat_hedged(
+        self,
+        messages: list[dict],
+        model: Optional[str],
+        max_tokens: int,
+        timeout_s: float,
+    ) -> str:
+        """
+        _chat_once z opcjonalnym hedgingiem: jeśli pierwsze żądanie nie wróci
+        w czasie p95, wysyłamy drugie i bierzemy pierwszą udaną odpowiedź.
+        Kosztem jest co najwyżej ~5% dodatkowych żądań.
+        """
+        if not getattr(settings, "openai_hedge_enabled", False) or not self.enabled:
+            return self._chat_once(messages, model=model, max_tokens=max_tokens, timeout_s=timeout_s)
+
+        delay_s = self._hedge_delay_s()
+        min_call_s = float(getattr(settings, "openai_min_call_s", 0.5) or 0.5)
+        if delay_s + min_call_s >= timeout_s:
+            return self._chat_once(messages, model=model, max_tokens=max_tokens, timeout_s=timeout_s)
+
+        ex = _hedge_executor()
+        primary = ex.submit(self._chat_once, messages, model, max_tokens, timeout_s)
+        done, _ = wait([primary], timeout=delay_s)
+        if done:
+            return primary.result()
+
+        try:
+            hedge_timeout_s = bounded_timeout(timeout_s - delay_s, min_s=min_call_s)
+        except DeadlineExceeded:
+            return primary.result()
+        logger.info(
+            {
+                "component": "openai_client",
+                "event": "hedge_sent",
+                "delay_ms": int(delay_s * 1000),
+            }
+        )
+        hedge = ex.submit(self._chat_once, messages, model, max_tokens, hedge_timeout_s)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                exc = fut.exception()
+                if exc is None:
+                    logger.info(
+                        {
+                            "component": "openai_client",
+                            "event": "hedge_result",
+                            "winner": "hedge" if fut is hedge else "primary",
+                        }
+                    )
+                    return fut.result()
+                error = exc
+        raise error
+
+    def chat_stream(
+        self,
+        messages: list[dict],
+        model: Optional[str] = None,
+        max_tokens: int = 256,
+    ) -> Iterator[str]:
+        """
+        Streaming Chat Completions – zwraca kolejne fragmenty treści (delta.content).
+
+        Retry nie ma sensu po wysłaniu części odpowiedzi, więc:
+        - błąd przed pierwszym fragmentem -> fallback na chat() (z retry),
+        - błąd w trakcie -> log i koniec strumienia (wywołujący dostaje to, co przyszło).
+        Cały strumień (nie tylko otwarcie) mieści się w timeoucie przyciętym do
+        deadline'u invokacji; po jego przekroczeniu przestajemy czytać, a breaker
+        dostaje porażkę jak przy timeoucie chat().
+        Bez API key zachowuje się jak chat() (jeden fragment).
+        """
+        if not self.enabled or not self.client:
+            yield self.chat(messages, model=model, max_tokens=max_tokens)
+            return
+        try:
+            timeout_s = bounded_timeout(self._timeout_s, min_s=float(getattr(settings, "openai_min_call_s", 0.5) or 0.5))
+        except DeadlineExceeded:
+            yield self._fallback_json("LLM unavailable (deadline exceeded)")
+            return
+        if not self.breaker.allow():
+            yield self._fallback_json("LLM unavailable (circuit open)")
+            return
+
+        mdl = model or self.model
+        started = False
+        stream = None
+        t0 = time.perf_counter()
+        # timeout SDK dotyczy pojedynczego odczytu – limit całego strumienia pilnujemy sami
+        ends_at = time.monotonic() + timeout_s
+        try:
+            stream = self.client.chat.completions.create(
+                model=mdl,
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=0.0,
+                max_tokens=max_tokens,
+                timeout=timeout_s,
+                stream=True,
+            )
+            for event in stream:
+                if time.monotonic() >= ends_at:
+                    raise DeadlineExceeded(f"stream exceeded {timeout_s:.3f}s")
+                choices = getattr(event, "choices", None) or []
+                if not choices:
+                    continue
+                delta = getattr(getattr(choices[0], "delta", None), "content", None)
+                if not delta:
+                    continue
+                if not started:
+                    started = True
+                    logger.info(
+                        {
+                            "component": "openai_client",
+                            "event": "chat_stream_first_token",
+                            "model": mdl,
+                            "ttft_ms": int((time.perf_counter() - t0) * 1000),
+                        }
+                    )
+                yield delta
+            self.breaker.record(True)
+        except DeadlineExceeded as e:
+            self.breaker.record(False)
+            logger.warning(
+                {
+                    "component": "openai_client",
+                    "event": "chat_stream_deadline",
+                    "started": started,
+                    "message": str(e),
+                }
+            )
+            if not started:
+                yield self._fallback_json("LLM unavailable (deadline exceeded)")
+        except APIError as e:
+            self.breaker.record(False)
+            logger.error(
+                {
+                    "component": "openai_client",
+                    "event": "chat_stream_failed",
+                    "started": started,
+                    "error_type": type(e).__name__,
+                    "message": str(e),
+                }
+            )
+            if not started:
+                yield self.chat(messages, model=model, max_tokens=max_tokens)
+        except GeneratorExit:
+            # konsument porzucił stream – to nie jest awaria API
+            raise
+        except Exception as e:
+            # np. zerwane połączenie w trakcie odczytu (httpx) – przed pierwszym
+            # fragmentem propagujemy, w trakcie kończymy strumień jak przy APIError
+            self.breaker.record(False)
+            if not started:
+                raise
+            logger.error(
+                {
+                    "component": "openai_client",
+                    "event": "chat_stream_failed",
+                    "started": started,
+                    "error_type": type(e).__name__,
+                    "message": str(e),
+                }
+            )
+        except BaseException:
+            self.breaker.record(False)
+            raise
+        finally:
+            # zamykamy połączenie, gdy przestajemy czytać przed końcem strumienia
+            close = getattr(stream, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:
+                    pass
+            # próba half-open bez wyniku (porzucony stream) nie blokuje breakera
+            self.breaker.release_probe()
+
     async def chat_async(
         self,
         messages: list[dict],
@@ -347,9 +673,14 @@ class OpenAIClient:
         *,
         model: str,
         dimensions: int | None = None,
+        store: Any = None,
     ) -> list[list[float]]:
         """Return embeddings for the given texts.
 
+        store: optional persistent content-addressed store (EmbeddingStoreRepo)
+        consulted after the in-memory cache; only texts missing from both are
+        sent to the API, and new vectors are written back.
+
         In offline/dev mode (no API key) returns empty list to allow graceful fallback.
         """
         if not texts:
@@ -387,6 +718,13 @@ class OpenAIClient:
         if not missing:
             return [v or [] for v in cached_vecs]
 
+        if store is not None and getattr(store, "enabled", False):
+            missing, missing_idx = self._embed_from_store(
+                store, model, dimensions, missing, missing_idx, cached_vecs, now
+            )
+            if not missing:
+                return [v or [] for v in cached_vecs]
+
         # OpenAI Embeddings API: returns a list aligned with inputs.
         kwargs = {"model": model, "input": missing}
         if dimensions:
@@ -406,13 +744,60 @@ class OpenAIClient:
             i = missing_idx[j]
             cached_vecs[i] = vec
             key = (model, int(dimensions) if dimensions else None, missing[j])
-            # simple eviction: if over max, clear (cheap + safe)
-            if len(self._embed_cache) >= self._embed_cache_max:
-                self._embed_cache.clear()
-            self._embed_cache[key] = (now + self._embed_cache_ttl_s, vec)
+            self._embed_cache_put(key, vec, now)
+
+        if store is not None and getattr(store, "enabled", False) and new_vecs:
+            try:
+                store.put_many({store.key(model, dimensions, t): v for t, v in zip(missing, new_vecs) if v})
+            except Exception as e:
+                logger.warning({"component": "openai_client", "event": "embed_store_put_failed", "err": str(e)})
 
         return [v or [] for v in cached_vecs]
 
+    def _embed_cache_put(self, key: tuple[str, int | None, str], vec: list[float], now: float) -> None:
+        # simple eviction: if over max, clear (cheap + safe)
+        if len(self._embed_cache) >= self._embed_cache_max:
+            self._embed_cache.clear()
+        self._embed_cache[key] = (now + self._embed_cache_ttl_s, vec)
+
+    def _embed_from_store(
+        self,
+        store: Any,
+        model: str,
+        dimensions: int | None,
+        missing: list[str],
+        missing_idx: list[int],
+        out: list[list[float] | None],
+        now: float,
+    ) -> tuple[list[str], list[int]]:
+        """Uzupełnia `out` wektorami ze store'a; zwraca teksty/indeksy nadal brakujące."""
+        keys = [store.key(model, dimensions, t) for t in missing]
+        try:
+            found = store.get_many(keys)
+        except Exception as e:
+            # store jest optymalizacją – przy błędzie embeddujemy wszystko przez API
+            logger.warning({"component": "openai_client", "event": "embed_store_get_failed", "err": str(e)})
+            return missing, missing_idx
+
+        still: list[str] = []
+        still_idx: list[int] = []
+        for t, i, k in zip(missing, missing_idx, keys):
+            vec = found.get(k)
+            if vec:
+                out[i] = vec
+                self._embed_cache_put((model, int(dimensions) if dimensions else None, t), vec, now)
+            else:
+                still.append(t)
+                still_idx.append(i)
+        logger.info({
+            "component": "openai_client",
+            "event": "embed_store_lookup",
+            "model": model,
+            "hits": len(missing) - len(still),
+            "misses": len(still),
+        })
+        return still, still_idx
+
 
     def build_kb_prompt( self, strict_mode: bool, language_code: Optional[str], context: str) -> str:
         sys = SYSTEM_PROMPT_FAQ
@@ -133,6 +133,55 @@ class PineconeClient:
         })
         return False
 
+    def delete(
+        self,
+        *,
+        ids: List[str],
+        namespace: str,
+        max_attempts: int = 3,
+    ) -> bool:
+        """Usuwa wektory po ID (Pinecone przyjmuje do 1000 ID na żądanie)."""
+        if not self.enabled:
+            return False
+        if not ids:
+            return True
+
+        url = self._url("/vectors/delete")
+        for start in range(0, len(ids), 1000):
+            payload = {"ids": ids[start:start + 1000], "namespace": namespace}
+            for attempt in range(max_attempts):
+                try:
+                    with timed(
+                        "pinecone_delete_http",
+                        logger=logger,
+                        component="pinecone_client",
+                        extra={"namespace": namespace, "ids": len(payload["ids"]), "attempt": attempt + 1},
+                    ):
+                        r = requests.post(url, headers=self._headers(), json=payload, timeout=self.timeout_s)
+                    if 200 <= r.status_code < 300:
+                        break
+                    logger.warning({
+                        "component": "pinecone_client",
+                        "event": "pinecone_delete_http_error",
+                        "status": r.status_code,
+                        "body": (r.text or "")[:500],
+                        "namespace": namespace,
+                    })
+                except Exception as e:
+                    logger.error({"component": "pinecone_client", "event": "pinecone_delete_err", "err": str(e)})
+
+                sleep_s = min(2.0, 0.2 * (2**attempt) + random.random() * 0.2)
+                time.sleep(sleep_s)
+            else:
+                logger.error({
+                    "component": "pinecone_client",
+                    "event": "pinecone_delete_failed",
+                    "namespace": namespace,
+                    "ids": len(payload["ids"]),
+                })
+                return False
+        return True
+
     def query(
         self,
         *,
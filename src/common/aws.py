@@ -1,8 +1,21 @@
 # src/common/aws.py
 import os
+import threading
+import time
 import boto3
 from botocore.config import Config
 
+from .logging import logger
+
+# Rejestr klientów współdzielonych w procesie (warm Lambda): klient powstaje
+# przy pierwszym użyciu, a nie przy imporcie/konstrukcji serwisu.
+_SHARED_CLIENTS: dict = {}
+_SHARED_CLIENTS_LOCK = threading.Lock()
+# service -> czas utworzenia klienta (ms), do diagnostyki cold startu
+_CLIENT_INIT_MS: dict[str, int] = {}
+# zasoby DynamoDB wątków roboczych (boto3 resources nie są thread-safe)
+_THREAD_DDB = threading.local()
+
 def _region():
     return os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "eu-central-1"
 
@@ -68,7 +81,47 @@ def ddb_resource():
     kwargs = {"region_name": _region(), "config": _cfg()}
     if ep:
         kwargs["endpoint_url"] = ep
-    return boto3.resource("dynamodb", **kwargs)
+    if threading.current_thread() is threading.main_thread():
+        return boto3.resource("dynamodb", **kwargs)
+    # wątek roboczy (np. równoległe rozmowy w message_router): własna sesja
+    # i zasób per wątek, reużywane przez kolejne invokacje ciepłego kontenera
+    key = (kwargs["region_name"], ep)
+    resources = getattr(_THREAD_DDB, "resources", None)
+    if resources is None:
+        resources = _THREAD_DDB.resources = {}
+    resource = resources.get(key)
+    if resource is None:
+        resource = resources[key] = boto3.session.Session().resource("dynamodb", **kwargs)
+    return resource
+
+
+class ThreadLocalTable:
+    """Tabela DynamoDB, której obiekt boto3 jest osobny dla każdego wątku.
+
+    Repozytoria są współdzielone przez wątki (kontener serwisów, równoległe
+    rozmowy w batchu), a zasoby boto3 nie są thread-safe. Atrybuty (get_item,
+    query, meta.client, batch_writer...) są delegowane do Table bieżącego
+    wątku, tworzonej przy pierwszym użyciu.
+    """
+
+    def __init__(self, name: str, resource_factory=None) -> None:
+        self.name = name
+        self._resource_factory = resource_factory or ddb_resource
+        self._local = threading.local()
+
+    def _table(self):
+        table = getattr(self._local, "table", None)
+        if table is None:
+            table = self._local.table = self._resource_factory().Table(self.name)
+        return table
+
+    def __getattr__(self, attr: str):
+        return getattr(self._table(), attr)
+
+
+def ddb_table(name: str, resource_factory=None) -> ThreadLocalTable:
+    """Tabela DynamoDB bezpieczna do współdzielenia między wątkami."""
+    return ThreadLocalTable(name, resource_factory)
 
 
 def ssm_client():
@@ -92,3 +145,49 @@ def cloudwatch_client():
     if ep:
         kwargs["endpoint_url"] = ep
     return boto3.client("cloudwatch", **kwargs)
+
+
+def shared_client(service: str, *, config: Config | None = None, region_name: str | None = None):
+    """Klient boto3 tworzony leniwie i współdzielony w procesie.
+
+    Klucz: (usługa, region, endpoint) – jedna konfiguracja na usługę;
+    `config` jest brany pod uwagę tylko przy pierwszym utworzeniu.
+    """
+    region = region_name or _region()
+    ep = _endpoint_for(service)
+    key = (service, region, ep)
+    client = _SHARED_CLIENTS.get(key)
+    if client is not None:
+        return client
+    with _SHARED_CLIENTS_LOCK:
+        client = _SHARED_CLIENTS.get(key)
+        if client is None:
+            kwargs = {"region_name": region, "config": config or _cfg()}
+            if ep:
+                kwargs["endpoint_url"] = ep
+            start = time.perf_counter()
+            client = boto3.client(service, **kwargs)
+            _CLIENT_INIT_MS[service] = int((time.perf_counter() - start) * 1000)
+            _SHARED_CLIENTS[key] = client
+            logger.info({"component": "aws", "event": "client_init", "service": service, "duration_ms": _CLIENT_INIT_MS[service]})
+    return client
+
+
+def client_init_timings() -> dict[str, int]:
+    """Czasy tworzenia klientów z rejestru (ms) w tym procesie."""
+    return dict(_CLIENT_INIT_MS)
+
+
+def reset_shared_clients() -> None:
+    with _SHARED_CLIENTS_LOCK:
+        _SHARED_CLIENTS.clear()
+        _CLIENT_INIT_MS.clear()
+
+
+def comprehend_client():
+    # Detekcja języka jest na ścieżce krytycznej latency – szybki fallback
+    # (tenant/rozmowa) zamiast długiego czekania.
+    return shared_client(
+        "comprehend",
+        config=Config(read_timeout=1, connect_timeout=1, retries={"max_attempts": 1}),
+    )
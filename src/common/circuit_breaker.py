@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker liczony po oknie czasowym wywołań (w pamięci procesu).
+
+    - closed: wywołania idą normalnie; gdy w oknie jest >= min_calls wywołań
+      i odsetek błędów >= failure_ratio, przechodzimy w open,
+    - open: allow() zwraca False przez open_seconds (wołający od razu
+      używa fallbacku),
+    - half_open: przepuszczamy jedno próbne wywołanie; sukces zamyka obwód,
+      błąd otwiera go ponownie.
+
+    Próba bez wyniku (wyjątek spoza API, przerwany stream) nie może zablokować
+    obwodu: wołający zwalnia ją przez release_probe(), a rezerwacja i tak
+    wygasa po probe_timeout_s.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_ratio: float = 0.5,
+        min_calls: int = 5,
+        window_s: float = 30.0,
+        open_seconds: float = 20.0,
+        probe_timeout_s: float = 60.0,
+    ) -> None:
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.min_calls = max(1, min_calls)
+        self.window_s = window_s
+        self.open_seconds = open_seconds
+        self.probe_timeout_s = probe_timeout_s
+        self._calls: Deque[Tuple[float, bool]] = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._probe_owner = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and (not self._probe_in_flight or now - self._probe_started >= self.probe_timeout_s):
+                self._probe_in_flight = True
+                self._probe_started = now
+                self._probe_owner = threading.get_ident()
+                return True
+            return False
+
+    def release_probe(self) -> None:
+        """Zwalnia próbę zarezerwowaną przez ten wątek, jeśli nie zapisano jej wyniku."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probe_in_flight and self._probe_owner == threading.get_ident():
+                self._probe_in_flight = False
+                self._probe_owner = None
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == HALF_OPEN:
+                self._probe_in_flight = False
+                self._calls.clear()
+                if ok:
+                    self._state = CLOSED
+                else:
+                    self._state, self._opened_at = OPEN, now
+                return
+            if state == OPEN:
+                return
+
+            self._calls.append((now, ok))
+            while self._calls and now - self._calls[0][0] > self.window_s:
+                self._calls.popleft()
+            failures = sum(1 for _, good in self._calls if not good)
+            if len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.failure_ratio:
+                self._state, self._opened_at = OPEN, now
+                self._calls.clear()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls.clear()
+            self._state = CLOSED
+            self._probe_in_flight = False
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Breaker współdzielony w procesie (np. wszyscy klienci OpenAI w kontenerze)."""
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(name)
+        if breaker is None:
+            prefix = f"CB_{name.upper()}_"
+            breaker = CircuitBreaker(
+                name,
+                failure_ratio=float(os.getenv(prefix + "FAILURE_RATIO", "0.5")),
+                min_calls=int(os.getenv(prefix + "MIN_CALLS", "5")),
+                window_s=float(os.getenv(prefix + "WINDOW_S", "30")),
+                open_seconds=float(os.getenv(prefix + "OPEN_S", "20")),
+                probe_timeout_s=float(os.getenv(prefix + "PROBE_TIMEOUT_S", "60")),
+            )
+            _BREAKERS[name] = breaker
+        return breaker
@@ -16,10 +16,27 @@ from __future__ import annotations
 import os
 from dataclasses import dataclass
 
-from dotenv import load_dotenv, find_dotenv
 
-# Ładujemy zmienne z .env (jeżeli plik istnieje).
-load_dotenv(find_dotenv())
+def _load_dotenv() -> None:
+    """Ładuje zmienne z .env (jeżeli plik istnieje) – domyślnie poza Lambdą.
+
+    W Lambdzie konfiguracja pochodzi z ENV funkcji (template.yaml), a
+    find_dotenv() przy każdym cold starcie przeszukuje katalogi w górę drzewa.
+    LOAD_DOTENV=1/0 wymusza zachowanie niezależnie od środowiska.
+    """
+    flag = os.getenv("LOAD_DOTENV")
+    if flag is None:
+        enabled = not os.getenv("AWS_LAMBDA_FUNCTION_NAME")
+    else:
+        enabled = flag.lower() in ("1", "true", "yes")
+    if not enabled:
+        return
+    from dotenv import find_dotenv, load_dotenv
+
+    load_dotenv(find_dotenv())
+
+
+_load_dotenv()
 
 
 @dataclass
@@ -83,6 +100,9 @@ class Settings:
     # tryb deweloperski
     dev_mode: bool = os.getenv("DEV_MODE", "false").lower() == "true"
     tenant_default_lang: str = os.getenv("TENANT_DEFAULT_LANG", "pl")
+    # lokalna detekcja języka (n-gramy) przed Comprehend; poniżej progu -> Comprehend
+    lang_local_detect_enabled: bool = os.getenv("LANG_LOCAL_DETECT_ENABLED", "1").lower() in ("1", "true", "yes")
+    lang_local_min_confidence: float = get_env_float("LANG_LOCAL_MIN_CONFIDENCE", "0.75")
 
     # --- peppers (dla kompatybilności testów i security.py)
     # UWAGA: nie ładujemy z SSM podczas importu.
@@ -93,6 +113,12 @@ class Settings:
     otp_hash_pepper: str = os.getenv("OTP_HASH_PEPPER", "")
 
     openai_timeout_s: float = get_env_float("OPENAI_TIMEOUT_S", "6")
+    # minimalny sensowny czas na wywołanie OpenAI przed deadline'em invokacji
+    openai_min_call_s: float = get_env_float("OPENAI_MIN_CALL_S", "0.5")
+    # hedging: drugie, równoległe żądanie po opóźnieniu = p95 ostatnich wywołań
+    openai_hedge_enabled: bool = os.getenv("OPENAI_HEDGE_ENABLED", "0").lower() in ("1", "true", "yes")
+    openai_hedge_delay_ms: int = get_env_int("OPENAI_HEDGE_DELAY_MS", "1500")
+    openai_hedge_min_samples: int = get_env_int("OPENAI_HEDGE_MIN_SAMPLES", "20")
 
     #code sender email
     ses_from_email = os.getenv("SES_FROM_EMAIL")
@@ -113,6 +139,19 @@ class Settings:
     pinecone_top_k: int = get_env_int("PINECONE_TOP_K", "6")
     # Optional: force-disable vector retrieval (use legacy keyword retrieval)
     kb_vector_enabled: bool = os.getenv("KB_VECTOR_ENABLED", "1").lower() not in ("0", "false", "no")
+    # Optional: start KB retrieval (embedding + Pinecone) speculatively in parallel with NLU
+    kb_speculative_retrieval: bool = os.getenv("KB_SPECULATIVE_RETRIEVAL", "0").lower() in ("1", "true", "yes")
+    kb_speculative_min_words: int = get_env_int("KB_SPECULATIVE_MIN_WORDS", "4")
+    # Optional: stream AI-FAQ answers and send the first paragraph/sentence before the rest is generated
+    kb_stream_answers: bool = os.getenv("KB_STREAM_ANSWERS", "0").lower() in ("1", "true", "yes")
+    kb_stream_first_min_chars: int = get_env_int("KB_STREAM_FIRST_MIN_CHARS", "120")
+    # Indeksowanie FAQ: batche embeddingów (liczba wejść / szacowane tokeny) i równoległość
+    kb_index_batch_size: int = get_env_int("KB_INDEX_BATCH_SIZE", "100")
+    kb_index_batch_max_tokens: int = get_env_int("KB_INDEX_BATCH_MAX_TOKENS", "100000")
+    kb_index_concurrency: int = get_env_int("KB_INDEX_CONCURRENCY", "4")
+    kb_index_batch_attempts: int = get_env_int("KB_INDEX_BATCH_ATTEMPTS", "3")
+    # Prompt AI-FAQ: limit tokenów historii (całość – per tenant, kb_prompt_max_tokens)
+    kb_prompt_history_max_tokens: int = get_env_int("KB_PROMPT_HISTORY_MAX_TOKENS", "400")
  
     pg_rate_limit_rps: float = get_env_float("PG_RATE_LIMIT_RPS", "30")
     pg_rate_limit_burst: float = get_env_float("PG_RATE_LIMIT_BURST", "30")
@@ -7,6 +7,28 @@ CAMPAIGNS_PAYMENT_URL_PLACEHOLDER = "payment_link"
 CAMPAIGNS_PRODUCT_ID_PLACEHOLDER = "payment_product_id"
 CAMPAIGNS_EXCLUDE_TAGS_PLACEHOLDER = "exclude_tags"
 CAMPAIGNS_INCLUDE_TAGS_PLACEHOLDER = "include_tags"
+CAMPAIGNS_NEXT_RUN_FORMAT = "%Y-%m-%dT%H:%M:%S"
+# Strefa czasowa odbiorcy po prefiksie numeru (najdłuższy pasujący prefiks wygrywa).
+# Kraje z wieloma strefami (np. +1) celowo pominięte -> strefa domyślna kampanii.
+CAMPAIGNS_PHONE_PREFIX_TIMEZONES = {
+    "+48": "Europe/Warsaw",
+    "+49": "Europe/Berlin",
+    "+43": "Europe/Vienna",
+    "+420": "Europe/Prague",
+    "+421": "Europe/Bratislava",
+    "+44": "Europe/London",
+    "+353": "Europe/Dublin",
+    "+33": "Europe/Paris",
+    "+34": "Europe/Madrid",
+    "+39": "Europe/Rome",
+    "+31": "Europe/Amsterdam",
+    "+380": "Europe/Kyiv",
+    "+370": "Europe/Vilnius",
+    "+971": "Asia/Dubai",
+    "+966": "Asia/Riyadh",
+    "+974": "Asia/Qatar",
+    "+20": "Africa/Cairo",
+}
 
 STATE_AWAITING_CONFIRMATION = "awaiting_confirmation"
 STATE_AWAITING_VERIFICATION = "awaiting_verification"
@@ -90,10 +112,31 @@ _VALID_INTENTS = {
     INTENT_MARKETING_OPTIN,
 }
 
+# intencje, które lokalny klasyfikator (bez LLM) może rozstrzygnąć samodzielnie
+# marketing_optout celowo poza listą: krótkie "nie"/"stop" z innej rozmowy
+# nie może wypisać klienta z marketingu bez potwierdzenia przez OpenAI
+NLU_LOCAL_INTENTS = frozenset({
+    INTENT_ACK,
+    INTENT_AVAILABLE_CLASSES,
+    INTENT_CONTRACT_STATUS,
+    INTENT_CRM_MEMBER_BALANCE,
+})
+NLU_LOCAL_MIN_CONFIDENCE = 0.85
+# softmax przy niskiej temperaturze daje ~1.0 także dla tekstów spoza domeny,
+# więc decyzję bramkuje surowy cosine do centroidu i przewaga nad drugą intencją
+# (model może nadpisać je wartościami skalibrowanymi na hold-oucie)
+NLU_LOCAL_MIN_SIMILARITY = 0.5
+NLU_LOCAL_MIN_MARGIN = 0.15
+NLU_MODEL_DEFAULT_TENANT = "_default"
+
 #mozliwe ze musi isc na per tenant
 KB_SMALLTALK_MIN_SCORE = 0.35
 KB_VECTOR_MIN_SCORE_LOW = 0.43
 KB_VECTOR_FASTPATH_MIN_SCORE = 0.50
+# semantyczny cache odpowiedzi AI-FAQ – cosine pytania do wcześniej zadanego
+KB_ANSWER_CACHE_MIN_SCORE = 0.95
+# budżet tokenów promptu AI-FAQ (system + kontekst + historia + pytanie)
+KB_PROMPT_MAX_TOKENS = 2000
 
 KB_RETRIEVED_CHUNKS = 6
 KB_FETCHED_CHUNKS = 3
@@ -0,0 +1,69 @@
+"""
+Deadline bieżącej invokacji Lambdy.
+
+Handler ustawia go na starcie z context.get_remaining_time_in_millis()
+(minus rezerwa na publikację wyników / batchItemFailures), a klienci IO
+(OpenAIClient) przycinają do niego timeouty, retry i hedging.
+
+Deadline jest globalny dla procesu, a nie per wątek: Lambda obsługuje jedną
+invokację naraz, a grupy rekordów przetwarzane równolegle dzielą ten sam limit.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, Optional
+
+_DEADLINE: Optional[float] = None  # time.monotonic()
+
+
+class DeadlineExceeded(Exception):
+    """Za mało czasu do końca invokacji, żeby rozpocząć operację."""
+
+
+def set_deadline(seconds_from_now: Optional[float]) -> None:
+    global _DEADLINE
+    _DEADLINE = None if seconds_from_now is None else time.monotonic() + seconds_from_now
+
+
+def clear_deadline() -> None:
+    set_deadline(None)
+
+
+def start_from_lambda_context(context: Any, reserve_ms: Optional[int] = None) -> Optional[float]:
+    """Ustawia deadline z kontekstu Lambdy; zwraca budżet w sekundach (albo None)."""
+    getter = getattr(context, "get_remaining_time_in_millis", None)
+    if not callable(getter):
+        clear_deadline()
+        return None
+    if reserve_ms is None:
+        reserve_ms = int(os.getenv("LAMBDA_DEADLINE_RESERVE_MS", "1500"))
+    try:
+        budget_s = max(0.0, (float(getter()) - reserve_ms) / 1000.0)
+    except (TypeError, ValueError):
+        clear_deadline()
+        return None
+    set_deadline(budget_s)
+    return budget_s
+
+
+def remaining_s() -> Optional[float]:
+    """Sekundy do deadline'u (>= 0) albo None, gdy deadline nie jest ustawiony."""
+    if _DEADLINE is None:
+        return None
+    return max(0.0, _DEADLINE - time.monotonic())
+
+
+def bounded_timeout(timeout_s: float, *, min_s: float = 0.0) -> float:
+    """Timeout operacji przycięty do deadline'u.
+
+    Rzuca DeadlineExceeded, gdy zostało mniej niż min_s – lepiej od razu
+    przejść do fallbacku niż zacząć wywołanie, które i tak zostanie ucięte.
+    """
+    left = remaining_s()
+    if left is None:
+        return timeout_s
+    if left < max(min_s, 1e-3):
+        raise DeadlineExceeded(f"{left:.3f}s left")
+    return min(timeout_s, left)
@@ -0,0 +1,30 @@
+"""
+Współdzielona pula wątków dla blokującego IO (boto3, requests) w tle.
+
+boto3 i nasze adaptery HTTP są synchroniczne – kroki, które mogą biec
+równolegle z głównym flow (np. spekulatywny retrieval KB razem z NLU),
+idą do jednej, ograniczonej puli per kontener (warm Lambda ją reużywa).
+Zadania w tej puli nie mogą czekać na inne zadania z tej samej puli.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def shared_executor() -> ThreadPoolExecutor:
+    """Pula procesu dla blokującego IO w tle (rozmiar: IO_EXECUTOR_WORKERS)."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("IO_EXECUTOR_WORKERS", "16")),
+                    thread_name_prefix="io",
+                )
+    return _EXECUTOR
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import random
+import threading
 import time
 from dataclasses import dataclass
 from typing import Dict
@@ -26,42 +27,42 @@ class InMemoryRateLimiter:
 
     def __init__(self) -> None:
         self._buckets: Dict[str, _Bucket] = {}
+        # try_acquire bywa wołane z wielu wątków (równoległe rozmowy w batchu)
+        self._lock = threading.Lock()
 
     def reset(self) -> None:
         self._buckets.clear()
 
     def acquire(self, key: str, *, rate: float, burst: float, cost: float = 1.0) -> None:
+        """Blokujący acquire – bezpieczny dla wielu wątków (np. równoległe wywołania CRM).
+
+        Refill i pobranie tokenów odbywają się pod lockiem; sleep poza nim,
+        a po przebudzeniu tokeny są pobierane ponownie pod lockiem.
+        """
         if rate <= 0:
             return
 
-        now = time.monotonic()
-        b = self._buckets.get(key)
-        if b is None:
-            b = _Bucket(rate=rate, burst=burst, tokens=burst, ts=now)
-            self._buckets[key] = b
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                b = self._buckets.get(key)
+                if b is None:
+                    b = _Bucket(rate=rate, burst=burst, tokens=burst, ts=now)
+                    self._buckets[key] = b
 
-        # refill
-        elapsed = max(0.0, now - b.ts)
-        b.tokens = min(b.burst, b.tokens + elapsed * b.rate)
-        b.ts = now
-
-        if b.tokens >= cost:
-            b.tokens -= cost
-            return
+                # refill
+                elapsed = max(0.0, now - b.ts)
+                b.tokens = min(b.burst, b.tokens + elapsed * b.rate)
+                b.ts = now
 
-        missing = cost - b.tokens
-        wait_s = missing / b.rate
+                if b.tokens >= min(cost, b.burst):
+                    b.tokens = max(0.0, b.tokens - cost)
+                    return
 
-        # drobny jitter, żeby nie synchronizować sleepów wewnątrz batcha
-        wait_s *= random.uniform(0.9, 1.1)
-        time.sleep(wait_s)
+                wait_s = (min(cost, b.burst) - b.tokens) / b.rate
 
-        # refill po sleep i pobierz
-        now2 = time.monotonic()
-        elapsed2 = max(0.0, now2 - b.ts)
-        b.tokens = min(b.burst, b.tokens + elapsed2 * b.rate)
-        b.ts = now2
-        b.tokens = max(0.0, b.tokens - cost)
+            # drobny jitter, żeby nie synchronizować sleepów wewnątrz batcha
+            time.sleep(wait_s * random.uniform(0.9, 1.1))
 
     def try_acquire(self, key: str, *, rate: float, burst: float, cost: float = 1.0) -> bool:
         """Non-blocking acquire.
@@ -71,17 +72,18 @@ class InMemoryRateLimiter:
         if rate <= 0:
             return True
 
-        now = time.monotonic()
-        b = self._buckets.get(key)
-        if b is None:
-            b = _Bucket(rate=rate, burst=burst, tokens=burst, ts=now)
-            self._buckets[key] = b
-
-        elapsed = max(0.0, now - b.ts)
-        b.tokens = min(b.burst, b.tokens + elapsed * b.rate)
-        b.ts = now
-
-        if b.tokens >= cost:
-            b.tokens -= cost
-            return True
-        return False
\ No newline at end of file
+        with self._lock:
+            now = time.monotonic()
+            b = self._buckets.get(key)
+            if b is None:
+                b = _Bucket(rate=rate, burst=burst, tokens=burst, ts=now)
+                self._buckets[key] = b
+
+            elapsed = max(0.0, now - b.ts)
+            b.tokens = min(b.burst, b.tokens + elapsed * b.rate)
+            b.ts = now
+
+            if b.tokens >= cost:
+                b.tokens -= cost
+                return True
+            return False
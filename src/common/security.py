@@ -1,8 +1,19 @@
+from __future__ import annotations
+
 import os, hmac, hashlib, base64, time
-from typing import Dict
+from typing import TYPE_CHECKING, Dict
 from .config import settings
 from .logging import logger
-from cryptography.fernet import Fernet, InvalidToken
+
+if TYPE_CHECKING:
+    from cryptography.fernet import Fernet
+
+
+def _fernet():
+    # cryptography ładujemy dopiero przy szyfrowaniu numerów (HMAC-e go nie potrzebują)
+    from cryptography import fernet
+
+    return fernet
 
 def verify_twilio_signature(
     url: str,
@@ -69,6 +80,18 @@ def _get_param_from_store(env_value_name: str, env_param_name: str) -> str:
     _cached_peppers[cache_key] = ""
     return ""
 
+# (wartość, parametr SSM) dla wszystkich pepperów używanych przez HMAC-e poniżej
+_PEPPER_ENVS = (
+    ("PHONE_HASH_PEPPER", "PHONE_HASH_PEPPER_PARAM"),
+    ("USER_HASH_PEPPER", "USER_HASH_PEPPER_PARAM"),
+    ("OTP_HASH_PEPPER", "OTP_HASH_PEPPER_PARAM"),
+)
+
+
+def preload_peppers() -> int:
+    """Wczytuje peppery (ENV/SSM) do cache procesu; zwraca liczbę niepustych."""
+    return sum(1 for value_env, param_env in _PEPPER_ENVS if _get_param_from_store(value_env, param_env))
+
 def normalize_phone(phone: str) -> str:
     p = (phone or "").strip()
     if p.startswith("whatsapp:"):
@@ -196,30 +219,42 @@ def _get_phone_enc_key() -> str:
     return key
 
 
-def encrypt_phone(tenant_id: str, phone: str) -> str:
-    """Encrypt phone for storage.
+_cached_phone_cipher: tuple[str, Fernet] | None = None
 
-    The ciphertext is safe to store (base64). Tenant id is included in the
-    plaintext to reduce cross-tenant key/record mixups.
+# Minimalna liczba tokenów, od której batch API w ogóle rozważa process pool.
+# Poniżej tego progu koszt startu procesów przewyższa zysk.
+_PHONE_CRYPTO_POOL_MIN = int(os.getenv("PHONE_CRYPTO_POOL_MIN", "5000"))
+
+
+def _get_phone_cipher() -> Fernet:
+    """Returns a Fernet instance for the phone key, built once per key.
+
+    The key itself is cached by _get_param_from_store; here we additionally
+    avoid re-parsing it into a Fernet object for every single token.
     """
+    global _cached_phone_cipher
+    key = _get_phone_enc_key()
+    cached = _cached_phone_cipher
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    f = _fernet().Fernet(key)
+    _cached_phone_cipher = (key, f)
+    return f
+
+
+def _encrypt_phone_with(f: Fernet, tenant_id: str, phone: str) -> str:
     if not phone:
         return ""
-    f = Fernet(_get_phone_enc_key())
     payload = f"{tenant_id}|{normalize_phone(phone)}".encode("utf-8")
     return f.encrypt(payload).decode("utf-8")
 
 
-def decrypt_phone(tenant_id: str, phone_enc: str) -> str:
-    """Decrypt phone from storage.
-
-    Returns normalized phone (without whatsapp: prefix).
-    """
+def _decrypt_phone_with(f: Fernet, tenant_id: str, phone_enc: str) -> str:
     if not phone_enc:
         return ""
-    f = Fernet(_get_phone_enc_key())
     try:
         raw = f.decrypt(phone_enc.encode("utf-8")).decode("utf-8")
-    except InvalidToken:
+    except _fernet().InvalidToken:
         logger.error({"security": "phone_decrypt_invalid_token", "tenant_id": tenant_id})
         return ""
     except Exception as e:
@@ -234,4 +269,94 @@ def decrypt_phone(tenant_id: str, phone_enc: str) -> str:
     if t != tenant_id:
         logger.warning({"security": "phone_decrypt_tenant_mismatch", "tenant_id": tenant_id})
         return ""
-    return p
\ No newline at end of file
+    return p
+
+
+def _encrypt_phone_chunk(key: str, tenant_id: str, phones: list[str]) -> list[str]:
+    """Process-pool worker: encrypts a slice of phones with its own cipher."""
+    f = _fernet().Fernet(key)
+    return [_encrypt_phone_with(f, tenant_id, p) for p in phones]
+
+
+def _decrypt_phone_chunk(key: str, tenant_id: str, tokens: list[str]) -> list[str]:
+    """Process-pool worker: decrypts a slice of tokens with its own cipher."""
+    f = _fernet().Fernet(key)
+    return [_decrypt_phone_with(f, tenant_id, t) for t in tokens]
+
+
+def _map_phone_chunks_in_pool(fn, tenant_id: str, items: list[str], processes: int) -> list[str] | None:
+    """Runs fn over item slices in a process pool.
+
+    Returns None when the pool cannot be used (e.g. AWS Lambda has no
+    /dev/shm for multiprocessing semaphores) so the caller can fall back
+    to the sequential path.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    key = _get_phone_enc_key()
+    size = -(-len(items) // processes)
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as ex:
+            parts = list(ex.map(fn, [key] * len(chunks), [tenant_id] * len(chunks), chunks))
+    except (OSError, NotImplementedError, ImportError, BrokenProcessPool) as e:
+        # BrokenProcessPool: worker zabity (np. OOM w Lambdzie) – liczymy sekwencyjnie
+        logger.warning({"security": "phone_crypto_pool_unavailable", "error": str(e)})
+        return None
+    return [x for part in parts for x in part]
+
+
+def encrypt_phone(tenant_id: str, phone: str) -> str:
+    """Encrypt phone for storage.
+
+    The ciphertext is safe to store (base64). Tenant id is included in the
+    plaintext to reduce cross-tenant key/record mixups.
+    """
+    if not phone:
+        return ""
+    return _encrypt_phone_with(_get_phone_cipher(), tenant_id, phone)
+
+
+def decrypt_phone(tenant_id: str, phone_enc: str) -> str:
+    """Decrypt phone from storage.
+
+    Returns normalized phone (without whatsapp: prefix).
+    """
+    if not phone_enc:
+        return ""
+    return _decrypt_phone_with(_get_phone_cipher(), tenant_id, phone_enc)
+
+
+def encrypt_phones(tenant_id: str, phones: list[str], *, processes: int = 0) -> list[str]:
+    """Batch version of encrypt_phone (same order, "" for empty input).
+
+    processes > 1 enables a process pool for very large lists
+    (>= PHONE_CRYPTO_POOL_MIN); otherwise a single cached cipher is used.
+    """
+    items = list(phones or [])
+    if not items:
+        return []
+    if processes > 1 and len(items) >= _PHONE_CRYPTO_POOL_MIN:
+        out = _map_phone_chunks_in_pool(_encrypt_phone_chunk, tenant_id, items, processes)
+        if out is not None:
+            return out
+    f = _get_phone_cipher()
+    return [_encrypt_phone_with(f, tenant_id, p) for p in items]
+
+
+def decrypt_phones(tenant_id: str, phone_encs: list[str], *, processes: int = 0) -> list[str]:
+    """Batch version of decrypt_phone (same order, "" for invalid tokens).
+
+    processes > 1 enables a process pool for very large lists
+    (>= PHONE_CRYPTO_POOL_MIN); otherwise a single cached cipher is used.
+    """
+    items = list(phone_encs or [])
+    if not items:
+        return []
+    if processes > 1 and len(items) >= _PHONE_CRYPTO_POOL_MIN:
+        out = _map_phone_chunks_in_pool(_decrypt_phone_chunk, tenant_id, items, processes)
+        if out is not None:
+            return out
+    f = _get_phone_cipher()
+    return [_decrypt_phone_with(f, tenant_id, t) for t in items]
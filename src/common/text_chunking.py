@@ -7,7 +7,7 @@ previous vectors in Pinecone.
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Union, Iterable, Tuple
+from typing import Any, Dict, Iterator, List, Union, Tuple
 import re
 import hashlib
 
@@ -22,8 +22,13 @@ class FAQChunk:
     text: str
 
 
+_RE_WS = re.compile(r"\s+")
+_RE_PARAGRAPHS = re.compile(r"\n\n+")
+_RE_SENTENCES = re.compile(r"(?<=[\.!\?])\s+")
+
+
 def _normalize_ws(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "").strip())
+    return _RE_WS.sub(" ", (s or "").strip())
 
 
 def _stable_id(*parts: str) -> str:
@@ -31,16 +36,62 @@ def _stable_id(*parts: str) -> str:
     return hashlib.sha1(raw.encode("utf-8")).hexdigest()
 
 
-    
-
-def chunk_faq(
+def iter_faq_entries(obj: Union[Dict[str, str], Dict[str, Any]]) -> Iterator[Tuple[str, str, List[str], str]]:
+    """
+    Yields (faq_key, category, questions[], answer) for both formats:
+      - legacy: { "key": "answer" }
+      - new: { "entries": [ { "key": ..., "questions": [...], "answer": ... }, ... ] }
+    """
+    if not obj or not isinstance(obj, dict):
+        return
+    if isinstance(obj.get("entries"), list):
+        for e in obj.get("entries") or []:
+            if not isinstance(e, dict):
+                continue
+            key = _normalize_ws(str(e.get("key") or ""))
+            ans = _normalize_ws(str(e.get("answer") or ""))
+            cat = _normalize_ws(str(e.get("category") or "kb")).lower()
+            if cat not in ("kb", "smalltalk"):
+                cat = "kb"
+            qs_raw = e.get("questions") or []
+            qs: List[str] = []
+            if isinstance(qs_raw, list):
+                for q in qs_raw:
+                    qn = _normalize_ws(str(q or ""))
+                    if qn:
+                        qs.append(qn)
+            if key and ans:
+                yield key, cat, qs, ans
+        return
+    # legacy
+    for k, v in obj.items():
+        key = _normalize_ws(str(k or ""))
+        ans = _normalize_ws(str(v or ""))
+        if key and ans:
+            yield key, "kb", [], ans
+
+
+def _hard_split(text: str, max_chars: int, overlap_chars: int) -> Iterator[str]:
+    """Fixed-size windows with overlap for pieces that have no usable boundary."""
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + max_chars)
+        piece = text[start:end].strip()
+        if piece:
+            yield piece
+        if end >= len(text):
+            break
+        start = max(0, end - overlap_chars)
+
+
+def iter_faq_chunks(
     faq: Union[Dict[str, str], Dict[str, Any]],
     *,
     max_chars: int = 1200,
     overlap_chars: int = 150,
     include_q_prefix: bool = True,
-) -> List[FAQChunk]:
-    """Chunk FAQ dict into a list of FAQChunk.
+) -> Iterator[FAQChunk]:
+    """Yield FAQChunk for every FAQ entry in a single pass.
 
     Strategy:
     - Each FAQ entry is a document: "Q: ...\nA: ...".
@@ -48,66 +99,28 @@ def chunk_faq(
       falling back to hard splits.
     - We add small character overlap to preserve context across boundaries.
 
+    Oversized pieces are hard-split as soon as they are produced, so work and
+    memory are linear in the FAQ size and nothing is buffered beyond the
+    current question.
+
     Args:
         faq: mapping question/topic -> answer
         max_chars: maximum characters per chunk (safe for embedding models)
         overlap_chars: number of chars to overlap between adjacent chunks
         include_q_prefix: include "Q:" and "A:" labels in the chunk body
 
-    Returns:
-        List of FAQChunk with deterministic chunk_id.
+    Yields:
+        FAQChunk with deterministic chunk_id.
     """
-    
-    chunks: List[FAQChunk] = []
-    
-    def _iter_entries(obj: Union[Dict[str, str], Dict[str, Any]]) -> Iterable[Tuple[str, str, List[str], str]]:
-        """
-        Yields (faq_key, questions[], answer) for both formats:
-          - legacy: { "key": "answer" }
-          - new: { "entries": [ { "key": ..., "questions": [...], "answer": ... }, ... ] }
-        """
-        if not obj:
-            return []
-        if isinstance(obj, dict) and isinstance(obj.get("entries"), list):
-            out: List[Tuple[str, str, List[str], str]] = []
-            for e in obj.get("entries") or []:
-                if not isinstance(e, dict):
-                    continue
-                key = _normalize_ws(str(e.get("key") or ""))
-                ans = _normalize_ws(str(e.get("answer") or ""))
-                cat = _normalize_ws(str(e.get("category") or "kb")).lower()
-                if cat not in ("kb", "smalltalk"):
-                    cat = "kb"
-                qs_raw = e.get("questions") or []
-                qs: List[str] = []
-                if isinstance(qs_raw, list):
-                    for q in qs_raw:
-                        qn = _normalize_ws(str(q or ""))
-                        if qn:
-                            qs.append(qn)
-                if key and ans:
-                    out.append((key, cat, qs, ans))
-            return out
-        # legacy
-        if isinstance(obj, dict):
-            out2: List[Tuple[str, str, List[str], str]] = []
-            for k, v in obj.items():
-                key = _normalize_ws(str(k or ""))
-                ans = _normalize_ws(str(v or ""))
-                if key and ans:
-                    out2.append((key, "kb", [], ans))
-            return out2
-        return []
-        
-    for faq_key, category, questions, answer in _iter_entries(faq):
+    for faq_key, category, questions, answer in iter_faq_entries(faq):
         # Build one or multiple "documents" per entry:
         # - if questions[] is provided -> chunk per natural question
         # - else -> fallback to key as question (legacy)
         q_list = questions if questions else [faq_key]
+        a = _normalize_ws(str(answer))
 
         for q_item in q_list:
             q = _normalize_ws(str(q_item))
-            a = _normalize_ws(str(answer))
 
             doc = f"Q: {q}\nA: {a}" if include_q_prefix else f"{q}\n{a}"
 
@@ -117,18 +130,23 @@ def chunk_faq(
 
             if len(doc) <= max_chars:
                 cid = _stable_id(faq_key, q, a)
-                chunks.append(FAQChunk(chunk_id=cid, faq_key=faq_key, category=category, text=doc))
-
+                yield FAQChunk(chunk_id=cid, faq_key=faq_key, category=category, text=doc)
                 continue
 
+            def _emit(text: str) -> Iterator[FAQChunk]:
+                # If a piece still exceeds max_chars (rare), hard-split with overlap.
+                pieces = [text] if len(text) <= max_chars else _hard_split(text, max_chars, overlap_chars)
+                for piece in pieces:
+                    cid = _stable_id(faq_key, q, piece)
+                    yield FAQChunk(chunk_id=cid, faq_key=faq_key, category=category, text=piece)
+
             # Prefer splitting on paragraphs, then sentences.
-            parts: List[str] = []
-            paras = [p.strip() for p in re.split(r"\n\n+", doc) if p.strip()]
+            paras = [p.strip() for p in _RE_PARAGRAPHS.split(doc) if p.strip()]
             if len(paras) > 1:
                 parts = paras
             else:
                 # sentence-ish split
-                parts = [p.strip() for p in re.split(r"(?<=[\.!\?])\s+", doc) if p.strip()]
+                parts = [p.strip() for p in _RE_SENTENCES.split(doc) if p.strip()]
 
             buf = ""
             for part in parts:
@@ -140,31 +158,30 @@ def chunk_faq(
                 else:
                     buf = buf.strip()
                     if buf:
-                        cid = _stable_id(faq_key,q, buf)
-                        chunks.append(FAQChunk(chunk_id=cid, faq_key=faq_key, category=category, text=buf))
+                        yield from _emit(buf)
                     buf = part
 
             if buf.strip():
-                cid = _stable_id(faq_key, q, buf.strip())
-                chunks.append(FAQChunk(chunk_id=cid, faq_key=faq_key, category=category, text=buf.strip()))
-
-            # If still any chunk exceeds max_chars (rare), hard-split with overlap.
-            final: List[FAQChunk] = []
-            for ch in chunks:
-                if ch.faq_key != faq_key or len(ch.text) <= max_chars:
-                    final.append(ch)
-                    continue
-                t = ch.text
-                start = 0
-                while start < len(t):
-                    end = min(len(t), start + max_chars)
-                    piece = t[start:end].strip()
-                    if piece:
-                        cid = _stable_id(faq_key, q, piece)
-                        final.append(FAQChunk(chunk_id=cid, faq_key=faq_key, category=category, text=piece))
-                    if end >= len(t):
-                        break
-                    start = max(0, end - overlap_chars)
-            chunks = final
-
-    return chunks
+                yield from _emit(buf.strip())
+
+
+def chunk_faq(
+    faq: Union[Dict[str, str], Dict[str, Any]],
+    *,
+    max_chars: int = 1200,
+    overlap_chars: int = 150,
+    include_q_prefix: bool = True,
+) -> List[FAQChunk]:
+    """Chunk FAQ dict into a list of FAQChunk (materialized iter_faq_chunks).
+
+    Returns:
+        List of FAQChunk with deterministic chunk_id.
+    """
+    return list(
+        iter_faq_chunks(
+            faq,
+            max_chars=max_chars,
+            overlap_chars=overlap_chars,
+            include_q_prefix=include_q_prefix,
+        )
+    )
@@ -14,18 +14,22 @@ from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
 from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
 
 from ...services.campaign_service import CampaignService
+from ...services.campaign_scheduler import CampaignScheduler
+from ...services.tenant_config_service import default_tenant_config_service
 from ...repos.conversations_repo import ConversationsRepo
 from ...common.aws import sqs_client, ddb_resource, resolve_queue_url
 from ...common.logging import logger
 from ...common.utils import normalize_whatsapp_channel_user_id
 from ...services.clients_factory import ClientsFactory
 from ...repos.tenants_repo import TenantsRepo
-from ...common.security import decrypt_phone, conversation_key
+from ...common.security import decrypt_phones, conversation_key
 from ...services.metrics_service import MetricsService
 from ...common.constants import (
     CAMPAIGNS_TENANT_NEXT_RUN_INDEX, 
+    CAMPAIGNS_NEXT_RUN_FORMAT,
     CAMPAIGNS_TIME_ZONE, 
     CAMPAIGNS_1ST_NAME_PLACEHOLDER, 
     CAMPAIGNS_PAYMENT_URL_PLACEHOLDER,
@@ -34,8 +38,21 @@ from ...common.constants import (
 
 OUTBOUND_QUEUE_URL = os.getenv("OutboundQueueUrl")
 CAMPAIGNS_TABLE = os.getenv("DDB_TABLE_CAMPAIGNS", "Campaigns")
+# >1 włącza process pool dla bardzo dużych list odbiorców (poza Lambdą)
+CAMPAIGN_DECRYPT_PROCESSES = int(os.getenv("CAMPAIGN_DECRYPT_PROCESSES", "0"))
+# Timeout funkcji z template.yaml (CampaignRunnerFunction)
+CAMPAIGN_FUNCTION_TIMEOUT_S = int(os.getenv("CAMPAIGN_FUNCTION_TIMEOUT_S", "300"))
+# lease chroni przed równoległym runem tej samej kampanii: timeout Lambdy + zapas,
+# ale krótszy niż interwał ticku (15 min), żeby po crashu kolejny tick przejął kampanię
+CAMPAIGN_LEASE_SECONDS = int(os.getenv("CAMPAIGN_LEASE_SECONDS", str(CAMPAIGN_FUNCTION_TIMEOUT_S + 60)))
+# co ile wysłanych odbiorców zapisujemy kursor (max tyle duplikatów po awarii)
+CAMPAIGN_CURSOR_FLUSH_EVERY = max(1, int(os.getenv("CAMPAIGN_CURSOR_FLUSH_EVERY", "10")))
+# zapas czasu przed timeoutem Lambdy na zapis kursora
+CAMPAIGN_RUNTIME_MARGIN_MS = int(os.getenv("CAMPAIGN_RUNTIME_MARGIN_MS", "5000"))
 
 svc = CampaignService()
+scheduler = CampaignScheduler()
+tenant_cfg = default_tenant_config_service()
 conv_repo = ConversationsRepo()
 clients = ClientsFactory()
 tenants_repo = TenantsRepo()
@@ -79,13 +96,356 @@ def check_member_type(tenant_id: str, tag: str, phone_number: str, exclude: bool
         return False
     return member_type.lower() != tag.lower() if exclude else member_type.lower() == tag.lower()
 
+def _send_to_recipient(item: dict, tenant_id_item: str, recipient, phone: str, out_q_url: str, delay_seconds: int = 0) -> bool:
+    """Wysyła kampanię do jednego odbiorcy; False = odbiorca pominięty."""
+    if not (isinstance(recipient, dict) and recipient.get("token")):
+        logger.warning(
+            {
+                "campaign": "no_phone",
+                "campaign_id": item.get("campaign_id"),
+                "tenant_id": tenant_id_item,
+            }
+        )
+        return False
+    if not phone:
+        logger.warning(
+            {
+                "campaign": "no_phone_mapping",
+                "campaign_id": item.get("campaign_id"),
+                "tenant_id": tenant_id_item,
+            }
+        )
+        return False
+
+    members = clients.perfectgym(tenant_id_item).get_member_by_phone(phone)
+    items = (members or {}).get("value") or []
+    if not items:
+        logger.warning(
+            {
+                "campaign": "no member",
+                "campaign_id": item.get("campaign_id"),
+                "tenant_id": tenant_id_item,
+            }
+        )
+        return False
+
+    raw_id = items[0].get("Id") or items[0].get("id")
+    member_id = None
+
+    try:
+        member_id = int(raw_id)
+    except (TypeError, ValueError):
+        logger.warning(
+            {
+                "campaign": "get_member_id_failed",
+                "campaign_id": item.get("campaign_id"),
+                "tenant_id": tenant_id_item,
+                "raw_id": raw_id,
+            }
+        )
+        return False
+
+    if not clients.perfectgym(tenant_id_item).get_marketing_consent_for_member(
+        member_id=member_id,
+        ):
+        logger.warning(
+            {
+                "campaign": "no marketing_consent_for_member",
+                "campaign_id": item.get("campaign_id"),
+                "tenant_id": tenant_id_item,
+            }
+        )
+        return False
+
+    include_tags = svc.select_include_tags(item)
+
+    if include_tags:
+        is_included = any(
+            check_member_type(
+                tenant_id_item,
+                tag,
+                phone,
+                exclude=False,
+            )
+            for tag in include_tags
+        )
+
+        if not is_included:
+            logger.warning(
+                {
+                    "campaign": "not included",
+                    "campaign_id": item.get("campaign_id"),
+                    "tenant_id": tenant_id_item,
+                    "include_tags": include_tags,
+                }
+            )
+            return False
+
+
+    exclude_tags = svc.select_exclude_tags(item)
+
+    if exclude_tags:
+        is_excluded = any(
+            check_member_type(
+                tenant_id_item,
+                tag,
+                phone,
+                exclude=False,
+            )
+            for tag in exclude_tags
+        )
+
+        if is_excluded:
+            logger.warning(
+                {
+                    "campaign": "excluded",
+                    "campaign_id": item.get("campaign_id"),
+                    "tenant_id": tenant_id_item,
+                    "exclude_tags": exclude_tags,
+                }
+            )
+            return False
+
+    product_id = item.get(CAMPAIGNS_PRODUCT_ID_PLACEHOLDER)
+    context = build_campaign_context(tenant_id_item, member_id, phone, product_id) 
+
+    msg = svc.build_message(
+        campaign=item,
+        tenant_id=tenant_id_item,
+        recipient_phone=phone,
+        context=context,
+    )
+    to = normalize_whatsapp_channel_user_id(phone)
+
+    payload = {
+        "to": to,
+        "body": msg["body"],
+        "tenant_id": tenant_id_item,
+        "message_type": "campaign",
+    }     
+    if msg.get("language_code"):
+        payload["language_code"] = msg["language_code"]
+
+    send_kwargs = {"QueueUrl": out_q_url, "MessageBody": json.dumps(payload)}
+    if delay_seconds > 0:
+        send_kwargs["DelaySeconds"] = delay_seconds
+    try:
+        sqs_client().send_message(**send_kwargs)
+    except Exception as e:
+        raise _OutboundUnavailable(str(e)) from e
+
+    conv_key = conversation_key(
+        tenant_id_item,
+        "whatsapp",
+        to,
+        None,
+    )
+    try:
+        MESSAGES.log_message(
+            tenant_id=msg.tenant_id,
+            conversation_id=conv_key,
+            msg_id=new_id("out-"),
+            direction="outbound",
+            body=msg.body or "",
+            from_phone=msg.from_phone,
+            to_phone=msg.to_phone,
+            channel=msg.channel or "whatsapp",
+            channel_user_id=msg.channel_user_id or msg.from_phone,
+            language_code=None,
+            tag="campaign"
+        )
+    except Exception:
+        # nie blokujemy flow jeśli logowanie padnie
+        pass
+
+    metrics.incr("TenantCampaignSendOk", tenant_id=tenant_id_item, component="campaign_runner")
+    return True
+
+
+def _acquire_lease(table, pk: str, now_s: int) -> dict | None:
+    """Blokuje kampanię na czas ticku (dwa równoległe runy nie wyślą jej podwójnie).
+
+    Zwraca pełny, świeży item (z postępem) albo None, gdy kampania jest
+    zajęta przez inny run lub już nieaktywna.
+    """
+    try:
+        resp = table.update_item(
+            Key={"pk": pk},
+            UpdateExpression="SET lease_until = :until",
+            ConditionExpression="active = :active AND (attribute_not_exists(lease_until) OR lease_until < :now)",
+            ExpressionAttributeValues={
+                ":until": now_s + CAMPAIGN_LEASE_SECONDS,
+                ":now": now_s,
+                ":active": True,
+            },
+            ReturnValues="ALL_NEW",
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return None
+        raise
+    return resp.get("Attributes") or {}
+
+
+def _save_progress(table, pk: str, progress: dict, sent_count: int, *, final: bool = False, next_run_time: str | None = None) -> None:
+    """Zapisuje kursor wysyłki; final=True zwalnia lease i planuje kolejny tick (albo kończy kampanię)."""
+    values = {
+        ":progress": {k: int(v) for k, v in progress.items()},
+        ":sent": int(sent_count),
+    }
+    expr = "SET progress = :progress, sent_count = :sent"
+    if final:
+        if next_run_time:
+            expr += ", next_run_time = :next, campaign_status = :status"
+            values[":next"] = next_run_time
+            values[":status"] = "running"
+        else:
+            expr += ", active = :active, campaign_status = :status"
+            values[":active"] = False
+            values[":status"] = "done"
+        expr += " REMOVE lease_until"
+    table.update_item(Key={"pk": pk}, UpdateExpression=expr, ExpressionAttributeValues=values)
+
+
+def _release_lease(table, pk: str, progress: dict, sent_count: int) -> None:
+    """Po błędzie ticku: zapisuje dotychczasowy postęp i zwalnia lease (next_run_time bez zmian -> retry w kolejnym ticku)."""
+    table.update_item(
+        Key={"pk": pk},
+        UpdateExpression="SET progress = :progress, sent_count = :sent REMOVE lease_until",
+        ExpressionAttributeValues={
+            ":progress": {k: int(v) for k, v in progress.items()},
+            ":sent": int(sent_count),
+        },
+    )
+
+
+def _remaining_ms(context) -> float:
+    fn = getattr(context, "get_remaining_time_in_millis", None)
+    if not callable(fn):
+        return float("inf")
+    try:
+        return float(fn())
+    except Exception:
+        return float("inf")
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+class _OutboundUnavailable(Exception):
+    """Błąd kolejki wychodzącej – przejściowy, przerywa cały tick (kursor stoi na odbiorcy)."""
+
+
+def run_campaign(table, item: dict, tenant_id: str, out_q_url: str, context=None, tick_start=None) -> dict:
+    """Jeden tick kampanii: wysyła bieżący fragment i zapisuje postęp.
+
+    tick_start: początek invokacji – od niego liczony jest next_run_time.
+    """
+    tenant_id_item = item.get("tenant_id") or tenant_id
+    now = scheduler.now()
+    leased = _acquire_lease(table, item["pk"], int(now.timestamp()))
+    if leased is None:
+        logger.info({"campaign": "locked_or_inactive", "campaign_id": item.get("campaign_id"), "tenant_id": tenant_id_item})
+        return {"sent": 0, "done": False, "skipped": True}
+    item = {**item, **leased}
+    progress = {k: int(v) for k, v in (item.get("progress") or {}).items()}
+    sent_count = int(item.get("sent_count") or 0)
+
+    try:
+        recipients = list(svc.select_recipients(item))
+        # jeden batch decrypt (wspólny cipher) zamiast decrypt per odbiorca
+        phones = decrypt_phones(
+            tenant_id_item,
+            [r.get("token") or "" if isinstance(r, dict) else "" for r in recipients],
+            processes=CAMPAIGN_DECRYPT_PROCESSES,
+        )
+        buckets = scheduler.bucket_by_timezone(phones, default=item.get("timezone"))
+
+        try:
+            cfg = tenant_cfg.get(tenant_id_item)
+        except Exception:
+            cfg = {}
+        rate = scheduler.pacing_rate(cfg)
+
+        # pos = faktycznie wysłane w tym ticku (budżet tempa i DelaySeconds);
+        # pominięci odbiorcy przesuwają tylko kursor
+        pos = 0
+        processed = 0
+        try:
+            for sl in scheduler.plan(item, buckets, progress, rate=rate, now=now):
+                bucket = buckets[sl.timezone]
+                quota = sl.end - sl.start
+                k = sl.start
+                while quota > 0 and k < len(bucket):
+                    if _remaining_ms(context) < CAMPAIGN_RUNTIME_MARGIN_MS:
+                        raise _OutOfTime()
+                    idx = bucket[k]
+                    try:
+                        ok = _send_to_recipient(item, tenant_id_item, recipients[idx], phones[idx], out_q_url, scheduler.delay_seconds(pos, rate))
+                    except _OutboundUnavailable:
+                        raise
+                    except Exception as e:
+                        # błąd jednego odbiorcy (PerfectGym, kontekst, szablon) nie blokuje kampanii
+                        logger.error(
+                            {
+                                "campaign": "recipient_failed",
+                                "campaign_id": item.get("campaign_id"),
+                                "tenant_id": tenant_id_item,
+                                "err": str(e),
+                            }
+                        )
+                        metrics.incr("TenantCampaignSendError", tenant_id=tenant_id_item, component="campaign_runner")
+                        ok = False
+                    if ok:
+                        sent_count += 1
+                        pos += 1
+                        quota -= 1
+                    k += 1
+                    processed += 1
+                    progress[sl.timezone] = k
+                    if processed % CAMPAIGN_CURSOR_FLUSH_EVERY == 0:
+                        _save_progress(table, item["pk"], progress, sent_count)
+        except _OutOfTime:
+            logger.warning({"campaign": "tick_out_of_time", "campaign_id": item.get("campaign_id"), "tenant_id": tenant_id_item})
+
+        next_run_time = scheduler.next_run_time(item, buckets, progress, now=tick_start or now)
+        _save_progress(table, item["pk"], progress, sent_count, final=True, next_run_time=next_run_time)
+    except Exception:
+        # lease nie może wisieć CAMPAIGN_LEASE_SECONDS po błędzie
+        try:
+            _release_lease(table, item["pk"], progress, sent_count)
+        except Exception as e:
+            logger.error({"campaign": "lease_release_failed", "campaign_id": item.get("campaign_id"), "err": str(e)})
+        raise
+
+    if next_run_time:
+        metrics.incr("TenantCampaignDeferred", tenant_id=tenant_id_item, component="campaign_runner")
+
+    logger.info(
+        {
+            "campaign": "send",
+            "campaign_id": item.get("campaign_id"),
+            "tenant_id": tenant_id_item,
+            "sent": pos,
+            "processed": processed,
+            "sent_total": sent_count,
+            "rate": rate,
+            "next_run_time": next_run_time,
+        }
+    )
+    return {"sent": pos, "done": next_run_time is None, "skipped": False}
+
+
 def lambda_handler(event, context):
     """
-    Główny handler kampanii:
+    Główny handler kampanii (tick EventBridge):
     - NIE skanuje tabeli kampanii,
     - pobiera kampanie "due" przez GSI tenant_id + next_run_time (<= now),
-    - dla każdej aktywnej kampanii wysyła wiadomości do odbiorców
+    - dla każdej aktywnej kampanii wysyła bieżący fragment (okno + tempo tenanta),
+      zapisuje kursor i planuje kolejny tick; active=False dopiero po wysłaniu całości.
     """
+    tick_start = scheduler.now()
     table = ddb_resource().Table(CAMPAIGNS_TABLE)
     out_q_url = resolve_queue_url("OutboundQueueUrl")
 
@@ -100,12 +460,11 @@ def lambda_handler(event, context):
     def iter_due_campaigns(tenant_id: str):
         """
         Query po GSI (tenant_id + next_run_time), z paginacją.
-        Pobiera kampanie, których next_run_time <= teraz i ustawia 
-        pole active na false
+        Pobiera kampanie, których next_run_time <= teraz.
         """
         # ISO 8601 UTC (lexicographically sortable)        
         now_dt = datetime.now(ZoneInfo(CAMPAIGNS_TIME_ZONE))
-        now_iso = now_dt.strftime("%Y-%m-%dT%H:%M:%S")
+        now_iso = now_dt.strftime(CAMPAIGNS_NEXT_RUN_FORMAT)
         
 
         query_kwargs = {
@@ -129,6 +488,10 @@ def lambda_handler(event, context):
                 yield it
               
     for tid in tenant_ids:
+        if _remaining_ms(context) < CAMPAIGN_RUNTIME_MARGIN_MS:
+            # pozostali tenanci zostaną podjęci w kolejnym ticku – bez zapytań o kampanie
+            logger.info({"campaign": "tick_out_of_time", "tenant_id": tid})
+            return {"statusCode": 200}
         for item in iter_due_campaigns(tid):
             if not item.get("active", False):                
                 logger.warning(
@@ -139,187 +502,21 @@ def lambda_handler(event, context):
                     }
                 )
                 continue
-            table.update_item(
-                Key={
-                    "pk": item["pk"],
-                },
-                UpdateExpression="SET active = :active",
-                ExpressionAttributeValues={
-                    ":active": False,
-                },
-            )
-
-            tenant_id_item = item.get("tenant_id") or tid
-            for recipient in svc.select_recipients(item):
-                # recipient ma byc dict z token (bez PII w Campaigns)
-                if isinstance(recipient, dict) and recipient.get("token"):
-                    phone_enc = recipient.get("token")   
-                    phone = decrypt_phone(tenant_id_item, phone_enc) if phone_enc else ""
-                    if not phone:
-                        logger.warning(
-                            {
-                                "campaign": "no_phone_mapping",
-                                "campaign_id": item.get("campaign_id"),
-                                "tenant_id": tenant_id_item,
-                            }
-                        )
-                        continue
-                else:
-                    logger.warning(
-                        {
-                            "campaign": "no_phone",
-                            "campaign_id": item.get("campaign_id"),
-                            "tenant_id": tenant_id_item,
-                        }
-                    )
-                    continue
-
-                members = clients.perfectgym(tenant_id_item).get_member_by_phone(phone)
-                items = (members or {}).get("value") or []
-                if not items:
-                    logger.warning(
-                        {
-                            "campaign": "no member",
-                            "campaign_id": item.get("campaign_id"),
-                            "tenant_id": item.get("tenant_id", tid),
-                        }
-                    )
-                    continue
-
-                raw_id = items[0].get("Id") or items[0].get("id")
-                member_id = None
-
-                try:
-                    member_id = int(raw_id)
-                except (TypeError, ValueError):
-                    logger.warning(
-                        {
-                            "campaign": "get_member_id_failed",
-                            "campaign_id": item.get("campaign_id"),
-                            "tenant_id": item.get("tenant_id", tid),
-                            "raw_id": raw_id,
-                        }
-                    )
-                    continue
-
-                if not clients.perfectgym(tenant_id_item).get_marketing_consent_for_member(
-                    member_id=member_id,
-                    ):
-                    logger.warning(
-                        {
-                            "campaign": "no marketing_consent_for_member",
-                            "campaign_id": item.get("campaign_id"),
-                            "tenant_id": item.get("tenant_id", tid),
-                        }
-                    )
-                    continue
-
-                include_tags = svc.select_include_tags(item)
-
-                if include_tags:
-                    is_included = any(
-                        check_member_type(
-                            tenant_id_item,
-                            tag,
-                            phone,
-                            exclude=False,
-                        )
-                        for tag in include_tags
-                    )
-
-                    if not is_included:
-                        logger.warning(
-                            {
-                                "campaign": "not included",
-                                "campaign_id": item.get("campaign_id"),
-                                "tenant_id": item.get("tenant_id", tid),
-                                "include_tags": include_tags,
-                            }
-                        )
-                        continue
-
-
-                exclude_tags = svc.select_exclude_tags(item)
-
-                if exclude_tags:
-                    is_excluded = any(
-                        check_member_type(
-                            tenant_id_item,
-                            tag,
-                            phone,
-                            exclude=False,
-                        )
-                        for tag in exclude_tags
-                    )
-
-                    if is_excluded:
-                        logger.warning(
-                            {
-                                "campaign": "excluded",
-                                "campaign_id": item.get("campaign_id"),
-                                "tenant_id": item.get("tenant_id", tid),
-                                "exclude_tags": exclude_tags,
-                            }
-                        )
-                        continue
-                    
-                product_id = item.get(CAMPAIGNS_PRODUCT_ID_PLACEHOLDER)
-                context = build_campaign_context(tenant_id_item, member_id, phone, product_id) 
-
-                msg = svc.build_message(
-                    campaign=item,
-                    tenant_id=tenant_id_item,
-                    recipient_phone=phone,
-                    context=context,
-                )
-                to = normalize_whatsapp_channel_user_id(phone)
-                
-                payload = {
-                    "to": to,
-                    "body": msg["body"],
-                    "tenant_id": tenant_id_item,
-                    "message_type": "campaign",
-                }     
-                if msg.get("language_code"):
-                    payload["language_code"] = msg["language_code"]
-
-                sqs_client().send_message(
-                    QueueUrl=out_q_url,
-                    MessageBody=json.dumps(payload),
-                )
-                
-                conv_key = conversation_key(
-                    tenant_id_item,
-                    "whatsapp",
-                    to,
-                    None,
+            if _remaining_ms(context) < CAMPAIGN_RUNTIME_MARGIN_MS:
+                # reszta kampanii (i tenantów) zostanie podjęta w kolejnym ticku
+                logger.info({"campaign": "tick_out_of_time", "tenant_id": tid})
+                return {"statusCode": 200}
+            try:
+                run_campaign(table, item, tid, out_q_url, context, tick_start=tick_start)
+            except Exception as e:
+                # błąd jednej kampanii nie blokuje pozostałych w ticku
+                logger.exception(
+                    {
+                        "campaign": "run_failed",
+                        "campaign_id": item.get("campaign_id"),
+                        "tenant_id": item.get("tenant_id", tid),
+                        "err": str(e),
+                    }
                 )
-                try:
-                    MESSAGES.log_message(
-                        tenant_id=msg.tenant_id,
-                        conversation_id=conv_key,
-                        msg_id=new_id("out-"),
-                        direction="outbound",
-                        body=msg.body or "",
-                        from_phone=msg.from_phone,
-                        to_phone=msg.to_phone,
-                        channel=msg.channel or "whatsapp",
-                        channel_user_id=msg.channel_user_id or msg.from_phone,
-                        language_code=None,
-                        tag="campaign"
-                    )
-                except Exception:
-                    # nie blokujemy flow jeśli logowanie padnie
-                    pass
-                    
-                
-                metrics.incr("TenantCampaignSendOk", tenant_id=tenant_id_item, component="campaign_runner")
-                
-            logger.info(
-                {
-                    "campaign": "send",
-                    "campaign_id": item.get("campaign_id"),
-                    "tenant_id": tenant_id_item,
-                }
-            )
-    return {"statusCode": 200}
\ No newline at end of file
+                metrics.incr("TenantCampaignError", tenant_id=item.get("tenant_id", tid), component="campaign_runner")
+    return {"statusCode": 200}
@@ -11,6 +11,7 @@ Trigger:
 Input event examples:
   {"tenant_id": "default", "language_code": "pl"}
   {"tenant_id": "clubA", "languages": ["pl", "en"]}
+  {"tenant_id": "clubA", "language_code": "pl", "force": true}   (pełna reindeksacja, bez manifestu)
   S3 event: {"Records":[{"s3":{"bucket":{"name":"..."}, "object":{"key":"tenantA/faq_pl.json"}}}]}
 """
 
@@ -88,11 +89,19 @@ def lambda_handler(event, context):
 
     # 1) S3-triggered mode: parse Records and reindex only affected tenant/lang pairs
     pairs = []
+    s3_event = False
     if isinstance(body, dict):
         pairs = _parse_s3_records(body)
+        s3_event = bool(body.get("Records"))
         if not pairs and body.get("source") == "aws.s3" and body.get("detail-type") in ("Object Created", "Object Created (All)"):
+            s3_event = True
             pairs = _parse_eventbridge_s3(body)
 
+    if s3_event and not pairs:
+        # inny obiekt w buckecie KB (manifest indeksu, modele NLU) – nie reindeksujemy "default"
+        logger.info({"component": "lambda_handler", "event": "kb_reindexer_ignored_key"})
+        return {"statusCode": 200, "body": json.dumps({"mode": "s3", "indexed": []})}
+
     if pairs:
         indexed = []
         for tenant_id, lang in pairs:
@@ -107,15 +116,16 @@ def lambda_handler(event, context):
     tenant_id = body.get("tenant_id") or "default"
     language_code = body.get("language_code")
     languages = body.get("languages")
+    force = bool(body.get("force"))
 
     results = {"mode": "manual", "tenant_id": tenant_id, "indexed": []}
  
     if isinstance(languages, list) and languages:
         for lang in languages:
-            ok = kb.reindex_faq(tenant_id=tenant_id, language_code=str(lang))
+            ok = kb.reindex_faq(tenant_id=tenant_id, language_code=str(lang), force=force)
             results["indexed"].append({"language_code": str(lang), "ok": bool(ok)})
     else:
-        ok = kb.reindex_faq(tenant_id=tenant_id, language_code=language_code)
+        ok = kb.reindex_faq(tenant_id=tenant_id, language_code=language_code, force=force)
         results["indexed"].append({"language_code": language_code or "", "ok": bool(ok)})
 
     logger.info({"event": "kb_reindexer_done", **results})
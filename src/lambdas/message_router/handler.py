@@ -8,34 +8,72 @@ i przekazuje do RoutingService, a następnie wrzuca odpowiedzi do kolejki outbou
 import json
 import time
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from ...services.routing_service import RoutingService
-from ...services.template_service import TemplateService
-from ...services.kb_service import KBService
+from ...services.container import default_container
+from ...services.warmup_service import WarmupService, warmup_on_init_enabled
 from ...repos.idempotency_repo import IdempotencyRepo
-from ...adapters.openai_client import OpenAIClient
-from ...repos.conversations_repo import ConversationsRepo
-from ...repos.messages_repo import MessagesRepo
-from ...repos.tenants_repo import TenantsRepo 
 from ...common.aws import resolve_queue_url, sqs_client 
 from ...domain.models import Message
 from ...common.logging import logger
 from ...common.logging_utils import mask_phone, shorten_body
 from ...common.utils import new_id
 from ...common.security import conversation_key
-from ...services.metrics_service import MetricsService
 from ...services.tenant_config_service import default_tenant_config_service
 from ...common.rate_limiter import InMemoryRateLimiter
+from ...common import deadline
 
 IDEMPOTENCY = IdempotencyRepo()
 
-ROUTER = RoutingService()
-MESSAGES = MessagesRepo()
+# Graf serwisów routera budowany leniwie (pierwsza wiadomość, która go
+# potrzebuje) i współdzielony przez kontener – cold start nie tworzy NLU/KB/CRM.
+CONTAINER = default_container()
+ROUTER = RoutingService(container=CONTAINER)
+MESSAGES = CONTAINER.messages()
 
-metrics = MetricsService()
+metrics = CONTAINER.metrics()
 tenant_cfg = default_tenant_config_service()
 tenant_limiter = InMemoryRateLimiter()
 
+# Priming cache'y (tenant config, szablony, FAQ, peppery) jeszcze w fazie init,
+# żeby pierwsza wiadomość po scale-out nie płaciła za zimne odczyty.
+if warmup_on_init_enabled():
+    try:
+        WarmupService(container=CONTAINER, metrics=metrics).prime(source="init")
+    except Exception as e:
+        logger.warning({"component": "warmup", "event": "init_prime_failed", "err": str(e)})
+
+# Ile rozmów (MessageGroupId) z jednego batcha przetwarzamy równolegle.
+ROUTER_GROUP_CONCURRENCY = int(os.getenv("ROUTER_GROUP_CONCURRENCY", "4"))
+# Minimalny czas do deadline'u invokacji, żeby zacząć routing kolejnego rekordu;
+# poniżej rekord wraca do SQS zamiast ryzykować timeout całego batcha.
+ROUTER_MIN_RECORD_S = float(os.getenv("ROUTER_MIN_RECORD_S", "2"))
+# OutboundQueue nie jest FIFO: resztę streamowanej odpowiedzi FAQ publikujemy
+# z opóźnieniem (SQS DelaySeconds), żeby nie wyprzedziła wysłanego wcześniej fragmentu.
+OUTBOUND_STREAM_REMAINDER_DELAY_S = int(os.getenv("OUTBOUND_STREAM_REMAINDER_DELAY_S", "3"))
+
+# Pula wątków rozmów żyje tyle co kontener: wątki (i ich zasoby DynamoDB,
+# zob. common.aws.ThreadLocalTable) są reużywane przez kolejne invokacje.
+# Wątki współdzielą ROUTER i serwisy kontenera – ich cache w pamięci muszą
+# znosić równoległe odczyty/zapisy.
+_GROUP_EXECUTOR: ThreadPoolExecutor | None = None
+_GROUP_EXECUTOR_LOCK = threading.Lock()
+
+
+def _group_executor() -> ThreadPoolExecutor:
+    global _GROUP_EXECUTOR
+    if _GROUP_EXECUTOR is None:
+        with _GROUP_EXECUTOR_LOCK:
+            if _GROUP_EXECUTOR is None:
+                _GROUP_EXECUTOR = ThreadPoolExecutor(
+                    max_workers=max(1, ROUTER_GROUP_CONCURRENCY),
+                    thread_name_prefix="router",
+                )
+    return _GROUP_EXECUTOR
+
+
 def _parse_record(record: dict) -> dict | None:
     raw_body = record.get("body", "")
     try:
@@ -68,7 +106,7 @@ def _build_message(body: dict) -> Message:
     )
 
 
-def _publish_actions(actions, original_body: dict):
+def _publish_actions(actions, original_body: dict, idx_offset: int = 0, delay_s: int = 0):
     outbound_url = resolve_queue_url("OutboundQueueUrl")
     tickets_url = (
         resolve_queue_url("TicketsQueueUrl")
@@ -76,7 +114,7 @@ def _publish_actions(actions, original_body: dict):
         else None
     )
 
-    for idx, a in enumerate(actions or []):
+    for idx, a in enumerate(actions or [], start=idx_offset):
         # akcje ticket – do kolejki ticketów, nie wysyłamy do klienta
         if a.type == "ticket":
             if tickets_url:
@@ -144,10 +182,10 @@ def _publish_actions(actions, original_body: dict):
 
         t0 = time.perf_counter()
         # wysyłka do kolejki outbound
-        sqs_client().send_message(
-            QueueUrl=outbound_url,
-            MessageBody=json.dumps(payload),
-        )
+        send_kwargs = {"QueueUrl": outbound_url, "MessageBody": json.dumps(payload)}
+        if delay_s > 0:
+            send_kwargs["DelaySeconds"] = min(int(delay_s), 900)
+        sqs_client().send_message(**send_kwargs)
 
         logger.info(
             {
@@ -163,6 +201,149 @@ def _publish_actions(actions, original_body: dict):
 
 
 
+def _route_record(r: dict, msg_body: dict, inbound_key: str | None) -> bool:
+    """Przetwarza jeden rekord (limiter, log, routing, publikacja). False = retry przez SQS."""
+    tenant_id = msg_body.get("tenant_id", "default")
+    logger.info(
+        {
+            "handler": "message_router",
+            "event": "received",
+            "from": mask_phone(msg_body.get("from")),
+            "to": mask_phone(msg_body.get("to")),
+            "body": shorten_body(msg_body.get("body")),
+            "tenant_id": msg_body.get("tenant_id"),
+            "channel": msg_body.get("channel", "whatsapp"),
+        }
+    )
+
+    # --- per-tenant soft limiter (no sleep; retry via batch failure) ---
+    try:
+        cfg = tenant_cfg.get(tenant_id)
+    except Exception:
+        cfg = {}
+    lim = (cfg.get("limits") or {}).get("router") or {}
+    try:
+        rate = float(lim.get("per_tenant_rps") or 0)
+        burst = float(lim.get("per_tenant_burst") or max(1.0, rate))
+    except Exception:
+        rate, burst = 0.0, 0.0
+
+    if rate > 0 and not tenant_limiter.try_acquire(f"router#{tenant_id}", rate=rate, burst=burst):
+        logger.warning({"handler": "message_router", "event": "tenant_throttled", "tenant_id": tenant_id})
+        metrics.incr("TenantRoutedThrottled", tenant_id=tenant_id, component="message_router")
+        # Let SQS retry later (klucz zwalniamy, żeby retry nie był duplikatem)
+        if inbound_key:
+            IDEMPOTENCY.release(inbound_key)
+        return False
+    metrics.incr("TenantRoutedInbound", tenant_id=tenant_id, component="message_router")
+
+    t_msg = time.perf_counter()
+
+    msg = _build_message(msg_body)
+    # Canonical conversation key for Messages history (no PII).
+    conv_key = conversation_key(
+        msg.tenant_id,
+        msg.channel or "whatsapp",
+        msg.channel_user_id or msg.from_phone,
+        msg.conversation_id,
+    )
+    # logujemy inbound do Messages
+    try:
+        MESSAGES.log_message(
+            tenant_id=msg.tenant_id,
+            conversation_id=conv_key,
+            msg_id=new_id("in-"),
+            direction="inbound",
+            body=msg.body or "",
+            from_phone=msg.from_phone,
+            to_phone=msg.to_phone,
+            channel=msg.channel or "whatsapp",
+            channel_user_id=msg.channel_user_id or msg.from_phone,
+            language_code=None,
+        )
+    except Exception:
+        # nie blokujemy flow jeśli logowanie padnie
+        pass
+
+    # akcje opublikowane w trakcie routingu (np. pierwszy akapit streamowanej odpowiedzi FAQ);
+    # licznik przesuwa indeksy idempotency_key kolejnych akcji
+    early = []
+
+    def _emit(action):
+        _publish_actions([action], msg_body, idx_offset=len(early))
+        early.append(action)
+
+    try:
+        actions = ROUTER.handle(msg, emit=_emit)
+        # po wczesnym fragmencie reszta idzie z opóźnieniem (kolejność u klienta)
+        _publish_actions(
+            actions,
+            msg_body,
+            idx_offset=len(early),
+            delay_s=OUTBOUND_STREAM_REMAINDER_DELAY_S if early else 0,
+        )
+        metrics.incr("TenantRoutedOk", tenant_id=tenant_id, component="message_router")
+    except Exception as e:
+        logger.error({"handler": "message_router", "event": "route_fail", "tenant_id": tenant_id, "err": str(e)})
+        metrics.incr("TenantRoutedError", tenant_id=tenant_id, component="message_router")
+        # SQS ponowi rekord – bez zwolnienia klucza retry zostałby uznany za duplikat
+        if inbound_key:
+            IDEMPOTENCY.release(inbound_key)
+        return False
+    finally:
+        metrics.timing_ms(
+            "TenantRoutingLatencyMs",
+            (time.perf_counter() - t_msg) * 1000,
+            tenant_id=tenant_id,
+            component="message_router",
+        )
+    return True
+
+
+def _group_key(r: dict, msg_body: dict) -> str:
+    """Klucz kolejności: MessageGroupId (FIFO), a bez niego rozmowa."""
+    attrs = r.get("attributes") or {}
+    return (
+        attrs.get("MessageGroupId")
+        or msg_body.get("conversation_id")
+        or f"{msg_body.get('tenant_id', 'default')}#{msg_body.get('channel_user_id') or msg_body.get('from') or r.get('messageId')}"
+    )
+
+
+def _run_group(items: list[tuple[dict, dict, str | None]]) -> list[str]:
+    """Przetwarza rekordy jednej rozmowy po kolei.
+
+    Po pierwszej porażce kolejne rekordy grupy NIE są przetwarzane – wracają
+    do SQS jako batchItemFailures (inaczej FIFO wykonałby je przed retry).
+    """
+    failed: list[str] = []
+    for pos, (r, msg_body, inbound_key) in enumerate(items):
+        left = deadline.remaining_s()
+        if left is not None and left < ROUTER_MIN_RECORD_S:
+            logger.warning(
+                {
+                    "handler": "message_router",
+                    "event": "deadline_defer",
+                    "remaining_s": round(left, 3),
+                    "deferred": len(items) - pos,
+                }
+            )
+            for r_next, _, key_next in items[pos:]:
+                if key_next:
+                    IDEMPOTENCY.release(key_next)
+                failed.append(r_next.get("messageId"))
+            break
+        if _route_record(r, msg_body, inbound_key):
+            continue
+        failed.append(r.get("messageId"))
+        for r_next, _, key_next in items[pos + 1:]:
+            if key_next:
+                IDEMPOTENCY.release(key_next)
+            failed.append(r_next.get("messageId"))
+        break
+    return failed
+
+
 def lambda_handler(event, context):
     """
     Główny handler AWS Lambda dla message_routera.
@@ -173,6 +354,17 @@ def lambda_handler(event, context):
     - wywołuje RoutingService.handle,
     - dla akcji typu "reply" publikuje komunikat do kolejki outbound.
     """
+    # jawne wywołanie {"warmup": true} (np. po deployu) – tylko priming, bez rekordów SQS.
+    # Nie ma harmonogramu: ping co N minut grzeje jeden kontener, a nie te, które
+    # powstaną przy scale-oucie – te primują się same przy init (WARMUP_ON_INIT
+    # dla tenantów z WARMUP_TENANTS).
+    if isinstance(event, dict) and event.get("warmup"):
+        report = WarmupService(container=CONTAINER, metrics=metrics).prime(event.get("tenant_ids"), source="event")
+        return {"warmup": report}
+
+    # deadline invokacji: OpenAIClient przycina do niego timeouty i retry
+    deadline.start_from_lambda_context(context)
+
     # limiter w CRMService jest w pamięci procesu (warm container),
     # więc resetujemy go na początku invokacji żeby działał "per invoke"
     try:
@@ -209,13 +401,25 @@ def lambda_handler(event, context):
         return {"statusCode": 200, "body": "no-records"}
 
     batch_failures = []
+    prepared: list[tuple[dict, dict, str | None]] = []
+    # grupy FIFO z odrzuconym rekordem – ich kolejne rekordy też wracają do SQS
+    blocked_groups: set[str] = set()
+
+    def _fail(rec: dict) -> None:
+        batch_failures.append({"itemIdentifier": rec.get("messageId")})
+        gid_failed = (rec.get("attributes") or {}).get("MessageGroupId")
+        if gid_failed:
+            blocked_groups.add(gid_failed)
 
     for r in records:
+        if (r.get("attributes") or {}).get("MessageGroupId") in blocked_groups:
+            _fail(r)
+            continue
         try:
             msg_body = _parse_record(r)
         except Exception as e:
             logger.error({"handler": "message_router", "event": "bad_record", "err": str(e)})
-            batch_failures.append({"itemIdentifier": r.get("messageId")})
+            _fail(r)
             continue
 
         if not msg_body:
@@ -238,7 +442,7 @@ def lambda_handler(event, context):
                     "conversation_id": conv_id,
                 }
             )
-            batch_failures.append({"itemIdentifier": r.get("messageId")})
+            _fail(r)
             continue
 
         # deduplication: if FIFO dedup id is set and we can derive expected, enforce it
@@ -253,94 +457,46 @@ def lambda_handler(event, context):
                     "expected": expected_dedup,
                 }
             )
-            batch_failures.append({"itemIdentifier": r.get("messageId")})
+            _fail(r)
             continue
 
-        # inbound idempotency
+        # inbound idempotency – klucze zbieramy dla całego batcha
         base = msg_body.get("event_id") or msg_body.get("message_sid") or r.get("messageId")
         tenant_id = msg_body.get("tenant_id", "default")
-        if base:
-            inbound_key = f"in#{tenant_id}#{base}"
-            if not IDEMPOTENCY.try_acquire(inbound_key, meta={"scope": "inbound"}):
-                logger.info({"handler": "message_router", "event": "duplicate_inbound", "tenant_id": tenant_id})
-                continue
-        logger.info(
-            {
-                "handler": "message_router",
-                "event": "received",
-                "from": mask_phone(msg_body.get("from")),
-                "to": mask_phone(msg_body.get("to")),
-                "body": shorten_body(msg_body.get("body")),
-                "tenant_id": msg_body.get("tenant_id"),
-                "channel": msg_body.get("channel", "whatsapp"),
-            }
-        )
-
-        # --- per-tenant soft limiter (no sleep; retry via batch failure) ---
-        try:
-            cfg = tenant_cfg.get(tenant_id)
-        except Exception:
-            cfg = {}
-        lim = (cfg.get("limits") or {}).get("router") or {}
-        try:
-            rate = float(lim.get("per_tenant_rps") or 0)
-            burst = float(lim.get("per_tenant_burst") or max(1.0, rate))
-        except Exception:
-            rate, burst = 0.0, 0.0
+        prepared.append((r, msg_body, f"in#{tenant_id}#{base}" if base else None))
 
-        if rate > 0 and not tenant_limiter.try_acquire(f"router#{tenant_id}", rate=rate, burst=burst):
-            logger.warning({"handler": "message_router", "event": "tenant_throttled", "tenant_id": tenant_id})
-            metrics.incr("TenantRoutedThrottled", tenant_id=tenant_id, component="message_router")
-            # Let SQS retry later
-            batch_failures.append({"itemIdentifier": r.get("messageId")})
-            continue
-        metrics.incr("TenantRoutedInbound", tenant_id=tenant_id, component="message_router")
-
-        t_msg = time.perf_counter()
-
-        msg = _build_message(msg_body)
-        # Canonical conversation key for Messages history (no PII).
-        conv_key = conversation_key(
-            msg.tenant_id,
-            msg.channel or "whatsapp",
-            msg.channel_user_id or msg.from_phone,
-            msg.conversation_id,
-        )
-        # logujemy inbound do Messages
-        try:
-            MESSAGES.log_message(
-                tenant_id=msg.tenant_id,
-                conversation_id=conv_key,
-                msg_id=new_id("in-"),
-                direction="inbound",
-                body=msg.body or "",
-                from_phone=msg.from_phone,
-                to_phone=msg.to_phone,
-                channel=msg.channel or "whatsapp",
-                channel_user_id=msg.channel_user_id or msg.from_phone,
-                language_code=None,
-            )
-        except Exception:
-            # nie blokujemy flow jeśli logowanie padnie
-            pass
-
-        try:
-            actions = ROUTER.handle(msg)
-            _publish_actions(actions, msg_body)
-            metrics.incr("TenantRoutedOk", tenant_id=tenant_id, component="message_router")
-        except Exception as e:
-            logger.error({"handler": "message_router", "event": "route_fail", "tenant_id": tenant_id, "err": str(e)})
-            metrics.incr("TenantRoutedError", tenant_id=tenant_id, component="message_router")
-            if r.get("messageId"):
+    # jeden round trip idempotencji na cały batch
+    inbound_keys = [key for _, _, key in prepared if key]
+    try:
+        acquired_flags = IDEMPOTENCY.try_acquire_many(
+            inbound_keys, metas=[{"scope": "inbound"}] * len(inbound_keys)
+        ) if inbound_keys else []
+    except Exception as e:
+        logger.error({"handler": "message_router", "event": "idempotency_fail", "err": str(e)})
+        for r, _, key in prepared:
+            if key:
                 batch_failures.append({"itemIdentifier": r.get("messageId")})
+        prepared = [p for p in prepared if not p[2]]
+        acquired_flags = []
+    flags = iter(acquired_flags)
+
+    groups: dict[str, list[tuple[dict, dict, str | None]]] = {}
+    for r, msg_body, inbound_key in prepared:
+        if inbound_key and not next(flags):
+            logger.info({"handler": "message_router", "event": "duplicate_inbound", "tenant_id": msg_body.get("tenant_id", "default")})
             continue
-        finally:
-            metrics.timing_ms(
-                "TenantRoutingLatencyMs",
-                (time.perf_counter() - t_msg) * 1000,
-                tenant_id=tenant_id,
-                component="message_router",
-            )
+        groups.setdefault(_group_key(r, msg_body), []).append((r, msg_body, inbound_key))
+
+    # różne rozmowy równolegle, w obrębie rozmowy kolejno
+    failed_ids: list[str] = []
+    workers = min(ROUTER_GROUP_CONCURRENCY, len(groups))
+    if workers <= 1:
+        for items in groups.values():
+            failed_ids.extend(_run_group(items))
+    else:
+        for failed in _group_executor().map(_run_group, groups.values()):
+            failed_ids.extend(failed)
+    batch_failures.extend({"itemIdentifier": mid} for mid in failed_ids if mid)
 
     logger.info({"handler": "message_router", "event": "done", "failures": len(batch_failures)})
     # partial batch response for SQS event source mapping
@@ -1,5 +1,8 @@
 import json
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 from ...common.aws import sqs_client, resolve_optional_queue_url
 from ...common.logging import logger
@@ -17,6 +20,19 @@ IDEMPOTENCY = IdempotencyRepo()
 tenant_cfg = default_tenant_config_service()
 tenant_limiter = InMemoryRateLimiter()
 
+# Ile rozmów (lane) wysyłamy równolegle w jednym batchu SQS.
+# W obrębie jednej rozmowy wiadomości idą sekwencyjnie (kolejność zachowana).
+OUTBOUND_SEND_CONCURRENCY = int(os.getenv("OUTBOUND_SEND_CONCURRENCY", "8"))
+
+
+@dataclass
+class _SendJob:
+    msg_id: str | None
+    tenant_id: str
+    channel: str
+    payload: dict
+    idem_key: str | None = None
+
 def _queue_delay_ms(record: dict) -> int | None:
     try:
         attrs = record.get("attributes") or {}
@@ -26,6 +42,105 @@ def _queue_delay_ms(record: dict) -> int | None:
     except Exception:
         return None
 
+def _lane_key(job: _SendJob) -> str:
+    """Klucz rozmowy – wiadomości z tym samym kluczem wysyłamy po kolei."""
+    target = job.payload.get("to") or job.payload.get("channel_user_id") or ""
+    return f"{job.tenant_id}#{job.channel}#{target}"
+
+
+def _deliver(job: _SendJob, sqs, web_q_url: str | None) -> None:
+    """Wysyła jedną wiadomość do providera (WhatsApp) albo na kolejkę web. Wyjątek = retry."""
+    tenant_id = job.tenant_id
+    payload = job.payload
+    text = payload.get("body")
+
+    # --- Kanał WWW ---
+    if job.channel == "web":
+        web_msg = {
+            "tenant_id": tenant_id,
+            "channel_user_id": payload.get("channel_user_id"),
+            "body": text,
+        }
+
+        if web_q_url:
+            sqs.send_message(
+                QueueUrl=web_q_url,
+                MessageBody=json.dumps(web_msg),
+            )
+            metrics.incr("TenantOutboundQueued", tenant_id=tenant_id, component="outbound_sender", channel="web")
+            metrics.incr("message_sent", tenant_id=tenant_id, component="outbound_sender", channel="web", status="QUEUED")
+            logger.info(
+                {
+                    "handler": "outbound_sender",
+                    "event": "web_outbound_queued",
+                    "tenant_id": web_msg["tenant_id"],
+                    "channel_user_id": web_msg["channel_user_id"],
+                    "body": shorten_body(text),
+                }
+            )
+        else:
+            metrics.incr("TenantOutboundQueued", tenant_id=tenant_id, component="outbound_sender", channel="web", status="NO_QUEUE")
+            metrics.incr("message_sent", tenant_id=tenant_id, component="outbound_sender", channel="web", status="NO_QUEUE")
+            logger.info(
+                {
+                    "handler": "outbound_sender",
+                    "event": "web_outbound_no_queue",
+                    "tenant_id": web_msg["tenant_id"],
+                    "channel_user_id": web_msg["channel_user_id"],
+                    "body": shorten_body(text),
+                }
+            )
+        return
+
+    # --- Kanał WhatsApp (Twilio) ---
+    to = payload.get("to")
+    res = clients.whatsapp(tenant_id).send_text(to=to, body=text)
+    res_status = res.get("status", "UNKNOWN")
+
+    metrics.incr("TenantOutboundSent", tenant_id=tenant_id, component="outbound_sender", channel="whatsapp", status=res_status)
+    metrics.incr("message_sent", tenant_id=tenant_id, component="outbound_sender", channel="whatsapp", status=res_status)
+
+    logger.info(
+        {
+            "handler": "outbound_sender",
+            "event": "sent",
+            "to": mask_phone(to),
+            "body": shorten_body(text),
+            "tenant_id": tenant_id,
+            "result": res_status,
+        }
+    )
+
+
+def _run_lane(jobs: list[_SendJob], sqs, web_q_url: str | None) -> list[str]:
+    """Wysyła wiadomości jednej rozmowy po kolei; zwraca messageId porażek.
+
+    Po pierwszej porażce lane się zatrzymuje: kolejne wiadomości rozmowy nie mogą
+    wyprzedzić tej, która wróci do kolejki – idą do retry razem z nią.
+    """
+    failed: list[str] = []
+    for i, job in enumerate(jobs):
+        try:
+            _deliver(job, sqs, web_q_url)
+        except Exception as e:
+            logger.error({"handler": "outbound_sender", "event": "fail", "err": str(e)})
+            # nieudana wiadomość i jej następniki wracają do kolejki razem
+            rest = jobs[i:]
+            if len(rest) > 1:
+                logger.warning({"handler": "outbound_sender", "event": "lane_stopped", "tenant_id": job.tenant_id, "pending": len(rest) - 1})
+            for pending in rest:
+                # niewysłane – klucz idempotencji (DDB + LRU kontenera) zwalniamy, żeby retry nie był duplikatem
+                if pending.idem_key:
+                    try:
+                        IDEMPOTENCY.release(f"snd#{pending.idem_key}")
+                    except Exception:
+                        pass
+                if pending.msg_id:
+                    failed.append(pending.msg_id)
+            break
+    return failed
+
+
 def lambda_handler(event, context):
     try:
         tenant_limiter.reset()
@@ -37,11 +152,17 @@ def lambda_handler(event, context):
         logger.info({"sender": "no_records"})
         return {"statusCode": 200, "body": "no-records"}
 
-    batch_failures = []
+    failed_ids: set[str] = set()
+    jobs: list[_SendJob] = []
+    candidates: list[tuple[_SendJob, str | None]] = []
+    # rozmowy z rekordem odrzuconym w fazie 1 – ich późniejsze rekordy z batcha
+    # też wracają do kolejki, żeby nie wyprzedziły odrzuconego (jak stop w _run_lane)
+    blocked_lanes: set[str] = set()
 
     sqs = sqs_client()
     web_q_url = resolve_optional_queue_url("WebOutboundEventsQueueUrl")
 
+    # Faza 1 (sekwencyjnie): parsowanie, limiter, idempotencja (batch), walidacja.
     for r in records:
         msg_id = r.get("messageId")
         delay_ms = _queue_delay_ms(r)
@@ -51,6 +172,7 @@ def lambda_handler(event, context):
             "sqs_delay_ms": delay_ms,
             "message_id": msg_id,
         })
+        lane = None
         try:
             raw = r.get("body", "")
             try:
@@ -61,8 +183,15 @@ def lambda_handler(event, context):
                 continue
 
             channel = payload.get("channel", "whatsapp")
-            text = payload.get("body")
             tenant_id = payload.get("tenant_id", "default")
+            job = _SendJob(msg_id=msg_id, tenant_id=tenant_id, channel=channel, payload=payload)
+            lane = _lane_key(job)
+
+            if lane in blocked_lanes:
+                logger.warning({"handler": "outbound_sender", "event": "lane_blocked", "tenant_id": tenant_id})
+                if msg_id:
+                    failed_ids.add(msg_id)
+                continue
 
             # --- per-tenant soft limiter (no sleep; retry via batch failure) ---
             try:
@@ -80,88 +209,87 @@ def lambda_handler(event, context):
                 logger.warning({"handler": "outbound_sender", "event": "tenant_throttled", "tenant_id": tenant_id})
                 metrics.incr("TenantOutboundThrottled", tenant_id=tenant_id, component="outbound_sender")
                 if msg_id:
-                    batch_failures.append({"itemIdentifier": msg_id})
+                    failed_ids.add(msg_id)
+                blocked_lanes.add(lane)
                 continue
 
-            # Idempotency for outbound send (Twilio / web queue)
+            # Idempotency for outbound send (Twilio / web queue) – klucze zbieramy dla całego batcha
             idem_key = payload.get("idempotency_key") or (f"out#{tenant_id}#{msg_id}" if msg_id else None)
-            if idem_key:
-                acquired = IDEMPOTENCY.try_acquire(f"snd#{idem_key}", meta={"scope": "outbound", "channel": channel})
-                if not acquired:
-                    logger.info({"handler": "outbound_sender", "event": "duplicate_outbound", "tenant_id": tenant_id})
-                    metrics.incr("TenantOutboundDuplicate", tenant_id=tenant_id, component="outbound_sender", channel=channel)
-                    metrics.incr("message_sent_duplicate", tenant_id=tenant_id, component="outbound_sender", channel=channel, status="DUPLICATE")
-                    continue
-            else:
-                logger.warning({"handler": "outbound_sender", "event": "missing_idempotency_key", "tenant_id": tenant_id})
-
-            # --- Kanał WWW ---
-            if channel == "web":
-                web_msg = {
-                    "tenant_id": tenant_id,
-                    "channel_user_id": payload.get("channel_user_id"),
-                    "body": text,
-                }
+            job.idem_key = idem_key
+            candidates.append((job, idem_key))
 
-                if web_q_url:
-                    sqs.send_message(
-                        QueueUrl=web_q_url,
-                        MessageBody=json.dumps(web_msg),
-                    )
-                    metrics.incr("TenantOutboundQueued", tenant_id=tenant_id, component="outbound_sender", channel="web")
-                    metrics.incr("message_sent", tenant_id=tenant_id, component="outbound_sender", channel="web", status="QUEUED")
-                    logger.info(
-                        {
-                            "handler": "outbound_sender",
-                            "event": "web_outbound_queued",
-                            "tenant_id": web_msg["tenant_id"],
-                            "channel_user_id": web_msg["channel_user_id"],
-                            "body": shorten_body(text),
-                        }
-                    )
-                else:
-                    metrics.incr("TenantOutboundQueued", tenant_id=tenant_id, component="outbound_sender", channel="web", status="NO_QUEUE")
-                    metrics.incr("message_sent", tenant_id=tenant_id, component="outbound_sender", channel="web", status="NO_QUEUE")
-                    logger.info(
-                        {
-                            "handler": "outbound_sender",
-                            "event": "web_outbound_no_queue",
-                            "tenant_id": web_msg["tenant_id"],
-                            "channel_user_id": web_msg["channel_user_id"],
-                            "body": shorten_body(text),
-                        }
-                    )
-                continue
+        except Exception as e:
+            # retry only this message
+            logger.error({"handler": "outbound_sender", "event": "fail", "err": str(e)})
+            if msg_id:
+                failed_ids.add(msg_id)
+            if lane is not None:
+                blocked_lanes.add(lane)
 
-            # --- Kanał WhatsApp (Twilio) ---
-            to = payload.get("to")
-            if not to or not text:
-                logger.warning({"sender": "invalid_payload", "payload": payload})
+    # jeden round trip idempotencji na cały batch
+    keyed = [(job, key) for job, key in candidates if key]
+    try:
+        acquired_flags = IDEMPOTENCY.try_acquire_many(
+            [f"snd#{key}" for _, key in keyed],
+            metas=[{"scope": "outbound", "channel": job.channel} for job, _ in keyed],
+        ) if keyed else []
+    except Exception as e:
+        # retry całego batcha kluczy
+        logger.error({"handler": "outbound_sender", "event": "idempotency_fail", "err": str(e)})
+        failed_ids.update(job.msg_id for job, _ in keyed if job.msg_id)
+        acquired_flags = None
+    flags = iter(acquired_flags or [])
+    # rekordy odrzucone w fazie 1 nie są kandydatami – tu blokują tylko rozmowy,
+    # których klucze idempotencji wróciły do kolejki razem z batchem kluczy
+    blocked_lanes.clear()
+
+    for job, idem_key in candidates:
+        tenant_id, channel = job.tenant_id, job.channel
+        lane = _lane_key(job)
+        if idem_key:
+            if acquired_flags is None:
+                blocked_lanes.add(lane)
+                continue
+            if not next(flags):
+                logger.info({"handler": "outbound_sender", "event": "duplicate_outbound", "tenant_id": tenant_id})
+                metrics.incr("TenantOutboundDuplicate", tenant_id=tenant_id, component="outbound_sender", channel=channel)
+                metrics.incr("message_sent_duplicate", tenant_id=tenant_id, component="outbound_sender", channel=channel, status="DUPLICATE")
                 continue
+        else:
+            logger.warning({"handler": "outbound_sender", "event": "missing_idempotency_key", "tenant_id": tenant_id})
 
-            res = clients.whatsapp(tenant_id).send_text(to=to, body=text)
-            res_status = res.get("status", "UNKNOWN")
+        if lane in blocked_lanes:
+            logger.warning({"handler": "outbound_sender", "event": "lane_blocked", "tenant_id": tenant_id})
+            if job.msg_id:
+                failed_ids.add(job.msg_id)
+            continue
 
-            metrics.incr("TenantOutboundSent", tenant_id=tenant_id, component="outbound_sender", channel="whatsapp", status=res_status)
-            metrics.incr("message_sent", tenant_id=tenant_id, component="outbound_sender", channel="whatsapp", status=res_status)
+        if channel != "web" and (not job.payload.get("to") or not job.payload.get("body")):
+            logger.warning({"sender": "invalid_payload", "payload": job.payload})
+            continue
 
-            logger.info(
-                {
-                    "handler": "outbound_sender",
-                    "event": "sent",
-                    "to": mask_phone(to),
-                    "body": shorten_body(text),
-                    "tenant_id": tenant_id,
-                    "result": res_status,
-                }
-            )
+        jobs.append(job)
 
-        except Exception as e:
-            # retry only this message
-            logger.error({"handler": "outbound_sender", "event": "fail", "err": str(e)})
-            if msg_id:
-                batch_failures.append({"itemIdentifier": msg_id})
+    # Faza 2: wysyłka – rozmowy równolegle, w obrębie rozmowy po kolei.
+    lanes: dict[str, list[_SendJob]] = {}
+    for job in jobs:
+        lanes.setdefault(_lane_key(job), []).append(job)
+
+    workers = min(OUTBOUND_SEND_CONCURRENCY, len(lanes))
+    if workers <= 1:
+        for lane_jobs in lanes.values():
+            failed_ids.update(_run_lane(lane_jobs, sqs, web_q_url))
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="outbound") as ex:
+            for failed in ex.map(lambda lane_jobs: _run_lane(lane_jobs, sqs, web_q_url), lanes.values()):
+                failed_ids.update(failed)
 
+    # batchItemFailures w kolejności rekordów
+    batch_failures = [
+        {"itemIdentifier": r.get("messageId")}
+        for r in records
+        if r.get("messageId") in failed_ids
+    ]
     if batch_failures:
         return {"batchItemFailures": batch_failures}
     return {"statusCode": 200}
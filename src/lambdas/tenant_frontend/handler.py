@@ -9,7 +9,7 @@ from typing import Any
 
 from ...common.aws import ddb_resource
 from ...common.logging import logger
-from ...common.security import encrypt_phone, normalize_phone
+from ...common.security import encrypt_phones, normalize_phone
 from ...common.utils import new_id
 from ...services.metrics_service import MetricsService
 
@@ -202,7 +202,7 @@ def _campaign_item(tenant_id: str, payload: dict[str, Any]) -> dict[str, Any]:
     if not phones:
         raise ValueError("recipients_required")
 
-    recipients = [{"token": encrypt_phone(tenant_id, phone)} for phone in phones]
+    recipients = [{"token": token} for token in encrypt_phones(tenant_id, phones)]
     now = datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
     next_run_time = str(payload.get("next_run_time") or now).strip()
 
@@ -0,0 +1,106 @@
+import os
+import time
+import uuid
+from array import array
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from ..common.aws import ddb_resource, ddb_table
+from ..common.logging import logger
+
+
+def _pack(vec: list[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+
+def _unpack(raw) -> list[float]:
+    data = getattr(raw, "value", raw)
+    out = array("f")
+    out.frombytes(bytes(data))
+    return out.tolist()
+
+
+class AnswerCacheRepo:
+    """Współdzielony cache odpowiedzi AI-FAQ (KBService.answer_ai).
+
+    Item schema (pk + sk):
+      - pk="ver#<tenant>#<lang>", sk="v": wersja FAQ (podbijana przez kb_reindexer)
+      - pk="ans#<tenant>#<lang>#<wersja>", sk="<ts>#<uuid>": wpis
+          vec (float32, binary), answer, ttl
+
+    Stare wersje nie są kasowane – wygasają z TTL.
+    Wyłączony, gdy DDB_TABLE_ANSWER_CACHE nie jest ustawione.
+    """
+
+    def __init__(self, table_name_env: str = "DDB_TABLE_ANSWER_CACHE"):
+        self.table_name = os.getenv(table_name_env, "")
+        self.table = ddb_table(self.table_name, ddb_resource) if self.table_name else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.table is not None
+
+    @staticmethod
+    def _version_key(tenant_id: str, lang: str) -> dict:
+        return {"pk": f"ver#{tenant_id}#{lang}", "sk": "v"}
+
+    def get_version(self, tenant_id: str, lang: str) -> int:
+        if self.table is None:
+            return 0
+        try:
+            item = self.table.get_item(Key=self._version_key(tenant_id, lang)).get("Item") or {}
+        except ClientError as e:
+            logger.warning({"answer_cache": "ddb_get_version_failed", "err": str(e), "table": self.table_name})
+            return 0
+        return int(item.get("version") or 0)
+
+    def bump_version(self, tenant_id: str, lang: str) -> int:
+        """Unieważnia wszystkie wpisy tenant/lang (nowa wersja = nowa partycja)."""
+        if self.table is None:
+            return 0
+        resp = self.table.update_item(
+            Key=self._version_key(tenant_id, lang),
+            UpdateExpression="ADD #v :one SET updated_at = :now",
+            ExpressionAttributeNames={"#v": "version"},
+            ExpressionAttributeValues={":one": 1, ":now": int(time.time())},
+            ReturnValues="UPDATED_NEW",
+        )
+        return int((resp.get("Attributes") or {}).get("version") or 0)
+
+    def list_entries(self, tenant_id: str, lang: str, version: int, limit: int) -> list[dict]:
+        """Najnowsze wpisy (max `limit`) jako {"vec": [...], "answer": str}."""
+        if self.table is None:
+            return []
+        try:
+            resp = self.table.query(
+                KeyConditionExpression=Key("pk").eq(f"ans#{tenant_id}#{lang}#{version}"),
+                ScanIndexForward=False,
+                Limit=limit,
+            )
+        except ClientError as e:
+            logger.warning({"answer_cache": "ddb_query_failed", "err": str(e), "table": self.table_name})
+            return []
+        now = time.time()
+        out = []
+        for item in resp.get("Items") or []:
+            if int(item.get("ttl") or 0) < now or not item.get("vec"):
+                continue
+            out.append({"vec": _unpack(item["vec"]), "answer": item.get("answer") or ""})
+        return out
+
+    def put_entry(self, tenant_id: str, lang: str, version: int, vec: list[float], answer: str, ttl_seconds: int) -> None:
+        if self.table is None:
+            return
+        now = int(time.time())
+        try:
+            self.table.put_item(
+                Item={
+                    "pk": f"ans#{tenant_id}#{lang}#{version}",
+                    "sk": f"{now}#{uuid.uuid4().hex}",
+                    "vec": _pack(vec),
+                    "answer": answer,
+                    "ttl": now + int(ttl_seconds),
+                }
+            )
+        except ClientError as e:
+            logger.warning({"answer_cache": "ddb_put_failed", "err": str(e), "table": self.table_name})
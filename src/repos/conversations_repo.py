@@ -1,5 +1,5 @@
 import os, time
-from ..common.aws import ddb_resource
+from ..common.aws import ddb_resource, ddb_table
 from boto3.dynamodb.conditions import Key
 from ..common.security import user_hmac
 from decimal import Decimal
@@ -12,8 +12,9 @@ _UNSET = object()
 
 class ConversationsRepo:
     def __init__(self):
-        self.table = ddb_resource().Table(
-            os.environ.get("DDB_TABLE_CONVERSATIONS", "Conversations")
+        self.table = ddb_table(
+            os.environ.get("DDB_TABLE_CONVERSATIONS", "Conversations"),
+            ddb_resource,
         )
         self.retention_days: int = int(os.getenv("CONVERSATIONS_RETENTION_DAYS", "365"))
 
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import time
+from array import array
+
+from botocore.exceptions import ClientError
+from ..common.aws import ddb_resource, ddb_table
+from ..common.logging import logger
+
+# limit BatchGetItem (BatchWriteItem dzieli sam batch_writer)
+_BATCH_GET_MAX = 100
+
+
+def _pack(vec: list[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+
+def _unpack(raw) -> list[float]:
+    data = getattr(raw, "value", raw)
+    out = array("f")
+    out.frombytes(bytes(data))
+    return out.tolist()
+
+
+class EmbeddingStoreRepo:
+    """Content-addressed magazyn embeddingów współdzielony przez tenantów.
+
+    Item schema:
+      - pk="emb#<sha256(model|dims|text)>", vec (float32, binary), dims, ttl
+
+    Ten sam tekst chunku (standardowe FAQ z scripts/faq_*.json) jest
+    embeddowany raz dla wszystkich tenantów; zmiana modelu/wymiarów daje
+    inne klucze, więc wektory się nie mieszają.
+    Wyłączony, gdy DDB_TABLE_EMBEDDINGS nie jest ustawione.
+    """
+
+    def __init__(self, table_name_env: str = "DDB_TABLE_EMBEDDINGS"):
+        self.table_name = os.getenv(table_name_env, "")
+        self.table = ddb_table(self.table_name, ddb_resource) if self.table_name else None
+        self.ttl_seconds = int(os.getenv("EMBEDDING_STORE_TTL_SECONDS", str(180 * 86400)))
+
+    @property
+    def enabled(self) -> bool:
+        return self.table is not None
+
+    @staticmethod
+    def key(model: str, dimensions: int | None, text: str) -> str:
+        raw = f"{model}|{int(dimensions) if dimensions else ''}|{text}"
+        return "emb#" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        """Wektory dla znanych kluczy (brakujące po prostu nie występują w wyniku)."""
+        if self.table is None or not keys:
+            return {}
+        unique = list(dict.fromkeys(keys))
+        out: dict[str, list[float]] = {}
+        now = time.time()
+        client = self.table.meta.client
+        for i in range(0, len(unique), _BATCH_GET_MAX):
+            request = {self.table_name: {"Keys": [{"pk": k} for k in unique[i:i + _BATCH_GET_MAX]]}}
+            # UnprocessedKeys ponawiamy raz; reszta to po prostu miss
+            for _ in range(2):
+                try:
+                    resp = client.batch_get_item(RequestItems=request)
+                except ClientError as e:
+                    logger.warning({"embedding_store": "ddb_batch_get_failed", "err": str(e), "table": self.table_name})
+                    break
+                for item in (resp.get("Responses") or {}).get(self.table_name) or []:
+                    if int(item.get("ttl") or 0) < now or not item.get("vec"):
+                        continue
+                    vec = _unpack(item["vec"])
+                    if vec and len(vec) == int(item.get("dims") or len(vec)):
+                        out[item["pk"]] = vec
+                request = resp.get("UnprocessedKeys") or {}
+                if not request:
+                    break
+        return out
+
+    def put_many(self, vectors: dict[str, list[float]]) -> None:
+        if self.table is None or not vectors:
+            return
+        expires = int(time.time()) + self.ttl_seconds
+        try:
+            with self.table.batch_writer(overwrite_by_pkeys=["pk"]) as batch:
+                for k, vec in vectors.items():
+                    if vec:
+                        batch.put_item(Item={"pk": k, "vec": _pack(vec), "dims": len(vec), "ttl": expires})
+        except ClientError as e:
+            logger.warning({"embedding_store": "ddb_batch_write_failed", "err": str(e), "table": self.table_name})
@@ -1,12 +1,19 @@
 import os
+import threading
 import time
-from typing import Optional
+from collections import OrderedDict
+from typing import Optional, Sequence
 
 from botocore.exceptions import ClientError
-from ..common.aws import ddb_resource
+from ..common.aws import ddb_resource, ddb_table
 from ..common.logging import logger
 from ..common.config import settings
 
+# DynamoDB TransactWriteItems przyjmuje max 100 operacji
+TRANSACT_MAX_ITEMS = 100
+_TRANSACT_MAX_ATTEMPTS = 3
+
+
 class IdempotencyRepo:
     """Simple idempotency store based on DynamoDB conditional writes.
 
@@ -15,23 +22,50 @@ class IdempotencyRepo:
       - created_at: unix epoch seconds
       - ttl: unix epoch seconds (optional)
       - meta: optional small dict (must be JSON-serializable)
+
+    Keys seen by this container (acquired or found as duplicates) are kept
+    in a small LRU, so obvious SQS retries are rejected without a DDB call.
     """
 
     def __init__(self, table_name_env: str = "DDB_TABLE_IDEMPOTENCY"):
         self.table_name = os.getenv(table_name_env, "Idempotency")
-        self.table = ddb_resource().Table(self.table_name)
+        self.table = ddb_table(self.table_name, ddb_resource)
         self.ttl_seconds = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(7 * 24 * 3600)))
+        self._recent_max = int(os.getenv("IDEMPOTENCY_LRU_SIZE", "4096"))
+        self._recent: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
 
-    def try_acquire(self, key: str, meta: Optional[dict] = None) -> bool:
-        """Return True if key was acquired (first time), False if already exists."""
-        dev_mode = os.getenv("DEV_MODE", "false").lower() == "true" or settings.dev_mode
-        if dev_mode:
-            if not hasattr(self, "_dev_seen"):
-                self._dev_seen = set()
-            if key in self._dev_seen:
+    @staticmethod
+    def _dev_mode() -> bool:
+        return os.getenv("DEV_MODE", "false").lower() == "true" or settings.dev_mode
+
+    # ---------- per-container LRU ----------
+
+    def _seen_recently(self, key: str) -> bool:
+        if self._recent_max <= 0:
+            return False
+        now = time.time()
+        with self._lock:
+            exp = self._recent.get(key)
+            if exp is None:
                 return False
-            self._dev_seen.add(key)
+            if exp < now:
+                self._recent.pop(key, None)
+                return False
+            self._recent.move_to_end(key)
             return True
+
+    def _remember(self, key: str) -> None:
+        if self._recent_max <= 0:
+            return
+        exp = time.time() + self.ttl_seconds if self.ttl_seconds > 0 else float("inf")
+        with self._lock:
+            self._recent[key] = exp
+            self._recent.move_to_end(key)
+            while len(self._recent) > self._recent_max:
+                self._recent.popitem(last=False)
+
+    def _item(self, key: str, meta: Optional[dict]) -> dict:
         now = int(time.time())
         item = {"pk": key, "created_at": now}
         if self.ttl_seconds > 0:
@@ -39,15 +73,112 @@ class IdempotencyRepo:
         if meta is not None:
             # keep meta small; avoid PII
             item["meta"] = meta
+        return item
+
+    # ---------- API ----------
+
+    def try_acquire(self, key: str, meta: Optional[dict] = None) -> bool:
+        """Return True if key was acquired (first time), False if already exists."""
+        if self._dev_mode():
+            if not hasattr(self, "_dev_seen"):
+                self._dev_seen = set()
+            if key in self._dev_seen:
+                return False
+            self._dev_seen.add(key)
+            return True
+        if self._seen_recently(key):
+            return False
 
         try:
             self.table.put_item(
-                Item=item,
+                Item=self._item(key, meta),
                 ConditionExpression="attribute_not_exists(pk)",
             )
+            self._remember(key)
             return True
         except ClientError as e:
             if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                self._remember(key)
                 return False
             logger.error({"idempotency": "ddb_error", "err": str(e), "table": self.table_name})
             raise
+
+    def try_acquire_many(self, keys: Sequence[str], metas: Optional[Sequence[Optional[dict]]] = None) -> list[bool]:
+        """Batch version of try_acquire – one TransactWriteItems per up to 100 keys.
+
+        Returns a list aligned with `keys`: True if the key was acquired by this
+        call. A key repeated within the batch is acquired only by its first
+        occurrence.
+        """
+        metas = list(metas) if metas is not None else [None] * len(keys)
+        if self._dev_mode():
+            return [self.try_acquire(k, meta=m) for k, m in zip(keys, metas)]
+
+        first: dict[str, int] = {}
+        for idx, key in enumerate(keys):
+            if key not in first and not self._seen_recently(key):
+                first[key] = idx
+
+        acquired: set[str] = set()
+        pending = list(first)
+        for start in range(0, len(pending), TRANSACT_MAX_ITEMS):
+            chunk = pending[start:start + TRANSACT_MAX_ITEMS]
+            acquired |= self._acquire_chunk(chunk, {k: metas[first[k]] for k in chunk})
+
+        return [key in acquired and first.get(key) == idx for idx, key in enumerate(keys)]
+
+    def _acquire_chunk(self, keys: list[str], metas: dict[str, Optional[dict]]) -> set[str]:
+        if len(keys) == 1:
+            # pojedynczy put jest tańszy niż transakcja (2x WCU)
+            return {keys[0]} if self.try_acquire(keys[0], meta=metas.get(keys[0])) else set()
+
+        remaining = list(keys)
+        for _ in range(_TRANSACT_MAX_ATTEMPTS):
+            if not remaining:
+                return set()
+            try:
+                self.table.meta.client.transact_write_items(
+                    TransactItems=[
+                        {
+                            "Put": {
+                                "TableName": self.table_name,
+                                "Item": self._item(k, metas.get(k)),
+                                "ConditionExpression": "attribute_not_exists(pk)",
+                            }
+                        }
+                        for k in remaining
+                    ]
+                )
+                for k in remaining:
+                    self._remember(k)
+                return set(remaining)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+                    logger.error({"idempotency": "ddb_error", "err": str(e), "table": self.table_name})
+                    raise
+                reasons = e.response.get("CancellationReasons") or []
+                existing = {
+                    k for k, r in zip(remaining, reasons)
+                    if (r or {}).get("Code") == "ConditionalCheckFailed"
+                }
+                if not existing:
+                    # konflikt transakcji / throttling – dokończ pojedynczymi putami
+                    break
+                for k in existing:
+                    self._remember(k)
+                remaining = [k for k in remaining if k not in existing]
+
+        return {k for k in remaining if self.try_acquire(k, meta=metas.get(k))}
+
+    def release(self, key: str) -> None:
+        """Zwalnia klucz rekordu oddanego do kolejki bez przetworzenia (np. throttling),
+        żeby retry SQS nie został uznany za duplikat."""
+        with self._lock:
+            self._recent.pop(key, None)
+        if self._dev_mode():
+            getattr(self, "_dev_seen", set()).discard(key)
+            return
+        try:
+            self.table.delete_item(Key={"pk": key})
+        except ClientError as e:
+            logger.error({"idempotency": "release_failed", "err": str(e), "table": self.table_name})
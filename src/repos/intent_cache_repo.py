@@ -0,0 +1,66 @@
+import json
+import os
+import time
+from decimal import Decimal
+from typing import Optional
+
+from botocore.exceptions import ClientError
+from ..common.aws import ddb_resource, ddb_table
+from ..common.logging import logger
+
+
+class IntentCacheRepo:
+    """Współdzielony (między kontenerami) cache klasyfikacji intencji.
+
+    Item schema:
+      - pk: "<lang>#<sha256 znormalizowanego tekstu>" (bez treści wiadomości)
+      - intent, confidence, slots (JSON string)
+      - ttl: unix epoch seconds
+
+    Wyłączony, gdy DDB_TABLE_INTENT_CACHE nie jest ustawione.
+    Błędy DDB nie przerywają klasyfikacji – cache jest tylko optymalizacją.
+    """
+
+    def __init__(self, table_name_env: str = "DDB_TABLE_INTENT_CACHE"):
+        self.table_name = os.getenv(table_name_env, "")
+        self.table = ddb_table(self.table_name, ddb_resource) if self.table_name else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.table is not None
+
+    def get(self, pk: str) -> Optional[dict]:
+        if self.table is None:
+            return None
+        try:
+            item = self.table.get_item(Key={"pk": pk}).get("Item")
+        except ClientError as e:
+            logger.warning({"intent_cache": "ddb_get_failed", "err": str(e), "table": self.table_name})
+            return None
+        if not item or int(item.get("ttl") or 0) < time.time():
+            return None
+        try:
+            slots = json.loads(item.get("slots") or "{}")
+        except ValueError:
+            slots = {}
+        return {
+            "intent": item.get("intent"),
+            "confidence": float(item.get("confidence") or 0),
+            "slots": slots if isinstance(slots, dict) else {},
+        }
+
+    def put(self, pk: str, result: dict, ttl_seconds: int) -> None:
+        if self.table is None:
+            return
+        try:
+            self.table.put_item(
+                Item={
+                    "pk": pk,
+                    "intent": result.get("intent"),
+                    "confidence": Decimal(str(round(float(result.get("confidence") or 0), 4))),
+                    "slots": json.dumps(result.get("slots") or {}, ensure_ascii=False),
+                    "ttl": int(time.time()) + int(ttl_seconds),
+                }
+            )
+        except (ClientError, TypeError, ValueError) as e:
+            logger.warning({"intent_cache": "ddb_put_failed", "err": str(e), "table": self.table_name})
@@ -0,0 +1,85 @@
+import json
+import os
+import time
+
+from botocore.exceptions import ClientError
+from ..common.aws import s3_client
+from ..common.config import settings
+from ..common.logging import logger
+
+MANIFEST_VERSION = 1
+
+
+class KBManifestRepo:
+    """Manifest zaindeksowanych chunków FAQ per namespace Pinecone (S3).
+
+    Obiekt: <KB_MANIFEST_PREFIX><tenant>/<lang>.manifest w buckecie KB, np.
+      {"version": 1, "namespace": "kb:t1:pl", "embed_model": "...", "dims": null,
+       "fingerprint": "<sha256>", "chunks": {"<chunk_id>": "<category>", ...},
+       "updated_at": 1700000000}
+
+    Rozszerzenie inne niż .json – zapis manifestu nie pasuje do kluczy FAQ,
+    więc nie wyzwala kolejnej reindeksacji.
+    Wyłączony (brak incrementali), gdy nie ma bucketu KB.
+    """
+
+    def __init__(self, bucket: str | None = None, prefix: str | None = None):
+        self.bucket = bucket if bucket is not None else settings.kb_bucket
+        self.prefix = prefix if prefix is not None else os.getenv("KB_MANIFEST_PREFIX", "_manifests/")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bucket)
+
+    def _key(self, namespace: str) -> str:
+        # "kb:t1:pl" -> "_manifests/t1/pl.manifest" (prefiks namespace'u jest stały)
+        parts = namespace.split(":")
+        path = "/".join(parts[1:]) if len(parts) > 1 else namespace
+        return f"{self.prefix}{path}.manifest"
+
+    def get(self, namespace: str) -> dict | None:
+        if not self.enabled:
+            return None
+        try:
+            resp = s3_client().get_object(Bucket=self.bucket, Key=self._key(namespace))
+            data = json.loads(resp["Body"].read().decode("utf-8"))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                logger.warning({"kb_manifest": "s3_get_failed", "namespace": namespace, "err": str(e)})
+            return None
+        except Exception as e:
+            # manifest jest optymalizacją – bez niego robimy pełną reindeksację
+            logger.warning({"kb_manifest": "get_failed", "namespace": namespace, "err": str(e)})
+            return None
+        if not isinstance(data, dict) or int(data.get("version") or 0) != MANIFEST_VERSION:
+            return None
+        if data.get("namespace") != namespace or not isinstance(data.get("chunks"), dict):
+            return None
+        return data
+
+    def put(
+        self,
+        namespace: str,
+        *,
+        embed_model: str,
+        dims: int | None,
+        fingerprint: str,
+        chunks: dict[str, str],
+    ) -> None:
+        if not self.enabled:
+            return
+        body = {
+            "version": MANIFEST_VERSION,
+            "namespace": namespace,
+            "embed_model": embed_model,
+            "dims": dims,
+            "fingerprint": fingerprint,
+            "chunks": chunks,
+            "updated_at": int(time.time()),
+        }
+        s3_client().put_object(
+            Bucket=self.bucket,
+            Key=self._key(namespace),
+            Body=json.dumps(body, separators=(",", ":")).encode("utf-8"),
+            ContentType="application/json",
+        )
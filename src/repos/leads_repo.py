@@ -1,10 +1,11 @@
 import os, time
-from ..common.aws import ddb_resource
+from ..common.aws import ddb_resource, ddb_table
 
 class LeadsRepo:
     def __init__(self):
-        self.table = ddb_resource().Table(
-            os.environ.get("DDB_TABLE_LEADS", "Leads")
+        self.table = ddb_table(
+            os.environ.get("DDB_TABLE_LEADS", "Leads"),
+            ddb_resource,
         )
 
     def _pk(self, tenant_id: str) -> str:
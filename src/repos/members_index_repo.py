@@ -1,12 +1,13 @@
 import os, time
-from ..common.aws import ddb_resource
+from ..common.aws import ddb_resource, ddb_table
 from ..common.security import phone_hmac, normalize_phone
 from boto3.dynamodb.conditions import Key
 
 class MembersIndexRepo:
     def __init__(self):
-        self.table = ddb_resource().Table(
-            os.environ.get("DDB_TABLE_MEMBERS_INDEX", "MembersIndex")
+        self.table = ddb_table(
+            os.environ.get("DDB_TABLE_MEMBERS_INDEX", "MembersIndex"),
+            ddb_resource,
         )
 
     def find_by_phone(self, tenant_id: str, phone: str) -> dict | None:
@@ -2,13 +2,13 @@ import os
 import time
 import json
 from boto3.dynamodb.conditions import Key
-from ..common.aws import ddb_resource, s3_client
+from ..common.aws import ddb_resource, ddb_table, s3_client
 from ..common.security import phone_hmac, phone_last4, conversation_key
 from ..common.logging import logger
 
 class MessagesRepo:
     def __init__(self):
-        self.table = ddb_resource().Table(os.environ.get("DDB_TABLE_MESSAGES", "Messages"))
+        self.table = ddb_table(os.environ.get("DDB_TABLE_MESSAGES", "Messages"), ddb_resource)
         self.retention_days: int = int(os.getenv("CONVERSATIONS_RETENTION_DAYS", "365"))
         self.archive_bucket: str | None = os.getenv("ARCHIVE_BUCKET")
         self.archive_prefix: str = os.getenv("ARCHIVE_PREFIX", "archive/")
@@ -1,9 +1,9 @@
 import os
-from ..common.aws import ddb_resource
+from ..common.aws import ddb_resource, ddb_table
 
 class TemplatesRepo:
     def __init__(self):
-        self.table = ddb_resource().Table(os.environ.get("DDB_TABLE_TEMPLATES", "Templates"))
+        self.table = ddb_table(os.environ.get("DDB_TABLE_TEMPLATES", "Templates"), ddb_resource)
 
     def pk(self, tenant_id: str, name: str, language_code: str) -> str:
         return f"{tenant_id}#{name}#{language_code}"
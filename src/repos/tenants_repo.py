@@ -1,29 +1,28 @@
 import os
-from typing import Any
+from dataclasses import dataclass
+from typing import Any, Optional
 from boto3.dynamodb.conditions import Key
-from ..common.aws import ddb_resource
+from ..common.aws import ddb_resource, ddb_table
 from ..common.logging import logger
 from ..common.config import settings
 from ..common.constants import (
     KB_SMALLTALK_MIN_SCORE,
     KB_VECTOR_MIN_SCORE_LOW,
     KB_VECTOR_FASTPATH_MIN_SCORE,
+    KB_ANSWER_CACHE_MIN_SCORE,
+    KB_PROMPT_MAX_TOKENS,
 )
 
 
 class TenantsRepo:
     def __init__(self):
-        self.table = ddb_resource().Table(os.environ.get("DDB_TABLE_TENANTS", "Tenants"))
+        self.table = ddb_table(os.environ.get("DDB_TABLE_TENANTS", "Tenants"), ddb_resource)
 
     def get(self, tenant_id: str) -> dict | None:
         return self.table.get_item(Key={"tenant_id": tenant_id}).get("Item")
 
     def _get_env_float(self, name: str, default: float) -> float:
-        value: Optional[str] = os.getenv(name)
-        try:
-            return float(value) if value is not None else default
-        except (TypeError, ValueError):
-            return default
+        return _env_float(name, default)
             
     def list_all(self) -> list[dict]:
         """Lists all tenants.
@@ -158,70 +157,77 @@ class TenantsRepo:
             ExpressionAttributeValues={":email": current},
         )
         
+    def get_kb_settings(self, tenant_id: str) -> "KBTenantSettings":
+        """Wszystkie progi KB tenanta z jednego odczytu rekordu."""
+        return KBTenantSettings.from_item(self.get(tenant_id))
+
     def get_kb_smalltalk_min_score(self, tenant_id: str) -> float:
         """Zwraca minimalny score smalltalk dla tenanta."""
+        return self.get_kb_settings(tenant_id).smalltalk_min_score
 
-        item = self.get(tenant_id) or {}
-        kb_cfg = item.get("kb_parameters")
-
-        if not isinstance(kb_cfg, dict):
-            return self._get_env_float(
-                "KB_SMALLTALK_MIN_SCORE",
-                KB_SMALLTALK_MIN_SCORE,
-            )
-
-        value = kb_cfg.get("kb_smalltalk_min_score")
-
-        if value in (None, ""):
-            return self._get_env_float(
-                "KB_SMALLTALK_MIN_SCORE",
-                KB_SMALLTALK_MIN_SCORE,
-            )
-
-        return float(value)
-        
     def get_kb_vector_min_score_low(self, tenant_id: str) -> float:
         """Zwraca minimalny score dla tenanta."""
+        return self.get_kb_settings(tenant_id).vector_min_score_low
 
-        item = self.get(tenant_id) or {}
-        kb_cfg = item.get("kb_parameters")
-
-        if not isinstance(kb_cfg, dict):
-            return self._get_env_float(
-                "KB_VECTOR_MIN_SCORE_LOW",
-                KB_VECTOR_MIN_SCORE_LOW,
-            )
-
-        value = kb_cfg.get("kb_vector_min_score_low")
+    def get_kb_answer_cache_min_score(self, tenant_id: str) -> float:
+        """Zwraca minimalne podobieństwo pytań dla cache odpowiedzi AI-FAQ."""
+        return self.get_kb_settings(tenant_id).answer_cache_min_score
 
-        if value in (None, ""):
-            return self._get_env_float(
-                "KB_VECTOR_MIN_SCORE_LOW",
-                KB_VECTOR_MIN_SCORE_LOW,
-            )
+    def get_kb_prompt_max_tokens(self, tenant_id: str) -> int:
+        """Zwraca budżet tokenów promptu AI-FAQ dla tenanta."""
+        return self.get_kb_settings(tenant_id).prompt_max_tokens
 
-        return float(value)
-        
     def get_kb_vector_fastpath_min_score(self, tenant_id: str) -> float:
         """Zwraca minimalny score fastpath dla tenanta."""
-
-        item = self.get(tenant_id) or {}
-        kb_cfg = item.get("kb_parameters")
-
-        if not isinstance(kb_cfg, dict):
-            return self._get_env_float(
-                "KB_VECTOR_FASTPATH_MIN_SCORE",
-                KB_VECTOR_FASTPATH_MIN_SCORE,
-            )
-
-        value = kb_cfg.get("kb_vector_fastpath_min_score")
-
-        if value in (None, ""):
-            return self._get_env_float(
-                "KB_VECTOR_FASTPATH_MIN_SCORE",
-                KB_VECTOR_FASTPATH_MIN_SCORE,
-            )
-
-        return float(value)
-        
-        
\ No newline at end of file
+        return self.get_kb_settings(tenant_id).vector_fastpath_min_score
+
+
+def _env_float(name: str, default: float) -> float:
+    value: Optional[str] = os.getenv(name)
+    try:
+        return float(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _kb_param(kb_cfg: Any, key: str, env_name: str, default: float) -> float:
+    # wartość tenanta (kb_parameters) > ENV > stała z constants
+    value = kb_cfg.get(key) if isinstance(kb_cfg, dict) else None
+    if value in (None, ""):
+        return _env_float(env_name, default)
+    return float(value)
+
+
+@dataclass(frozen=True)
+class KBTenantSettings:
+    """Progi i budżety KB tenanta (kb_parameters w rekordzie Tenants).
+
+    Rozwiązywane raz na pytanie z rekordu tenanta (np. z cache
+    TenantConfigService), zamiast osobnego odczytu DDB na każdy próg.
+    """
+    smalltalk_min_score: float
+    vector_min_score_low: float
+    vector_fastpath_min_score: float
+    answer_cache_min_score: float
+    prompt_max_tokens: int
+
+    @classmethod
+    def from_item(cls, item: Optional[dict]) -> "KBTenantSettings":
+        kb_cfg = (item or {}).get("kb_parameters")
+        return cls(
+            smalltalk_min_score=_kb_param(
+                kb_cfg, "kb_smalltalk_min_score", "KB_SMALLTALK_MIN_SCORE", KB_SMALLTALK_MIN_SCORE
+            ),
+            vector_min_score_low=_kb_param(
+                kb_cfg, "kb_vector_min_score_low", "KB_VECTOR_MIN_SCORE_LOW", KB_VECTOR_MIN_SCORE_LOW
+            ),
+            vector_fastpath_min_score=_kb_param(
+                kb_cfg, "kb_vector_fastpath_min_score", "KB_VECTOR_FASTPATH_MIN_SCORE", KB_VECTOR_FASTPATH_MIN_SCORE
+            ),
+            answer_cache_min_score=_kb_param(
+                kb_cfg, "kb_answer_cache_min_score", "KB_ANSWER_CACHE_MIN_SCORE", KB_ANSWER_CACHE_MIN_SCORE
+            ),
+            prompt_max_tokens=int(
+                _kb_param(kb_cfg, "kb_prompt_max_tokens", "KB_PROMPT_MAX_TOKENS", KB_PROMPT_MAX_TOKENS)
+            ),
+        )
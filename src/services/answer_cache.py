@@ -0,0 +1,171 @@
+"""
+Semantyczny cache odpowiedzi AI-FAQ (KBService.answer_ai).
+
+Klucz: (tenant, język, wersja FAQ) + embedding pytania. Odpowiedź z cache
+zwracamy, gdy cosine similarity do wcześniej zadanego pytania >= progu
+tenanta (kb_parameters.kb_answer_cache_min_score).
+
+Wersję FAQ podbija kb_reindexer po reindeksacji tenant/język, więc wpisy
+dla starej treści FAQ przestają być widoczne we wszystkich kontenerach
+najpóźniej po KB_ANSWER_CACHE_VERSION_TTL sekund.
+
+Wpisy żyją w DynamoDB (AnswerCacheRepo) z kopią w pamięci procesu,
+przeładowywaną co KB_ANSWER_CACHE_RELOAD_TTL sekund (odpowiedzi zapisane
+przez inne kontenery); bez skonfigurowanej tabeli cache jest wyłączony.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from operator import mul
+from typing import Dict, List, Optional, Tuple
+
+from ..common.logging import logger
+from ..repos.answer_cache_repo import AnswerCacheRepo
+
+
+def _unit(vec: List[float]) -> Optional[List[float]]:
+    # lista floatów + sum(map(mul)) – pętla iloczynu w C; array('f') byłby wolniejszy
+    # (boxing floatów przy każdym odczycie)
+    norm = math.sqrt(sum(map(mul, vec, vec))) if vec else 0.0
+    if norm <= 0:
+        return None
+    return [x / norm for x in vec]
+
+
+class _Partition:
+    __slots__ = ("version", "version_checked", "loaded_at", "entries")
+
+    def __init__(self) -> None:
+        self.version = 0
+        self.version_checked = 0.0
+        self.loaded_at = 0.0
+        self.entries: List[Tuple[List[float], str]] = []
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        *,
+        repo: AnswerCacheRepo | None = None,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        version_ttl_seconds: Optional[float] = None,
+        reload_ttl_seconds: Optional[float] = None,
+    ) -> None:
+        self.repo = repo if repo is not None else AnswerCacheRepo()
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv("KB_ANSWER_CACHE_MAX", "200"))
+        self.ttl_seconds = int(ttl_seconds if ttl_seconds is not None else os.getenv("KB_ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+        self.version_ttl_seconds = float(
+            version_ttl_seconds if version_ttl_seconds is not None else os.getenv("KB_ANSWER_CACHE_VERSION_TTL", "60")
+        )
+        # niezależnie od wersji: co ile przeładować wpisy z DDB (nowe odpowiedzi innych kontenerów)
+        self.reload_ttl_seconds = float(
+            reload_ttl_seconds if reload_ttl_seconds is not None else os.getenv("KB_ANSWER_CACHE_RELOAD_TTL", "30")
+        )
+        self._enabled = os.getenv("KB_ANSWER_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+        self._partitions: Dict[Tuple[str, str], _Partition] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled and self.repo.enabled and self.max_entries > 0
+
+    @staticmethod
+    def _lang(language_code: Optional[str]) -> str:
+        return ((language_code or "en").split("-", 1)[0]).lower()
+
+    def _partition(self, tenant_id: str, lang: str) -> _Partition:
+        """Partycja tenant/lang z aktualną wersją FAQ i wczytanymi wpisami."""
+        now = time.time()
+        with self._lock:
+            part = self._partitions.setdefault((tenant_id, lang), _Partition())
+            check_version = now - part.version_checked >= self.version_ttl_seconds
+
+        if check_version:
+            version = self.repo.get_version(tenant_id, lang)
+            with self._lock:
+                if version != part.version or not part.loaded_at:
+                    part.version = version
+                    part.loaded_at = 0.0
+                    part.entries = []
+                part.version_checked = now
+
+        if not part.loaded_at or now - part.loaded_at >= self.reload_ttl_seconds:
+            version = part.version
+            loaded = []
+            for e in self.repo.list_entries(tenant_id, lang, version, self.max_entries):
+                unit = _unit(e.get("vec"))
+                if unit is not None and e.get("answer"):
+                    loaded.append((unit, e["answer"]))
+            with self._lock:
+                # w międzyczasie inny wątek mógł wykryć nową wersję – nie nadpisujemy jej
+                if part.version == version:
+                    part.entries = loaded
+                    part.loaded_at = now
+        return part
+
+    def lookup(
+        self,
+        tenant_id: str,
+        language_code: Optional[str],
+        vec: List[float],
+        *,
+        min_score: float,
+    ) -> Optional[str]:
+        if not self.enabled:
+            return None
+        q = _unit(vec)
+        if q is None:
+            return None
+        try:
+            part = self._partition(tenant_id, self._lang(language_code))
+        except Exception as e:
+            logger.warning({"component": "answer_cache", "event": "lookup_failed", "tenant_id": tenant_id, "err": str(e)})
+            return None
+
+        best_score, best_answer = 0.0, None
+        for unit, answer in list(part.entries):
+            score = sum(map(mul, q, unit))
+            if score > best_score:
+                best_score, best_answer = score, answer
+        logger.info({
+            "component": "answer_cache",
+            "event": "lookup",
+            "tenant_id": tenant_id,
+            "lang": language_code,
+            "version": part.version,
+            "entries": len(part.entries),
+            "best_score": round(best_score, 4),
+            "min_score": min_score,
+            "hit": best_score >= min_score,
+        })
+        return best_answer if best_score >= min_score else None
+
+    def store(self, tenant_id: str, language_code: Optional[str], vec: List[float], answer: str) -> None:
+        if not self.enabled or not answer:
+            return
+        unit = _unit(vec)
+        if unit is None:
+            return
+        lang = self._lang(language_code)
+        try:
+            part = self._partition(tenant_id, lang)
+            with self._lock:
+                part.entries.insert(0, (unit, answer))
+                del part.entries[self.max_entries:]
+            self.repo.put_entry(tenant_id, lang, part.version, vec, answer, self.ttl_seconds)
+        except Exception as e:
+            logger.warning({"component": "answer_cache", "event": "store_failed", "tenant_id": tenant_id, "err": str(e)})
+
+    def invalidate(self, tenant_id: str, language_code: Optional[str]) -> int:
+        """Podbija wersję FAQ tenant/lang (wywoływane po reindeksacji)."""
+        lang = self._lang(language_code)
+        with self._lock:
+            self._partitions.pop((tenant_id, lang), None)
+        if not self.repo.enabled:
+            return 0
+        return self.repo.bump_version(tenant_id, lang)
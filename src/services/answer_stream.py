@@ -0,0 +1,102 @@
+"""
+Przyrostowe parsowanie streamowanej odpowiedzi AI-FAQ.
+
+LLM zwraca JSON {"answer": "..."} (response_format=json_object), więc w trakcie
+streamingu wyciągamy zdekodowaną treść pola "answer" (z obsługą escape'ów
+rozciętych między fragmentami) i szukamy granicy akapitu/zdania, po której
+można już wysłać użytkownikowi pierwszą wiadomość.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Optional
+
+_RE_SENTENCE_END = re.compile(r"[.!?…](?=\s)", re.UNICODE)
+_HEX = set("0123456789abcdefABCDEF")
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class AnswerStreamParser:
+    """Dekoduje wartość jednego pola tekstowego JSON-a z kolejnych fragmentów."""
+
+    def __init__(self, field: str) -> None:
+        self._key_re = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._buf = ""
+        self._pos = 0
+        self._in_value = False
+        self.done = False
+        self.text = ""
+
+    def feed(self, chunk: str) -> str:
+        """Dokłada fragment; zwraca nowo zdekodowany tekst pola (może być pusty)."""
+        if self.done or not chunk:
+            return ""
+        self._buf += chunk
+        if not self._in_value:
+            m = self._key_re.search(self._buf)
+            if not m:
+                return ""
+            self._in_value = True
+            self._pos = m.end()
+
+        out = []
+        buf, i, n = self._buf, self._pos, len(self._buf)
+        while i < n:
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            # escape – czekamy, aż będzie kompletny
+            if i + 1 >= n:
+                break
+            if buf[i + 1] != "u":
+                # niepoprawny escape (np. \x) zostawiamy jako zwykły tekst
+                out.append(_ESCAPES.get(buf[i + 1], buf[i:i + 2]))
+                i += 2
+                continue
+            end = i + 6
+            code = buf[i + 2:min(end, n)]
+            if not set(code) <= _HEX:
+                # j.w.; reszta (np. zamykający cudzysłów) parsowana normalnie
+                out.append(buf[i:i + 2])
+                i += 2
+                continue
+            if end > n:
+                break
+            if 0xD800 <= int(code, 16) <= 0xDBFF:
+                # para surogatów (np. emoji) – potrzebny drugi \\uXXXX
+                if end + 6 > n:
+                    break
+                end += 6
+            try:
+                out.append(json.loads(f'"{buf[i:end]}"'))
+            except ValueError:
+                pass
+            i = end
+
+        self._pos = i
+        new = "".join(out)
+        self.text += new
+        return new
+
+
+def first_segment_end(text: str, min_chars: int) -> Optional[int]:
+    """Indeks końca pierwszego fragmentu do wysłania albo None (jeszcze za wcześnie).
+
+    Preferujemy granicę akapitu; zdanie tniemy dopiero po min_chars znakach,
+    żeby nie wysyłać pojedynczego "Cześć!" jako osobnej wiadomości.
+    """
+    para = text.find("\n\n")
+    if para >= max(1, min_chars // 2):
+        return para
+    for m in _RE_SENTENCE_END.finditer(text):
+        if m.end() >= min_chars:
+            return m.end()
+    return None
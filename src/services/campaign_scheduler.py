@@ -0,0 +1,237 @@
+"""
+Planowanie wysyłki kampanii w oknach czasowych.
+
+Kampania nie jest już wysyłana "na raz" w jednym ticku EventBridge:
+- odbiorcy są dzieleni na kubełki wg strefy czasowej (prefiks numeru),
+- w każdym ticku wysyłamy tylko kubełki, dla których trwa okno send_from/send_to,
+- liczba wiadomości w ticku wynika z limitu outbound tenanta (rps * długość ticku),
+- wiadomości w ticku są rozkładane równomiernie (SQS DelaySeconds),
+- postęp (kursor per kubełek) jest zapisywany w Campaigns, więc kolejny tick
+  (albo retry po awarii) wznawia wysyłkę zamiast ją gubić.
+
+Klasa jest czysta (bez IO) – zapis/odczyt postępu robi campaign_runner.
+"""
+
+import math
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+from ..common.constants import (
+    CAMPAIGNS_NEXT_RUN_FORMAT,
+    CAMPAIGNS_PHONE_PREFIX_TIMEZONES,
+    CAMPAIGNS_TIME_ZONE,
+)
+from ..common.security import normalize_phone
+from .campaign_service import DEFAULT_SEND_FROM, DEFAULT_SEND_TO
+
+# SQS pozwala opóźnić pojedynczą wiadomość maksymalnie o 15 minut
+MAX_SQS_DELAY_SECONDS = 900
+# next_run_time wypada tyle przed kolejnym tickiem, żeby tick EventBridge
+# (rate = tick_seconds) zawsze zastał kampanię jako "due" mimo dryfu startu
+NEXT_RUN_MARGIN_SECONDS = 60
+_DAY_MINUTES = 24 * 60
+
+
+@dataclass(frozen=True)
+class CampaignSlice:
+    """Fragment kubełka strefy czasowej do wysłania w bieżącym ticku: [start, end)."""
+    timezone: str
+    start: int
+    end: int
+
+
+def _parse_hhmm(value: Any, default: str) -> int:
+    """'HH:MM' -> minuty od północy (0..1440, '24:00' = koniec doby)."""
+    raw = str(value or default).strip()
+    try:
+        hh, mm = raw.split(":", 1)
+        minutes = int(hh) * 60 + int(mm)
+    except (TypeError, ValueError):
+        hh, mm = default.split(":", 1)
+        minutes = int(hh) * 60 + int(mm)
+    return max(0, min(_DAY_MINUTES, minutes))
+
+
+class CampaignScheduler:
+    def __init__(
+        self,
+        now_fn: Optional[Callable[[], datetime]] = None,
+        default_tz: str = CAMPAIGNS_TIME_ZONE,
+        tick_seconds: Optional[int] = None,
+        default_rps: Optional[float] = None,
+        outbound_share: Optional[float] = None,
+    ) -> None:
+        self._now_fn = now_fn or (lambda: datetime.now(timezone.utc))
+        self.default_tz = default_tz
+        self.tick_seconds = int(tick_seconds or os.getenv("CAMPAIGN_TICK_SECONDS", "900"))
+        # rps używane, gdy tenant nie ma limits.outbound.per_tenant_rps
+        self.default_rps = float(default_rps or os.getenv("CAMPAIGN_DEFAULT_RPS", "2"))
+        # część limitu outbound tenanta, którą mogą zająć kampanie (reszta dla rozmów)
+        self.outbound_share = float(outbound_share or os.getenv("CAMPAIGN_OUTBOUND_SHARE", "0.5"))
+
+    def now(self) -> datetime:
+        now = self._now_fn()
+        return now if now.tzinfo else now.replace(tzinfo=timezone.utc)
+
+    # ---------- okno wysyłki ----------
+
+    def window(self, campaign: Dict[str, Any]) -> tuple[int, int]:
+        """Okno wysyłki kampanii w minutach od północy (czas lokalny odbiorcy)."""
+        return (
+            _parse_hhmm(campaign.get("send_from"), DEFAULT_SEND_FROM),
+            _parse_hhmm(campaign.get("send_to"), DEFAULT_SEND_TO),
+        )
+
+    def _local_now(self, tz_name: str, now: Optional[datetime]) -> datetime:
+        now = now or self._now_fn()
+        if now.tzinfo is None:
+            now = now.replace(tzinfo=timezone.utc)
+        return now.astimezone(ZoneInfo(tz_name))
+
+    def seconds_left(self, campaign: Dict[str, Any], tz_name: str, now: Optional[datetime] = None) -> int:
+        """Ile sekund zostało do końca okna w danej strefie (0 = okno zamknięte).
+
+        Obsługuje także okna "przez północ" (np. 20:00-02:00).
+        """
+        start, end = self.window(campaign)
+        local = self._local_now(tz_name, now)
+        minute = local.hour * 60 + local.minute
+        second = minute * 60 + local.second
+
+        if start == end:
+            return 0
+        if start < end:
+            if start <= minute < end:
+                return end * 60 - second
+            return 0
+        # okno przez północ
+        if minute >= start:
+            return (_DAY_MINUTES + end) * 60 - second
+        if minute < end:
+            return end * 60 - second
+        return 0
+
+    def is_open(self, campaign: Dict[str, Any], tz_name: str, now: Optional[datetime] = None) -> bool:
+        return self.seconds_left(campaign, tz_name, now) > 0
+
+    def next_open_at(self, campaign: Dict[str, Any], tz_name: str, now: Optional[datetime] = None) -> datetime:
+        """Najbliższy (UTC) moment otwarcia okna w danej strefie."""
+        now = now or self._now_fn()
+        if self.is_open(campaign, tz_name, now):
+            return now
+        start, _ = self.window(campaign)
+        local = self._local_now(tz_name, now)
+        candidate = local.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(minutes=start)
+        if candidate <= local:
+            candidate += timedelta(days=1)
+        return candidate.astimezone(timezone.utc)
+
+    # ---------- kubełki stref czasowych ----------
+
+    def timezone_for_phone(self, phone: str, default: Optional[str] = None) -> str:
+        p = normalize_phone(phone or "")
+        for length in range(min(len(p), 5), 1, -1):
+            tz_name = CAMPAIGNS_PHONE_PREFIX_TIMEZONES.get(p[:length])
+            if tz_name:
+                return tz_name
+        return default or self.default_tz
+
+    def bucket_by_timezone(self, phones: Sequence[str], default: Optional[str] = None) -> Dict[str, List[int]]:
+        """Indeksy odbiorców pogrupowane wg strefy czasowej (kolejność stabilna).
+
+        Puste numery trafiają do strefy domyślnej – runner je pominie,
+        ale kursor i tak musi przez nie przejść.
+        """
+        buckets: Dict[str, List[int]] = {}
+        for idx, phone in enumerate(phones):
+            buckets.setdefault(self.timezone_for_phone(phone, default), []).append(idx)
+        return buckets
+
+    # ---------- tempo wysyłki ----------
+
+    def pacing_rate(self, tenant_cfg: Optional[Dict[str, Any]]) -> float:
+        """Wiadomości kampanii na sekundę dla tenanta."""
+        lim = ((tenant_cfg or {}).get("limits") or {}).get("outbound") or {}
+        try:
+            rps = float(lim.get("per_tenant_rps") or 0)
+        except (TypeError, ValueError):
+            rps = 0.0
+        if rps <= 0:
+            return self.default_rps
+        return max(0.1, rps * self.outbound_share)
+
+    def delay_seconds(self, position: int, rate: float) -> int:
+        """DelaySeconds dla wiadomości nr `position` w bieżącym ticku."""
+        if rate <= 0:
+            return 0
+        return min(MAX_SQS_DELAY_SECONDS, int(position / rate))
+
+    def plan(
+        self,
+        campaign: Dict[str, Any],
+        buckets: Dict[str, List[int]],
+        progress: Dict[str, int],
+        *,
+        rate: float,
+        now: Optional[datetime] = None,
+    ) -> List[CampaignSlice]:
+        """Wybiera fragmenty kubełków do wysłania w bieżącym ticku.
+
+        Budżet ticku (rate * tick_seconds, max 15 min opóźnienia SQS) jest
+        wspólny dla wszystkich stref, a żadna wiadomość nie może zostać
+        opóźniona poza koniec okna swojej strefy.
+        """
+        now = now or self._now_fn()
+        horizon = min(self.tick_seconds, MAX_SQS_DELAY_SECONDS)
+        budget = max(1, int(math.floor(rate * horizon)))
+
+        slices: List[CampaignSlice] = []
+        pos = 0
+        for tz_name in sorted(buckets):
+            if pos >= budget:
+                break
+            start = int(progress.get(tz_name, 0))
+            remaining = len(buckets[tz_name]) - start
+            if remaining <= 0:
+                continue
+            left = self.seconds_left(campaign, tz_name, now)
+            if left <= 0:
+                continue
+            window_cap = max(1, int(math.floor(rate * min(horizon, left))))
+            take = min(remaining, budget - pos, window_cap - pos)
+            if take <= 0:
+                continue
+            slices.append(CampaignSlice(timezone=tz_name, start=start, end=start + take))
+            pos += take
+        return slices
+
+    def is_done(self, buckets: Dict[str, List[int]], progress: Dict[str, int]) -> bool:
+        return all(int(progress.get(tz, 0)) >= len(idx) for tz, idx in buckets.items())
+
+    def next_run_time(
+        self,
+        campaign: Dict[str, Any],
+        buckets: Dict[str, List[int]],
+        progress: Dict[str, int],
+        now: Optional[datetime] = None,
+    ) -> Optional[str]:
+        """next_run_time (format GSI, CAMPAIGNS_TIME_ZONE) albo None, gdy wszystko wysłane.
+
+        `now` powinien być początkiem ticku (nie startem danej kampanii, który
+        może wypaść minuty później) – inaczej kampania przeskakuje cały tick.
+        """
+        now = now or self._now_fn()
+        if now.tzinfo is None:
+            now = now.replace(tzinfo=timezone.utc)
+        pending = [tz for tz, idx in buckets.items() if int(progress.get(tz, 0)) < len(idx)]
+        if not pending:
+            return None
+        if any(self.is_open(campaign, tz, now) for tz in pending):
+            margin = min(NEXT_RUN_MARGIN_SECONDS, self.tick_seconds // 2)
+            at = now + timedelta(seconds=self.tick_seconds - margin)
+        else:
+            at = min(self.next_open_at(campaign, tz, now) for tz in pending)
+        return at.astimezone(ZoneInfo(CAMPAIGNS_TIME_ZONE)).strftime(CAMPAIGNS_NEXT_RUN_FORMAT)
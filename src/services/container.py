@@ -0,0 +1,178 @@
+"""
+Kontener zależności dla grafu obiektów message_routera.
+
+Każdy komponent (repozytoria, klient OpenAI, serwisy) powstaje raz na proces
+i dopiero przy pierwszym użyciu – cold start Lambdy nie płaci za NLU, KB,
+CRM czy ticketing, zanim faktycznie trafi się wiadomość, która ich wymaga.
+Wspólne zależności (TenantsRepo, OpenAIClient, ClientsFactory,
+ConversationsRepo, TemplateService) są współdzielone zamiast tworzone
+osobno w konstruktorze każdego serwisu.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from ..adapters.openai_client import OpenAIClient
+from ..common.logging import logger
+from ..repos.conversations_repo import ConversationsRepo
+from ..repos.messages_repo import MessagesRepo
+from ..repos.tenants_repo import TenantsRepo
+from .clients_factory import ClientsFactory
+from .crm_flow_service import CRMFlowService
+from .crm_service import CRMService
+from .kb_service import KBService
+from .language_service import LanguageService
+from .metrics_service import MetricsService
+from .nlu_service import NLUService
+from .template_service import TemplateService
+from .ticketing_service import TicketingService
+
+
+class ServiceContainer:
+    """Leniwe singletony procesu; budowa jest jednorazowa także przy wątkach."""
+
+    def __init__(self) -> None:
+        self._instances: Dict[str, Any] = {}
+        # RLock: fabryki wołają gettery zależności (kb -> openai, tenants...)
+        self._lock = threading.RLock()
+        # komponent -> czas budowy (ms), do diagnostyki cold startu
+        self._init_ms: Dict[str, int] = {}
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        inst = self._instances.get(name)
+        if inst is not None:
+            return inst
+        with self._lock:
+            inst = self._instances.get(name)
+            if inst is None:
+                start = time.perf_counter()
+                inst = factory()
+                self._init_ms[name] = int((time.perf_counter() - start) * 1000)
+                self._instances[name] = inst
+                logger.info(
+                    {"component": "container", "event": "component_init", "name": name, "duration_ms": self._init_ms[name]}
+                )
+        return inst
+
+    def built(self) -> list[str]:
+        """Nazwy komponentów zbudowanych do tej pory (kolejność budowy)."""
+        return list(self._instances)
+
+    def init_timings(self) -> dict[str, int]:
+        """Czasy budowy komponentów (ms, łącznie z zależnościami budowanymi po drodze)."""
+        return dict(self._init_ms)
+
+    # ------------------------------------------------------------------
+    #  Repozytoria i klienci
+    # ------------------------------------------------------------------
+
+    def tenants(self) -> TenantsRepo:
+        return self._get("tenants", TenantsRepo)
+
+    def conv(self) -> ConversationsRepo:
+        return self._get("conv", ConversationsRepo)
+
+    def messages(self) -> MessagesRepo:
+        return self._get("messages", MessagesRepo)
+
+    def metrics(self) -> MetricsService:
+        return self._get("metrics", MetricsService)
+
+    def openai(self) -> OpenAIClient:
+        return self._get("openai", OpenAIClient)
+
+    def clients_factory(self) -> ClientsFactory:
+        return self._get("clients_factory", ClientsFactory)
+
+    # ------------------------------------------------------------------
+    #  Serwisy
+    # ------------------------------------------------------------------
+
+    def tpl(self) -> TemplateService:
+        return self._get("tpl", lambda: TemplateService(tenants=self.tenants()))
+
+    def nlu(self) -> NLUService:
+        return self._get("nlu", lambda: NLUService(client=self.openai(), metrics=self.metrics()))
+
+    def kb(self) -> KBService:
+        return self._get(
+            "kb",
+            lambda: KBService(
+                openai_client=self.openai(),
+                clients_factory=self.clients_factory(),
+                tenants=self.tenants(),
+            ),
+        )
+
+    def crm(self) -> CRMService:
+        return self._get("crm", lambda: CRMService(clients_factory=self.clients_factory()))
+
+    def ticketing(self) -> TicketingService:
+        return self._get(
+            "ticketing",
+            lambda: TicketingService(tpl=self.tpl(), clients_factory=self.clients_factory()),
+        )
+
+    def crm_flow(self) -> CRMFlowService:
+        return self._get(
+            "crm_flow",
+            lambda: CRMFlowService(
+                crm=self.crm(),
+                _clients_factory=self.clients_factory(),
+                tpl=self.tpl(),
+                conv=self.conv(),
+                tenants=self.tenants(),
+            ),
+        )
+
+    def language(self) -> LanguageService:
+        return self._get("language", lambda: LanguageService(conv=self.conv(), tenants=self.tenants()))
+
+
+class LazyComponent:
+    """Atrybut instancji budowany przy pierwszym odczycie.
+
+    Deskryptor bez __set__: przypisanie (konstruktor, testy, monkeypatch)
+    trafia do __dict__ instancji i ma pierwszeństwo przed fabryką.
+    """
+
+    def __init__(self, factory: Callable[[Any], Any]) -> None:
+        self._factory = factory
+        self._lock = threading.RLock()
+        self.name = ""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, obj: Any, objtype: Optional[type] = None) -> Any:
+        if obj is None:
+            return self
+        with self._lock:
+            if self.name in obj.__dict__:
+                return obj.__dict__[self.name]
+            value = self._factory(obj)
+            obj.__dict__[self.name] = value
+        return value
+
+
+_DEFAULT_CONTAINER: Optional[ServiceContainer] = None
+_DEFAULT_CONTAINER_LOCK = threading.Lock()
+
+
+def default_container() -> ServiceContainer:
+    """Kontener współdzielony w procesie (warm Lambda)."""
+    global _DEFAULT_CONTAINER
+    if _DEFAULT_CONTAINER is None:
+        with _DEFAULT_CONTAINER_LOCK:
+            if _DEFAULT_CONTAINER is None:
+                _DEFAULT_CONTAINER = ServiceContainer()
+    return _DEFAULT_CONTAINER
+
+
+def reset_default_container() -> None:
+    global _DEFAULT_CONTAINER
+    with _DEFAULT_CONTAINER_LOCK:
+        _DEFAULT_CONTAINER = None
@@ -77,13 +77,14 @@ class CRMFlowService:
         conv: ConversationsRepo | None = None,
         tenants: TenantsRepo | None = None,
     ) -> None:
-        self._clients_factory = ClientsFactory()
+        self._clients_factory = _clients_factory or ClientsFactory()
         self.crm = crm or CRMService(clients_factory=self._clients_factory)
         self.tpl = tpl or TemplateService()
         self.conv = conv or ConversationsRepo()
         self.tenants = tenants or TenantsRepo()
 
-        # cache słów typu TAK/NIE z templatek
+        # cache słów typu TAK/NIE z templatek; współdzielony przez wątki routera
+        # bez locka – wpisy są tylko dopisywane, a wyścig daje ten sam zbiór słów
         self._words_cache: dict[tuple[str, str, str], set[str]] = {}
 
     # ------------------------------------------------------------------ #
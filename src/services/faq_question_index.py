@@ -0,0 +1,62 @@
+"""
+Indeks dokładnych pytań FAQ (entries[].questions -> answer).
+
+Pytanie użytkownika, które po normalizacji jest identyczne z pytaniem
+z FAQ tenanta, dostaje odpowiedź od razu – bez embeddingu i zapytania do
+Pinecone. Normalizacja łapie "prawie dokładne" powtórki: wielkość liter,
+interpunkcję, wielokrotne spacje i polskie znaki diakrytyczne.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Any, Dict, Optional
+
+from ..common.text_chunking import iter_faq_entries
+
+_RE_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+# litery bez rozkładu NFKD (ł nie ma znaku łączącego)
+_FOLD = str.maketrans({"ł": "l", "ß": "ss", "ø": "o", "đ": "d"})
+
+
+def normalize_question(text: str) -> str:
+    """Klucz indeksu: małe litery, bez diakrytyków i interpunkcji, pojedyncze spacje."""
+    s = unicodedata.normalize("NFKD", (text or "").casefold().translate(_FOLD))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return _RE_NON_WORD.sub(" ", s).strip()
+
+
+class FAQQuestionIndex:
+    """Znormalizowane pytanie -> odpowiedź, budowany raz przy wczytaniu FAQ.
+
+    Pytania prowadzące do różnych odpowiedzi (kolizja po normalizacji)
+    są pomijane – wtedy decyduje zwykły retrieval.
+    """
+
+    def __init__(self, answers: Optional[Dict[str, str]] = None) -> None:
+        self._answers: Dict[str, str] = dict(answers or {})
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    @classmethod
+    def build(cls, faq: Optional[Dict[str, Any]]) -> "FAQQuestionIndex":
+        answers: Dict[str, str] = {}
+        ambiguous: set = set()
+        for _key, _category, questions, answer in iter_faq_entries(faq or {}):
+            for q in questions:
+                k = normalize_question(q)
+                if not k or k in ambiguous:
+                    continue
+                if k in answers and answers[k] != answer:
+                    ambiguous.add(k)
+                    del answers[k]
+                    continue
+                answers[k] = answer
+        return cls(answers)
+
+    def lookup(self, question: str) -> Optional[str]:
+        if not self._answers:
+            return None
+        return self._answers.get(normalize_question(question))
@@ -0,0 +1,118 @@
+"""
+Cache wyników klasyfikacji intencji (znormalizowany tekst + język -> wynik NLU).
+
+Dwie warstwy:
+- pamięć procesu (LRU z TTL, ograniczony rozmiar) – warm Lambda,
+- opcjonalnie DynamoDB (IntentCacheRepo) – wspólny dla wszystkich kontenerów.
+
+Normalizacja jest celowo zachowawcza (wielkość liter, spacje, interpunkcja
+na brzegach), bo w cache trzymamy też sloty – "rezerwuj 12" i "rezerwuj 13"
+muszą pozostać różnymi kluczami.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from ..repos.intent_cache_repo import IntentCacheRepo
+
+_RE_SPACES = re.compile(r"\s+", re.UNICODE)
+_RE_EDGE_PUNCT = re.compile(r"^[^\w]+|[^\w]+$", re.UNICODE)
+
+SOURCE_MEMORY = "memory"
+SOURCE_DDB = "ddb"
+
+
+def normalize_for_cache(text: str) -> str:
+    t = _RE_SPACES.sub(" ", (text or "").strip().lower())
+    return _RE_EDGE_PUNCT.sub("", t)
+
+
+class IntentCache:
+    def __init__(
+        self,
+        *,
+        repo: IntentCacheRepo | None = None,
+        max_items: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        min_confidence: Optional[float] = None,
+        max_text_chars: Optional[int] = None,
+    ) -> None:
+        self.repo = repo if repo is not None else IntentCacheRepo()
+        self.max_items = int(max_items if max_items is not None else os.getenv("NLU_CACHE_MAX", "2000"))
+        self.ttl_seconds = int(ttl_seconds if ttl_seconds is not None else os.getenv("NLU_CACHE_TTL", "86400"))
+        self.min_confidence = float(
+            min_confidence if min_confidence is not None else os.getenv("NLU_CACHE_MIN_CONFIDENCE", "0.6")
+        )
+        # długie wiadomości praktycznie się nie powtarzają – nie zaśmiecamy nimi cache
+        self.max_text_chars = int(max_text_chars if max_text_chars is not None else os.getenv("NLU_CACHE_MAX_TEXT", "200"))
+        self._items: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, text: str, lang: str) -> Optional[str]:
+        norm = normalize_for_cache(text)
+        if not norm or len(norm) > self.max_text_chars:
+            return None
+        lang = (lang or "").split("-", 1)[0].lower()
+        return f"{lang}#{hashlib.sha256(norm.encode('utf-8')).hexdigest()}"
+
+    def get(self, text: str, lang: str) -> Tuple[Optional[dict], Optional[str]]:
+        """(wynik, źródło) – źródło: 'memory' / 'ddb' / None (miss)."""
+        key = self.key(text, lang)
+        if key is None or self.max_items <= 0:
+            return None, None
+        now = time.time()
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is not None:
+                if hit[0] > now:
+                    self._items.move_to_end(key)
+                    return copy.deepcopy(hit[1]), SOURCE_MEMORY
+                self._items.pop(key, None)
+
+        shared = self.repo.get(key) if self.repo.enabled else None
+        if shared and shared.get("intent"):
+            self._remember(key, shared)
+            return copy.deepcopy(shared), SOURCE_DDB
+        return None, None
+
+    def cacheable(self, result: dict) -> bool:
+        if not isinstance(result, dict) or not result.get("intent"):
+            return False
+        try:
+            conf = float(result.get("confidence", 0))
+        except (TypeError, ValueError):
+            return False
+        # niska pewność (np. clarify po błędzie parsowania / timeoucie) – nie utrwalamy
+        return conf >= self.min_confidence
+
+    def put(self, text: str, lang: str, result: dict) -> None:
+        key = self.key(text, lang)
+        if key is None or self.max_items <= 0 or not self.cacheable(result):
+            return
+        value = {
+            "intent": result.get("intent"),
+            "confidence": float(result.get("confidence", 0)),
+            "slots": dict(result.get("slots") or {}),
+        }
+        self._remember(key, value)
+        if self.repo.enabled:
+            self.repo.put(key, value, self.ttl_seconds)
+
+    def _remember(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._items[key] = (time.time() + self.ttl_seconds, copy.deepcopy(value))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
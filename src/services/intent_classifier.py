@@ -0,0 +1,372 @@
+"""
+Lokalny, lekki klasyfikator intencji (bez LLM).
+
+Model: n-gramy znakowe (TF-IDF, sublinear tf) + najbliższy centroid (cosine),
+prawdopodobieństwa z softmaxu po podobieństwach. Softmax sam w sobie nie mówi,
+czy tekst w ogóle pasuje do którejś intencji, dlatego predict() odrzuca wynik,
+gdy najlepszy cosine jest poniżej progu (min_similarity) albo przewaga nad
+drugą intencją jest za mała (min_margin). Progi kalibruje calibrate() na
+hold-oucie. Czysty Python, serializacja do JSON – jeden plik na tenanta i język:
+
+    <prefix><tenant_id>/intent_<lang>.json
+    <prefix>_default/intent_<lang>.json   (fallback wspólny dla tenantów)
+
+Modele trenuje offline scripts/train_intent_model.py.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from ..common.aws import s3_client
+from ..common.config import settings
+from ..common.constants import NLU_LOCAL_MIN_MARGIN, NLU_LOCAL_MIN_SIMILARITY, NLU_MODEL_DEFAULT_TENANT
+from ..common.logging import logger
+
+MODEL_VERSION = 1
+
+_RE_URL = re.compile(r"https?://\S+", re.UNICODE)
+_RE_DIGITS = re.compile(r"\d+", re.UNICODE)
+_RE_SPACES = re.compile(r"\s+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, bez ogonków, cyfry -> '0', zredukowane spacje."""
+    t = (text or "").strip().lower()
+    t = _RE_URL.sub(" url ", t)
+    t = _RE_DIGITS.sub("0", t)
+    t = unicodedata.normalize("NFKD", t)
+    t = "".join(ch for ch in t if not unicodedata.combining(ch)).replace("ł", "l")
+    return _RE_SPACES.sub(" ", t).strip()
+
+
+def char_ngrams(text: str, n_min: int, n_max: int) -> Counter:
+    padded = f" {text} "
+    grams: Counter = Counter()
+    for n in range(n_min, n_max + 1):
+        for i in range(len(padded) - n + 1):
+            grams[padded[i:i + n]] += 1
+    return grams
+
+
+def _l2_normalize(vec: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    if norm <= 0:
+        return {}
+    return {k: v / norm for k, v in vec.items()}
+
+
+class LocalIntentModel:
+    """TF-IDF (char n-gram) + nearest centroid."""
+
+    def __init__(
+        self,
+        *,
+        idf: Dict[str, float],
+        centroids: Dict[str, Dict[str, float]],
+        ngram_min: int = 2,
+        ngram_max: int = 4,
+        temperature: float = 0.05,
+        min_similarity: float = NLU_LOCAL_MIN_SIMILARITY,
+        min_margin: float = NLU_LOCAL_MIN_MARGIN,
+        meta: Optional[dict] = None,
+    ) -> None:
+        self.idf = idf
+        self.centroids = centroids
+        self.ngram_min = ngram_min
+        self.ngram_max = ngram_max
+        self.temperature = temperature
+        # próg na surowy cosine i przewagę top-1 nad top-2
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.meta = meta or {}
+
+    @property
+    def intents(self) -> List[str]:
+        return sorted(self.centroids)
+
+    def vectorize(self, text: str) -> Dict[str, float]:
+        grams = char_ngrams(normalize_text(text), self.ngram_min, self.ngram_max)
+        vec = {
+            g: (1.0 + math.log(tf)) * self.idf[g]
+            for g, tf in grams.items()
+            if g in self.idf
+        }
+        return _l2_normalize(vec)
+
+    def similarities(self, text: str) -> Dict[str, float]:
+        """Cosine tekstu do centroidu każdej intencji."""
+        vec = self.vectorize(text)
+        if not vec or not self.centroids:
+            return {}
+        return {
+            intent: sum(w * centroid.get(g, 0.0) for g, w in vec.items())
+            for intent, centroid in self.centroids.items()
+        }
+
+    def _softmax(self, sims: Dict[str, float]) -> Dict[str, float]:
+        t = max(self.temperature, 1e-6)
+        top = max(sims.values())
+        exps = {k: math.exp((s - top) / t) for k, s in sims.items()}
+        total = sum(exps.values())
+        return {k: v / total for k, v in exps.items()}
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Prawdopodobieństwo per intencja (softmax z cosine / temperature)."""
+        sims = self.similarities(text)
+        return self._softmax(sims) if sims else {}
+
+    @staticmethod
+    def _top2(sims: Dict[str, float]) -> Tuple[str, float, float]:
+        ranked = sorted(sims.items(), key=lambda kv: kv[1], reverse=True)
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+        return ranked[0][0], ranked[0][1], ranked[0][1] - second
+
+    def predict(
+        self,
+        text: str,
+        *,
+        min_similarity: Optional[float] = None,
+        min_margin: Optional[float] = None,
+    ) -> Tuple[Optional[str], float]:
+        """(intencja, pewność) albo (None, 0.0), gdy tekst nie pasuje wyraźnie do żadnej intencji."""
+        sims = self.similarities(text)
+        if not sims:
+            return None, 0.0
+        intent, top, margin = self._top2(sims)
+        floor = self.min_similarity if min_similarity is None else min_similarity
+        gap = self.min_margin if min_margin is None else min_margin
+        if top < floor or margin < gap:
+            return None, 0.0
+        return intent, self._softmax(sims)[intent]
+
+    def calibrate(
+        self,
+        holdout: Iterable[Tuple[str, str]],
+        *,
+        intents: Iterable[str],
+        target_precision: float = 0.95,
+    ) -> Optional[dict]:
+        """Dobiera min_similarity/min_margin na hold-oucie.
+
+        Szuka najniższych progów (maks. pokrycie), przy których precyzja na
+        `intents` jest >= target_precision. Bez takich progów model zostaje
+        przy bieżących wartościach. Zwraca raport albo None (pusty hold-out).
+        """
+        accepted = frozenset(intents)
+        rows = []
+        for text, label in holdout:
+            sims = self.similarities(text)
+            if sims:
+                rows.append((label, *self._top2(sims)))
+        if not rows:
+            return None
+
+        best = None
+        for floor in [x / 20 for x in range(4, 17)]:
+            for gap in [x / 20 for x in range(0, 9)]:
+                handled = [(label, pred) for label, pred, top, margin in rows if pred in accepted and top >= floor and margin >= gap]
+                if not handled:
+                    continue
+                precision = sum(label == pred for label, pred in handled) / len(handled)
+                if precision >= target_precision and (best is None or len(handled) > best[0]):
+                    best = (len(handled), floor, gap, precision)
+        if best is None:
+            return {"test": len(rows), "calibrated": False, "min_similarity": self.min_similarity, "min_margin": self.min_margin}
+        handled, self.min_similarity, self.min_margin, precision = best
+        return {
+            "test": len(rows),
+            "calibrated": True,
+            "min_similarity": self.min_similarity,
+            "min_margin": self.min_margin,
+            "coverage": round(handled / len(rows), 3),
+            "precision": round(precision, 3),
+        }
+
+    # ---------- trening ----------
+
+    @classmethod
+    def train(
+        cls,
+        samples: Iterable[Tuple[str, str]],
+        *,
+        ngram_min: int = 2,
+        ngram_max: int = 4,
+        min_df: int = 1,
+        temperature: float = 0.05,
+        max_features_per_intent: int = 2000,
+    ) -> "LocalIntentModel":
+        """samples: (text, intent). Centroid = średnia znormalizowanych wektorów TF-IDF."""
+        docs: List[Tuple[Counter, str]] = []
+        df: Counter = Counter()
+        for text, intent in samples:
+            norm = normalize_text(text)
+            if not norm or not intent:
+                continue
+            grams = char_ngrams(norm, ngram_min, ngram_max)
+            docs.append((grams, intent))
+            df.update(grams.keys())
+        if not docs:
+            raise ValueError("no training samples")
+
+        n_docs = len(docs)
+        idf = {
+            g: math.log((1 + n_docs) / (1 + c)) + 1.0
+            for g, c in df.items()
+            if c >= min_df
+        }
+
+        sums: Dict[str, Dict[str, float]] = {}
+        counts: Counter = Counter()
+        for grams, intent in docs:
+            vec = _l2_normalize({
+                g: (1.0 + math.log(tf)) * idf[g] for g, tf in grams.items() if g in idf
+            })
+            acc = sums.setdefault(intent, {})
+            for g, w in vec.items():
+                acc[g] = acc.get(g, 0.0) + w
+            counts[intent] += 1
+
+        centroids: Dict[str, Dict[str, float]] = {}
+        for intent, acc in sums.items():
+            top = sorted(acc.items(), key=lambda kv: kv[1], reverse=True)[:max_features_per_intent]
+            centroids[intent] = _l2_normalize({g: w / counts[intent] for g, w in top})
+
+        # słownik przycinamy do n-gramów, które występują w jakimkolwiek centroidzie
+        used = set().union(*(c.keys() for c in centroids.values()))
+        idf = {g: v for g, v in idf.items() if g in used}
+
+        return cls(
+            idf=idf,
+            centroids=centroids,
+            ngram_min=ngram_min,
+            ngram_max=ngram_max,
+            temperature=temperature,
+            meta={"samples": dict(counts), "trained_at": int(time.time())},
+        )
+
+    # ---------- serializacja ----------
+
+    def to_dict(self) -> dict:
+        return {
+            "version": MODEL_VERSION,
+            "ngram_min": self.ngram_min,
+            "ngram_max": self.ngram_max,
+            "temperature": self.temperature,
+            "min_similarity": self.min_similarity,
+            "min_margin": self.min_margin,
+            "idf": {g: round(v, 6) for g, v in self.idf.items()},
+            "centroids": {
+                intent: {g: round(w, 6) for g, w in c.items()}
+                for intent, c in self.centroids.items()
+            },
+            "meta": self.meta,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LocalIntentModel":
+        if int(data.get("version") or 0) != MODEL_VERSION:
+            raise ValueError(f"unsupported intent model version: {data.get('version')!r}")
+        return cls(
+            idf={str(k): float(v) for k, v in (data.get("idf") or {}).items()},
+            centroids={
+                str(intent): {str(g): float(w) for g, w in (c or {}).items()}
+                for intent, c in (data.get("centroids") or {}).items()
+            },
+            ngram_min=int(data.get("ngram_min", 2)),
+            ngram_max=int(data.get("ngram_max", 4)),
+            temperature=float(data.get("temperature", 0.05)),
+            min_similarity=float(data.get("min_similarity", NLU_LOCAL_MIN_SIMILARITY)),
+            min_margin=float(data.get("min_margin", NLU_LOCAL_MIN_MARGIN)),
+            meta=data.get("meta") or {},
+        )
+
+    def dumps(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, raw: str | bytes) -> "LocalIntentModel":
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        return cls.from_dict(json.loads(raw))
+
+
+def model_key(tenant_id: str, lang: str, prefix: str = "") -> str:
+    lang = (lang or "en").split("-", 1)[0].lower()
+    return f"{prefix}{tenant_id}/intent_{lang}.json"
+
+
+class IntentModelStore:
+    """
+    Ładuje modele per tenant/język z katalogu lokalnego (NLU_MODEL_DIR)
+    albo z S3 (NLU_MODEL_BUCKET, domyślnie bucket KB) i trzyma je w pamięci
+    procesu (TTL), razem z informacją o braku modelu.
+    """
+
+    def __init__(
+        self,
+        *,
+        bucket: Optional[str] = None,
+        prefix: Optional[str] = None,
+        local_dir: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+    ) -> None:
+        self.bucket = bucket if bucket is not None else (os.getenv("NLU_MODEL_BUCKET") or settings.kb_bucket)
+        self.prefix = prefix if prefix is not None else os.getenv("NLU_MODEL_PREFIX", "nlu/")
+        self.local_dir = local_dir if local_dir is not None else os.getenv("NLU_MODEL_DIR", "")
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.getenv("NLU_MODEL_CACHE_TTL", "600"))
+        # (tenant_id, lang) -> (expires_at, model | None); współdzielony przez wątki
+        # routera bez locka – pojedynczy get/set słownika jest atomowy, a wyścig
+        # kończy się co najwyżej podwójnym wczytaniem tego samego modelu
+        self._cache: Dict[Tuple[str, str], Tuple[float, Optional[LocalIntentModel]]] = {}
+
+    def get(self, tenant_id: Optional[str], lang: str) -> Optional[LocalIntentModel]:
+        key = (tenant_id or NLU_MODEL_DEFAULT_TENANT, lang or "")
+        now = time.time()
+        cached = self._cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        model = None
+        for tenant in dict.fromkeys([key[0], NLU_MODEL_DEFAULT_TENANT]):
+            model = self._load(tenant, lang)
+            if model is not None:
+                break
+        self._cache[key] = (now + self.ttl_seconds, model)
+        return model
+
+    def _load(self, tenant_id: str, lang: str) -> Optional[LocalIntentModel]:
+        raw = None
+        if self.local_dir:
+            path = os.path.join(self.local_dir, model_key(tenant_id, lang))
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    raw = f.read()
+        if raw is None and self.bucket:
+            try:
+                resp = s3_client().get_object(Bucket=self.bucket, Key=model_key(tenant_id, lang, self.prefix))
+                raw = resp["Body"].read()
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code not in ("NoSuchKey", "404", "AccessDenied"):
+                    logger.warning({"component": "intent_classifier", "event": "model_load_failed", "tenant_id": tenant_id, "lang": lang, "err": str(e)})
+                return None
+            except Exception as e:
+                logger.warning({"component": "intent_classifier", "event": "model_load_failed", "tenant_id": tenant_id, "lang": lang, "err": str(e)})
+                return None
+        if raw is None:
+            return None
+        try:
+            return LocalIntentModel.loads(raw)
+        except (ValueError, TypeError) as e:
+            logger.error({"component": "intent_classifier", "event": "model_invalid", "tenant_id": tenant_id, "lang": lang, "err": str(e)})
+            return None
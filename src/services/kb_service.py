@@ -11,14 +11,21 @@ import json
 import re
 import time  
 import random
-from typing import Dict, Optional, List
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, Optional, List
 
 from botocore.exceptions import ClientError
-from .kb_vector_service import KBVectorService
+from .kb_vector_service import KBVectorService, RetrievedChunk
+from .answer_cache import SemanticAnswerCache
+from .answer_stream import AnswerStreamParser, first_segment_end
+from .faq_question_index import FAQQuestionIndex
+from .prompt_budget import count_message_tokens, count_tokens, dedupe_chunks, fit_prompt
 from .clients_factory import ClientsFactory
-from .tenant_config_service import default_tenant_config_service
+from .tenant_config_service import TenantConfigService, default_tenant_config_service
 from ..common.logging import logger
-from ..repos.tenants_repo import TenantsRepo
+from ..repos.tenants_repo import KBTenantSettings, TenantsRepo
 from ..domain.templates import DEFAULT_FAQ
 from ..common.aws import s3_client
 from ..common.config import settings
@@ -44,6 +51,71 @@ from ..common.constants import (
     FAQ_NO_KEY_ERR,
 )
 
+# wzorce z constants kompilujemy raz – answer_ai jest na ścieżce każdej wiadomości FAQ
+_RE_FAQ_TOKENS = re.compile(FAQ_FIND_REGEX, re.UNICODE)
+_RE_SMALLTALK_SEP = re.compile(SMALLTALK_SEARCH_REGEX)
+_RE_TRAILING_PUNCT = re.compile(SMALLTALK_SUB1_REGEX, re.UNICODE)
+_RE_WS = re.compile(SMALLTALK_SUB2_REGEX)
+_RE_FASTPATH_ANSWER = re.compile(FASTPATCH_SEARCH_REGEX, re.IGNORECASE | re.DOTALL)
+_RE_FASTPATH_SPLIT = re.compile(FASTPATCH_SPLIT_REGEX, re.IGNORECASE)
+_RE_Q_LINES = re.compile(r"^\s*Q:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+
+@lru_cache(maxsize=1024)
+def _smalltalk_only(q: str) -> bool:
+    # answer_ai/retrieve_for_answer pytają o to samo pytanie kilka razy na wiadomość
+    q = (q or "").strip()
+    if not q:
+        return False
+    if "?" in q:
+        return False
+    tokens = _RE_FAQ_TOKENS.findall(q)
+    if len(tokens) > 2:
+        return False
+    # jeśli są przecinki/średniki i jest więcej treści, to raczej nie smalltalk-only
+    if _RE_SMALLTALK_SEP.search(q) and len(tokens) > 1:
+        return False
+    return True
+
+
+@lru_cache(maxsize=1024)
+def _norm_question(s: str) -> str:
+    s = (s or "").strip().lower()
+    # usuń trailing interpunkcję i zredukuj spacje
+    s = _RE_TRAILING_PUNCT.sub("", s)
+    return _RE_WS.sub(" ", s).strip()
+
+
+def _fastpath_answer(txt: str) -> str:
+    """Część "A: ..." chunku FAQ (pusty string, gdy chunk nie ma odpowiedzi)."""
+    m = _RE_FASTPATH_ANSWER.search(txt)
+    if m:
+        return (m.group(1) or "").strip()
+    # Fallback: try split on 'A:' if newlines differ
+    parts = _RE_FASTPATH_SPLIT.split(txt, maxsplit=1)
+    return parts[1].strip() if len(parts) == 2 else ""
+
+
+@dataclass(frozen=True)
+class KBRetrieval:
+    """Wynik retrievalu wektorowego dla pytania (smalltalk + KB).
+
+    Może zostać policzony z wyprzedzeniem (np. równolegle z NLU) i przekazany
+    do answer_ai – jest ważny tylko dla tego samego pytania, tenanta i języka.
+    """
+    question: str
+    tenant_id: str
+    language_code: Optional[str]
+    smalltalk: List[RetrievedChunk] = field(default_factory=list)
+    chunks: List[RetrievedChunk] = field(default_factory=list)
+
+    def matches(self, *, question: str, tenant_id: str, language_code: Optional[str]) -> bool:
+        return (
+            self.question == (question or "").strip()
+            and self.tenant_id == tenant_id
+            and self.language_code == language_code
+        )
+
 
 class KBService:
     """
@@ -57,15 +129,31 @@ class KBService:
         self,
         bucket: Optional[str] = None,
         openai_client: Optional[OpenAIClient] = None,
-        clients_factory: ClientsFactory | None = None
+        clients_factory: ClientsFactory | None = None,
+        answer_cache: SemanticAnswerCache | None = None,
+        tenant_config: TenantConfigService | None = None,
+        tenants: TenantsRepo | None = None,
     ) -> None:
         #tenants repo
-        self.tenants = TenantsRepo()
+        self.tenants = tenants or TenantsRepo()
+        # rekord tenanta z cache procesu (DDB + SSM, TTL) – źródło progów KB
+        self._tenant_cfg = tenant_config or default_tenant_config_service()
         # bucket z ENV / Settings
         self.bucket = bucket or settings.kb_bucket
 
         # cache FAQ z S3: { "tenant#lang": {topic: answer, ...} }
         self._cache: Dict[str, Dict[str, str] | None] = {}
+        # po KB_FAQ_CACHE_TTL sekundach FAQ jest rewalidowane w S3 (If-None-Match z ETag),
+        # żeby zmiana FAQ dotarła do ciepłych kontenerów
+        self._faq_ttl_s = float(os.getenv("KB_FAQ_CACHE_TTL", "300"))
+        self._cache_expires: Dict[str, float] = {}
+        self._cache_etags: Dict[str, str] = {}
+        # indeks dokładnych pytań FAQ per "tenant#lang": (wygasa, indeks) – przebudowa po TTL FAQ
+        self._question_index: Dict[str, tuple[float, FAQQuestionIndex]] = {}
+        # KBService jest współdzielony przez wątki routera (kontener procesu):
+        # odczyt i aktualizacja powiązanych wpisów powyższych cache'y pod lockiem,
+        # pobranie z S3 i budowa indeksu poza nim
+        self._faq_lock = threading.Lock()
         
         # klient OpenAI – opcjonalny, żeby w dev/offline dalej działało
         self._client = openai_client or OpenAIClient()
@@ -75,6 +163,8 @@ class KBService:
             openai_client=self._client,
             clients_factory=self._clients_factory,
         )
+        # semantyczny cache odpowiedzi AI-FAQ (wyłączony bez tabeli DDB)
+        self._answer_cache = answer_cache or SemanticAnswerCache()
     # -------------------------------------------------------------------------
     # Helpery 
     # -------------------------------------------------------------------------
@@ -85,6 +175,21 @@ class KBService:
     def _tenant_default_lang(self, tenant_id: str) -> str:
         return self.tenants.get_language(tenant_id)
 
+    def kb_settings(self, tenant_id: str) -> KBTenantSettings:
+        """Progi KB tenanta z rekordu w cache TenantConfigService (bez odczytu DDB na próg)."""
+        try:
+            item = self._tenant_cfg.get(tenant_id)
+        except Exception as e:
+            # brak tenanta / błąd DDB – progi z ENV i constants, jak przy braku kb_parameters
+            logger.warning({
+                "component": "kb_service",
+                "event": "kb_settings_fallback",
+                "tenant_id": tenant_id,
+                "err": str(e),
+            })
+            item = None
+        return KBTenantSettings.from_item(item)
+
     def _faq_key(self, tenant_id: str, language_code: str | None) -> str:
         # np. "tenantA/faq_pl.json" albo "tenantA/faq_en.json"
         lang = language_code or "en"
@@ -120,27 +225,52 @@ class KBService:
             return None
 
         cache_key = self._cache_key(tenant_id, language_code)
-        if cache_key in self._cache:
-            return self._cache[cache_key]
+        now = time.monotonic()
+        with self._faq_lock:
+            cached = self._cache.get(cache_key)
+            has_cached = cache_key in self._cache
+            # wpisy bez znacznika wygaśnięcia (podstawione z zewnątrz) traktujemy jako świeże
+            if has_cached and self._cache_expires.get(cache_key, float("inf")) > now:
+                return cached
+            etag = self._cache_etags.get(cache_key) if has_cached else None
 
         key = self._faq_key(tenant_id, language_code)
+        params = {"Bucket": self.bucket, "Key": key}
+        if etag:
+            params["IfNoneMatch"] = etag
 
         try:
-            resp = s3_client().get_object(Bucket=self.bucket, Key=key)
+            resp = s3_client().get_object(**params)
             body = resp["Body"].read().decode("utf-8")
             data = json.loads(body) or {}
             if not isinstance(data, dict):
                 data = {}
             # normalizujemy klucze
-            if isinstance(data.get("entries"), list):
-                # new format: keep as-is
-                self._cache[cache_key] = data
-                return data
-            normalized = {(k or "").strip().lower(): v for k, v in data.items()}
-            self._cache[cache_key] = normalized
-            return normalized
+            if not isinstance(data.get("entries"), list):
+                data = {(k or "").strip().lower(): v for k, v in data.items()}
+            # new format ("entries") – keep as-is
+            self._store_faq(cache_key, data, now, resp.get("ETag"))
+            return data
+        except ValueError as e:
+            # uszkodzony plik FAQ (JSON / UTF-8) – brak FAQ zamiast wyjątku w answer_ai
+            logger.error(
+                {
+                    "component": "kb_service",
+                    "tenant_id": tenant_id,
+                    "key": key,
+                    "err": "faq_invalid",
+                    "error details": str(e),
+                }
+            )
+            self._store_faq(cache_key, None, now)
+            return None
         except ClientError as e:
-            if e.response["Error"]["Code"] != FAQ_NO_KEY_ERR:
+            code = e.response["Error"]["Code"]
+            if code in ("304", "NotModified"):
+                # FAQ bez zmian – przedłużamy ważność wpisu
+                self._store_faq(cache_key, cached, now, etag)
+                return cached
+            if code != FAQ_NO_KEY_ERR:
                 logger.warning(
                     {
                         "component": "kb_service",
@@ -150,9 +280,81 @@ class KBService:
                         "error details": str(e),
                     }
                 )
-            self._cache[cache_key] = None
+            self._store_faq(cache_key, None, now)
             return None
 
+    def _store_faq(self, cache_key: str, data: Optional[Dict[str, str]], now: float, etag: Optional[str] = None) -> None:
+        with self._faq_lock:
+            self._cache[cache_key] = data
+            self._cache_expires[cache_key] = now + self._faq_ttl_s
+            if etag:
+                self._cache_etags[cache_key] = etag
+            else:
+                self._cache_etags.pop(cache_key, None)
+
+    def _invalidate_faq(self, tenant_id: str, language_code: str | None) -> None:
+        cache_key = self._cache_key(tenant_id, language_code)
+        with self._faq_lock:
+            for cache in (self._cache, self._cache_expires, self._cache_etags, self._question_index):
+                cache.pop(cache_key, None)
+
+    def _faq_question_index(self, tenant_id: str, language_code: str | None) -> FAQQuestionIndex:
+        cache_key = self._cache_key(tenant_id, language_code)
+        now = time.monotonic()
+        cached = self._question_index.get(cache_key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        try:
+            faq = self._load_tenant_faq(tenant_id, language_code) if self.bucket else None
+            index = FAQQuestionIndex.build(faq)
+        except Exception as e:
+            # indeks to tylko skrót – przy błędzie pusty indeks, odpowiedź z retrievalu
+            logger.error({
+                "component": "kb_service",
+                "event": "faq_index_failed",
+                "tenant_id": tenant_id,
+                "lang": language_code,
+                "err": str(e),
+            })
+            index = FAQQuestionIndex.build(None)
+        with self._faq_lock:
+            self._question_index[cache_key] = (now + self._faq_ttl_s, index)
+        return index
+
+    def faq_languages(self, tenant_id: str) -> list[str]:
+        """Języki, dla których tenant ma plik FAQ w S3 (<tenant>/faq_<lang>.json)."""
+        if not self.bucket:
+            return []
+        prefix = f"{tenant_id}/faq_"
+        langs: list[str] = []
+        try:
+            paginator = s3_client().get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                for obj in page.get("Contents") or []:
+                    name = obj.get("Key", "")[len(prefix):]
+                    if name.endswith(".json") and "/" not in name:
+                        langs.append(name[: -len(".json")])
+        except ClientError as e:
+            logger.warning({"component": "kb_service", "event": "faq_languages_failed", "tenant_id": tenant_id, "err": str(e)})
+            return []
+        return sorted(langs)
+
+    def prime(self, tenant_id: str, language_code: str | None) -> int:
+        """Wczytuje FAQ tenanta i buduje indeks pytań (warmup); zwraca liczbę pytań w indeksie."""
+        return len(self._faq_question_index(tenant_id, language_code))
+
+    def exact_answer(self, question: str, tenant_id: str, language_code: str | None) -> Optional[str]:
+        """Odpowiedź dla pytania identycznego (po normalizacji) z pytaniem z FAQ, bez embeddingu."""
+        answer = self._faq_question_index(tenant_id, language_code).lookup(question)
+        if answer:
+            logger.info({
+                "component": "kb_service",
+                "event": "faq_exact_hit",
+                "tenant_id": tenant_id,
+                "lang": language_code,
+            })
+        return answer
+
     # -------------------------------------------------------------------------
     # Prosty retrieval po FAQ
     # -------------------------------------------------------------------------
@@ -172,7 +374,7 @@ class KBService:
             Jeśli nic sensownego nie pasuje, zwraca pusty dict (caller powinien obsłużyć brak dopasowania).
         """
         q = (question or "").lower()
-        q_tokens = set(re.findall(r"\w+", q))
+        q_tokens = set(_RE_FAQ_TOKENS.findall(q))
 
         scored: list[tuple[int, str, str]] = []
 
@@ -181,7 +383,7 @@ class KBService:
                 continue
 
             text = f"{key} {answer}".lower()
-            t_tokens = set(re.findall(FAQ_FIND_REGEX, text))
+            t_tokens = set(_RE_FAQ_TOKENS.findall(text))
             overlap = len(q_tokens & t_tokens)
 
             # mały fallback: pełne pytanie w tekście
@@ -204,29 +406,58 @@ class KBService:
         return selected
         
     def _is_smalltalk_only(self, q: str) -> bool:
-        q = (q or "").strip()
-        if not q:
-            return False
-        if "?" in q:
-            return False
-        tokens = re.findall(FAQ_FIND_REGEX, q, flags=re.UNICODE)
-        if len(tokens) > 2:
-            return False
-        # jeśli są przecinki/średniki i jest więcej treści, to raczej nie smalltalk-only
-        if re.search(SMALLTALK_SEARCH_REGEX, q) and len(tokens) > 1:
-            return False
-        return True
+        return _smalltalk_only(q or "")
 
     def _norm(self, s: str) -> str:
-        s = (s or "").strip().lower()
-        # usuń trailing interpunkcję i zredukuj spacje
-        s = re.sub(SMALLTALK_SUB1_REGEX, "", s, flags=re.UNICODE)
-        s = re.sub(SMALLTALK_SUB2_REGEX, " ", s).strip()
-        return s
+        return _norm_question(s or "")
     # -------------------------------------------------------------------------
     # Publiczne API
     # -------------------------------------------------------------------------
 
+    def retrieve_for_answer(
+        self,
+        *,
+        question: str,
+        tenant_id: str,
+        language_code: Optional[str] = None,
+    ) -> Optional[KBRetrieval]:
+        """
+        Retrieval wektorowy (embedding pytania + Pinecone) dokładnie taki,
+        jakiego użyłby answer_ai. None, gdy pytanie jest puste, jest znanym
+        pytaniem z FAQ (indeks pytań) albo tenant nie ma włączonego vector DB.
+        """
+        question = (question or "").strip()
+        if not question or not self._vector.enabled(tenant_id):
+            return None
+        if self._faq_question_index(tenant_id, language_code).lookup(question):
+            # answer_ai odpowie z indeksu pytań – embedding niepotrzebny
+            return None
+
+        st = self._vector.retrieve(
+            tenant_id=tenant_id,
+            language_code=language_code,
+            question=question,
+            category=PC_NAME_SMALLTALK,
+            top_k=SMALLTALK_RETRIEVED_CHUNKS,
+        ) or []
+        if st and self._is_smalltalk_only(question):
+            chunks = []
+        else:
+            chunks = self._vector.retrieve(
+                tenant_id=tenant_id,
+                language_code=language_code,
+                question=question,
+                category=PC_NAME_KB,
+                top_k=KB_RETRIEVED_CHUNKS,
+            ) or []
+        return KBRetrieval(
+            question=question,
+            tenant_id=tenant_id,
+            language_code=language_code,
+            smalltalk=list(st),
+            chunks=list(chunks),
+        )
+
     def answer(
         self, topic: str, tenant_id: str, language_code: str | None = None
     ) -> Optional[str]:
@@ -259,18 +490,34 @@ class KBService:
         tenant_id: str,
         language_code: Optional[str] = None,
         history: list[dict] | None = None,
+        prefetched: Optional[KBRetrieval] = None,
+        on_partial: Optional[Callable[[str], None]] = None,
+        kb_settings: Optional[KBTenantSettings] = None,
     ) -> Optional[str]:
         """
         Generuje odpowiedź na pytanie użytkownika na podstawie FAQ tenanta
         z użyciem LLM (OpenAIClient).
 
         - wybiera kilka najbardziej pasujących wpisów FAQ (retrieval),
+          albo używa `prefetched` z retrieve_for_answer, jeśli dotyczy tego pytania,
         - opcjonalnie dokleja historię rozmowy (user/assistant),
         - oczekuje JSON-a {FAQ_ANSWER_KEY: "..."} i zwraca sam tekst odpowiedzi.
+
+        Z `on_partial` (i KB_STREAM_ANSWERS) odpowiedź LLM jest streamowana, a pierwszy
+        kompletny akapit/zdanie trafia do callbacku, zanim model skończy generować.
+        Zwracana jest zawsze pełna odpowiedź – wywołujący sam odcina wysłany początek.
+
+        `kb_settings` – progi tenanta, jeśli wołający już je ma; inaczej są
+        rozwiązywane raz z cache TenantConfigService (kb_settings()).
         """
         question = (question or "").strip()
         if not question:
             return None
+
+        # 1) znane pytanie z FAQ (entries[].questions) – bez embeddingu i Pinecone
+        exact = self.exact_answer(question, tenant_id, language_code)
+        if exact:
+            return exact
            
         top1 = 0.0
         top2 = 0.0
@@ -279,26 +526,31 @@ class KBService:
         chunks_for_prompt = []
         retrieved_chunks = []
             
+        # progi tenanta rozwiązane raz na pytanie (używane też poza gałęzią wektorową)
+        kb = kb_settings or self.kb_settings(tenant_id)
+
         # 2) retrieval: prefer Pinecone (vector DB) when configured.
         vector_enabled = self._vector.enabled(tenant_id)
         if vector_enabled:
+            if prefetched is not None and prefetched.matches(
+                question=question, tenant_id=tenant_id, language_code=language_code
+            ):
+                retrieval = prefetched
+            else:
+                retrieval = self.retrieve_for_answer(
+                    question=question, tenant_id=tenant_id, language_code=language_code
+                )
+            st = retrieval.smalltalk if retrieval else []
+
             # 0) smalltalk fast-path (NO LLM)
             #1--------------
-            st = self._vector.retrieve(
-                tenant_id=tenant_id,
-                language_code=language_code,
-                question=question,
-                category=PC_NAME_SMALLTALK,
-                top_k=SMALLTALK_RETRIEVED_CHUNKS,
-            )
-
             if st:
                 if self._is_smalltalk_only(question):
                     qn = self._norm(question)
                     txt0 = (st[0].text or "").strip()
 
                     # 1) deterministic: czy w chunku jest dokładnie takie Q: ?
-                    qs = re.findall(r"^\s*Q:\s*(.+)$", txt0, flags=re.IGNORECASE | re.MULTILINE)
+                    qs = _RE_Q_LINES.findall(txt0)
                     if any(self._norm(qline) == qn for qline in qs):
                         ans = self._vector._extract_answer_from_text(txt0)  # albo lokalnie ten sam regex na A:
                         if ans:
@@ -306,26 +558,16 @@ class KBService:
 
                     # 2) dopiero potem próg score (fallback)
                     st_top1 = float(getattr(st[0], "score", 0.0) or 0.0)
-                    st_min = self.tenants.get_kb_smalltalk_min_score(tenant_id)
-                    if st_top1 >= st_min:
+                    if st_top1 >= kb.smalltalk_min_score:
                         ans = self._vector._extract_answer_from_text(txt0)
                         if ans:
                             return ans
             #1--------------
                 chunks_for_prompt += st[:1]
-            if chunks_for_prompt and self._is_smalltalk_only(question):
-                retrieved_chunks = []
-            else:
-                retrieved_chunks = self._vector.retrieve(
-                    tenant_id=tenant_id,
-                    language_code=language_code,
-                    question=question,
-                    category=PC_NAME_KB,
-                    top_k=KB_RETRIEVED_CHUNKS,
-                )
+            retrieved_chunks = list(retrieval.chunks) if retrieval else []
 
             # Vector confidence gating:
-            strict_threshold = self.tenants.get_kb_vector_min_score_low(tenant_id)
+            strict_threshold = kb.vector_min_score_low
        
             if retrieved_chunks:
                 try:
@@ -373,7 +615,7 @@ class KBService:
                     "text[:200]": (getattr(ch, "text", "") or "")[:200],
                 })
 
-            min_score  = self.tenants.get_kb_vector_fastpath_min_score(tenant_id)
+            min_score = kb.vector_fastpath_min_score
 
             for idx, best in enumerate((retrieved_chunks or [])[:KB_FETCHED_CHUNKS]):  
 
@@ -388,13 +630,7 @@ class KBService:
 
                     continue
                     
-                m = re.search(FASTPATCH_SEARCH_REGEX, txt, flags=re.IGNORECASE | re.DOTALL)
-                if m:
-                    ans = (m.group(1) or "").strip()
-                else:
-                    # Fallback: try split on 'A:' if newlines differ
-                    parts = re.split(FASTPATCH_SPLIT_REGEX, txt, maxsplit=1, flags=re.IGNORECASE)
-                    ans = parts[1].strip() if len(parts) == 2 else ""
+                ans = _fastpath_answer(txt)
                 if not ans:                
 
                     continue
@@ -424,10 +660,23 @@ class KBService:
             chunks_for_prompt += retrieved_chunks
         if chunks_for_prompt and self._is_smalltalk_only(question):
             strict_mode = True
-        if chunks_for_prompt:
-            system_prompt = self._vector.build_kb_prompt(chunks=chunks_for_prompt, language_code=language_code, strict_mode=strict_mode)
-        else:
+        chunks_for_prompt = dedupe_chunks(chunks_for_prompt)
+        if not chunks_for_prompt:
             return None
+
+        # 4a) semantyczny cache odpowiedzi – tylko pytania bez kontekstu rozmowy
+        #     (embedding pytania jest już w cache OpenAIClient po retrievalu)
+        cache_vec: list[float] = []
+        if not history and self._answer_cache.enabled:
+            cache_vec = self._vector.embed_question(question)
+            cached = self._answer_cache.lookup(
+                tenant_id,
+                language_code,
+                cache_vec,
+                min_score=kb.answer_cache_min_score,
+            )
+            if cached:
+                return cached
             
         with timed(
             "prompt_build",
@@ -438,17 +687,25 @@ class KBService:
                 "lang": language_code,
             },
         ):
-            messages: list[dict] = [
-                {"role": "system", "content": system_prompt},
-            ]
-            if history:
-                history = [m for m in history if m.get("role") == "user"]
-                messages.extend(history)
-
             # 5) aktualne pytanie
             question_content = f"{question}\n\n"
             question_content += FAQ_MSG_JSON
-            
+
+            # budżet tokenów: szablon + pytanie zawsze, potem najnowsza historia i chunki wg trafności
+            base_prompt = self._vector.build_kb_prompt(chunks=[], language_code=language_code, strict_mode=strict_mode)
+            budget = fit_prompt(
+                base_tokens=count_message_tokens([{"content": base_prompt}, {"content": question_content}]),
+                chunks=chunks_for_prompt,
+                history=[m for m in (history or []) if m.get("role") == "user"],
+                max_tokens=kb.prompt_max_tokens,
+                history_max_tokens=settings.kb_prompt_history_max_tokens,
+            )
+            system_prompt = self._vector.build_kb_prompt(chunks=budget.chunks, language_code=language_code, strict_mode=strict_mode)
+
+            messages: list[dict] = [
+                {"role": "system", "content": system_prompt},
+            ]
+            messages.extend(budget.history)
             messages.append(
                 {
                     "role": FAQ_ROLE_USER,
@@ -457,24 +714,34 @@ class KBService:
             )
 
         # Emit prompt_size as a separate log field (measured after building messages).
-        try:
-            prompt_chars = sum(len(str(m.get("content") or "")) for m in messages)
-            logger.warning(
-                {
-                    "component": "kb_service",
-                    "event": "prompt_size",
-                    "tenant_id": tenant_id,
-                    "lang": language_code,
-                    "prompt_size_chars": prompt_chars,
-                    "prompt_messages": len(messages),
-                }
-            )
-        except Exception:
-            pass
+        tokens_in = count_message_tokens(messages)
+        logger.warning(
+            {
+                "component": "kb_service",
+                "event": "prompt_size",
+                "tenant_id": tenant_id,
+                "lang": language_code,
+                "prompt_size_chars": sum(len(str(m.get("content") or "")) for m in messages),
+                "prompt_tokens": tokens_in,
+                "prompt_max_tokens": budget.max_tokens,
+                "prompt_messages": len(messages),
+                "chunks_used": len(budget.chunks),
+                "chunks_dropped": budget.chunks_dropped,
+                "history_dropped": budget.history_dropped,
+            }
+        )
 
-        # 6) Wołamy LLM
+        # 6) Wołamy LLM (otwarty breaker -> od razu szablon "brak informacji" w routingu)
+        if getattr(self._client, "circuit_open", False):
+            logger.warning({"component": "kb_service", "event": "kb_llm_circuit_open", "tenant_id": tenant_id})
+            return None
+        streamed: Optional[AnswerStreamParser] = None
         try:
-            raw = self._client.chat(messages=messages, max_tokens=512)
+            if on_partial is not None and getattr(settings, "kb_stream_answers", False):
+                streamed = AnswerStreamParser(FAQ_ANSWER_KEY)
+                raw = self._chat_streaming(messages, streamed, on_partial, tenant_id, language_code)
+            else:
+                raw = self._client.chat(messages=messages, max_tokens=512)
         except Exception as e:
             logger.error(
                 {
@@ -489,6 +756,16 @@ class KBService:
             return None
 
         raw = raw.strip()
+        logger.info(
+            {
+                "component": "kb_service",
+                "event": "kb_llm_tokens",
+                "tenant_id": tenant_id,
+                "lang": language_code,
+                "tokens_in": tokens_in,
+                "tokens_out": count_tokens(raw),
+            }
+        )
         if raw == ANSWER_NO_INFO:
             logger.info(
                 {
@@ -502,6 +779,56 @@ class KBService:
             return None
 
         # 7) próbujemy wyciągnąć FAQ_ANSWER_KEY z JSON-a
+        ans = self._parse_ai_answer(raw)
+        if ans is None and streamed is not None and streamed.text.strip():
+            # strumień urwany (np. max_tokens) – nie gubimy tego, co już zdekodowane
+            ans = streamed.text.strip()
+        if ans and cache_vec:
+            self._answer_cache.store(tenant_id, language_code, cache_vec, ans)
+        return ans
+
+    def _chat_streaming(
+        self,
+        messages: list[dict],
+        parser: AnswerStreamParser,
+        on_partial: Callable[[str], None],
+        tenant_id: str,
+        language_code: Optional[str],
+    ) -> str:
+        """Streamuje odpowiedź LLM; pierwszy gotowy fragment pola answer idzie do on_partial."""
+        min_chars = int(getattr(settings, "kb_stream_first_min_chars", 120) or 120)
+        t0 = time.perf_counter()
+        parts: list[str] = []
+        pending = True
+        for delta in self._client.chat_stream(messages=messages, max_tokens=512):
+            parts.append(delta)
+            parser.feed(delta)
+            if not pending:
+                continue
+            cut = first_segment_end(parser.text, min_chars)
+            if cut is None:
+                continue
+            pending = False
+            segment = parser.text[:cut].strip()
+            if not segment or segment == ANSWER_NO_INFO:
+                continue
+            try:
+                on_partial(segment)
+            except Exception as e:
+                logger.error({"component": "kb_service", "event": "stream_partial_failed", "tenant_id": tenant_id, "err": str(e)})
+                continue
+            logger.info({
+                "component": "kb_service",
+                "event": "stream_first_segment",
+                "tenant_id": tenant_id,
+                "lang": language_code,
+                "chars": len(segment),
+                "first_segment_ms": int((time.perf_counter() - t0) * 1000),
+            })
+        return "".join(parts)
+
+    def _parse_ai_answer(self, raw: str) -> Optional[str]:
+        """Wyciąga tekst odpowiedzi z JSON-a {FAQ_ANSWER_KEY: "..."} zwróconego przez LLM."""
         #4--------------
         try:
             logger.info(
@@ -521,6 +848,9 @@ class KBService:
                             return None
                         return ans
                     return None
+                if "intent" in data and "slots" in data:
+                    # fallback OpenAIClient (retry/deadline/breaker) – to nie jest odpowiedź
+                    return None
                 parts = []
                 for v in data.values():
                     if isinstance(v, str):
@@ -554,19 +884,29 @@ class KBService:
         *,
         tenant_id: str,
         language_code: Optional[str] = None,
+        force: bool = False,
     ) -> bool:
         """Load tenant FAQ and push it to Pinecone (chunking + embeddings + upsert).
 
         Safe to call multiple times. If vector mode is disabled, returns False.
+        Only changed chunks are re-embedded (manifest); force=True reindexes everything.
         """
         if not self._vector.enabled(tenant_id):
             return False
         tenant_faq = self._load_tenant_faq(tenant_id=tenant_id, language_code=language_code)
         if not tenant_faq:
-            tenant_language = self._tenant_default_lang(tenant_id)
-            tenant_faq = self._load_tenant_faq(tenant_id, tenant_language)
-            return self._vector.index_faq(tenant_id=tenant_id, language_code=tenant_language, faq=tenant_faq)
-        return self._vector.index_faq(tenant_id=tenant_id, language_code=language_code, faq=tenant_faq)
+            language_code = self._tenant_default_lang(tenant_id)
+            tenant_faq = self._load_tenant_faq(tenant_id, language_code)
+        ok = self._vector.index_faq(tenant_id=tenant_id, language_code=language_code, faq=tenant_faq, force=force)
+        stats = getattr(self._vector, "last_index_stats", None)
+        if ok and not (stats and stats.unchanged):
+            self._invalidate_faq(tenant_id, language_code)
+            # nowa treść FAQ -> odpowiedzi z cache dla tej wersji są nieaktualne
+            try:
+                self._answer_cache.invalidate(tenant_id, language_code)
+            except Exception as e:
+                logger.error({"component": "kb_service", "event": "answer_cache_invalidate_failed", "tenant_id": tenant_id, "lang": language_code, "err": str(e)})
+        return ok
       
     def normalize_ai_answer(self, text: str) -> str | None:
         if text.lstrip().startswith("{"):
@@ -1,17 +1,22 @@
 """Vector-based KB retrieval and indexing (FAQ -> embeddings -> Pinecone)."""
 
 from __future__ import annotations
+import hashlib
 import re
-import os, time
+import os, time, random
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 from ..common.config import settings
 from ..common.logging_utils import logger
-from ..common.text_chunking import chunk_faq
+from ..common.text_chunking import FAQChunk, iter_faq_chunks
 from ..adapters.openai_client import OpenAIClient
 from ..adapters.pinecone_client import PineconeClient
+from ..repos.embedding_store_repo import EmbeddingStoreRepo
+from ..repos.kb_manifest_repo import KBManifestRepo
 from .clients_factory import ClientsFactory
+from .prompt_budget import count_tokens
 
 from ..common.timing import timed
 from ..common.constants import (
@@ -20,6 +25,16 @@ from ..common.constants import (
     PC_NAME_KB,
 )
 
+_RE_WS = re.compile(r"\s+")
+_RE_WORDS = re.compile(r"\w+", re.UNICODE)
+_RE_TRAILING_PUNCT = re.compile(r"[^\w]+$", re.UNICODE)
+_RE_CHUNK_ANSWER = re.compile(r"\bA:\s*(.+)$", re.IGNORECASE | re.DOTALL)
+# split po mocnych separatorach; przecinek zostawiamy jako "miękki"
+_RE_QUESTION_SPLIT = re.compile(
+    r"(?:[\n\r]+)|(?:\s*[;|/]\s*)|(?:\s*(?:\?+|!+|\.{2,})\s*)",
+    re.UNICODE,
+)
+
 
 @dataclass(frozen=True)
 class RetrievedChunk:
@@ -29,6 +44,15 @@ class RetrievedChunk:
     chunk_id: str
 
 
+@dataclass(frozen=True)
+class IndexStats:
+    """Podsumowanie ostatniego index_faq (incremental względem manifestu)."""
+    chunks: int
+    upserted: int
+    deleted: int
+    unchanged: bool = False
+
+
 class KBVectorService:
     """Handles indexing FAQ documents into Pinecone and retrieving relevant chunks."""
 
@@ -38,10 +62,17 @@ class KBVectorService:
         openai_client: Optional[OpenAIClient] = None,
         clients_factory: ClientsFactory | None = None,
         pinecone_client: Optional[PineconeClient] = None,
+        manifest_repo: Optional[KBManifestRepo] = None,
+        embedding_store: Optional[EmbeddingStoreRepo] = None,
     ) -> None:
         self._openai = openai_client or OpenAIClient()
         self._factory = clients_factory
         self._pinecone = pinecone_client or (None if self._factory else PineconeClient())
+        # manifest chunków per namespace -> reindeksacja tylko zmienionych chunków
+        self._manifests = manifest_repo or KBManifestRepo()
+        # embeddingi chunków współdzielone między tenantami (te same szablony FAQ)
+        self._embedding_store = embedding_store or EmbeddingStoreRepo()
+        self.last_index_stats: Optional[IndexStats] = None
 
         # enabled() cache (per warm runtime)
         # tenant_id -> (expires_at_epoch, enabled_bool)
@@ -107,7 +138,7 @@ class KBVectorService:
         """
         if not text:
             return None
-        m = re.search(r"\bA:\s*(.+)$", text, flags=re.IGNORECASE | re.DOTALL)
+        m = _RE_CHUNK_ANSWER.search(text)
         if not m:
             return None
         ans = (m.group(1) or "").strip()
@@ -130,7 +161,29 @@ class KBVectorService:
               "text": text,
             })
             return []
-            
+
+    def embed_question(self, question: str) -> list[float]:
+        """
+        Embedding pytania z tą samą konfiguracją co retrieve() – drugie wywołanie
+        dla tego samego pytania trafia w cache embeddingów OpenAIClient.
+        Pusta lista, gdy embedding się nie powiódł.
+        """
+        emb_model = getattr(settings, "embedding_model", "text-embedding-3-small")
+        emb_dims = getattr(settings, "embedding_dimensions", None)
+        q = (question or "").strip()
+        if not q:
+            return []
+        try:
+            vecs = self._openai.embed([q], model=emb_model, dimensions=emb_dims)
+            return (vecs[0] if vecs else None) or []
+        except Exception as e:
+            logger.warning({
+              "component": "kb_vector_service",
+              "event": "embed_question_failed",
+              "err": str(e),
+            })
+            return []
+
     def _split_question(self, question: str) -> list[str]:
         q = (question or "").strip()
         if not q:
@@ -139,25 +192,18 @@ class KBVectorService:
         # zawsze zachowaj pełne pytanie
         parts: List[str] = [q]
 
-        norm = re.sub(r"\s+", " ", q).strip()
-
-        # split po mocnych separatorach; przecinek zostawiamy jako "miękki"
-        split_re = re.compile(
-            r"(?:[\n\r]+)|(?:\s*[;|/]\s*)|(?:\s*(?:\?+|!+|\.{2,})\s*)",
-            re.UNICODE,
-        )
-        raw = [p.strip() for p in split_re.split(norm) if (p or "").strip()]
+        norm = _RE_WS.sub(" ", q).strip()
 
-        def token_count(s: str) -> int:
-            return len(re.findall(r"\w+", s, flags=re.UNICODE))
+        raw = [p.strip() for p in _RE_QUESTION_SPLIT.split(norm) if (p or "").strip()]
 
         def too_thin(s: str) -> bool:
             # "cienkie" = słabe jako osobne zapytanie wektorowe; nie usuwamy, tylko scalamy
-            tc = token_count(s)
+            words = _RE_WORDS.findall(s)
+            tc = len(words)
             if tc == 0:
                 return True
             if tc == 1:
-                w = re.findall(r"\w+", s, flags=re.UNICODE)[0]
+                w = words[0]
                 has_digit = any(ch.isdigit() for ch in w)
                 is_acronymish = (len(w) <= 6 and w.upper() == w and any(ch.isalpha() for ch in w))
                 longish = len(w) >= 6
@@ -178,7 +224,7 @@ class KBVectorService:
         out, seen = [], set()
         for seg in [q] + merged:
             k = seg.lower()
-            k = re.sub(r"[^\w]+$", "", k, flags=re.UNICODE).strip()
+            k = _RE_TRAILING_PUNCT.sub("", k).strip()
             if not k or k in seen:
                 continue
             seen.add(k)
@@ -195,10 +241,14 @@ class KBVectorService:
         language_code: Optional[str],
         faq: Dict[str, str],
         max_chars: int = 1200,
+        force: bool = False,
     ) -> bool:
         """Chunk + embed + upsert FAQ into Pinecone.
 
         This is idempotent: chunk IDs are deterministic so re-running updates vectors.
+        With a manifest of the previous run (KBManifestRepo) only new chunk IDs are
+        embedded, vanished ones are deleted and an unchanged FAQ is skipped entirely.
+        force=True ignores the manifest (full reindex, e.g. after an index rebuild).
         """
         if not self.enabled(tenant_id):
             logger.warning({
@@ -209,17 +259,22 @@ class KBVectorService:
             })
             return False
 
+        # 1. przebieg: tylko id + kategoria chunków (manifest, fingerprint) – teksty
+        # nie są trzymane w pamięci; chunkowanie jest deterministyczne, więc drugi
+        # przebieg (embed) zwraca te same chunki strumieniem
+        index: Dict[str, str] = {}
         with timed(
             "chunk_faq",
             logger=logger, 
             component="kb_vector_service",
             extra={"tenant_id": tenant_id, "max_chars": max_chars},
         ):
-            chunks = chunk_faq(faq, max_chars=max_chars)
+            for ch in iter_faq_chunks(faq, max_chars=max_chars):
+                index.setdefault(ch.chunk_id, getattr(ch, "category", PC_NAME_KB))
         
-        logger.warning({"event":"chunk_faq_done","chunks":len(chunks),"sample":chunks[0].text[:80] if chunks else None})
+        logger.warning({"event":"chunk_faq_done","chunks":len(index)})
 
-        if not chunks:
+        if not index:
             logger.warning({
               "component": "kb_vector_service",
               "event": "index FAQ no chunks",
@@ -228,37 +283,183 @@ class KBVectorService:
             })
             return False
 
-        texts = [c.text for c in chunks]
-        emb_model = getattr(settings, "embedding_model", "text-embedding-3-small")
+        ns = self._namespace(tenant_id, language_code)
+        pc = self._client_for(tenant_id)
+        emb_model = getattr(settings, "embedding_model", "") or ""
         emb_dims = getattr(settings, "embedding_dimensions", None)
 
-        with timed(
-            "embed_faq_chunks",
-            logger=logger, 
-            component="kb_vector_service",
-            extra={"tenant_id": tenant_id, "chunks": len(texts), "model": emb_model},
-        ):
-            vectors = self._openai.embed(texts, model=emb_model, dimensions=emb_dims)
-            logger.info({"event":"embed_dim", "dim": len(vectors[0]) if vectors else 0, "dims_param": emb_dims})
-
-        if not vectors or len(vectors) != len(chunks):
-            logger.error({
-                "event": "index_faq error",
-                "len(vectors)": len(vectors),
-                "len(chunks)": len(chunks),
+        fingerprint = self._fingerprint(index, emb_model, emb_dims)
+
+        manifest = None if force else self._manifests.get(ns)
+        if manifest and manifest.get("fingerprint") == fingerprint:
+            self.last_index_stats = IndexStats(chunks=len(index), upserted=0, deleted=0, unchanged=True)
+            logger.info({
+                "component": "kb_vector_service",
+                "event": "index_faq_unchanged",
+                "tenant_id": tenant_id,
+                "namespace": ns,
+                "chunks": len(index),
             })
-            return False
+            return True
+
+        previous: Dict[str, str] = (manifest or {}).get("chunks") or {}
+        same_model = bool(manifest) and manifest.get("embed_model") == emb_model and manifest.get("dims") == emb_dims
+        to_index = {cid for cid, category in index.items() if not same_model or previous.get(cid) != category}
+        stale = [cid for cid in previous if cid not in index]
+
+        def _pending() -> Iterator[FAQChunk]:
+            # 2. przebieg: tylko chunki do (re)indeksacji, każdy id raz
+            left = set(to_index)
+            for ch in iter_faq_chunks(faq, max_chars=max_chars):
+                if ch.chunk_id in left:
+                    left.discard(ch.chunk_id)
+                    yield ch
+
+        failed = self._upsert_chunks(pc, ns, tenant_id, language_code, _pending()) if to_index else 0
+        deleted_ok = pc.delete(ids=stale, namespace=ns) if stale else True
+        ok = failed == 0 and deleted_ok
+
+        self.last_index_stats = IndexStats(chunks=len(index), upserted=len(to_index), deleted=len(stale))
+        logger.info({
+            "component": "kb_vector_service",
+            "event": "index_faq_diff",
+            "tenant_id": tenant_id,
+            "namespace": ns,
+            "chunks": len(index),
+            "upserted": len(to_index),
+            "deleted": len(stale),
+            "incremental": same_model,
+            "ok": ok,
+        })
+        if ok:
+            try:
+                self._manifests.put(ns, embed_model=emb_model, dims=emb_dims, fingerprint=fingerprint, chunks=index)
+            except Exception as e:
+                # brak manifestu = następnym razem pełna reindeksacja, nie błąd
+                logger.error({"component": "kb_vector_service", "event": "manifest_put_failed", "namespace": ns, "err": str(e)})
+        return ok
+
+    @staticmethod
+    def _fingerprint(index: Dict[str, str], emb_model: str, emb_dims: Optional[int]) -> str:
+        h = hashlib.sha256(f"{emb_model}|{emb_dims}".encode("utf-8"))
+        for cid in sorted(index):
+            h.update(f"\n{cid}:{index[cid]}".encode("utf-8"))
+        return h.hexdigest()
+
+    def _upsert_chunks(
+        self,
+        pc: PineconeClient,
+        ns: str,
+        tenant_id: str,
+        language_code: Optional[str],
+        chunks: Iterable[FAQChunk],
+    ) -> int:
+        """Embed + upsert chunków batchami (strumieniowo); zwraca liczbę batchy zakończonych błędem."""
+        concurrency = max(1, int(getattr(settings, "kb_index_concurrency", 4) or 1))
+        t0 = time.perf_counter()
+
+        # embed + upsert batchami; najwyżej `concurrency` batchy w locie (backpressure –
+        # kolejny batch startuje dopiero, gdy któryś się skończy)
+        failed = 0
+        n_chunks = n_batches = 0
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="kb-index") as ex:
+            in_flight: set[Future] = set()
+            for batch in self._embed_batches(chunks):
+                n_chunks += len(batch)
+                n_batches += 1
+                if len(in_flight) >= concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    failed += sum(1 for f in done if not f.result())
+                in_flight.add(ex.submit(self._index_batch, pc, ns, language_code, batch))
+            for f in in_flight:
+                failed += 0 if f.result() else 1
+
+        duration_s = max(1e-6, time.perf_counter() - t0)
+        logger.info({
+            "component": "kb_vector_service",
+            "event": "index_faq_done",
+            "tenant_id": tenant_id,
+            "namespace": ns,
+            "chunks": n_chunks,
+            "batches": n_batches,
+            "failed_batches": failed,
+            "concurrency": concurrency,
+            "duration_ms": int(duration_s * 1000),
+            "chunks_per_s": round(n_chunks / duration_s, 1),
+        })
+        return failed
+
+    def _embed_batches(self, chunks: Iterable[FAQChunk]) -> Iterator[List[FAQChunk]]:
+        """Dzieli chunki na batche mieszczące się w limitach Embeddings API (wejścia + tokeny)."""
+        max_items = max(1, int(getattr(settings, "kb_index_batch_size", 100) or 100))
+        max_tokens = max(1, int(getattr(settings, "kb_index_batch_max_tokens", 100000) or 100000))
+        batch: List[FAQChunk] = []
+        tokens = 0
+        for ch in chunks:
+            cost = count_tokens(ch.text)
+            if batch and (len(batch) >= max_items or tokens + cost > max_tokens):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(ch)
+            tokens += cost
+        if batch:
+            yield batch
+
+    def _index_batch(
+        self,
+        pc: PineconeClient,
+        namespace: str,
+        language_code: Optional[str],
+        batch: List[FAQChunk],
+    ) -> bool:
+        """Embed + upsert jednego batcha; błędny batch jest ponawiany niezależnie od reszty.
 
-        ns = self._namespace(tenant_id, language_code)
-        batch_size = 100
-        ok_all = True
-
-        for i in range(0, len(chunks), batch_size):
-            batch_chunks = chunks[i:i + batch_size]
-            batch_vecs = vectors[i:i + batch_size]
-            payload_vectors: list[dict[str, Any]] = []
-            for ch, vec in zip(batch_chunks, batch_vecs):
-                payload_vectors.append(
+        Ponawiany jest tylko krok, który się nie udał: po udanym embeddingu
+        kolejne próby robią już wyłącznie upsert (po jednej próbie HTTP).
+        """
+        emb_model = getattr(settings, "embedding_model", "text-embedding-3-small")
+        emb_dims = getattr(settings, "embedding_dimensions", None)
+        attempts = max(1, int(getattr(settings, "kb_index_batch_attempts", 3) or 1))
+        lang = (language_code or "").strip() or "en"
+
+        payload_vectors: Optional[list[dict[str, Any]]] = None
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(min(2.0, 0.2 * (2 ** attempt) + random.random() * 0.2))
+            if payload_vectors is None:
+                try:
+                    with timed(
+                        "embed_faq_chunks",
+                        logger=logger,
+                        component="kb_vector_service",
+                        extra={"namespace": namespace, "chunks": len(batch), "model": emb_model, "attempt": attempt + 1},
+                    ):
+                        vectors = self._openai.embed(
+                            [c.text for c in batch],
+                            model=emb_model,
+                            dimensions=emb_dims,
+                            store=self._embedding_store,
+                        )
+                except Exception as e:
+                    logger.warning({
+                        "component": "kb_vector_service",
+                        "event": "index_batch_embed_failed",
+                        "namespace": namespace,
+                        "chunks": len(batch),
+                        "attempt": attempt + 1,
+                        "err": str(e),
+                    })
+                    continue
+                if not vectors or len(vectors) != len(batch):
+                    logger.error({
+                        "event": "index_faq error",
+                        "len(vectors)": len(vectors or []),
+                        "len(chunks)": len(batch),
+                        "attempt": attempt + 1,
+                    })
+                    continue
+
+                payload_vectors = [
                     {
                         "id": ch.chunk_id,
                         "values": vec,
@@ -266,40 +467,32 @@ class KBVectorService:
                             "text": ch.text,
                             "faq_key": ch.faq_key,
                             "chunk_id": ch.chunk_id,
-                            "lang": ((language_code or "").strip() or "en"),
+                            "lang": lang,
                             "category": getattr(ch, "category", PC_NAME_KB),
                             # Optional: helps prevent mixing when you migrate embedding models
                             "embed_model": getattr(settings, "embedding_model", "") or "",
-
                         },
                     }
-                )
-            logger.warning({
-              "event": "upsert_payload_meta_sample",
-              "namespace": ns,
-              "meta": payload_vectors[0].get("metadata") if payload_vectors else None,
-            })
+                    for ch, vec in zip(batch, vectors)
+                ]
             with timed(
                 "pinecone_upsert_batch",
-                logger=logger, 
+                logger=logger,
                 component="kb_vector_service",
-                extra={"tenant_id": tenant_id, "namespace": ns, "batch_size": len(payload_vectors)},
+                extra={"namespace": namespace, "batch_size": len(payload_vectors), "attempt": attempt + 1},
             ):
-                logger.warning({
-                  "event": "upsert_sample_meta",
-                  "namespace": ns,
-                  "chunk_id": chunks[0].chunk_id if chunks else None,
-                  "faq_key": chunks[0].faq_key if chunks else None,
-                  "category": getattr(chunks[0], "category", None) if chunks else None,
-                })
+                # retry jest tutaj (z backoffem) – bez wewnętrznych ponowień klienta
+                if pc.upsert(vectors=payload_vectors, namespace=namespace, max_attempts=1):
+                    return True
 
-                ok = self._client_for(tenant_id).upsert(vectors=payload_vectors, namespace=ns)
-            ok_all = ok_all and ok
-
-        logger.info({
+        logger.error({
             "component": "kb_vector_service",
-            "event": "index_faq ok",})
-        return ok_all
+            "event": "index_batch_failed",
+            "namespace": namespace,
+            "chunks": len(batch),
+            "first_chunk_id": batch[0].chunk_id if batch else None,
+        })
+        return False
 
     def retrieve(
         self,
@@ -0,0 +1,224 @@
+"""
+Lokalna (w procesie) identyfikacja języka wiadomości.
+
+LanguageService pyta najpierw ten model, a Amazon Comprehend dopiero wtedy,
+gdy lokalna pewność jest niska – dla większości nowych rozmów odpada
+wywołanie sieciowe na ścieżce krytycznej.
+
+Model:
+- pismo (arabskie, cyrylica) rozstrzyga od razu, z rozróżnieniem liter
+  specyficznych (ukraińskie і/ї/є/ґ vs rosyjskie ы/э/ъ/ё, perskie پ/چ/ژ/گ),
+- dla alfabetu łacińskiego: profile trigramów znakowych (Cavnar–Trenkle,
+  ranking "out-of-place") zbudowane leniwie z wbudowanych próbek tekstu
+  + litery diakrytyczne charakterystyczne dla języka,
+- pewność = względna przewaga najlepszego języka nad drugim, tłumiona
+  dla krótkich tekstów (mało trigramów = mało dowodów).
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PROFILE_SIZE = 400
+# pełną pewność dajemy dopiero od tylu trigramów w tekście
+FULL_EVIDENCE_TRIGRAMS = 24
+
+_SAMPLES: Dict[str, str] = {
+    "pl": (
+        "Dzień dobry, chciałbym zapytać o godziny otwarcia klubu w weekend. "
+        "Ile kosztuje karnet miesięczny i czy jest zniżka dla studentów? "
+        "Czy mogę zapisać się na zajęcia jogi w środę wieczorem? "
+        "Nie mogę wejść do klubu, karta nie działa przy bramce. "
+        "Proszę o kontakt z konsultantem, mam problem z płatnością za członkostwo. "
+        "Jak mogę zawiesić karnet na czas urlopu albo choroby? "
+        "Dziękuję bardzo za pomoc, to wszystko na dzisiaj. "
+        "Gdzie znajduje się najbliższy klub i czy jest tam parking dla samochodów? "
+        "Chcę odwołać rezerwację, bo nie zdążę przyjść na trening. "
+        "Czy sauna jest wliczona w cenę, czy trzeba dopłacić? "
+        "Mój syn ma szesnaście lat, czy może ćwiczyć na siłowni bez opiekuna? "
+        "Potrzebuję faktury za ostatni miesiąc, proszę wysłać ją na mój adres. "
+        "Który trener prowadzi zajęcia z crossfitu i ile osób jest w grupie? "
+        "Rozmawiałem wczoraj z recepcją, ale nadal nie dostałem odpowiedzi."
+    ),
+    "en": (
+        "Hello, I would like to ask about the club opening hours at the weekend. "
+        "How much does the monthly membership cost and is there a student discount? "
+        "Can I sign up for the yoga class on Wednesday evening? "
+        "I cannot get into the club, my card does not work at the gate. "
+        "Please connect me with an agent, I have a problem with my membership payment. "
+        "How can I freeze my membership while I am on holiday or sick? "
+        "Thank you very much for your help, that is all for today. "
+        "Where is the nearest club and is there parking for cars? "
+        "I want to cancel my booking because I will not make it to the workout. "
+        "Is the sauna included in the price or do I have to pay extra? "
+        "My son is sixteen, can he train at the gym without a guardian? "
+        "I need an invoice for last month, please send it to my address. "
+        "Which trainer runs the crossfit classes and how many people are in the group? "
+        "I talked to the reception yesterday but I still have not received an answer."
+    ),
+    "de": (
+        "Guten Tag, ich möchte nach den Öffnungszeiten des Clubs am Wochenende fragen. "
+        "Wie viel kostet die monatliche Mitgliedschaft und gibt es einen Rabatt für Studenten? "
+        "Kann ich mich für den Yogakurs am Mittwochabend anmelden? "
+        "Ich komme nicht in den Club, meine Karte funktioniert am Eingang nicht. "
+        "Bitte verbinden Sie mich mit einem Mitarbeiter, ich habe ein Problem mit der Zahlung. "
+        "Wie kann ich meine Mitgliedschaft während des Urlaubs oder einer Krankheit pausieren? "
+        "Vielen Dank für Ihre Hilfe, das ist alles für heute. "
+        "Wo ist der nächste Club und gibt es dort Parkplätze für Autos? "
+        "Ich möchte meine Buchung stornieren, weil ich es nicht zum Training schaffe. "
+        "Ist die Sauna im Preis enthalten oder muss ich extra bezahlen? "
+        "Mein Sohn ist sechzehn, darf er ohne Begleitung im Fitnessstudio trainieren? "
+        "Ich brauche eine Rechnung für den letzten Monat, bitte schicken Sie sie an meine Adresse. "
+        "Welcher Trainer leitet die Crossfit Kurse und wie viele Personen sind in der Gruppe? "
+        "Ich habe gestern mit der Rezeption gesprochen, aber noch keine Antwort bekommen."
+    ),
+    "uk": (
+        "Добрий день, я хотів би запитати про години роботи клубу у вихідні. "
+        "Скільки коштує місячний абонемент і чи є знижка для студентів? "
+        "Чи можу я записатися на заняття йогою в середу ввечері? "
+        "Я не можу зайти до клубу, моя картка не працює біля турнікета. "
+        "Будь ласка, з'єднайте мене з консультантом, у мене проблема з оплатою. "
+        "Як я можу призупинити абонемент на час відпустки або хвороби? "
+        "Дуже дякую за допомогу, це все на сьогодні. "
+        "Де знаходиться найближчий клуб і чи є там парковка для автомобілів? "
+        "Я хочу скасувати бронювання, бо не встигну на тренування. "
+        "Чи входить сауна у вартість, чи треба доплатити? "
+        "Моєму синові шістнадцять років, чи може він тренуватися без супроводу? "
+        "Мені потрібен рахунок за минулий місяць, надішліть його на мою адресу."
+    ),
+}
+
+# litery, które praktycznie przesądzają o języku (w obrębie kandydatów)
+_MARKER_LETTERS: Dict[str, str] = {
+    "pl": "ąćęłńśźż",
+    "de": "äöüß",
+    "uk": "іїєґ",
+}
+# pozostałe litery spoza ASCII, które występują w językach z listy
+_KNOWN_LATIN_EXTRA = set("ó")
+_RE_LETTERS = re.compile(r"[^\W\d_]+", re.UNICODE)
+_RE_ARABIC = re.compile(r"[؀-ۿݐ-ݿ]")
+_RE_CYRILLIC = re.compile(r"[Ѐ-ӿ]")
+_RU_ONLY = set("ыэъё")
+_PERSIAN_URDU_ONLY = set("پچژگڈٹڑں")
+
+
+@dataclass(frozen=True)
+class LanguageGuess:
+    code: Optional[str]
+    confidence: float
+
+
+def _trigrams(text: str) -> Counter:
+    grams: Counter = Counter()
+    for word in _RE_LETTERS.findall(text.lower()):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            grams[padded[i:i + 3]] += 1
+    return grams
+
+
+def _profile(text: str, size: int = PROFILE_SIZE) -> Dict[str, int]:
+    ranked = sorted(_trigrams(text).items(), key=lambda kv: (-kv[1], kv[0]))[:size]
+    return {g: rank for rank, (g, _) in enumerate(ranked)}
+
+
+class LanguageIdentifier:
+    """Identyfikator języka z n-gramów znakowych; profile budowane raz na proces."""
+
+    def __init__(self, languages: Optional[Iterable[str]] = None, samples: Optional[Dict[str, str]] = None) -> None:
+        samples = samples or _SAMPLES
+        if languages is None:
+            raw = os.getenv("LANG_LOCAL_LANGUAGES", "pl,en,de,uk,ar")
+            languages = [x.strip().lower() for x in raw.split(",") if x.strip()]
+        self.languages = list(languages)
+        self._samples = {k: v for k, v in samples.items() if k in self.languages}
+        self._profiles: Optional[Dict[str, Dict[str, int]]] = None
+        self._lock = threading.Lock()
+
+    def _latin_profiles(self) -> Dict[str, Dict[str, int]]:
+        if self._profiles is None:
+            with self._lock:
+                if self._profiles is None:
+                    self._profiles = {
+                        lang: _profile(text)
+                        for lang, text in self._samples.items()
+                        if not _RE_CYRILLIC.search(text)
+                    }
+        return self._profiles
+
+    def detect(self, text: str) -> LanguageGuess:
+        t = (text or "").strip()
+        letters = "".join(_RE_LETTERS.findall(t.lower()))
+        if not letters:
+            return LanguageGuess(None, 0.0)
+
+        arabic = len(_RE_ARABIC.findall(letters))
+        cyrillic = len(_RE_CYRILLIC.findall(letters))
+        if arabic * 2 > len(letters):
+            return self._script_guess("ar", letters, foreign=_PERSIAN_URDU_ONLY)
+        if cyrillic * 2 > len(letters):
+            return self._script_guess("uk", letters, foreign=_RU_ONLY, markers=_MARKER_LETTERS["uk"])
+        return self._latin_guess(letters, t)
+
+    def _script_guess(self, lang: str, letters: str, *, foreign: set, markers: str = "") -> LanguageGuess:
+        if lang not in self.languages or foreign & set(letters):
+            # inny język tego samego pisma (rosyjski, perski...) – decyzja dla Comprehend
+            return LanguageGuess(None, 0.0)
+        evidence = min(1.0, len(letters) / 12)
+        if markers and not set(markers) & set(letters):
+            # cyrylica bez liter ukraińskich może być rosyjska/bułgarska
+            evidence *= 0.6
+        return LanguageGuess(lang, round(evidence, 3))
+
+    def _latin_guess(self, letters: str, text: str) -> LanguageGuess:
+        profiles = self._latin_profiles()
+        grams = _trigrams(text)
+        total = sum(grams.values())
+        if not profiles or not total:
+            return LanguageGuess(None, 0.0)
+
+        scores: List[Tuple[float, str]] = []
+        for lang, prof in profiles.items():
+            # out-of-place: trigram spoza profilu kosztuje maksymalną karę
+            dist = sum(n * min(prof.get(g, PROFILE_SIZE), PROFILE_SIZE) for g, n in grams.items())
+            fit = 1.0 - dist / (total * PROFILE_SIZE)
+            markers = _MARKER_LETTERS.get(lang, "")
+            if markers and set(markers) & set(letters):
+                fit += 0.25
+            scores.append((fit, lang))
+        scores.sort(reverse=True)
+
+        best_fit, best = scores[0]
+        second_fit = scores[1][0] if len(scores) > 1 else 0.0
+        if best_fit <= 0:
+            return LanguageGuess(None, 0.0)
+        margin = (best_fit - second_fit) / best_fit
+        evidence = min(1.0, total / FULL_EVIDENCE_TRIGRAMS)
+        # słabe dopasowanie do wszystkich profili = raczej język spoza listy
+        coverage = min(1.0, best_fit / 0.35)
+        confidence = min(1.0, margin * 2.5) * evidence * coverage
+        known = _KNOWN_LATIN_EXTRA.union(*(set(_MARKER_LETTERS.get(lang, "")) for lang in profiles))
+        if any(ord(ch) > 127 and ch not in known for ch in letters):
+            # é/ñ/ç/å... – tekst w języku spoza profili (es, fr, sv...)
+            confidence *= 0.5
+        return LanguageGuess(best, round(confidence, 3))
+
+
+_DEFAULT: Optional[LanguageIdentifier] = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_language_identifier() -> LanguageIdentifier:
+    """Identyfikator współdzielony w procesie (profile liczone raz na cold start)."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        with _DEFAULT_LOCK:
+            if _DEFAULT is None:
+                _DEFAULT = LanguageIdentifier()
+    return _DEFAULT
@@ -1,15 +1,16 @@
 from __future__ import annotations
 
-import boto3, re
-from botocore.config import Config
-from typing import Optional
+import re
+from typing import Any, Optional
 from datetime import datetime
 
+from ..common.aws import comprehend_client
 from ..common.config import settings
 from ..common.logging import logger
 from ..repos.conversations_repo import ConversationsRepo
 from ..repos.tenants_repo import TenantsRepo
 from ..domain.models import Message
+from .language_id import LanguageIdentifier, default_language_identifier
 
 from ..common.constants import (
     STATE_AWAITING_VERIFICATION,
@@ -26,16 +27,21 @@ class LanguageService:
         self,
         conv: ConversationsRepo | None = None,
         tenants: TenantsRepo | None = None,
+        identifier: LanguageIdentifier | None = None,
     ) -> None:
         self.conv = conv or ConversationsRepo()
         self.tenants = tenants or TenantsRepo()
-        # klient Comprehend trzymamy tutaj, żeby go nie tworzyć za każdym razem
-        self._comprehend = boto3.client(
-            "comprehend",
-            # Detekcja języka jest na ścieżce krytycznej latency.
-            # Preferujemy szybki fallback (tenant/rozmowa) zamiast długiego czekania.
-            config=Config(read_timeout=1, connect_timeout=1, retries={"max_attempts": 1}),
-        )
+        # lokalny model n-gramowy – pierwszy wybór przed Comprehend
+        self.identifier = identifier or default_language_identifier()
+        # klient Comprehend powstaje przy pierwszej detekcji (rzadko: tylko tenanci
+        # "auto", nowe rozmowy, niska pewność lokalna) – nie przy cold starcie
+        self._comprehend_client: Any = None
+
+    @property
+    def _comprehend(self) -> Any:
+        if self._comprehend_client is None:
+            self._comprehend_client = comprehend_client()
+        return self._comprehend_client
 
     # ------------------------------------------------------------------ #
     #  Public API
@@ -45,7 +51,7 @@ class LanguageService:
         """
         Ustala język konwersacji per numer:
         1) explicit msg.language_code (np. z WWW),
-        2) wykryty język z treści (Comprehend),
+        2) wykryty język z treści (lokalny model, przy niskiej pewności Comprehend),
         3) language_code z istniejącej rozmowy,
         4) language_code tenanta,
         5) global default.
@@ -55,11 +61,11 @@ class LanguageService:
         """
         channel = msg.channel or "whatsapp"
         channel_user_id = msg.channel_user_id or msg.from_phone
+        existing = self.conv.get_conversation(msg.tenant_id, channel, channel_user_id)
 
         # 1) jeżeli kanał podał język – traktujemy jako źródło prawdy
         if getattr(msg, "language_code", None):
             lang = msg.language_code
-            existing = self.conv.get_conversation(msg.tenant_id, channel, channel_user_id)
             if existing:
                 # aktualizujemy tylko language_code
                 self.conv.upsert_conversation(
@@ -78,8 +84,7 @@ class LanguageService:
                 )
             return lang
 
-        # 2) pobierz istniejącą rozmowę (jeśli jest)
-        existing = self.conv.get_conversation(msg.tenant_id, channel, channel_user_id)
+        # 2) istniejąca rozmowa (jeśli jest)
         existing_lang = existing.get("language_code") if existing else None
         existing_state = (existing or {}).get("state_machine_status")
 
@@ -127,10 +132,32 @@ class LanguageService:
         return lang
 
     # ------------------------------------------------------------------ #
-    #  Detekcja języka (Amazon Comprehend)
+    #  Detekcja języka (lokalnie, fallback: Amazon Comprehend)
     # ------------------------------------------------------------------ #
 
     def _detect_language(self, text: str) -> Optional[str]:
+        """
+        Detekcja języka: najpierw lokalny identyfikator n-gramowy (bez sieci),
+        Comprehend tylko gdy lokalna pewność < LANG_LOCAL_MIN_CONFIDENCE.
+        """
+        t = (text or "").strip()
+        if t and settings.lang_local_detect_enabled:
+            guess = self.identifier.detect(t)
+            local_ok = bool(guess.code) and guess.confidence >= settings.lang_local_min_confidence
+            logger.info(
+                {
+                    "sender": "routing",
+                    "event": "lang_detect_local",
+                    "code": guess.code,
+                    "confidence": guess.confidence,
+                    "fallback": not local_ok,
+                }
+            )
+            if local_ok:
+                return guess.code
+        return self._detect_language_comprehend(t)
+
+    def _detect_language_comprehend(self, text: str) -> Optional[str]:
         """
         Neutralna detekcja języka z użyciem Amazon Comprehend.
 
@@ -5,13 +5,23 @@ import os
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 
-from aws_embedded_metrics import metric_scope
-
 from ..common.aws import cloudwatch_client
 
+# aws_embedded_metrics (~0.2 s importu) ładujemy przy pierwszej metryce
+_EMIT = None
+
+
+def emit_metric(**kwargs: Any) -> None:
+    """Metryka EMF (jako log); biblioteka importowana przy pierwszym użyciu."""
+    global _EMIT
+    if _EMIT is None:
+        from aws_embedded_metrics import metric_scope
+
+        _EMIT = metric_scope(_emit_metric)
+    _EMIT(**kwargs)
+
 
-@metric_scope
-def emit_metric(
+def _emit_metric(
     metrics,
     *,
     namespace: str,
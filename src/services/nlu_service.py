@@ -1,4 +1,5 @@
 from __future__ import annotations
+import os
 import re
 from ..common.constants import (
     INTENT_FAQ,
@@ -11,17 +12,54 @@ from ..common.constants import (
     INTENT_CONTRACT_STATUS,
     INTENT_CRM_MEMBER_BALANCE,
     INTENT_ACK,
-    INTENT_MARKETING_OPTOUT,
     INTENT_MARKETING_OPTIN,
+    NLU_LOCAL_INTENTS,
+    NLU_LOCAL_MIN_CONFIDENCE,
 )
 from ..adapters.openai_client import OpenAIClient
+from ..common.logging import logger
+from .intent_cache import IntentCache
+from .intent_classifier import IntentModelStore
+from .metrics_service import MetricsService
 
 _RE_ONLY_EMOJI_OR_PUNCT = re.compile(r"^[^\w\d]{1,12}$", re.UNICODE)
 
 
+def _env_float(name: str) -> float | None:
+    raw = os.getenv(name, "").strip()
+    return float(raw) if raw else None
+
+
 class NLUService:
-    def __init__(self):
-        self.client = OpenAIClient()
+    """
+    Klasyfikacja intencji w kolejnych warstwach:
+    1) reguły (_fast_classify),
+    2) cache wyników (znormalizowany tekst + język; pamięć procesu + opcjonalnie DDB),
+    3) lokalny model per tenant/język (tylko NLU_LOCAL_INTENTS, powyżej progu pewności),
+    4) OpenAI (wynik trafia do cache).
+    """
+
+    def __init__(
+        self,
+        local_models: IntentModelStore | None = None,
+        cache: IntentCache | None = None,
+        metrics: MetricsService | None = None,
+        client: OpenAIClient | None = None,
+    ):
+        self.client = client or OpenAIClient()
+        self.cache_enabled = os.getenv("NLU_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+        self.cache = cache or IntentCache()
+        self.metrics = metrics or MetricsService()
+        self.cache_hits = 0
+        self.cache_lookups = 0
+        self.local_enabled = os.getenv("NLU_LOCAL_ENABLED", "1").lower() not in ("0", "false", "no")
+        self.local_models = local_models or IntentModelStore()
+        self.local_min_confidence = float(os.getenv("NLU_LOCAL_MIN_CONFIDENCE", str(NLU_LOCAL_MIN_CONFIDENCE)))
+        # puste = progi zapisane w modelu (skalibrowane przy treningu)
+        self.local_min_similarity = _env_float("NLU_LOCAL_MIN_SIMILARITY")
+        self.local_min_margin = _env_float("NLU_LOCAL_MIN_MARGIN")
+        # próbki do treningu modelu lokalnego (treść wiadomości w logach – tylko świadomie włączone)
+        self.log_samples = os.getenv("NLU_LOG_SAMPLES", "false").lower() == "true"
 
     def _fast_classify(self, text: str) -> dict | None:
         t = (text or "").strip()
@@ -34,8 +72,88 @@ class NLUService:
 
         return None
 
-    def classify_intent(self, text: str, lang: str):
+    def _local_classify(self, text: str, lang: str, tenant_id: str | None) -> dict | None:
+        if not self.local_enabled:
+            return None
+        try:
+            model = self.local_models.get(tenant_id, lang)
+            if model is None:
+                return None
+            intent, confidence = model.predict(
+                text,
+                min_similarity=self.local_min_similarity,
+                min_margin=self.local_min_margin,
+            )
+        except Exception as e:
+            logger.warning({"component": "nlu_service", "event": "local_classify_failed", "tenant_id": tenant_id, "err": str(e)})
+            return None
+
+        if intent not in NLU_LOCAL_INTENTS or confidence < self.local_min_confidence:
+            return None
+        logger.info({
+            "component": "nlu_service",
+            "event": "local_intent",
+            "tenant_id": tenant_id,
+            "lang": lang,
+            "intent": intent,
+            "confidence": round(confidence, 4),
+        })
+        return {"intent": intent, "confidence": confidence, "slots": {}}
+
+    def _cache_get(self, text: str, lang: str, tenant_id: str | None) -> dict | None:
+        if not self.cache_enabled:
+            return None
+        try:
+            cached, source = self.cache.get(text, lang)
+        except Exception as e:
+            logger.warning({"component": "nlu_service", "event": "cache_get_failed", "err": str(e)})
+            return None
+
+        self.cache_lookups += 1
+        if cached is not None:
+            self.cache_hits += 1
+        try:
+            self.metrics.incr(
+                "NLUCacheHit" if cached is not None else "NLUCacheMiss",
+                tenant_id=tenant_id,
+                component="nlu_service",
+                source=source,
+                lang=lang,
+                hit_ratio=round(self.cache_hit_ratio, 4),
+            )
+        except Exception:
+            pass
+        return cached
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        """Hit ratio cache w tym procesie (od startu kontenera)."""
+        return self.cache_hits / self.cache_lookups if self.cache_lookups else 0.0
+
+    def classify_intent(self, text: str, lang: str, tenant_id: str | None = None):
         fast = self._fast_classify(text)
         if fast is not None:
             return fast
-        return self.client.classify(text, lang)
\ No newline at end of file
+        cached = self._cache_get(text, lang, tenant_id)
+        if cached is not None:
+            return cached
+        local = self._local_classify(text, lang, tenant_id)
+        if local is not None:
+            return local
+        result = self.client.classify(text, lang)
+        if self.cache_enabled and isinstance(result, dict):
+            try:
+                self.cache.put(text, lang, result)
+            except Exception as e:
+                logger.warning({"component": "nlu_service", "event": "cache_put_failed", "err": str(e)})
+        if self.log_samples and isinstance(result, dict):
+            logger.info({
+                "component": "nlu_service",
+                "event": "intent_sample",
+                "tenant_id": tenant_id,
+                "lang": lang,
+                "text": text,
+                "intent": result.get("intent"),
+                "confidence": result.get("confidence"),
+            })
+        return result
\ No newline at end of file
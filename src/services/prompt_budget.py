@@ -0,0 +1,172 @@
+"""
+Budżet tokenów dla promptu AI-FAQ.
+
+Składanie promptu KB w jednym miejscu:
+- szacowanie tokenów (tiktoken, jeśli jest zainstalowany; inaczej lokalny
+  tokenizer zgodny z pre-tokenizacją cl100k, zawyżający raczej niż zaniżający),
+- deduplikacja nakładających się chunków (overlap z chunk_faq, te same FAQ
+  w kilku namespace'ach),
+- przycięcie historii i chunków do budżetu tenanta (kb_prompt_max_tokens).
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence
+
+try:  # opcjonalnie – dokładne liczenie, jeśli paczka jest w buildzie
+    import tiktoken
+except ImportError:  # pragma: no cover - zależy od środowiska
+    tiktoken = None
+
+# narzut Chat Completions na każdą wiadomość (role, separatory)
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+# przybliżenie regexu pre-tokenizacji cl100k (bez \p{L}/\p{N}, których nie ma w `re`)
+_RE_PRETOKEN = re.compile(
+    r"'(?:s|t|re|ve|m|ll|d)|[^\r\n\w]?[^\W\d_]+|\d{1,3}| ?[^\s\w]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+",
+    re.UNICODE | re.IGNORECASE,
+)
+_RE_WORDS = re.compile(r"\w+", re.UNICODE)
+
+_ENCODING = None
+
+
+def _encoding():
+    global _ENCODING
+    if _ENCODING is None and tiktoken is not None:
+        try:
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _ENCODING = False
+    return _ENCODING or None
+
+
+def _approx_piece_tokens(piece: str) -> int:
+    # ASCII ~4 bajty/token; znaki spoza ASCII (ą, ę, emoji) tokenizują się gorzej
+    ascii_len = sum(1 for ch in piece if ord(ch) < 128)
+    other_bytes = len(piece.encode("utf-8")) - ascii_len
+    return max(1, math.ceil(ascii_len / 4 + other_bytes / 2.5))
+
+
+def count_tokens(text: str) -> int:
+    """Liczba tokenów tekstu (dokładna z tiktoken, inaczej szacunek z górą)."""
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return sum(_approx_piece_tokens(p) for p in _RE_PRETOKEN.findall(text))
+
+
+def count_message_tokens(messages: Sequence[dict]) -> int:
+    """Tokeny wejściowe całej listy wiadomości Chat Completions."""
+    total = REPLY_PRIMING_TOKENS
+    for m in messages or []:
+        total += MESSAGE_OVERHEAD_TOKENS + count_tokens(str(m.get("content") or ""))
+    return total
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _RE_WORDS.findall((text or "").lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def dedupe_chunks(chunks: Sequence[Any], *, max_overlap: float = 0.8) -> List[Any]:
+    """Usuwa duplikaty i chunki w większości zawarte w już wybranych.
+
+    Chunki przychodzą posortowane po trafności, więc zostaje pierwszy (lepszy).
+    Overlap = część shingli słownych krótszego chunku obecna w dłuższym.
+    """
+    kept: List[Any] = []
+    kept_ids: set = set()
+    kept_shingles: List[set] = []
+    for ch in chunks or []:
+        cid = getattr(ch, "chunk_id", None)
+        if cid and cid in kept_ids:
+            continue
+        sh = _shingles(getattr(ch, "text", "") or "")
+        if not sh:
+            continue
+        duplicate = False
+        for other in kept_shingles:
+            smaller = min(len(sh), len(other))
+            if smaller and len(sh & other) / smaller >= max_overlap:
+                duplicate = True
+                break
+        if duplicate:
+            continue
+        kept.append(ch)
+        kept_shingles.append(sh)
+        if cid:
+            kept_ids.add(cid)
+    return kept
+
+
+@dataclass
+class PromptBudget:
+    """Wynik dopasowania chunków i historii do budżetu tokenów."""
+    chunks: List[Any] = field(default_factory=list)
+    history: List[dict] = field(default_factory=list)
+    tokens_in: int = 0
+    max_tokens: int = 0
+    chunks_dropped: int = 0
+    history_dropped: int = 0
+
+
+def chunk_prompt_tokens(chunk: Any, rank: int) -> int:
+    """Tokeny chunku w formacie build_kb_prompt ("[C1] ..." + separator)."""
+    return count_tokens(f"[C{rank}] {getattr(chunk, 'text', '') or ''}\n\n")
+
+
+def fit_prompt(
+    *,
+    base_tokens: int,
+    chunks: Sequence[Any],
+    history: Optional[Sequence[dict]],
+    max_tokens: int,
+    history_max_tokens: int,
+) -> PromptBudget:
+    """Dobiera chunki (w kolejności trafności) i najnowszą historię do budżetu.
+
+    base_tokens – system prompt bez kontekstu + pytanie (+ narzut wiadomości),
+    zawsze wchodzi w całości. Historia ma własny sufit (history_max_tokens),
+    bierzemy od najnowszych wiadomości. Pierwszy chunk trafia do promptu
+    nawet ponad budżet – bez kontekstu odpowiedź i tak byłaby "brak informacji".
+    """
+    used = base_tokens
+
+    hist_in = list(history or [])
+    hist_out: List[dict] = []
+    hist_budget = max(0, min(history_max_tokens, max_tokens - used))
+    hist_used = 0
+    for m in reversed(hist_in):
+        cost = MESSAGE_OVERHEAD_TOKENS + count_tokens(str(m.get("content") or ""))
+        if hist_used + cost > hist_budget:
+            break
+        hist_out.append(m)
+        hist_used += cost
+    hist_out.reverse()
+    used += hist_used
+
+    picked: List[Any] = []
+    for ch in chunks or []:
+        cost = chunk_prompt_tokens(ch, len(picked) + 1)
+        if picked and used + cost > max_tokens:
+            continue
+        picked.append(ch)
+        used += cost
+
+    return PromptBudget(
+        chunks=picked,
+        history=hist_out,
+        tokens_in=used,
+        max_tokens=max_tokens,
+        chunks_dropped=len(chunks or []) - len(picked),
+        history_dropped=len(hist_in) - len(hist_out),
+    )
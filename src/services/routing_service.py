@@ -14,16 +14,19 @@ import logging
 import os
 import boto3
 from datetime import datetime
-from typing import List, Optional
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, List, Optional
 from botocore.config import Config
 
 from ..domain.models import Message, Action
 from ..common.utils import build_reply_action
 from ..common.config import settings
+from ..common.deadline import remaining_s
 from ..common.timing import timed
+from ..common.executor import shared_executor
 from ..common.security import conversation_key
 from ..services.nlu_service import NLUService
-from ..services.kb_service import KBService
+from ..services.kb_service import KBService, KBRetrieval
 from ..services.template_service import TemplateService
 from ..services.crm_service import CRMService
 from .clients_factory import ClientsFactory
@@ -32,6 +35,7 @@ from ..services.ticketing_service import TicketingService
 from ..services.metrics_service import MetricsService
 from ..services.crm_flow_service import CRMFlowService
 from ..services.language_service import LanguageService
+from .container import LazyComponent, ServiceContainer, default_container
 from ..repos.conversations_repo import ConversationsRepo
 from ..repos.tenants_repo import TenantsRepo
 from ..repos.messages_repo import MessagesRepo
@@ -67,12 +71,57 @@ from ..common.constants import (
 
 logger = logging.getLogger(__name__)
 
+# koniec zdania albo akapitu – do dopasowania wysłanego wcześniej fragmentu odpowiedzi
+_RE_SEGMENT_BOUNDARY = re.compile(r"[.!?…](?:\s+|$)|\n\s*\n")
+
+
+class _KBSpeculation:
+    """Retrieval KB odpalony spekulatywnie równolegle z NLU (dla wiadomości wyglądających na FAQ)."""
+
+    def __init__(self, future: Future, started: float) -> None:
+        self.future = future
+        self.started = started
+        self.used = False
+
+
 class RoutingService:
     """
     Serwis łączący NLU, KB i integracje zewnętrzne tak,
     by obsłużyć pełen flow rozmowy.
     """
 
+    # Komponenty budowane leniwie (pierwsze użycie), domyślnie współdzielone
+    # przez kontener procesu. Serwisy pochodne (crm, ticketing, crm_flow,
+    # language) budujemy lokalnie tylko wtedy, gdy wstrzyknięto ich zależność.
+    nlu = LazyComponent(lambda self: self._container.nlu())
+    kb = LazyComponent(lambda self: self._container.kb())
+    tpl = LazyComponent(lambda self: self._container.tpl())
+    metrics = LazyComponent(lambda self: self._container.metrics())
+    conv = LazyComponent(lambda self: self._container.conv())
+    tenants = LazyComponent(lambda self: self._container.tenants())
+    messages = LazyComponent(lambda self: self._container.messages())
+    _clients_factory = LazyComponent(lambda self: self._container.clients_factory())
+    crm = LazyComponent(
+        lambda self: CRMService(clients_factory=self._clients_factory)
+        if self._injected & {"_clients_factory"}
+        else self._container.crm()
+    )
+    ticketing = LazyComponent(
+        lambda self: TicketingService(tpl=self._container.tpl(), clients_factory=self._clients_factory)
+        if self._injected & {"_clients_factory"}
+        else self._container.ticketing()
+    )
+    crm_flow = LazyComponent(
+        lambda self: CRMFlowService(crm=self.crm, tpl=self.tpl, conv=self.conv)
+        if self._injected & {"_clients_factory", "crm", "tpl", "conv"}
+        else self._container.crm_flow()
+    )
+    language = LazyComponent(
+        lambda self: LanguageService(conv=self.conv, tenants=self._container.tenants())
+        if self._injected & {"conv"}
+        else self._container.language()
+    )
+
     def __init__(
         self,
         nlu: NLUService | None = None,
@@ -87,25 +136,26 @@ class RoutingService:
         ticketing: TicketingService | None = None,
         crm_flow: CRMFlowService | None = None, 
         language: LanguageService | None = None,
+        container: ServiceContainer | None = None,
     ) -> None:
-        self.nlu = nlu or NLUService()
-        self.kb = kb or KBService()
-        self.tpl = tpl or TemplateService()
-        self.metrics = metrics or MetricsService()
-        self.conv = conv or ConversationsRepo()
-        self.tenants = tenants or TenantsRepo()
-        self.messages = messages or MessagesRepo()
-        self._clients_factory = _clients_factory or ClientsFactory()
-        self.crm = crm or CRMService(clients_factory=self._clients_factory)
-        self.ticketing = ticketing or TicketingService(clients_factory=self._clients_factory)
-        self.crm_flow = crm_flow or CRMFlowService(
-            crm=self.crm,
-            tpl=self.tpl,
-            conv=self.conv,
-        )
-        self.language = language or LanguageService(conv=self.conv)
-        # cache na słowa typu TAK / NIE z templatek
-        self._words_cache: dict[tuple[str, str, str], set[str]] = {}
+        self._container = container or default_container()
+        injected = {
+            "nlu": nlu,
+            "kb": kb,
+            "tpl": tpl,
+            "metrics": metrics,
+            "conv": conv,
+            "tenants": tenants,
+            "messages": messages,
+            "_clients_factory": _clients_factory,
+            "crm": crm,
+            "ticketing": ticketing,
+            "crm_flow": crm_flow,
+            "language": language,
+        }
+        self._injected = {name for name, value in injected.items() if value is not None}
+        for name in self._injected:
+            setattr(self, name, injected[name])
 
     # -------------------------------------------------------------------------
     #  Helpers ogólne
@@ -125,7 +175,7 @@ class RoutingService:
             slots = msg.slots or {}
             confidence = DEFAULT_NLU_CONFIDENCE
         else:
-            nlu = self.nlu.classify_intent(msg.body, lang)
+            nlu = self.nlu.classify_intent(msg.body, lang, tenant_id=msg.tenant_id)
             if isinstance(nlu, dict):
                 intent = nlu.get("intent", INTENT_CLARIFY)
                 slots = nlu.get("slots") or {}
@@ -202,12 +252,142 @@ class RoutingService:
     #  Główna metoda
     # -------------------------------------------------------------------------
 
-    def handle(self, msg: Message) -> List[Action]:
+    def _is_new_session(self, conv: dict) -> bool:
+        now_ts = int(time.time())
+        last_ts = int(conv.get("updated_at") or 0)
+        gap = now_ts - last_ts if last_ts else 0
+        return last_ts == 0 or gap > SESSION_TIMEOUT_SECONDS
+
+    # -------------------------------------------------------------------------
+    #  Spekulatywny retrieval KB (równolegle z NLU)
+    # -------------------------------------------------------------------------
+
+    def _looks_like_faq(self, msg: Message, conv: dict) -> bool:
+        """Tania heurystyka: czy warto zacząć retrieval KB zanim NLU zwróci intencję."""
+        if not getattr(settings, "kb_speculative_retrieval", False):
+            return False
+        if msg.intent:
+            # intencja już znana – NLU nie wołamy, nie ma czego nakładać
+            return False
+        text = (msg.body or "").strip()
+        if not text:
+            return False
+        if "?" in text:
+            return True
+        if conv.get("last_intent") == INTENT_FAQ and not self._is_new_session(conv):
+            return True
+        min_words = int(getattr(settings, "kb_speculative_min_words", 4) or 4)
+        return len(text.split()) >= min_words
+
+    def _start_kb_speculation(self, msg: Message, lang: str, conv: dict) -> Optional[_KBSpeculation]:
+        if not self._looks_like_faq(msg, conv):
+            return None
+        try:
+            future = shared_executor().submit(
+                self.kb.retrieve_for_answer,
+                question=msg.body,
+                tenant_id=msg.tenant_id,
+                language_code=lang,
+            )
+        except Exception as e:
+            logger.warning({"component": "routing_service", "event": "kb_speculation_submit_failed", "err": str(e)})
+            return None
+        self._speculation_metric("KBSpeculationStarted", msg)
+        return _KBSpeculation(future, time.monotonic())
+
+    def _take_kb_speculation(self, spec: Optional[_KBSpeculation], msg: Message) -> Optional[KBRetrieval]:
+        """Wynik spekulacji dla ścieżki FAQ (None = answer_ai zrobi retrieval sam)."""
+        if spec is None:
+            return None
+        spec.used = True
+        # nie czekamy dłużej niż trwałby sam retrieval ani po deadline invokacji
+        timeout_s = float(getattr(settings, "openai_timeout_s", 6) or 6)
+        left = remaining_s()
+        if left is not None:
+            timeout_s = min(timeout_s, left)
+        try:
+            result = spec.future.result(timeout=timeout_s)
+        except FutureTimeoutError:
+            # zadanie jeszcze w kolejce puli nie musi już startować
+            spec.future.cancel()
+            logger.warning({"component": "routing_service", "event": "kb_speculation_timeout", "timeout_s": round(timeout_s, 3)})
+            self._speculation_metric("KBSpeculationFailed", msg, reason="timeout")
+            return None
+        except Exception as e:
+            logger.warning({"component": "routing_service", "event": "kb_speculation_failed", "err": str(e)})
+            self._speculation_metric("KBSpeculationFailed", msg)
+            return None
+        self._speculation_metric("KBSpeculationUsed", msg)
+        return result
+
+    def _finish_kb_speculation(self, spec: Optional[_KBSpeculation], msg: Message, intent: str) -> None:
+        """Spekulacja niewykorzystana (intencja inna niż FAQ) – liczymy zmarnowaną pracę."""
+        if spec is None or spec.used:
+            return
+        cancelled = spec.future.cancel()
+        self._speculation_metric("KBSpeculationWasted", msg, intent=intent, cancelled=cancelled)
+        if not cancelled:
+            spec.future.add_done_callback(
+                lambda _f: self._speculation_metric(
+                    "KBSpeculationWastedMs",
+                    msg,
+                    value=(time.monotonic() - spec.started) * 1000.0,
+                    unit="Milliseconds",
+                    intent=intent,
+                )
+            )
+
+    @staticmethod
+    def _prefix_end(full: str, sent: str) -> Optional[int]:
+        """Indeks w `full` za treścią `sent` (różnice w białych znakach pomijamy) albo None."""
+        i = 0
+        for ch in sent:
+            if ch.isspace():
+                continue
+            while i < len(full) and full[i].isspace():
+                i += 1
+            if i >= len(full) or full[i] != ch:
+                return None
+            i += 1
+        return i
+
+    def _remainder_after_streamed(self, body: Optional[str], sent: str) -> Optional[str]:
+        """Część odpowiedzi FAQ, której nie wysłaliśmy jeszcze jako wczesny fragment."""
+        full = (body or "").strip()
+        end = self._prefix_end(full, sent)
+        if end is not None:
+            return full[end:].strip()
+        # początek odpowiedzi różni się od wysłanego fragmentu – klient ma już
+        # pierwszy fragment, więc wysyłamy tylko to, co jest za jego odpowiednikiem
+        logger.warning({"component": "routing_service", "event": "streamed_prefix_mismatch"})
+        # (granica zdania/akapitu najbliższa długości wysłanego fragmentu)
+        bounds = [m.end() for m in _RE_SEGMENT_BOUNDARY.finditer(full)]
+        if not bounds:
+            return ""
+        cut = min(bounds, key=lambda b: abs(b - len(sent)))
+        return full[cut:].strip()
+
+    def _speculation_metric(self, name: str, msg: Message, *, value: float = 1.0, unit: str = "Count", **fields) -> None:
+        try:
+            self.metrics.incr(
+                name,
+                value=value,
+                unit=unit,
+                tenant_id=msg.tenant_id,
+                component="routing_service",
+                **fields,
+            )
+        except Exception as e:
+            logger.warning({"component": "routing_service", "event": "metric_failed", "metric": name, "err": str(e)})
+
+    def handle(self, msg: Message, emit: Optional[Callable[[Action], None]] = None) -> List[Action]:
         """
         Przetwarza pojedynczą wiadomość biznesową i zwraca listę akcji do wykonania.
-        """
-        text_raw = (msg.body or "").strip()
 
+        emit – opcjonalny callback do natychmiastowej publikacji akcji, zanim flow
+        się skończy (np. pierwszy akapit streamowanej odpowiedzi FAQ); akcje
+        przekazane do emit nie są już zwracane.
+        """
         # 1) Język
         lang = self.language.resolve_and_persist_language(msg)
 
@@ -215,15 +395,29 @@ class RoutingService:
         channel = msg.channel or DEFAULT_CHANNEL
         channel_user_id = msg.channel_user_id or msg.from_phone
         conv = self.conv.get_conversation(msg.tenant_id, channel, channel_user_id) or {}
-        
-        state = conv.get("state_machine_status")
-
-        now_ts = int(time.time())
-        last_ts = int(conv.get("updated_at") or 0)
-        gap = now_ts - last_ts if last_ts else 0
-        is_new_session = last_ts == 0 or gap > SESSION_TIMEOUT_SECONDS
 
         # 3) Stany specjalne – bez NLU
+        special = self._handle_special_states(msg, lang, conv)
+        if special is not None:
+            return special
+
+        # 4) NLU – klasyfikacja intencji (+ opcjonalnie spekulatywny retrieval KB
+        #    na shared_executor). Routing po intencji jest wydzielony do _route_intent,
+        #    żeby każde wyjście (return z dowolnej gałęzi, wyjątek) rozliczyło spekulację.
+        spec = self._start_kb_speculation(msg, lang, conv)
+        intent = None
+        try:
+            intent, slots, _ = self._classify_intent(msg, lang)
+            return self._route_intent(msg, lang, conv, intent, slots, kb_speculation=spec, emit=emit)
+        finally:
+            self._finish_kb_speculation(spec, msg, intent)
+
+    def _handle_special_states(self, msg: Message, lang: str, conv: dict) -> Optional[List[Action]]:
+        """Stany maszyny obsługiwane bez NLU; None = idziemy dalej do NLU."""
+        channel = msg.channel or DEFAULT_CHANNEL
+        channel_user_id = msg.channel_user_id or msg.from_phone
+        state = conv.get("state_machine_status")
+
         #3x) Ticket: czekamy na komentarz uzytkownika
         if state == STATE_AWAITING_TICKET_COMMENT:    
             conv_key = self._conv_key(msg)
@@ -278,8 +472,24 @@ class RoutingService:
         if pending_response is not None:
             return pending_response
 
-        # 4) NLU – klasyfikacja intencji
-        intent, slots, _ = self._classify_intent(msg, lang)
+        return None
+
+    def _route_intent(
+        self,
+        msg: Message,
+        lang: str,
+        conv: dict,
+        intent: str,
+        slots: dict,
+        kb_speculation: Optional[_KBSpeculation] = None,
+        emit: Optional[Callable[[Action], None]] = None,
+    ) -> List[Action]:
+        """Routing po intencji (od kroku 4x).
+
+        kb_speculation – opcjonalnie odpalony równolegle z NLU retrieval KB,
+        emit – publikacja wczesnej części odpowiedzi FAQ (streaming).
+        """
+        is_new_session = self._is_new_session(conv)
         
         # 4x) Fast-path intents (bez LLM/CRM/KB) – tylko szablony.
         #      Zero hardkodowania: treść kontroluje TemplatesRepo.
@@ -314,7 +524,6 @@ class RoutingService:
 
             # historia potrzebna nam tylko jako fallback do answer_ai
             if not is_new_session and self.messages:
-
                 history_items = self._fetch_history_items(msg.tenant_id, conv_key)
                 for item in reversed(history_items):
                     if item.get("direction") != "inbound":
@@ -327,15 +536,43 @@ class RoutingService:
 
             # 3) Fallback – jeśli NLU nie podało topic albo FAQ nie ma wpisu,
             #    używamy dotychczasowego AI-FAQ (answer_ai) z historią
-            ai_body = self.kb.answer_ai(
+            answer_kwargs = {}
+            exact = None
+            if kb_speculation is not None:
+                # znane pytanie z indeksu FAQ nie czeka na embedding/Pinecone spekulacji
+                # (niewykorzystaną spekulację policzy _finish_kb_speculation)
+                exact = self.kb.exact_answer(msg.body, msg.tenant_id, lang)
+                if not exact:
+                    answer_kwargs["prefetched"] = self._take_kb_speculation(kb_speculation, msg)
+            early: list[str] = []
+            if emit is not None:
+                def _on_partial(segment: str) -> None:
+                    # ta sama normalizacja co dla pełnej odpowiedzi
+                    segment = (self.kb.normalize_ai_answer(segment) or "").strip()
+                    if not segment:
+                        return
+                    emit(self._reply(msg, lang, segment))
+                    early.append(segment)
+
+                answer_kwargs["on_partial"] = _on_partial
+            ai_body = exact or self.kb.answer_ai(
                 question=msg.body,
                 tenant_id=msg.tenant_id,
                 language_code=lang,
                 history=chat_history,
+                **answer_kwargs,
             )
 
             if ai_body:
                 body = self.kb.normalize_ai_answer(ai_body)           
+                if early:
+                    body = self._remainder_after_streamed(body, early[0])
+                    if not body:
+                        return []
+            elif early:
+                # użytkownik dostał już początek odpowiedzi – "brak informacji" by mu przeczył
+                logger.warning({"component": "routing_service", "event": "faq_stream_no_final_answer", "tenant_id": msg.tenant_id})
+                return []
             else:
                 # Deterministic fallback (no extra LLM calls).
                 body = self.tpl.render_named(msg.tenant_id, "faq_no_info", lang, {})         
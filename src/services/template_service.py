@@ -7,9 +7,9 @@ import time
 
 
 class TemplateService:
-    def __init__(self, repo: TemplatesRepo | None = None) -> None:
+    def __init__(self, repo: TemplatesRepo | None = None, tenants: TenantsRepo | None = None) -> None:
         self.repo = repo or TemplatesRepo()
-        self.tenants = TenantsRepo()
+        self.tenants = tenants or TenantsRepo()
         # Prosty cache w pamięci procesu Lambdy.
         # Znacząco redukuje liczbę zapytań do DDB na ścieżce krytycznej latency.
         self._cache: dict[tuple[str, str, str], tuple[dict, float]] = {}
@@ -42,6 +42,19 @@ class TemplateService:
             self._cache[key] = (item, now)
         return item
 
+    def prime(self, tenant_id: str, names: list[str], language_code: str | None) -> int:
+        """Wczytuje szablony do cache procesu (warmup); zwraca liczbę znalezionych."""
+        langs = [language_code] if language_code else []
+        if language_code and "-" in language_code:
+            langs.append(language_code.split("-", 1)[0])
+        found = 0
+        for name in names:
+            for lang in langs:
+                if self._try_get_template(tenant_id, name, lang):
+                    found += 1
+                    break
+        return found
+
     def render_named(
         self,
         tenant_id: str,
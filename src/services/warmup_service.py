@@ -0,0 +1,137 @@
+"""
+Priming cache'y procesu przed pierwszą wiadomością (warm-up).
+
+Bez tego pierwszy użytkownik obsłużony przez nowy kontener (scale-out) płaci
+za wszystkie zimne odczyty: peppery z SSM, konfigurację tenanta (DDB + SSM),
+szablony, FAQ z S3 z indeksem pytań oraz budowę grafu serwisów i klienta
+OpenAI. WarmupService robi to z góry – przy inicjalizacji Lambdy
+(WARMUP_ON_INIT) albo na jawne zdarzenie {"warmup": true} – dla tenantów,
+których kontener najpewniej obsłuży (WARMUP_TENANTS). Bez listy tenantów init
+nie primuje niczego, żeby cold start nie budował grafu NLU/KB/CRM na zapas.
+Cache FAQ i szablonów mają TTL, więc priming przyspiesza pierwsze wiadomości,
+ale nie utrwala treści.
+
+Tenant z language_code="auto" primuje FAQ we wszystkich językach, dla których
+ma plik FAQ w S3 (język rozmowy wynika dopiero z detekcji).
+
+Każdy krok jest mierzony i niezależny: błąd jednego tenanta/kroku jest
+logowany i nie przerywa reszty. WARMUP_BUDGET_S sprawdzamy przed każdym
+krokiem tenanta (także per język), więc tenant "auto" z wieloma plikami FAQ
+nie przeciąga initu ponad budżet o więcej niż jeden krok.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from ..common.config import settings
+from ..common.logging import logger
+from ..common.security import preload_peppers
+from .container import ServiceContainer, default_container
+from .metrics_service import MetricsService
+from .tenant_config_service import TenantConfigService, default_tenant_config_service
+
+# szablony z najczęstszych ścieżek routera (clarify, brak odpowiedzi w FAQ, CRM)
+DEFAULT_WARMUP_TEMPLATES = ("clarify_generic", "faq_no_info", "crm_member_not_linked")
+
+
+def _env_list(name: str, default: str = "") -> List[str]:
+    return [x.strip() for x in os.getenv(name, default).split(",") if x.strip()]
+
+
+def warmup_on_init_enabled() -> bool:
+    enabled = os.getenv("WARMUP_ON_INIT", "false").lower() in ("1", "true", "yes")
+    return enabled and bool(_env_list("WARMUP_TENANTS"))
+
+
+class WarmupService:
+    def __init__(
+        self,
+        container: ServiceContainer | None = None,
+        tenant_config: TenantConfigService | None = None,
+        metrics: MetricsService | None = None,
+    ) -> None:
+        self.container = container or default_container()
+        self.tenant_cfg = tenant_config or default_tenant_config_service()
+        self.metrics = metrics or self.container.metrics()
+        # lista tenantów albo "*" (wszyscy z tabeli Tenants, do WARMUP_MAX_TENANTS)
+        self.tenants = _env_list("WARMUP_TENANTS")
+        self.max_tenants = int(os.getenv("WARMUP_MAX_TENANTS", "20"))
+        # limit czasu na tenantów – init Lambdy nie może się przeciągać
+        self.budget_s = float(os.getenv("WARMUP_BUDGET_S", "3"))
+        self.templates = _env_list("WARMUP_TEMPLATES") or list(DEFAULT_WARMUP_TEMPLATES)
+
+    def _tenant_ids(self, tenant_ids: Optional[List[str]]) -> List[str]:
+        ids = list(tenant_ids) if tenant_ids is not None else self.tenants
+        if ids == ["*"]:
+            ids = [t.get("tenant_id") for t in self.container.tenants().list_all() if t.get("tenant_id")]
+        return ids[: self.max_tenants]
+
+    def _languages(self, tenant_id: str, cfg: Dict[str, Any]) -> List[str]:
+        lang = (cfg.get("language_code") or "").strip()
+        if lang.lower() == "auto":
+            return self.container.kb().faq_languages(tenant_id) or [settings.get_default_language()]
+        return [lang or settings.get_default_language()]
+
+    def _step(
+        self,
+        report: Dict[str, Any],
+        name: str,
+        fn: Callable[[], Any],
+        tenant_id: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> Any:
+        if deadline is not None and time.perf_counter() > deadline:
+            report["skipped_steps"] = report.get("skipped_steps", 0) + 1
+            return None
+        start = time.perf_counter()
+        try:
+            return fn()
+        except Exception as e:
+            report["errors"] += 1
+            logger.warning({"component": "warmup", "event": "step_failed", "step": name, "tenant_id": tenant_id, "err": str(e)})
+            return None
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            report["steps_ms"][name] = round(report["steps_ms"].get(name, 0.0) + ms, 1)
+
+    def prime(self, tenant_ids: Optional[List[str]] = None, *, source: str = "init") -> Dict[str, Any]:
+        """Wypełnia cache procesu; zwraca raport (czasy kroków w ms, tenanci, liczba błędów)."""
+        start = time.perf_counter()
+        report: Dict[str, Any] = {"source": source, "tenants": [], "steps_ms": {}, "errors": 0}
+        c = self.container
+
+        self._step(report, "peppers", preload_peppers)
+        # graf serwisów routera + klient OpenAI (import SDK, klient HTTP)
+        self._step(report, "services", lambda: (c.nlu(), c.kb(), c.tpl(), c.language(), c.crm_flow()))
+
+        # budżet dotyczy pracy per tenant; peppery i graf serwisów są wspólne
+        deadline = time.perf_counter() + self.budget_s
+        for tenant_id in self._step(report, "tenant_list", lambda: self._tenant_ids(tenant_ids)) or []:
+            if time.perf_counter() > deadline:
+                report["skipped_tenants"] = report.get("skipped_tenants", 0) + 1
+                continue
+            cfg = self._step(report, "tenant_config", lambda: self.tenant_cfg.get(tenant_id), tenant_id, deadline) or {}
+            langs = self._step(report, "faq_languages", lambda: self._languages(tenant_id, cfg), tenant_id, deadline) or [settings.get_default_language()]
+            primed_langs: List[str] = []
+            faq_questions = 0
+            for lang in langs:
+                if time.perf_counter() > deadline:
+                    report["skipped_langs"] = report.get("skipped_langs", 0) + len(langs) - len(primed_langs)
+                    break
+                self._step(report, "templates", lambda: c.tpl().prime(tenant_id, self.templates, lang), tenant_id, deadline)
+                faq_questions += self._step(report, "faq_index", lambda: c.kb().prime(tenant_id, lang), tenant_id, deadline) or 0
+                primed_langs.append(lang)
+            report["tenants"].append({"tenant_id": tenant_id, "langs": primed_langs, "faq_questions": faq_questions})
+
+        report["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info({"component": "warmup", "event": "primed", **report})
+        try:
+            self.metrics.timing_ms("WarmupDurationMs", report["duration_ms"], component="warmup", source=source)
+            for name, ms in report["steps_ms"].items():
+                self.metrics.timing_ms("WarmupStepMs", ms, component="warmup", step=name, source=source)
+        except Exception:
+            pass
+        return report
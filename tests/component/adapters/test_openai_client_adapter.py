@@ -125,3 +125,196 @@ def test_chat_retries_and_returns_fallback_on_api_error(monkeypatch):
     note = data["slots"].get("note", "")
     # Akceptujemy oba możliwe warianty komunikatu (w zależności od implementacji)
     assert "LLM unavailable" in note or "LLM error" in note
+
+
+def test_chat_caps_timeout_to_deadline_and_skips_retry_without_time(monkeypatch):
+    from src.common import deadline
+
+    class DummyConnError(Exception):
+        pass
+
+    monkeypatch.setattr(oa_mod, "APIConnectionError", DummyConnError)
+    monkeypatch.setattr(oa_mod.time, "sleep", lambda *_a, **_k: None)
+    client = oa_mod.OpenAIClient(api_key="dummy", model="gpt-4o-mini")
+
+    timeouts = []
+
+    def fail(messages, model=None, max_tokens=256, timeout_s=None):
+        timeouts.append(timeout_s)
+        raise DummyConnError("timeout")
+
+    monkeypatch.setattr(client, "_chat_once", fail)
+    deadline.set_deadline(0.7)
+
+    data = json.loads(client.chat([{"role": "user", "content": "hi"}]))
+    assert data["intent"] == "clarify"
+    # jedno wywołanie z timeoutem przyciętym do deadline'u, bez retry (brak czasu na backoff)
+    assert len(timeouts) == 1
+    assert timeouts[0] <= 0.7
+
+
+def test_chat_returns_fallback_without_calling_api_when_circuit_open(monkeypatch):
+    from src.common.circuit_breaker import CircuitBreaker
+
+    breaker = CircuitBreaker("t", min_calls=1, open_seconds=60)
+    breaker.record(False)
+    client = oa_mod.OpenAIClient(api_key="dummy", model="gpt-4o-mini", breaker=breaker)
+
+    def boom(*args, **kwargs):
+        raise AssertionError("API should not be called")
+
+    monkeypatch.setattr(client, "_chat_once", boom)
+
+    assert client.circuit_open
+    data = json.loads(client.chat([{"role": "user", "content": "hi"}]))
+    assert "circuit open" in data["slots"]["note"]
+
+
+def test_chat_hedges_slow_request(monkeypatch):
+    import threading
+
+    monkeypatch.setattr(settings, "openai_hedge_enabled", True, raising=False)
+    monkeypatch.setattr(settings, "openai_hedge_delay_ms", 50, raising=False)
+    client = oa_mod.OpenAIClient(api_key="dummy", model="gpt-4o-mini")
+
+    release = threading.Event()
+    calls = []
+
+    def once(messages, model=None, max_tokens=256, timeout_s=None):
+        calls.append(timeout_s)
+        if len(calls) == 1:
+            release.wait(5)  # pierwsze żądanie "wisi"
+            return '{"answer": "slow"}'
+        return '{"answer": "fast"}'
+
+    monkeypatch.setattr(client, "_chat_once", once)
+    try:
+        assert client.chat([{"role": "user", "content": "hi"}]) == '{"answer": "fast"}'
+    finally:
+        release.set()
+    assert len(calls) == 2
+
+
+def _half_open_breaker():
+    from src.common.circuit_breaker import HALF_OPEN, CircuitBreaker
+
+    breaker = CircuitBreaker("t", min_calls=1, open_seconds=0)
+    breaker.record(False)
+    assert breaker.state == HALF_OPEN
+    return breaker
+
+
+def test_chat_records_unexpected_exception_on_half_open_probe(monkeypatch):
+    from src.common.circuit_breaker import OPEN
+
+    breaker = _half_open_breaker()
+    breaker.open_seconds = 60
+    client = oa_mod.OpenAIClient(api_key="dummy", model="gpt-4o-mini", breaker=breaker)
+
+    def empty_choices(*args, **kwargs):
+        raise IndexError("list index out of range")
+
+    monkeypatch.setattr(client, "_chat_hedged", empty_choices)
+
+    with pytest.raises(IndexError):
+        client.chat([{"role": "user", "content": "hi"}])
+    # wynik próby zapisany – obwód nie zostaje w half-open z wiszącą rezerwacją
+    assert breaker.state == OPEN
+
+
+def test_chat_releases_half_open_probe_when_deadline_hits_before_call(monkeypatch):
+    breaker = _half_open_breaker()
+    client = oa_mod.OpenAIClient(api_key="dummy", model="gpt-4o-mini", breaker=breaker)
+
+    def no_time(*args, **kwargs):
+        raise oa_mod.DeadlineExceeded("no time")
+
+    monkeypatch.setattr(oa_mod, "bounded_timeout", no_time)
+    client.chat([{"role": "user", "content": "hi"}])
+
+    assert breaker.allow()
+
+
+def test_chat_stream_releases_probe_when_stream_is_abandoned():
+    breaker = _half_open_breaker()
+    client = oa_mod.OpenAIClient(api_key="dummy", model="gpt-4o-mini", breaker=breaker)
+
+    def delta(text):
+        return type("E", (), {"choices": [type("C", (), {"delta": type("D", (), {"content": text})()})()]})()
+
+    class Completions:
+        def create(self, **kwargs):
+            return iter([delta('{"answer": "a'), delta('bc"}')])
+
+    client.client = type("Client", (), {"chat": type("Chat", (), {"completions": Completions()})()})()
+
+    stream = client.chat_stream([{"role": "user", "content": "hi"}])
+    assert next(stream) == '{"answer": "a'
+    stream.close()
+
+    assert breaker.allow()
+
+
+def _stream_client(events, breaker=None):
+    from src.common.circuit_breaker import CircuitBreaker
+
+    breaker = breaker or CircuitBreaker("t", min_calls=1, open_seconds=60)
+    client = oa_mod.OpenAIClient(api_key="dummy", model="gpt-4o-mini", breaker=breaker)
+
+    class Completions:
+        def create(self, **kwargs):
+            return events()
+
+    client.client = type("Client", (), {"chat": type("Chat", (), {"completions": Completions()})()})()
+    return client
+
+
+def _delta(text):
+    return type("E", (), {"choices": [type("C", (), {"delta": type("D", (), {"content": text})()})()]})()
+
+
+def test_chat_stream_stops_reading_at_invocation_deadline(monkeypatch):
+    import time
+    from src.common import deadline
+    from src.common.circuit_breaker import OPEN
+
+    read = []
+    closed = []
+
+    def slow_events():
+        try:
+            read.append(1)
+            yield _delta('{"answer": "a')
+            time.sleep(0.65)  # kolejny fragment przychodzi już po deadline
+            read.append(2)
+            yield _delta("b")
+            read.append(3)
+            yield _delta('c"}')
+        finally:
+            closed.append(True)
+
+    client = _stream_client(slow_events)
+    deadline.set_deadline(0.6)
+
+    parts = list(client.chat_stream([{"role": "user", "content": "hi"}]))
+
+    # wywołujący dostaje to, co przyszło przed deadline; dalej nie czytamy
+    assert parts == ['{"answer": "a']
+    assert read == [1, 2]
+    assert closed == [True]
+    assert client.breaker.state == OPEN
+
+
+def test_chat_stream_records_mid_stream_failure_and_ends(monkeypatch):
+    from src.common.circuit_breaker import OPEN
+
+    def broken_events():
+        yield _delta('{"answer": "a')
+        raise ConnectionResetError("peer closed connection")
+
+    client = _stream_client(broken_events)
+
+    parts = list(client.chat_stream([{"role": "user", "content": "hi"}]))
+
+    assert parts == ['{"answer": "a']
+    assert client.breaker.state == OPEN
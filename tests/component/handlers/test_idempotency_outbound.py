@@ -11,7 +11,7 @@ def test_outbound_sender_idempotency_skips_duplicates(monkeypatch, aws_stack):
 
     # 1) Mock idempotency: pierwsze acquire=True, drugie=False
     it = iter([True, False])
-    monkeypatch.setattr(outbound_handler.IDEMPOTENCY, "try_acquire", lambda *a, **k: next(it))
+    monkeypatch.setattr(outbound_handler.IDEMPOTENCY, "try_acquire_many", lambda keys, metas=None: [next(it) for _ in keys])
 
     # 2) Mock WhatsApp via factory
     calls = []
@@ -1,4 +1,5 @@
 import json
+import types
 
 from src.lambdas.message_router import handler
 
@@ -14,7 +15,7 @@ class DummyRouter:
         self.actions_to_return = actions
         self.calls = []
 
-    def handle(self, msg):
+    def handle(self, msg, emit=None):
         self.calls.append(msg)
         return self.actions_to_return
 
@@ -163,4 +164,170 @@ def test_message_router_generates_unique_idempotency_key_per_reply(monkeypatch):
     p2 = json.loads(sent_messages[1]["MessageBody"])
     assert p1["idempotency_key"] != p2["idempotency_key"]
     assert p1["idempotency_key"].startswith("out#")
-    assert p2["idempotency_key"].startswith("out#")
\ No newline at end of file
+    assert p2["idempotency_key"].startswith("out#")
+    # zwykłe reply idą od razu, bez znaczników kolejności
+    assert "DelaySeconds" not in sent_messages[0] and "DelaySeconds" not in sent_messages[1]
+    assert "seq" not in p1 and "order_key" not in p2
+
+
+def test_message_router_delays_remainder_after_streamed_segment(monkeypatch):
+    class StreamingRouter:
+        def handle(self, msg, emit=None):
+            emit(DummyAction({"to": "whatsapp:+481", "body": "Pierwszy akapit.", "tenant_id": "default"}))
+            return [DummyAction({"to": "whatsapp:+481", "body": "Reszta odpowiedzi.", "tenant_id": "default"})]
+
+    monkeypatch.setattr(handler, "ROUTER", StreamingRouter())
+    monkeypatch.setattr(handler, "OUTBOUND_STREAM_REMAINDER_DELAY_S", 3)
+    monkeypatch.setattr(handler, "MESSAGES", types.SimpleNamespace(log_message=lambda **kw: None))
+    sent_messages = []
+
+    class DummySQS:
+        def send_message(self, **kwargs):
+            sent_messages.append(kwargs)
+
+    monkeypatch.setattr(handler, "sqs_client", lambda: DummySQS(), raising=False)
+    monkeypatch.setenv("OutboundQueueUrl", "dummy-outbound-url")
+
+    event = {"Records": [{"body": json.dumps({"event_id": "evt-stream-1", "tenant_id": "default", "body": "Jak działa klub?"})}]}
+    assert handler.lambda_handler(event, None) == {"statusCode": 200}
+
+    first, rest = sent_messages
+    assert "DelaySeconds" not in first
+    assert rest["DelaySeconds"] == 3
+    assert json.loads(first["MessageBody"])["idempotency_key"] == "out#evt-stream-1#reply#0"
+    assert json.loads(rest["MessageBody"])["idempotency_key"] == "out#evt-stream-1#reply#1"
+
+def test_message_router_processes_groups_in_parallel_and_stops_failed_group(monkeypatch):
+    class FailingRouter:
+        def __init__(self):
+            self.calls = []
+
+        def handle(self, msg, emit=None):
+            self.calls.append(msg.body)
+            if msg.body == "a-2":
+                raise RuntimeError("boom")
+            return []
+
+    router = FailingRouter()
+    monkeypatch.setattr(handler, "ROUTER", router)
+    monkeypatch.setattr(handler, "ROUTER_GROUP_CONCURRENCY", 4)
+    monkeypatch.setattr(handler, "_publish_actions", lambda actions, original_body, idx_offset=0, delay_s=0: None)
+    monkeypatch.setattr(handler, "MESSAGES", types.SimpleNamespace(log_message=lambda **kw: None))
+
+    def rec(mid, gid, seq, body):
+        return {
+            "messageId": mid,
+            "body": json.dumps({"event_id": mid, "conversation_id": gid, "tenant_id": "default", "body": body}),
+            "attributes": {"MessageGroupId": gid, "SequenceNumber": str(seq), "MessageDeduplicationId": mid},
+        }
+
+    event = {
+        "Records": [
+            rec("a1", "conv-a", 1, "a-1"), rec("b1", "conv-b", 1, "b-1"),
+            rec("a2", "conv-a", 2, "a-2"), rec("b2", "conv-b", 2, "b-2"),
+            rec("a3", "conv-a", 3, "a-3"), rec("b3", "conv-b", 3, "b-3"),
+        ]
+    }
+
+    res = handler.lambda_handler(event, None)
+
+    # a-3 nie jest przetwarzane po porażce a-2 – wraca do SQS razem z a-2
+    assert res == {"batchItemFailures": [{"itemIdentifier": "a2"}, {"itemIdentifier": "a3"}]}
+    assert [b for b in router.calls if b.startswith("a")] == ["a-1", "a-2"]
+    assert [b for b in router.calls if b.startswith("b")] == ["b-1", "b-2", "b-3"]
+
+    # zwolnione klucze idempotencji -> retry a3 jest przetwarzany
+    router.calls.clear()
+    res = handler.lambda_handler({"Records": event["Records"][4:5]}, None)
+    assert res == {"statusCode": 200}
+    assert router.calls == ["a-3"]
+
+
+def test_message_router_redelivered_failed_record_is_routed(monkeypatch):
+    class FlakyRouter:
+        def __init__(self):
+            self.calls = []
+            self.fail = True
+
+        def handle(self, msg, emit=None):
+            self.calls.append(msg.body)
+            if self.fail:
+                raise RuntimeError("boom")
+            return []
+
+    router = FlakyRouter()
+    monkeypatch.setattr(handler, "ROUTER", router)
+    monkeypatch.setattr(handler, "_publish_actions", lambda actions, original_body, idx_offset=0, delay_s=0: None)
+    monkeypatch.setattr(handler, "MESSAGES", types.SimpleNamespace(log_message=lambda **kw: None))
+
+    event = {
+        "Records": [
+            {"messageId": "rf1", "body": json.dumps({"event_id": "route-fail-1", "tenant_id": "default", "body": "hej"})},
+        ]
+    }
+
+    assert handler.lambda_handler(event, None) == {"batchItemFailures": [{"itemIdentifier": "rf1"}]}
+
+    # redelivery tego samego rekordu nie jest odrzucany jako duplikat
+    router.fail = False
+    assert handler.lambda_handler(event, None) == {"statusCode": 200}
+    assert router.calls == ["hej", "hej"]
+
+
+def test_message_router_defers_records_when_invocation_deadline_is_near(monkeypatch):
+    class Router:
+        def __init__(self):
+            self.calls = []
+
+        def handle(self, msg, emit=None):
+            self.calls.append(msg.body)
+            return []
+
+    class Ctx:
+        def get_remaining_time_in_millis(self):
+            return 2500
+
+    router = Router()
+    monkeypatch.setattr(handler, "ROUTER", router)
+    monkeypatch.setattr(handler, "ROUTER_MIN_RECORD_S", 2.0)
+    monkeypatch.setattr(handler, "_publish_actions", lambda actions, original_body, idx_offset=0, delay_s=0: None)
+    monkeypatch.setattr(handler, "MESSAGES", types.SimpleNamespace(log_message=lambda **kw: None))
+    monkeypatch.setenv("LAMBDA_DEADLINE_RESERVE_MS", "1000")
+
+    event = {
+        "Records": [
+            {"messageId": "m1", "body": json.dumps({"event_id": "dl-1", "tenant_id": "default", "body": "hej"})},
+        ]
+    }
+
+    # 2.5s - 1s rezerwy < ROUTER_MIN_RECORD_S -> rekord wraca do SQS bez routingu
+    res = handler.lambda_handler(event, Ctx())
+    assert res == {"batchItemFailures": [{"itemIdentifier": "m1"}]}
+    assert router.calls == []
+
+    # klucz idempotencji zwolniony -> retry z pełnym budżetem przechodzi
+    res = handler.lambda_handler(event, None)
+    assert res == {"statusCode": 200}
+    assert router.calls == ["hej"]
+
+
+def test_message_router_warmup_event_primes_without_routing(monkeypatch):
+    primed = []
+
+    class FakeWarmup:
+        def __init__(self, **kwargs):
+            pass
+
+        def prime(self, tenant_ids=None, *, source="init"):
+            primed.append((tenant_ids, source))
+            return {"source": source, "tenants": [], "steps_ms": {}, "errors": 0}
+
+    router = DummyRouter([])
+    monkeypatch.setattr(handler, "WarmupService", FakeWarmup)
+    monkeypatch.setattr(handler, "ROUTER", router)
+
+    result = handler.lambda_handler({"warmup": True, "tenant_ids": ["t1"]}, None)
+
+    assert result["warmup"]["source"] == "event"
+    assert primed == [(["t1"], "event")]
+    assert router.calls == []
@@ -15,7 +15,7 @@ def test_lambda_bad_json_is_skipped(monkeypatch):
 
     # 1) Mock idempotency: pierwsze acquire=True, drugie=False
     it = iter([True, False])
-    monkeypatch.setattr(handler.IDEMPOTENCY, "try_acquire", lambda *a, **k: next(it))
+    monkeypatch.setattr(handler.IDEMPOTENCY, "try_acquire_many", lambda keys, metas=None: [next(it) for _ in keys])
 
     # 2) Mock WhatsApp client via factory
     calls = []
@@ -52,7 +52,7 @@ def test_lambda_invalid_payload_missing_to(monkeypatch):
 
     # 1) Mock idempotency: pierwsze acquire=True, drugie=False
     it = iter([True, False])
-    monkeypatch.setattr(handler.IDEMPOTENCY, "try_acquire", lambda *a, **k: next(it))
+    monkeypatch.setattr(handler.IDEMPOTENCY, "try_acquire_many", lambda keys, metas=None: [next(it) for _ in keys])
 
     # 2) Mock WhatsApp client via factory
     calls = []
@@ -85,7 +85,7 @@ def test_lambda_whatsapp_exception_is_caught(monkeypatch):
 
     # 1) Mock idempotency: pierwsze acquire=True, drugie=False
     it = iter([True, False])
-    monkeypatch.setattr(handler.IDEMPOTENCY, "try_acquire", lambda *a, **k: next(it))
+    monkeypatch.setattr(handler.IDEMPOTENCY, "try_acquire_many", lambda keys, metas=None: [next(it) for _ in keys])
 
     # 2) Mock WhatsApp client via factory
     calls = []
@@ -110,3 +110,138 @@ def test_lambda_whatsapp_exception_is_caught(monkeypatch):
     assert res["statusCode"] == 200
     # brak crasha, a klient WhatsApp był wywołany
     assert len(calls) == 1
+
+
+def test_lambda_batch_sends_conversations_concurrently_in_order(monkeypatch):
+    os.environ["DEV_MODE"] = "true"
+    monkeypatch.setattr(handler.IDEMPOTENCY, "try_acquire_many", lambda keys, metas=None: [True for _ in keys])
+    released = []
+    monkeypatch.setattr(handler.IDEMPOTENCY, "release", released.append)
+    monkeypatch.setattr(handler, "OUTBOUND_SEND_CONCURRENCY", 4)
+
+    calls = []
+
+    class DummyWhatsApp:
+        def send_text(self, to, body):
+            calls.append((to, body))
+            if body == "b-2":
+                raise RuntimeError("provider down")
+            return {"status": "OK", "sid": "fake"}
+
+    class DummyFactory:
+        def whatsapp(self, tenant_id):
+            return DummyWhatsApp()
+
+    monkeypatch.setattr(handler, "clients", DummyFactory())
+    messages = [
+        ("a", "whatsapp:+48111"), ("b", "whatsapp:+48222"),
+        ("a", "whatsapp:+48111"), ("b", "whatsapp:+48222"),
+        ("a", "whatsapp:+48111"), ("b", "whatsapp:+48222"),
+    ]
+    event = {
+        "Records": [
+            {"messageId": f"m{i}", "body": json.dumps({"to": to, "body": f"{conv}-{i // 2 + 1}"})}
+            for i, (conv, to) in enumerate(messages)
+        ]
+    }
+
+    res = handler.lambda_handler(event, None)
+
+    # porażka b-2 zatrzymuje rozmowę b: b-3 wraca do kolejki razem z nią, bez wysyłki
+    assert res == {"batchItemFailures": [{"itemIdentifier": "m3"}, {"itemIdentifier": "m5"}]}
+    assert released == ["snd#out#default#m3", "snd#out#default#m5"]
+    # w obrębie rozmowy kolejność zachowana, inne rozmowy nie są wstrzymane
+    assert [b for to, b in calls if to.endswith("111")] == ["a-1", "a-2", "a-3"]
+    assert [b for to, b in calls if to.endswith("222")] == ["b-1", "b-2"]
+
+
+def test_lambda_failed_send_is_delivered_on_redelivery(monkeypatch):
+    os.environ["DEV_MODE"] = "true"
+    calls = []
+    outage = {"on": True}
+
+    class DummyWhatsApp:
+        def send_text(self, to, body):
+            if outage["on"] and body == "r-1":
+                raise RuntimeError("provider down")
+            calls.append(body)
+            return {"status": "OK", "sid": "fake"}
+
+    monkeypatch.setattr(handler, "clients", type("F", (), {"whatsapp": lambda self, tenant_id: DummyWhatsApp()})())
+    records = [
+        {"messageId": f"redeliver-{i}", "body": json.dumps({"to": "whatsapp:+48444", "body": f"r-{i}"})}
+        for i in (1, 2)
+    ]
+
+    res = handler.lambda_handler({"Records": records}, None)
+    assert res == {"batchItemFailures": [{"itemIdentifier": "redeliver-1"}, {"itemIdentifier": "redeliver-2"}]}
+    assert calls == []
+
+    # redelivery przez SQS: klucze zwolnione, więc nie są duplikatami
+    outage["on"] = False
+    assert handler.lambda_handler({"Records": records}, None) == {"statusCode": 200}
+    assert calls == ["r-1", "r-2"]
+
+
+def test_lambda_throttled_record_blocks_later_records_of_same_conversation(monkeypatch):
+    os.environ["DEV_MODE"] = "true"
+    acquired = []
+
+    def try_acquire_many(keys, metas=None):
+        acquired.extend(keys)
+        return [True for _ in keys]
+
+    monkeypatch.setattr(handler.IDEMPOTENCY, "try_acquire_many", try_acquire_many)
+    monkeypatch.setattr(handler.tenant_cfg, "get", lambda tenant_id: {"limits": {"outbound": {"per_tenant_rps": 1}}})
+    # pierwszy rekord batcha trafia na limit tenanta, kolejne już nie
+    tokens = iter([False, True, True])
+    monkeypatch.setattr(handler.tenant_limiter, "try_acquire", lambda key, rate, burst: next(tokens))
+
+    calls = []
+
+    class DummyWhatsApp:
+        def send_text(self, to, body):
+            calls.append((to, body))
+            return {"status": "OK", "sid": "fake"}
+
+    monkeypatch.setattr(handler, "clients", type("F", (), {"whatsapp": lambda self, tenant_id: DummyWhatsApp()})())
+    event = {
+        "Records": [
+            {"messageId": "t1", "body": json.dumps({"to": "whatsapp:+48555", "body": "c-1"})},
+            {"messageId": "t2", "body": json.dumps({"to": "whatsapp:+48555", "body": "c-2"})},
+            {"messageId": "t3", "body": json.dumps({"to": "whatsapp:+48666", "body": "d-1"})},
+        ]
+    }
+
+    res = handler.lambda_handler(event, None)
+
+    # c-2 nie może wyprzedzić odrzuconego c-1 – wraca do kolejki razem z nim
+    assert res == {"batchItemFailures": [{"itemIdentifier": "t1"}, {"itemIdentifier": "t2"}]}
+    assert calls == [("whatsapp:+48666", "d-1")]
+    assert acquired == ["snd#out#default#t3"]
+
+
+def test_lambda_throttled_record_does_not_hold_back_earlier_record(monkeypatch):
+    os.environ["DEV_MODE"] = "true"
+    monkeypatch.setattr(handler.IDEMPOTENCY, "try_acquire_many", lambda keys, metas=None: [True for _ in keys])
+    monkeypatch.setattr(handler.tenant_cfg, "get", lambda tenant_id: {"limits": {"outbound": {"per_tenant_rps": 1}}})
+    tokens = iter([True, False])
+    monkeypatch.setattr(handler.tenant_limiter, "try_acquire", lambda key, rate, burst: next(tokens))
+
+    calls = []
+
+    class DummyWhatsApp:
+        def send_text(self, to, body):
+            calls.append(body)
+            return {"status": "OK", "sid": "fake"}
+
+    monkeypatch.setattr(handler, "clients", type("F", (), {"whatsapp": lambda self, tenant_id: DummyWhatsApp()})())
+    event = {
+        "Records": [
+            {"messageId": "e1", "body": json.dumps({"to": "whatsapp:+48777", "body": "e-1"})},
+            {"messageId": "e2", "body": json.dumps({"to": "whatsapp:+48777", "body": "e-2"})},
+        ]
+    }
+
+    assert handler.lambda_handler(event, None) == {"batchItemFailures": [{"itemIdentifier": "e2"}]}
+    assert calls == ["e-1"]
@@ -5,7 +5,7 @@ import src.services.routing_service as routing_module
 
 def test_ticket_payload_contains_history_and_meta(monkeypatch):
     class DummyNLU:
-        def classify_intent(self, text: str, lang: str | None):
+        def classify_intent(self, text: str, lang: str | None, tenant_id=None):
             return {
                 "intent": "ticket",
                 "confidence": 0.99,
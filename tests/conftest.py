@@ -56,6 +56,29 @@ def reset_http_session_singleton():
     http_client._SESSION = None
 
 
+@pytest.fixture(autouse=True)
+def reset_shared_aws_clients():
+    from src.common import aws
+
+    aws.reset_shared_clients()
+
+
+@pytest.fixture(autouse=True)
+def reset_service_container():
+    from src.services import container
+
+    container.reset_default_container()
+
+
+@pytest.fixture(autouse=True)
+def reset_openai_resilience_state():
+    from src.common import circuit_breaker, deadline
+
+    for breaker in circuit_breaker._BREAKERS.values():
+        breaker.reset()
+    deadline.clear_deadline()
+
+
 @pytest.fixture(autouse=True)
 def disable_custom_aws_endpoints(monkeypatch, request):
     """Ignore all custom AWS endpoints in tests (LocalStack, *_ENDPOINT vars)."""
@@ -153,7 +176,7 @@ def env_setup(monkeypatch):
 def mock_ai(monkeypatch):
     """Mock NLU classification so unit tests do not call OpenAI."""
 
-    def fake_classify_intent(self, text: str, lang: str = "pl"):
+    def fake_classify_intent(self, text: str, lang: str = "pl", tenant_id=None):
         t = (text or "").lower()
         if "godzin" in t or "otwar" in t:
             return {"intent": "faq", "confidence": 0.95, "slots": {"topic": "hours"}}
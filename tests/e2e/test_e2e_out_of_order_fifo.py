@@ -10,6 +10,12 @@ class DummyIdempotency:
     def try_acquire(self, key, meta=None):
         return True
 
+    def try_acquire_many(self, keys, metas=None):
+        return [True for _ in keys]
+
+    def release(self, key):
+        pass
+
 
 class DummyTable:
     def __init__(self):
@@ -32,7 +38,7 @@ class DummyRouter:
         self.calls = []
         self.crm = types.SimpleNamespace(reset_invocation_limits=lambda: None)
 
-    def handle(self, msg):
+    def handle(self, msg, emit=None):
         # record order of processing
         self.calls.append(msg.body)
         return []
@@ -57,7 +63,7 @@ def test_message_router_sorts_records_by_fifo_sequence_number(monkeypatch):
     monkeypatch.setattr(h, "MESSAGES", DummyMessagesRepo())
 
     # avoid publishing actions
-    monkeypatch.setattr(h, "_publish_actions", lambda actions, original_body: None)
+    monkeypatch.setattr(h, "_publish_actions", lambda actions, original_body, idx_offset=0, delay_s=0: None)
 
     conv = "conv#whatsapp#abc"
     r1 = _record(
@@ -88,7 +94,7 @@ def test_message_router_rejects_group_id_mismatch(monkeypatch):
     monkeypatch.setattr(h, "ROUTER", dummy_router)
     monkeypatch.setattr(h, "IDEMPOTENCY", DummyIdempotency())
     monkeypatch.setattr(h, "MESSAGES", DummyMessagesRepo())
-    monkeypatch.setattr(h, "_publish_actions", lambda actions, original_body: None)
+    monkeypatch.setattr(h, "_publish_actions", lambda actions, original_body, idx_offset=0, delay_s=0: None)
 
     conv = "conv#whatsapp#abc"
     bad = _record(
@@ -71,7 +71,17 @@ class FakeTenantsRepo:
          return self.lang
    
     def get(self, tenant_id: str):
-        return {"tenant_id": tenant_id, "language_code": self.lang}
+        return {
+            "tenant_id": tenant_id,
+            "language_code": self.lang,
+            "kb_parameters": {
+                "kb_smalltalk_min_score": 0.35,
+                "kb_vector_min_score_low": 0.43,
+                "kb_vector_fastpath_min_score": 0.50,
+                "kb_answer_cache_min_score": 0.95,
+                "kb_prompt_max_tokens": 2000,
+            },
+        }
 
     def get_kb_smalltalk_min_score(self, tenant_id: str) -> float:
         return 0.35
@@ -81,6 +91,12 @@ class FakeTenantsRepo:
         
     def get_kb_vector_fastpath_min_score(self, tenant_id: str) -> float:
         return 0.50
+
+    def get_kb_answer_cache_min_score(self, tenant_id: str) -> float:
+        return 0.95
+
+    def get_kb_prompt_max_tokens(self, tenant_id: str) -> int:
+        return 2000
         
 class FakeMembersIndex:
     def __init__(self, member_id: str = "999"):
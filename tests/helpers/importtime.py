@@ -0,0 +1,95 @@
+"""Pomiar importu modułu w świeżym interpreterze (`python -X importtime`).
+
+Każdy pomiar to osobny proces, więc widać prawdziwy koszt cold startu
+(bez modułów załadowanych już przez pytest) oraz szczytowe RSS po imporcie.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import subprocess
+import sys
+from dataclasses import dataclass, field
+
+ROOT = pathlib.Path(__file__).resolve().parents[2]
+
+_PROBE = """
+import json, resource, sys
+import {module} as m
+{probe}
+def _peak_rss_kb():
+    # VmHWM startuje od zera po exec; ru_maxrss na Linuksie dziedziczy szczyt rodzica (pytest)
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "rss_kb": _peak_rss_kb(),
+    "modules": sorted(sys.modules),
+    "extra": _extra if "_extra" in globals() else None,
+}}))
+"""
+
+
+@dataclass
+class ImportProfile:
+    module: str
+    # (self us, cumulative us, nazwa z wcięciem zagnieżdżenia)
+    rows: list[tuple[int, int, str]]
+    rss_kb: int
+    modules: set[str] = field(default_factory=set)
+    extra: object = None
+
+    @property
+    def total_ms(self) -> float:
+        return next(cum for _own, cum, name in self.rows if name.strip() == self.module) / 1000
+
+    def loaded(self, package: str) -> bool:
+        return package in self.modules
+
+    def report(self, top_n: int = 15) -> str:
+        top = sorted(self.rows, key=lambda r: r[1], reverse=True)[:top_n]
+        lines = [f"{'cumulative ms':>14} {'self ms':>9}  module"]
+        lines += [f"{cum / 1000:14.1f} {own / 1000:9.1f}  {name}" for own, cum, name in top]
+        return "\n".join(lines)
+
+
+def profile_import(module: str, *, probe: str = "", env: dict[str, str] | None = None) -> ImportProfile:
+    """Importuje `module` w nowym procesie; `probe` może ustawić `_extra`."""
+    run_env = dict(os.environ)
+    run_env.setdefault("AWS_REGION", "eu-central-1")
+    run_env.setdefault("AWS_DEFAULT_REGION", "eu-central-1")
+    run_env.update(env or {})
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, probe=probe)],
+        cwd=ROOT,
+        env=run_env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cum_us), name.rstrip()))
+
+    # ostatnia linia stdout – wcześniej mogą być logi JSON z inicjalizacji
+    data = json.loads(proc.stdout.strip().splitlines()[-1])
+    return ImportProfile(
+        module=module,
+        rows=rows,
+        rss_kb=int(data["rss_kb"]),
+        modules=set(data["modules"]),
+        extra=data["extra"],
+    )
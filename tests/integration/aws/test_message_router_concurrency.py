@@ -0,0 +1,77 @@
+import json
+import threading
+
+import boto3
+
+from src.common.aws import ThreadLocalTable
+from src.lambdas.message_router import handler
+from src.services.container import ServiceContainer
+from src.services.routing_service import RoutingService
+
+
+def _record(mid, conv_id, phone, seq):
+    return {
+        "messageId": mid,
+        "body": json.dumps(
+            {
+                "event_id": mid,
+                "conversation_id": conv_id,
+                "tenant_id": "default",
+                "from": phone,
+                "to": "whatsapp:+48000",
+                "body": "ok",
+                "channel": "whatsapp",
+                "language_code": "pl",
+                "intent": "ack",
+            }
+        ),
+        "attributes": {"MessageGroupId": conv_id, "SequenceNumber": str(seq), "MessageDeduplicationId": mid},
+    }
+
+
+def test_two_groups_route_concurrently_through_real_container(aws_stack, monkeypatch):
+    # prawdziwy graf serwisów (repozytoria DDB na moto), jak w kontenerze Lambdy
+    container = ServiceContainer()
+    monkeypatch.setattr(handler, "CONTAINER", container)
+    monkeypatch.setattr(handler, "ROUTER", RoutingService(container=container))
+    monkeypatch.setattr(handler, "MESSAGES", container.messages())
+    monkeypatch.setattr(handler, "ROUTER_GROUP_CONCURRENCY", 2)
+    monkeypatch.setattr(handler, "_GROUP_EXECUTOR", None)
+
+    # obie rozmowy muszą być w trakcie routingu jednocześnie
+    barrier = threading.Barrier(2, timeout=10)
+    seen = {}
+    tpl = container.tpl()
+    render_named = tpl.render_named
+
+    def render_in_parallel(tenant_id, name, lang, ctx):
+        barrier.wait()
+        seen[threading.get_ident()] = container.conv().table._table()
+        return render_named(tenant_id, name, lang, ctx)
+
+    monkeypatch.setattr(tpl, "render_named", render_in_parallel)
+
+    event = {
+        "Records": [
+            _record("a1", "conv-a", "whatsapp:+48111", 1),
+            _record("b1", "conv-b", "whatsapp:+48222", 1),
+        ]
+    }
+    try:
+        assert handler.lambda_handler(event, None) == {"statusCode": 200}
+    finally:
+        handler._group_executor().shutdown(wait=True)
+
+    # każdy wątek routera dostał własny obiekt Table (zasoby boto3 nie są thread-safe)
+    assert isinstance(container.conv().table, ThreadLocalTable)
+    assert len(seen) == 2
+    assert len({id(t) for t in seen.values()}) == 2
+
+    for phone in ("whatsapp:+48111", "whatsapp:+48222"):
+        conv = container.conv().get_conversation("default", "whatsapp", phone)
+        assert conv["last_intent"] == "ack"
+        assert conv["language_code"] == "pl"
+
+    sqs = boto3.client("sqs", region_name="eu-central-1")
+    out = sqs.receive_message(QueueUrl=aws_stack["outbound"], MaxNumberOfMessages=10)["Messages"]
+    assert sorted(json.loads(m["Body"])["to"] for m in out) == ["whatsapp:+48111", "whatsapp:+48222"]
@@ -0,0 +1,69 @@
+"""Budżet cold startu per handler Lambdy: czas importu i RSS.
+
+Każdy handler jest importowany w świeżym interpreterze tak jak w Lambdzie
+(AWS_LAMBDA_FUNCTION_NAME ustawione -> bez .env). Wyniki trafiają do tabeli
+na stdout (`pytest -s -m perf`) i – jeśli ustawiono IMPORT_BENCH_OUT – do
+pliku JSON, żeby porównywać je między commitami.
+
+Limity są hojne (regresja to zwykle rząd wielkości, np. ciężkie SDK
+wciągnięte na poziomie modułu); deterministycznie sprawdzamy za to, że
+handler nie importuje bibliotek ładowanych leniwie.
+"""
+
+import json
+import os
+import pathlib
+
+import pytest
+
+from tests.helpers.importtime import ROOT, profile_import
+
+# handler -> (limit importu w ms, limit RSS w MB)
+BUDGETS = {
+    "archive_messages": (1500, 90),
+    "campaign_runner": (2000, 120),
+    "dashboard_provisioner": (1500, 90),
+    "health": (200, 40),
+    "housekeeping": (1500, 90),
+    "inbound_webhook": (1500, 100),
+    "kb_reindexer": (2000, 120),
+    "message_router": (2000, 120),
+    "outbound_sender": (2000, 120),
+    "pg_reservations": (2000, 120),
+    "tenant_frontend": (1500, 90),
+    "tickets": (2000, 120),
+    "web_widget": (1500, 90),
+    "whatsapp_webhook": (1500, 100),
+}
+
+# ładowane dopiero przy pierwszym użyciu – żaden handler nie płaci za nie przy imporcie
+LAZY_PACKAGES = ("openai", "aws_embedded_metrics", "dotenv", "cryptography")
+
+_RESULTS: dict[str, dict] = {}
+
+
+def test_budgets_cover_all_handlers():
+    handlers = {p.parent.name for p in (ROOT / "src" / "lambdas").glob("*/handler.py")}
+    assert handlers == set(BUDGETS)
+
+
+@pytest.mark.parametrize("handler", sorted(BUDGETS))
+def test_handler_import_budget(handler):
+    prof = profile_import(
+        f"src.lambdas.{handler}.handler",
+        env={"AWS_LAMBDA_FUNCTION_NAME": handler, "LOAD_DOTENV": "0"},
+    )
+    budget_ms, budget_mb = BUDGETS[handler]
+    rss_mb = prof.rss_kb / 1024
+    _RESULTS[handler] = {"import_ms": round(prof.total_ms, 1), "rss_mb": round(rss_mb, 1)}
+    print(f"\n{handler}: import {prof.total_ms:.0f} ms, rss {rss_mb:.0f} MB\n{prof.report(8)}")
+
+    assert [p for p in LAZY_PACKAGES if prof.loaded(p)] == []
+    assert prof.total_ms < budget_ms
+    assert rss_mb < budget_mb
+
+
+def teardown_module(module):
+    out = os.getenv("IMPORT_BENCH_OUT")
+    if out and _RESULTS:
+        pathlib.Path(out).write_text(json.dumps(_RESULTS, indent=2, sort_keys=True))
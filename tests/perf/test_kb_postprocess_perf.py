@@ -0,0 +1,77 @@
+"""Mikro-benchmarki post-processingu KB (CPU na wiadomość w routerze).
+
+Każdy przypadek mierzy średni czas wywołania (najlepsza z kilku serii)
+i sprawdza go względem hojnego limitu – celem jest wychwycenie regresji
+rzędu wielkości (np. kompilacja regexu per wywołanie), nie mikrosekund.
+"""
+
+import time
+
+import pytest
+
+import src.services.kb_service as kb_mod
+from src.services.kb_service import KBService
+from src.services.kb_vector_service import KBVectorService
+
+QUESTIONS = [
+    "Cześć!",
+    "Dzień dobry",
+    "Jakie są godziny otwarcia w weekend?",
+    "Ile kosztuje karnet; czy jest zniżka dla studentów / seniorów?",
+    "hej, a sauna jest w cenie... i czy mogę przyjść z dzieckiem!",
+]
+CHUNK_TEXT = "Q: Godziny otwarcia\nA: " + "Klub jest otwarty od 6:00 do 23:00, w weekendy od 8:00 do 20:00. " * 4
+
+
+def _per_call_us(fn, *, n: int = 2000, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        best = min(best, time.perf_counter() - t0)
+    return best / n * 1e6
+
+
+@pytest.fixture
+def kb():
+    return KBService(bucket=None, openai_client=None)
+
+
+@pytest.fixture
+def vector():
+    return KBVectorService(openai_client=object(), pinecone_client=object())
+
+
+def test_smalltalk_classification_cost(kb):
+    kb_mod._smalltalk_only.cache_clear()
+    us = _per_call_us(lambda i: kb._is_smalltalk_only(QUESTIONS[i % len(QUESTIONS)]))
+    print(f"_is_smalltalk_only {us:.2f}us/call")
+    assert us < 20
+
+
+def test_norm_cost(kb):
+    us = _per_call_us(lambda i: kb._norm(QUESTIONS[i % len(QUESTIONS)]))
+    print(f"_norm {us:.2f}us/call")
+    assert us < 20
+
+
+def test_fastpath_answer_extraction_cost():
+    us = _per_call_us(lambda i: kb_mod._fastpath_answer(CHUNK_TEXT))
+    print(f"_fastpath_answer {us:.2f}us/call")
+    assert us < 50
+
+
+def test_split_question_cost(vector, monkeypatch):
+    # logowanie segmentów mierzyłoby handler loggera, nie split
+    monkeypatch.setattr("src.services.kb_vector_service.logger.warning", lambda *a, **k: None)
+    us = _per_call_us(lambda i: vector._split_question(QUESTIONS[i % len(QUESTIONS)]), n=1000)
+    print(f"_split_question {us:.2f}us/call")
+    assert us < 200
+
+
+def test_keyword_selection_cost(kb):
+    faq = {f"temat {i}": f"Odpowiedź numer {i} o karnetach, saunie i godzinach otwarcia." for i in range(50)}
+    us = _per_call_us(lambda i: kb._select_relevant_faq_entries(QUESTIONS[i % len(QUESTIONS)], faq), n=200)
+    print(f"_select_relevant_faq_entries(50) {us:.2f}us/call")
+    assert us < 2000
@@ -0,0 +1,22 @@
+"""Profil importu message_routera (odpowiednik `python -X importtime`).
+
+Import handlera odbywa się w osobnym interpreterze, więc mierzymy prawdziwy
+cold start modułu: raport z najdroższymi importami trafia na stdout
+(`pytest -s -m perf`), a asercje pilnują, że import nie buduje grafu serwisów.
+"""
+
+from tests.helpers.importtime import profile_import
+
+HANDLER = "src.lambdas.message_router.handler"
+# hojny limit na zimny import (CI bywa wolne); regresja to zwykle rząd wielkości
+IMPORT_BUDGET_S = 5.0
+
+
+def test_message_router_import_profile():
+    prof = profile_import(HANDLER, probe="_extra = m.CONTAINER.built()")
+    print("\n" + prof.report())
+
+    assert prof.total_ms / 1000 < IMPORT_BUDGET_S
+
+    # przy imporcie powstają tylko lekkie komponenty handlera, bez NLU/KB/CRM
+    assert set(prof.extra) <= {"messages", "metrics"}
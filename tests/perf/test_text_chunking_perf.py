@@ -0,0 +1,59 @@
+"""Chunking dużych FAQ: czas i pamięć mają rosnąć liniowo z liczbą wpisów."""
+
+import time
+import tracemalloc
+
+from src.common.text_chunking import chunk_faq, iter_faq_chunks
+
+
+def _synthetic_faq(n: int) -> dict:
+    long_answer = " ".join(f"Zdanie numer {i} o regulaminie klubu." for i in range(60))
+    entries = []
+    for i in range(n):
+        entries.append({
+            "key": f"topic_{i}",
+            "questions": [f"Pytanie {i} A?", f"Pytanie {i} B?"],
+            # co dziesiąty wpis jest długi i wymaga podziału
+            "answer": long_answer if i % 10 == 0 else f"Odpowiedź numer {i}.",
+        })
+    return {"entries": entries}
+
+
+def _best_of(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def test_chunk_faq_scales_linearly_on_10k_entries():
+    small, large = _synthetic_faq(1_000), _synthetic_faq(10_000)
+
+    t_small = _best_of(lambda: chunk_faq(small, max_chars=400))
+    t_large = _best_of(lambda: chunk_faq(large, max_chars=400))
+    chunks = chunk_faq(large, max_chars=400)
+
+    print(f"chunk_faq 1k={t_small*1000:.1f}ms 10k={t_large*1000:.1f}ms chunks={len(chunks)}")
+    assert len(chunks) > 20_000
+    # 10x wpisów ≈ 10x czasu; wersja kwadratowa wychodziła rzędy wielkości wyżej
+    assert t_large < t_small * 25
+
+
+def test_iter_faq_chunks_streams_without_materializing():
+    faq = _synthetic_faq(10_000)
+
+    tracemalloc.start()
+    count = sum(1 for _ in iter_faq_chunks(faq, max_chars=400))
+    _, peak_stream = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    chunks = chunk_faq(faq, max_chars=400)
+    _, peak_list = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"iter_faq_chunks peak={peak_stream/1024:.0f}KiB list peak={peak_list/1024:.0f}KiB")
+    assert count == len(chunks)
+    assert peak_stream * 5 < peak_list
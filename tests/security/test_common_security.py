@@ -49,3 +49,71 @@ def test_verify_twilio_signature_valid(monkeypatch):
 
     assert verify_twilio_signature(url, params, sig) is True
     assert verify_twilio_signature(url, params, "bad-signature") is False
+
+
+def _use_phone_key(monkeypatch):
+    from cryptography.fernet import Fernet
+    import src.common.security as sec
+
+    key = Fernet.generate_key().decode()
+    monkeypatch.setattr(sec, "_get_phone_enc_key", lambda: key)
+    monkeypatch.setattr(sec, "_cached_phone_cipher", None)
+    return sec
+
+
+def test_phone_cipher_is_built_once_per_key(monkeypatch):
+    sec = _use_phone_key(monkeypatch)
+    assert sec._get_phone_cipher() is sec._get_phone_cipher()
+
+
+def test_encrypt_decrypt_phones_batch_roundtrip(monkeypatch):
+    sec = _use_phone_key(monkeypatch)
+    phones = ["+48123123123", "whatsapp:+48999888777", ""]
+
+    tokens = sec.encrypt_phones("t1", phones)
+
+    assert tokens[2] == ""
+    assert sec.decrypt_phones("t1", tokens) == ["+48123123123", "+48999888777", ""]
+    assert sec.decrypt_phone("t1", tokens[0]) == "+48123123123"
+    # token innego tenanta / śmieci -> ""
+    assert sec.decrypt_phones("t2", tokens[:1]) == [""]
+    assert sec.decrypt_phones("t1", ["garbage"]) == [""]
+
+
+def test_decrypt_phones_process_pool_keeps_order(monkeypatch):
+    sec = _use_phone_key(monkeypatch)
+    monkeypatch.setattr(sec, "_PHONE_CRYPTO_POOL_MIN", 1)
+    phones = [f"+4850000{i:04d}" for i in range(20)]
+
+    tokens = sec.encrypt_phones("t1", phones, processes=2)
+
+    assert sec.decrypt_phones("t1", tokens, processes=2) == phones
+
+
+def test_phones_fall_back_to_sequential_when_pool_breaks(monkeypatch):
+    import concurrent.futures
+    from concurrent.futures.process import BrokenProcessPool
+
+    sec = _use_phone_key(monkeypatch)
+    monkeypatch.setattr(sec, "_PHONE_CRYPTO_POOL_MIN", 1)
+
+    class BrokenPool:
+        def __init__(self, *a, **k):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def map(self, *a, **k):
+            # worker zabity przez OOM
+            raise BrokenProcessPool("worker died")
+
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", BrokenPool)
+    phones = ["+48500000001", "+48500000002"]
+
+    tokens = sec.encrypt_phones("t1", phones, processes=2)
+
+    assert sec.decrypt_phones("t1", tokens, processes=2) == phones
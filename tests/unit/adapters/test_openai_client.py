@@ -109,3 +109,66 @@ def test_embed_uses_cache(monkeypatch):
     v2 = c.embed(["hello", "world"], model="text-embedding-3-small", dimensions=2)
     assert v2 == [[0.1, 0.2], [0.1, 0.2]]
     assert called["n"] == 0
+
+
+def test_chat_stream_yields_deltas(monkeypatch):
+    c = _mk_client(monkeypatch, enabled=True)
+
+    def chunk(content):
+        delta = type("Delta", (), {"content": content})()
+        return type("Chunk", (), {"choices": [type("Choice", (), {"delta": delta})()]})()
+
+    seen = {}
+
+    def create(**kwargs):
+        seen.update(kwargs)
+        return iter([chunk('{"answer": "Cze'), chunk(None), chunk('ść"}')])
+
+    c.client.chat.completions.create = create
+    assert "".join(c.chat_stream([{"role": "user", "content": "hi"}])) == '{"answer": "Cześć"}'
+    assert seen["stream"] is True
+
+
+def test_chat_stream_offline_falls_back_to_chat(monkeypatch):
+    c = _mk_client(monkeypatch, enabled=False)
+    parts = list(c.chat_stream([{"role": "user", "content": "hi"}]))
+    assert len(parts) == 1
+    assert json.loads(parts[0])["intent"] == "clarify"
+
+
+def test_embed_consults_store_and_writes_back_misses(monkeypatch):
+    from src.repos.embedding_store_repo import EmbeddingStoreRepo
+
+    class MemoryStore:
+        enabled = True
+        key = staticmethod(EmbeddingStoreRepo.key)
+
+        def __init__(self):
+            self.data = {}
+
+        def get_many(self, keys):
+            return {k: self.data[k] for k in keys if k in self.data}
+
+        def put_many(self, vectors):
+            self.data.update(vectors)
+
+    store = MemoryStore()
+    store.data[store.key("emb", 2, "known")] = [0.9, 0.8]
+
+    c = _mk_client(monkeypatch, enabled=True)
+    sent = []
+    create = c.client.embeddings.create
+
+    def spy(**kwargs):
+        sent.append(list(kwargs["input"]))
+        return create(**kwargs)
+
+    c.client.embeddings.create = spy
+    assert c.embed(["known", "new"], model="emb", dimensions=2, store=store) == [[0.9, 0.8], [0.1, 0.2]]
+    assert sent == [["new"]]
+    assert store.data[store.key("emb", 2, "new")] == [0.1, 0.2]
+
+    # inny proces (pusty cache w pamięci) – wszystko ze store'a, bez API
+    c2 = _mk_client(monkeypatch, enabled=True)
+    c2.client.embeddings.create = lambda **kw: (_ for _ in ()).throw(AssertionError("no API call"))
+    assert c2.embed(["new", "known"], model="emb", dimensions=2, store=store) == [[0.1, 0.2], [0.9, 0.8]]
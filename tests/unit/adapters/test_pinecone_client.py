@@ -96,3 +96,19 @@ def test_query_retries_and_fails(monkeypatch):
     out = c.query(vector=[0.0, 0.0, 0.0], namespace='ns', max_attempts=2)
     assert out == []
     assert calls['n'] == 2
+
+
+def test_delete_sends_ids_in_batches_of_1000(monkeypatch):
+    c = PineconeClient(api_key='k', index_host='example.com', timeout_s=0.01)
+    sent = []
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        assert url.endswith('/vectors/delete')
+        sent.append((json['namespace'], len(json['ids'])))
+        return DummyResp(status_code=200, json_data={}, text='{}')
+
+    monkeypatch.setattr('src.adapters.pinecone_client.requests.post', fake_post)
+    assert c.delete(ids=[str(i) for i in range(1500)], namespace='ns') is True
+    assert sent == [('ns', 1000), ('ns', 500)]
+    assert c.delete(ids=[], namespace='ns') is True
+    assert len(sent) == 2
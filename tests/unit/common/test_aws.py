@@ -1,3 +1,4 @@
+import threading
 import types
 import pytest
 
@@ -55,4 +56,48 @@ def test_endpoint_resolution_precedence(monkeypatch):
     assert aws._endpoint_for("sqs") == glob
 
     monkeypatch.delenv("AWS_ENDPOINT_URL", raising=False)
-    assert aws._endpoint_for("sqs") is None
\ No newline at end of file
+    assert aws._endpoint_for("sqs") is None
+
+def test_shared_client_created_once_and_timed(monkeypatch):
+    created = []
+
+    def fake_client(service, **kwargs):
+        created.append((service, kwargs))
+        return object()
+
+    monkeypatch.setattr(aws.boto3, 'client', fake_client)
+
+    c1 = aws.comprehend_client()
+    c2 = aws.comprehend_client()
+    assert c1 is c2
+    assert len(created) == 1
+    assert created[0][1]['config'].read_timeout == 1
+    assert 'comprehend' in aws.client_init_timings()
+
+    aws.reset_shared_clients()
+    assert aws.comprehend_client() is not c1
+    assert len(created) == 2
+
+
+def test_thread_local_table_builds_one_table_per_thread():
+    created = []
+
+    class FakeResource:
+        def Table(self, name):
+            table = types.SimpleNamespace(name=name, get_item=lambda **kw: {"table": len(created)})
+            created.append(table)
+            return table
+
+    table = aws.ddb_table('Conversations', FakeResource)
+    assert created == []  # nic nie powstaje przy konstrukcji repozytorium
+
+    assert table.get_item(Key={}) == {'table': 1}
+    assert table.get_item(Key={}) == {'table': 1}
+
+    results = []
+    worker = threading.Thread(target=lambda: results.append(table.get_item(Key={})))
+    worker.start()
+    worker.join()
+
+    assert results == [{'table': 2}]
+    assert [t.name for t in created] == ['Conversations', 'Conversations']
@@ -0,0 +1,67 @@
+from src.common import circuit_breaker as cb
+
+
+def _breaker(monkeypatch, now):
+    monkeypatch.setattr(cb.time, "monotonic", lambda: now[0])
+    return cb.CircuitBreaker("test", failure_ratio=0.5, min_calls=4, window_s=10, open_seconds=5)
+
+
+def test_opens_on_error_ratio_and_recovers_through_half_open(monkeypatch):
+    now = [100.0]
+    b = _breaker(monkeypatch, now)
+
+    for ok in (True, False, True):
+        b.record(ok)
+    assert b.state == cb.CLOSED  # za mało wywołań w oknie
+    b.record(False)
+    assert b.state == cb.OPEN
+    assert not b.allow()
+
+    now[0] += 5
+    assert b.allow()  # jedno próbne wywołanie
+    assert not b.allow()
+    b.record(False)
+    assert b.state == cb.OPEN
+
+    now[0] += 5
+    assert b.allow()
+    b.record(True)
+    assert b.state == cb.CLOSED
+    assert b.allow()
+
+
+def test_old_failures_fall_out_of_window(monkeypatch):
+    now = [0.0]
+    b = _breaker(monkeypatch, now)
+    b.record(False)
+    b.record(False)
+    now[0] += 11
+    b.record(False)
+    b.record(True)
+    b.record(True)
+    assert b.state == cb.CLOSED
+
+
+def test_get_breaker_is_shared_per_name():
+    assert cb.get_breaker("openai") is cb.get_breaker("openai")
+    assert cb.get_breaker("openai") is not cb.get_breaker("other")
+
+
+def test_half_open_probe_is_released_or_expires(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cb.time, "monotonic", lambda: now[0])
+    b = cb.CircuitBreaker("test", min_calls=1, open_seconds=5, probe_timeout_s=30)
+    b.record(False)
+    now[0] += 5
+
+    # próba bez wyniku zwolniona przez wołającego -> kolejna może ruszyć
+    assert b.allow()
+    b.release_probe()
+    assert b.allow()
+    assert not b.allow()
+
+    # niezwolniona próba wygasa po probe_timeout_s
+    now[0] += 30
+    assert b.allow()
+    b.record(True)
+    assert b.state == cb.CLOSED
@@ -0,0 +1,37 @@
+import pytest
+
+import dotenv
+
+from src.common import config
+
+
+@pytest.fixture
+def dotenv_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(dotenv, "find_dotenv", lambda *a, **k: "/tmp/.env")
+    monkeypatch.setattr(dotenv, "load_dotenv", lambda path=None, **k: calls.append(path))
+    monkeypatch.delenv("LOAD_DOTENV", raising=False)
+    return calls
+
+
+def test_dotenv_loaded_outside_lambda(monkeypatch, dotenv_calls):
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    config._load_dotenv()
+    assert dotenv_calls == ["/tmp/.env"]
+
+
+def test_dotenv_skipped_in_lambda_by_default(monkeypatch, dotenv_calls):
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "message-router")
+    config._load_dotenv()
+    assert dotenv_calls == []
+
+
+@pytest.mark.parametrize("flag, in_lambda, expected", [("1", True, 1), ("false", False, 0)])
+def test_dotenv_flag_overrides_environment(monkeypatch, dotenv_calls, flag, in_lambda, expected):
+    monkeypatch.setenv("LOAD_DOTENV", flag)
+    if in_lambda:
+        monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "message-router")
+    else:
+        monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    config._load_dotenv()
+    assert len(dotenv_calls) == expected
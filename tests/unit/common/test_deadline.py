@@ -0,0 +1,28 @@
+import pytest
+
+from src.common import deadline
+
+
+class Ctx:
+    def __init__(self, ms):
+        self.ms = ms
+
+    def get_remaining_time_in_millis(self):
+        return self.ms
+
+
+def test_start_from_lambda_context_applies_reserve():
+    assert deadline.start_from_lambda_context(Ctx(5000), reserve_ms=1000) == pytest.approx(4.0)
+    assert 3.9 < deadline.remaining_s() <= 4.0
+    assert deadline.bounded_timeout(6.0) <= 4.0
+    assert deadline.bounded_timeout(1.0) == 1.0
+
+
+def test_bounded_timeout_without_deadline_and_when_exhausted():
+    deadline.start_from_lambda_context(None)
+    assert deadline.remaining_s() is None
+    assert deadline.bounded_timeout(6.0, min_s=0.5) == 6.0
+
+    deadline.start_from_lambda_context(Ctx(1200), reserve_ms=1000)
+    with pytest.raises(deadline.DeadlineExceeded):
+        deadline.bounded_timeout(6.0, min_s=0.5)
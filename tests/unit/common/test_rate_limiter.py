@@ -0,0 +1,50 @@
+import threading
+import time
+
+from src.common import rate_limiter
+from src.common.rate_limiter import InMemoryRateLimiter
+
+
+class FakeClock:
+    """Zegar monotoniczny przesuwany przez sleep – bez realnego czekania."""
+
+    def __init__(self):
+        self.t = 0.0
+        self.sleeps = []
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        with self._lock:
+            return self.t
+
+    def sleep(self, s):
+        with self._lock:
+            self.sleeps.append(s)
+            self.t += s
+
+
+def test_acquire_waits_for_refill(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda a, b: 1.0)
+    lim = InMemoryRateLimiter()
+
+    lim.acquire("k", rate=2, burst=1)
+    lim.acquire("k", rate=2, burst=1)
+
+    assert clock.sleeps == [0.5]
+
+
+def test_acquire_does_not_overissue_tokens_across_threads():
+    lim = InMemoryRateLimiter()
+    rate, burst, n = 50.0, 5.0, 20
+    start = time.monotonic()
+
+    threads = [threading.Thread(target=lim.acquire, args=("crm#t1",), kwargs={"rate": rate, "burst": burst}) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # burst od ręki, reszta w tempie rate – bez wyścigu na wspólnym kubełku
+    assert time.monotonic() - start >= (n - burst) / rate * 0.85
@@ -0,0 +1,219 @@
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+import src.lambdas.campaign_runner.handler as h
+from src.services.campaign_scheduler import CampaignScheduler
+
+
+class FakeTable:
+    def __init__(self, item):
+        self.item = dict(item)
+        self.updates = []
+
+    def update_item(self, **kwargs):
+        self.updates.append(kwargs)
+        values = kwargs.get("ExpressionAttributeValues") or {}
+        if "ConditionExpression" in kwargs:
+            lease = self.item.get("lease_until")
+            if not self.item.get("active") or (lease is not None and lease >= values[":now"]):
+                raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+            self.item["lease_until"] = values[":until"]
+            return {"Attributes": dict(self.item)}
+        expr = kwargs["UpdateExpression"]
+        self.item["progress"] = values[":progress"]
+        self.item["sent_count"] = values[":sent"]
+        if ":next" in values:
+            self.item["next_run_time"] = values[":next"]
+        if ":active" in values:
+            self.item["active"] = values[":active"]
+        if "REMOVE lease_until" in expr:
+            self.item.pop("lease_until", None)
+        return {}
+
+
+def _setup(monkeypatch, n, rate):
+    now = datetime(2026, 1, 15, 10, 0, tzinfo=timezone.utc)
+    monkeypatch.setattr(h, "scheduler", CampaignScheduler(now_fn=lambda: now, tick_seconds=10, default_rps=rate))
+    monkeypatch.setattr(h.tenant_cfg, "get", lambda tenant_id: {})
+    monkeypatch.setattr(h, "decrypt_phones", lambda tenant_id, tokens, processes=0: [f"+4850000000{t}" for t in tokens])
+    sent = []
+    monkeypatch.setattr(
+        h, "_send_to_recipient",
+        lambda item, tenant_id, recipient, phone, out_q_url, delay_seconds=0: sent.append((phone, delay_seconds)) or True,
+    )
+    item = {
+        "pk": "TENANT#t1#CAMPAIGN#c1",
+        "campaign_id": "c1",
+        "tenant_id": "t1",
+        "active": True,
+        "send_from": "09:00",
+        "send_to": "20:00",
+        "recipients": [{"token": str(i)} for i in range(n)],
+    }
+    return FakeTable(item), item, sent
+
+
+def test_run_campaign_sends_slice_and_persists_cursor(monkeypatch):
+    table, item, sent = _setup(monkeypatch, n=5, rate=0.3)
+
+    res = h.run_campaign(table, item, "t1", "q")
+
+    # 0.3 rps * 10 s = 3 wiadomości w ticku, rozłożone w czasie
+    assert res == {"sent": 3, "done": False, "skipped": False}
+    assert [d for _, d in sent] == [0, 3, 6]
+    assert table.item["progress"] == {"Europe/Warsaw": 3}
+    assert table.item["active"] is True
+    # tick 10 s minus margines (połowa ticku) -> kolejny tick zastanie kampanię jako due
+    assert table.item["next_run_time"] == "2026-01-15T11:00:05"
+    assert "lease_until" not in table.item
+
+    # kolejny tick wznawia od kursora i kończy kampanię
+    res = h.run_campaign(table, dict(item), "t1", "q")
+    assert res["done"] is True
+    assert [p for p, _ in sent] == [f"+4850000000{i}" for i in range(5)]
+    assert table.item["active"] is False
+    assert table.item["sent_count"] == 5
+
+
+def test_run_campaign_skips_when_leased(monkeypatch):
+    table, item, sent = _setup(monkeypatch, n=2, rate=1)
+    table.item["lease_until"] = 2**40
+
+    res = h.run_campaign(table, item, "t1", "q")
+
+    assert res["skipped"] is True
+    assert sent == []
+
+
+def test_run_campaign_skipped_recipients_do_not_consume_budget(monkeypatch):
+    table, item, _ = _setup(monkeypatch, n=5, rate=0.2)
+    sent = []
+
+    def send(item, tenant_id, recipient, phone, out_q_url, delay_seconds=0):
+        if phone.endswith("1"):
+            return False
+        sent.append((phone, delay_seconds))
+        return True
+
+    monkeypatch.setattr(h, "_send_to_recipient", send)
+
+    res = h.run_campaign(table, item, "t1", "q")
+
+    # budżet 2 wiadomości: pominięty odbiorca nr 1 nie zjada slotu ani opóźnienia
+    assert res["sent"] == 2
+    assert sent == [("+48500000000", 0), ("+48500000002", 5)]
+    assert table.item["progress"] == {"Europe/Warsaw": 3}
+    assert table.item["sent_count"] == 2
+
+
+def test_run_campaign_releases_lease_on_error(monkeypatch):
+    table, item, _ = _setup(monkeypatch, n=3, rate=1)
+    monkeypatch.setattr(h.svc, "select_recipients", lambda item: (_ for _ in ()).throw(RuntimeError("boom")))
+
+    try:
+        h.run_campaign(table, item, "t1", "q")
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("expected RuntimeError")
+
+    assert "lease_until" not in table.item
+    assert table.item["active"] is True
+
+
+def test_run_campaign_skips_failing_recipient_and_advances_cursor(monkeypatch):
+    table, item, _ = _setup(monkeypatch, n=3, rate=1)
+    sent = []
+
+    def send(item, tenant_id, recipient, phone, out_q_url, delay_seconds=0):
+        if phone.endswith("1"):
+            raise RuntimeError("perfectgym down")
+        sent.append(phone)
+        return True
+
+    monkeypatch.setattr(h, "_send_to_recipient", send)
+
+    res = h.run_campaign(table, item, "t1", "q")
+
+    # błąd jednego odbiorcy nie zatrzymuje ticku ani kolejnych ticków
+    assert res["done"] is True
+    assert sent == ["+48500000000", "+48500000002"]
+    assert table.item["progress"] == {"Europe/Warsaw": 3}
+    assert table.item["sent_count"] == 2
+
+
+def test_run_campaign_aborts_tick_when_outbound_queue_fails(monkeypatch):
+    table, item, _ = _setup(monkeypatch, n=3, rate=1)
+
+    def send(item, tenant_id, recipient, phone, out_q_url, delay_seconds=0):
+        if phone.endswith("1"):
+            raise h._OutboundUnavailable("sqs down")
+        return True
+
+    monkeypatch.setattr(h, "_send_to_recipient", send)
+
+    try:
+        h.run_campaign(table, item, "t1", "q")
+    except h._OutboundUnavailable:
+        pass
+    else:
+        raise AssertionError("expected _OutboundUnavailable")
+
+    # kursor stoi na odbiorcy, którego nie udało się wysłać -> retry w kolejnym ticku
+    assert table.item["progress"] == {"Europe/Warsaw": 1}
+    assert "lease_until" not in table.item
+
+
+def test_campaign_lease_is_shorter_than_tick_interval():
+    assert h.CAMPAIGN_FUNCTION_TIMEOUT_S < h.CAMPAIGN_LEASE_SECONDS < 15 * 60
+
+
+def test_lambda_handler_continues_after_failed_campaign(monkeypatch):
+    monkeypatch.setattr(h, "resolve_queue_url", lambda name: "q")
+    items = [{"pk": "p1", "campaign_id": "c1", "active": True}, {"pk": "p2", "campaign_id": "c2", "active": True}]
+    table = type("T", (), {"query": lambda self, **kw: {"Items": items}})()
+    monkeypatch.setattr(h, "ddb_resource", lambda: type("R", (), {"Table": lambda self, name: table})())
+    calls = []
+
+    def run(table, item, tenant_id, out_q_url, context=None, tick_start=None):
+        calls.append((item["campaign_id"], tick_start))
+        if item["campaign_id"] == "c1":
+            raise RuntimeError("boom")
+        return {"sent": 1, "done": True, "skipped": False}
+
+    monkeypatch.setattr(h, "run_campaign", run)
+
+    assert h.lambda_handler({"tenant_id": "t1"}, None) == {"statusCode": 200}
+    assert [c for c, _ in calls] == ["c1", "c2"]
+    # wszystkie kampanie ticku liczą next_run_time od tego samego startu
+    assert calls[0][1] == calls[1][1] is not None
+
+
+def test_lambda_handler_stops_querying_tenants_when_out_of_time(monkeypatch):
+    monkeypatch.setattr(h, "resolve_queue_url", lambda name: "q")
+    monkeypatch.setattr(h.tenants_repo, "list_all", lambda: [{"tenant_id": t} for t in ("t1", "t2", "t3")])
+    queried = []
+
+    def query(self, **kw):
+        queried.append(kw)
+        return {"Items": [{"pk": f"p{len(queried)}", "campaign_id": f"c{len(queried)}", "active": True}]}
+
+    table = type("T", (), {"query": query})()
+    monkeypatch.setattr(h, "ddb_resource", lambda: type("R", (), {"Table": lambda self, name: table})())
+    remaining = {"ms": 60_000}
+
+    class Ctx:
+        def get_remaining_time_in_millis(self):
+            return remaining["ms"]
+
+    def run(table, item, tenant_id, out_q_url, context=None, tick_start=None):
+        # pierwsza kampania zjada czas ticku
+        remaining["ms"] = h.CAMPAIGN_RUNTIME_MARGIN_MS - 1
+        return {"sent": 1, "done": False, "skipped": False}
+
+    monkeypatch.setattr(h, "run_campaign", run)
+
+    assert h.lambda_handler({}, Ctx()) == {"statusCode": 200}
+    # pozostali tenanci nie są już odpytywani o kampanie
+    assert len(queried) == 1
@@ -7,7 +7,7 @@ class FakeKB:
     def __init__(self):
         self.calls = []
 
-    def reindex_faq(self, *, tenant_id: str, language_code: str | None):
+    def reindex_faq(self, *, tenant_id: str, language_code: str | None, force: bool = False):
         self.calls.append((tenant_id, language_code))
         return True
 
@@ -45,4 +45,13 @@ def test_lambda_handler_manual_mode(monkeypatch):
     body = json.loads(res["body"])
     assert body["mode"] == "manual"
     assert ("t1", "pl") in kb.calls
-    assert ("t1", "en") in kb.calls
\ No newline at end of file
+    assert ("t1", "en") in kb.calls
+
+def test_lambda_handler_ignores_non_faq_s3_objects(monkeypatch):
+    kb = FakeKB()
+    monkeypatch.setattr(h, "KBService", lambda: kb)
+
+    event = {"Records": [{"s3": {"object": {"key": "_manifests/tA/pl.manifest"}}}]}
+    res = h.lambda_handler(event, None)
+    assert json.loads(res["body"]) == {"mode": "s3", "indexed": []}
+    assert kb.calls == []
@@ -30,7 +30,9 @@ def authed_event(event, tenant_id="t1"):
 def test_create_campaign_stores_encrypted_recipient_tokens(monkeypatch):
     table = FakeTable()
     monkeypatch.setattr(h, "ddb_resource", lambda: FakeDdb(table))
-    monkeypatch.setattr(h, "encrypt_phone", lambda tenant_id, phone: f"enc:{tenant_id}:{phone}")
+    monkeypatch.setattr(
+        h, "encrypt_phones", lambda tenant_id, phones: [f"enc:{tenant_id}:{phone}" for phone in phones]
+    )
     monkeypatch.setattr(h, "new_id", lambda prefix="": prefix + "1")
 
     event = authed_event({
@@ -0,0 +1,37 @@
+import boto3
+from moto import mock_aws
+
+from src.repos.embedding_store_repo import EmbeddingStoreRepo
+
+
+def test_disabled_without_table_env(monkeypatch):
+    monkeypatch.delenv("DDB_TABLE_EMBEDDINGS", raising=False)
+    repo = EmbeddingStoreRepo()
+    assert not repo.enabled
+    assert repo.get_many([repo.key("m", None, "x")]) == {}
+
+
+def test_key_depends_on_model_dims_and_text():
+    k = EmbeddingStoreRepo.key
+    assert k("m", 256, "Q: a") == k("m", 256, "Q: a")
+    assert len({k("m", 256, "Q: a"), k("m", 512, "Q: a"), k("m2", 256, "Q: a"), k("m", 256, "Q: b")}) == 4
+
+
+@mock_aws
+def test_roundtrip_float32_batches(monkeypatch):
+    ddb = boto3.client("dynamodb", region_name="eu-central-1")
+    ddb.create_table(
+        TableName="Embeddings",
+        AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    monkeypatch.setenv("DDB_TABLE_EMBEDDINGS", "Embeddings")
+    repo = EmbeddingStoreRepo()
+
+    vectors = {repo.key("m", 3, f"t{i}"): [0.5, -1.0, float(i)] for i in range(130)}
+    repo.put_many(vectors)
+
+    keys = list(vectors) + [repo.key("m", 3, "unknown")]
+    got = repo.get_many(keys)
+    assert got == vectors  # > 100 kluczy -> kilka BatchGetItem; float32 dokładny dla tych wartości
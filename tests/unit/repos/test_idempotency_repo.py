@@ -1,4 +1,6 @@
 import os
+import types
+
 from botocore.exceptions import ClientError
 
 import pytest
@@ -6,10 +8,32 @@ import pytest
 import src.repos.idempotency_repo as ir
 
 
+class FakeClient:
+    def __init__(self, existing):
+        self.existing = existing
+        self.transact_calls = []
+
+    def transact_write_items(self, TransactItems):
+        self.transact_calls.append([t["Put"]["Item"]["pk"] for t in TransactItems])
+        reasons = [
+            {"Code": "ConditionalCheckFailed" if t["Put"]["Item"]["pk"] in self.existing else "None"}
+            for t in TransactItems
+        ]
+        if any(r["Code"] != "None" for r in reasons):
+            err = _client_error("TransactionCanceledException")
+            err.response["CancellationReasons"] = reasons
+            raise err
+        self.existing.update(t["Put"]["Item"]["pk"] for t in TransactItems)
+        return {}
+
+
 class FakeTable:
     def __init__(self):
         self.put_calls = []
+        self.delete_calls = []
         self.raise_error = None
+        self.existing = set()
+        self.meta = types.SimpleNamespace(client=FakeClient(self.existing))
 
     def put_item(self, **kwargs):
         self.put_calls.append(kwargs)
@@ -17,6 +41,11 @@ class FakeTable:
             raise self.raise_error
         return {}
 
+    def delete_item(self, **kwargs):
+        self.delete_calls.append(kwargs)
+        self.existing.discard(kwargs["Key"]["pk"])
+        return {}
+
 
 class FakeDdb:
     def __init__(self, table):
@@ -67,4 +96,50 @@ def test_try_acquire_ddb_other_error_raises(monkeypatch):
 
     repo = ir.IdempotencyRepo(table_name_env="")
     with pytest.raises(ClientError):
-        repo.try_acquire("k3")
\ No newline at end of file
+        repo.try_acquire("k3")
+
+def _ddb_repo(monkeypatch, t):
+    monkeypatch.setattr(ir, "ddb_resource", lambda: FakeDdb(t))
+    monkeypatch.setenv("DEV_MODE", "false")
+    monkeypatch.setattr(ir.settings, "dev_mode", False)
+    return ir.IdempotencyRepo(table_name_env="")
+
+
+def test_try_acquire_many_uses_single_transaction(monkeypatch):
+    t = FakeTable()
+    repo = _ddb_repo(monkeypatch, t)
+
+    assert repo.try_acquire_many(["a", "b", "a"]) == [True, True, False]
+    assert t.meta.client.transact_calls == [["a", "b"]]
+    assert t.put_calls == []
+
+
+def test_try_acquire_many_retries_without_existing_keys(monkeypatch):
+    t = FakeTable()
+    t.existing.add("b")
+    repo = _ddb_repo(monkeypatch, t)
+
+    assert repo.try_acquire_many(["a", "b", "c"]) == [True, False, True]
+    assert t.meta.client.transact_calls == [["a", "b", "c"], ["a", "c"]]
+
+
+def test_recently_seen_keys_skip_ddb(monkeypatch):
+    t = FakeTable()
+    repo = _ddb_repo(monkeypatch, t)
+    assert repo.try_acquire("k") is True
+
+    assert repo.try_acquire("k") is False
+    assert repo.try_acquire_many(["k"]) == [False]
+    assert len(t.put_calls) == 1
+
+
+def test_release_allows_reacquire(monkeypatch):
+    t = FakeTable()
+    repo = _ddb_repo(monkeypatch, t)
+    assert repo.try_acquire_many(["a", "b"]) == [True, True]
+
+    repo.release("a")
+
+    assert t.delete_calls == [{"Key": {"pk": "a"}}]
+    assert repo.try_acquire_many(["a", "b"]) == [True, False]
+
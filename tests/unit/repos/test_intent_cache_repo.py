@@ -0,0 +1,43 @@
+import time
+
+import src.repos.intent_cache_repo as icr
+
+
+class FakeTable:
+    def __init__(self):
+        self.items = {}
+
+    def put_item(self, Item):
+        self.items[Item["pk"]] = Item
+
+    def get_item(self, Key):
+        item = self.items.get(Key["pk"])
+        return {"Item": item} if item else {}
+
+
+class FakeDdb:
+    def __init__(self, table):
+        self._t = table
+
+    def Table(self, name):
+        return self._t
+
+
+def test_disabled_without_table_env(monkeypatch):
+    monkeypatch.delenv("DDB_TABLE_INTENT_CACHE", raising=False)
+    repo = icr.IntentCacheRepo()
+    assert not repo.enabled
+    assert repo.get("pl#x") is None
+
+
+def test_roundtrip_and_expiry(monkeypatch):
+    t = FakeTable()
+    monkeypatch.setenv("DDB_TABLE_INTENT_CACHE", "IntentCache")
+    monkeypatch.setattr(icr, "ddb_resource", lambda: FakeDdb(t))
+
+    repo = icr.IntentCacheRepo()
+    repo.put("pl#x", {"intent": "faq", "confidence": 0.91, "slots": {"topic": "hours"}}, ttl_seconds=60)
+    assert repo.get("pl#x") == {"intent": "faq", "confidence": 0.91, "slots": {"topic": "hours"}}
+
+    t.items["pl#x"]["ttl"] = int(time.time()) - 1
+    assert repo.get("pl#x") is None
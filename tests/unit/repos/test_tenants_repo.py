@@ -57,3 +57,23 @@ def test_find_by_twilio_to_returns_none_on_empty(monkeypatch):
     monkeypatch.setattr(tr, "ddb_resource", lambda: FakeDdb(t))
     repo = tr.TenantsRepo()
     assert repo.find_by_twilio_to("") is None
+
+
+def test_kb_settings_tenant_values_env_and_defaults(monkeypatch):
+    monkeypatch.setenv("KB_VECTOR_MIN_SCORE_LOW", "0.6")
+    monkeypatch.delenv("KB_PROMPT_MAX_TOKENS", raising=False)
+
+    s = tr.KBTenantSettings.from_item({"kb_parameters": {"kb_smalltalk_min_score": "0.7", "kb_prompt_max_tokens": ""}})
+    assert s.smalltalk_min_score == 0.7  # wartość tenanta
+    assert s.vector_min_score_low == 0.6  # ENV
+    assert s.prompt_max_tokens == tr.KB_PROMPT_MAX_TOKENS  # stała
+    assert tr.KBTenantSettings.from_item(None) == tr.KBTenantSettings.from_item({"kb_parameters": "x"})
+
+
+def test_kb_getters_read_settings_snapshot(monkeypatch):
+    t = FakeTable()
+    t.item = {"tenant_id": "t1", "kb_parameters": {"kb_vector_fastpath_min_score": 0.8}}
+    monkeypatch.setattr(tr, "ddb_resource", lambda: FakeDdb(t))
+    repo = tr.TenantsRepo()
+    assert repo.get_kb_vector_fastpath_min_score("t1") == 0.8
+    assert repo.get_kb_settings("t1").vector_fastpath_min_score == 0.8
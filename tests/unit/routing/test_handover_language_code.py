@@ -5,7 +5,7 @@ from tests.conftest import wire_subservices
 
 def test_handover_reply_contains_language_code(monkeypatch):
     class DummyNLU:
-        def classify_intent(self, text: str, lang: str | None):
+        def classify_intent(self, text: str, lang: str | None, tenant_id=None):
             return {"intent": "handover", "confidence": 0.99, "slots": {}}
 
     class DummyTpl:
@@ -29,10 +29,10 @@ def test_router_przekazuje_do_routingservice_conversation_id_z_body(monkeypatch)
     monkeypatch.setattr(h.MESSAGES, "log_message", lambda **kwargs: None)
 
     # 3) Patch: _publish_actions (no-op), żeby nie wołać SQS
-    monkeypatch.setattr(h, "_publish_actions", lambda actions, original_body: None)
+    monkeypatch.setattr(h, "_publish_actions", lambda actions, original_body, **kwargs: None)
 
     # 4) Patch: RoutingService.handle – przechwytujemy Message, nic nie robimy dalej
-    def fake_handle(msg):
+    def fake_handle(msg, emit=None):
         captured["conversation_id"] = msg.conversation_id
         captured["tenant_id"] = msg.tenant_id
         captured["from_phone"] = msg.from_phone
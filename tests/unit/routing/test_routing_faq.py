@@ -4,7 +4,7 @@ from tests.conftest import wire_subservices
 
 def test_faq_intent_uses_kb_service_answer(monkeypatch):
     class DummyNLU:
-        def classify_intent(self, text: str, lang: str | None):
+        def classify_intent(self, text: str, lang: str | None, tenant_id=None):
             return {
                 "intent": "faq",
                 "confidence": 0.9,
@@ -7,7 +7,7 @@ def test_handover_without_nlu_uses_precomputed_intent(monkeypatch):
     called = {"nlu_called": False}
 
     class DummyNLU:
-        def classify_intent(self, text: str, lang: str | None):
+        def classify_intent(self, text: str, lang: str | None, tenant_id=None):
             called["nlu_called"] = True
             return {"intent": "faq", "confidence": 0.9, "slots": {}}
 
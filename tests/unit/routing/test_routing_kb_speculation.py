@@ -0,0 +1,267 @@
+import threading
+import time
+
+from src.common.config import settings
+from src.domain.models import Message
+from src.services.kb_service import KBRetrieval
+from src.services.language_service import LanguageService
+from src.services.routing_service import RoutingService
+
+
+class FakeConv:
+    def __init__(self, conv):
+        self.conv = conv
+
+    def get_conversation(self, tenant_id, channel, channel_user_id):
+        return self.conv
+
+    def upsert_conversation(self, *args, **kwargs):
+        pass
+
+
+class FakeTenants:
+    def get(self, tenant_id):
+        return {"language_code": "pl"}
+
+
+class FakeCrmFlow:
+    def handle_pending_confirmation(self, msg, lang):
+        return None
+
+
+class FakeTpl:
+    def render_named(self, tenant_id, name, lang, ctx):
+        return name
+
+
+class FakeMetrics:
+    def __init__(self):
+        self.calls = []
+
+    def incr(self, name, **kwargs):
+        self.calls.append((name, kwargs))
+
+    def names(self):
+        return [name for name, _ in self.calls]
+
+
+class FakeKB:
+    def __init__(self, barrier=None):
+        self.barrier = barrier
+        self.retrievals = 0
+        self.answers = []
+        self.exact = {}
+
+    def retrieve_for_answer(self, *, question, tenant_id, language_code=None):
+        self.retrievals += 1
+        if self.barrier:
+            self.barrier.wait()
+        return KBRetrieval(question=question.strip(), tenant_id=tenant_id, language_code=language_code)
+
+    def answer_ai(self, **kwargs):
+        self.answers.append(kwargs)
+        return "odpowiedź"
+
+    def exact_answer(self, question, tenant_id, language_code):
+        return self.exact.get(question)
+
+    def normalize_ai_answer(self, text):
+        return text
+
+
+def _service(nlu, kb, metrics):
+    conv_repo = FakeConv({"language_code": "pl", "updated_at": int(time.time()) - 10})
+    return RoutingService(
+        nlu=nlu,
+        kb=kb,
+        tpl=FakeTpl(),
+        metrics=metrics,
+        conv=conv_repo,
+        tenants=FakeTenants(),
+        messages=None,
+        crm_flow=FakeCrmFlow(),
+        language=LanguageService(conv=conv_repo, tenants=FakeTenants()),
+    )
+
+
+def _msg(body):
+    return Message(tenant_id="t1", from_phone="+48111", to_phone="+48999", body=body)
+
+
+def test_faq_retrieval_overlaps_nlu_and_is_reused(monkeypatch):
+    monkeypatch.setattr(settings, "kb_speculative_retrieval", True, raising=False)
+    # NLU i retrieval czekają na siebie nawzajem – sekwencyjnie test by nie przeszedł
+    barrier = threading.Barrier(2, timeout=5)
+
+    class NLU:
+        def classify_intent(self, text, lang, tenant_id=None):
+            barrier.wait()
+            return {"intent": "faq", "confidence": 0.9, "slots": {}}
+
+    kb, metrics = FakeKB(barrier), FakeMetrics()
+    actions = _service(NLU(), kb, metrics).handle(_msg("Do której jest otwarty klub?"))
+
+    assert actions[0].payload["body"] == "odpowiedź"
+    assert kb.retrievals == 1
+    prefetched = kb.answers[0]["prefetched"]
+    assert prefetched.matches(question="Do której jest otwarty klub?", tenant_id="t1", language_code="pl")
+    assert metrics.names() == ["KBSpeculationStarted", "KBSpeculationUsed"]
+
+
+def test_non_faq_intent_discards_speculation(monkeypatch):
+    monkeypatch.setattr(settings, "kb_speculative_retrieval", True, raising=False)
+
+    class NLU:
+        def classify_intent(self, text, lang, tenant_id=None):
+            return {"intent": "ack", "confidence": 0.9, "slots": {}}
+
+    kb, metrics = FakeKB(), FakeMetrics()
+    actions = _service(NLU(), kb, metrics).handle(_msg("Dzięki, to wszystko na dziś"))
+
+    assert actions[0].payload["body"] == "ack_fallback_text"
+    assert kb.answers == []
+    wasted = [kw for name, kw in metrics.calls if name == "KBSpeculationWasted"]
+    assert len(wasted) == 1
+    assert wasted[0]["intent"] == "ack"
+    assert wasted[0]["tenant_id"] == "t1"
+
+
+def test_exact_faq_question_does_not_wait_for_speculation(monkeypatch):
+    monkeypatch.setattr(settings, "kb_speculative_retrieval", True, raising=False)
+    release = threading.Event()
+
+    class NLU:
+        def classify_intent(self, text, lang, tenant_id=None):
+            return {"intent": "faq", "confidence": 0.9, "slots": {}}
+
+    class SlowKB(FakeKB):
+        def retrieve_for_answer(self, **kwargs):
+            release.wait(30)  # embedding + Pinecone "wiszą"
+            return super().retrieve_for_answer(**kwargs)
+
+    kb, metrics = SlowKB(), FakeMetrics()
+    kb.exact = {"Do której jest otwarty klub?": "Do 22."}
+    try:
+        actions = _service(NLU(), kb, metrics).handle(_msg("Do której jest otwarty klub?"))
+        # odpowiedź gotowa, zanim spekulacja skończyła retrieval
+        assert kb.retrievals == 0
+    finally:
+        release.set()
+
+    assert actions[0].payload["body"] == "Do 22."
+    assert kb.answers == []
+    assert "KBSpeculationUsed" not in metrics.names()
+    assert "KBSpeculationWasted" in metrics.names()
+
+
+def test_slow_speculation_falls_back_at_invocation_deadline(monkeypatch):
+    from src.common import deadline
+
+    monkeypatch.setattr(settings, "kb_speculative_retrieval", True, raising=False)
+    release = threading.Event()
+
+    class NLU:
+        def classify_intent(self, text, lang, tenant_id=None):
+            # NLU zużywa budżet invokacji – na spekulację zostaje ~0
+            deadline.set_deadline(0.05)
+            return {"intent": "faq", "confidence": 0.9, "slots": {}}
+
+    class SlowKB(FakeKB):
+        def retrieve_for_answer(self, **kwargs):
+            release.wait(30)
+            return super().retrieve_for_answer(**kwargs)
+
+    kb, metrics = SlowKB(), FakeMetrics()
+    try:
+        actions = _service(NLU(), kb, metrics).handle(_msg("Do której jest otwarty klub?"))
+        assert kb.retrievals == 0
+    finally:
+        release.set()
+
+    assert actions[0].payload["body"] == "odpowiedź"
+    # answer_ai robi retrieval sam
+    assert kb.answers[0]["prefetched"] is None
+    failed = [kw for name, kw in metrics.calls if name == "KBSpeculationFailed"]
+    assert failed and failed[0]["reason"] == "timeout"
+
+
+def test_speculation_disabled_or_not_faq_like(monkeypatch):
+    class NLU:
+        def classify_intent(self, text, lang, tenant_id=None):
+            return {"intent": "faq", "confidence": 0.9, "slots": {}}
+
+    monkeypatch.setattr(settings, "kb_speculative_retrieval", False, raising=False)
+    kb, metrics = FakeKB(), FakeMetrics()
+    _service(NLU(), kb, metrics).handle(_msg("Do której jest otwarty klub?"))
+    assert kb.retrievals == 0
+    assert "prefetched" not in kb.answers[0]
+
+    # włączone, ale krótka wiadomość bez "?" nie wygląda na FAQ
+    monkeypatch.setattr(settings, "kb_speculative_retrieval", True, raising=False)
+    kb, metrics = FakeKB(), FakeMetrics()
+    _service(NLU(), kb, metrics).handle(_msg("cześć"))
+    assert kb.retrievals == 0
+    assert metrics.calls == []
+
+
+def test_faq_emits_streamed_segment_and_returns_remainder():
+    class NLU:
+        def classify_intent(self, text, lang, tenant_id=None):
+            return {"intent": "faq", "confidence": 0.9, "slots": {}}
+
+    class StreamingKB(FakeKB):
+        def answer_ai(self, **kwargs):
+            kwargs["on_partial"]("Czynne 8-20.")
+            return "Czynne 8-20.\n\nW soboty 9-14."
+
+    emitted = []
+    actions = _service(NLU(), StreamingKB(), FakeMetrics()).handle(_msg("Kiedy otwarte?"), emit=emitted.append)
+
+    assert [a.payload["body"] for a in emitted] == ["Czynne 8-20."]
+    assert [a.payload["body"] for a in actions] == ["W soboty 9-14."]
+
+
+def test_faq_streamed_segment_is_normalized_and_not_resent_on_mismatch():
+    class NLU:
+        def classify_intent(self, text, lang, tenant_id=None):
+            return {"intent": "faq", "confidence": 0.9, "slots": {}}
+
+    class StreamingKB(FakeKB):
+        def normalize_ai_answer(self, text):
+            return text.replace("  ", " ")
+
+        def answer_ai(self, **kwargs):
+            kwargs["on_partial"]("Klub jest czynny  codziennie 8-20.")
+            # pełna odpowiedź różni się początkiem od wysłanego fragmentu
+            return "Klub czynny codziennie 8-20. W soboty 9-14."
+
+    emitted = []
+    actions = _service(NLU(), StreamingKB(), FakeMetrics()).handle(_msg("Kiedy otwarte?"), emit=emitted.append)
+
+    assert [a.payload["body"] for a in emitted] == ["Klub jest czynny codziennie 8-20."]
+    # pierwszy fragment nie jest powtarzany – tylko reszta odpowiedzi
+    assert [a.payload["body"] for a in actions] == ["W soboty 9-14."]
+
+
+def test_remainder_after_streamed_ignores_whitespace_differences():
+    svc = _service(None, FakeKB(), FakeMetrics())
+
+    assert svc._remainder_after_streamed("Czynne\n8-20.\n\nW soboty 9-14.", "Czynne 8-20.") == "W soboty 9-14."
+    assert svc._remainder_after_streamed("Czynne 8-20.", "Czynne 8-20.") == ""
+
+
+def test_faq_streamed_segment_is_not_followed_by_no_info_template():
+    class NLU:
+        def classify_intent(self, text, lang, tenant_id=None):
+            return {"intent": "faq", "confidence": 0.9, "slots": {}}
+
+    class StreamingKB(FakeKB):
+        def answer_ai(self, **kwargs):
+            kwargs["on_partial"]("Czynne 8-20.")
+            return None  # np. strumień przerwany po pierwszym fragmencie
+
+    emitted = []
+    actions = _service(NLU(), StreamingKB(), FakeMetrics()).handle(_msg("Kiedy otwarte?"), emit=emitted.append)
+
+    assert [a.payload["body"] for a in emitted] == ["Czynne 8-20."]
+    assert actions == []
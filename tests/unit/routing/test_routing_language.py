@@ -105,3 +105,30 @@ def test_does_not_override_language_on_verification_code(monkeypatch):
     monkeypatch.setattr(svc, "_detect_language", lambda text: "pl")
     lang = svc.resolve_and_persist_language(_build_msg("KOD:ABC123"))
     assert lang == "pl"
+
+
+def test_detect_language_uses_local_model_before_comprehend(monkeypatch):
+    svc = LanguageService(conv=InMemoryConversations(), tenants=FakeTenantsRepo(lang="auto"))
+    calls = []
+    monkeypatch.setattr(svc, "_detect_language_comprehend", lambda text: calls.append(text) or "es")
+
+    assert svc._detect_language("Jakie są godziny otwarcia w sobotę?") == "pl"
+    assert svc._detect_language("Wann öffnet das Studio morgen früh?") == "de"
+    assert calls == []
+
+    # niska pewność lokalna (język spoza profili) -> Comprehend
+    assert svc._detect_language("¿A qué hora abre el gimnasio mañana?") == "es"
+    assert len(calls) == 1
+
+
+def test_comprehend_client_is_created_on_first_use(monkeypatch):
+    import src.services.language_service as ls
+
+    created = []
+    monkeypatch.setattr(ls, "comprehend_client", lambda: created.append(1) or object())
+
+    svc = LanguageService(conv=InMemoryConversations(), tenants=FakeTenantsRepo(lang="pl"))
+    assert created == []
+
+    assert svc._comprehend is svc._comprehend
+    assert created == [1]
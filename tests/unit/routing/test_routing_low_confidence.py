@@ -11,7 +11,7 @@ class DummyNLU:
         self._result = result
         self.calls: list[tuple[str, str | None]] = []
 
-    def classify_intent(self, text: str, lang: str | None):
+    def classify_intent(self, text: str, lang: str | None, tenant_id=None):
         # logujemy wywołania na wszelki wypadek
         self.calls.append((text, lang))
         return self._result
@@ -368,7 +368,7 @@ def test_reserve_class_with_class_type_name_returns_list_not_confirmation(
             },
         }
 
-    monkeypatch.setattr(router.nlu, "classify_intent", lambda body, lang: fake_detect_intent())
+    monkeypatch.setattr(router.nlu, "classify_intent", lambda body, lang, tenant_id=None: fake_detect_intent())
 
     msg = Message(
         tenant_id="tenantA",
@@ -16,7 +16,7 @@ class FakeNLUService:
     def __init__(self):
         self.calls = []
 
-    def classify_intent(self, text: str, lang: str):
+    def classify_intent(self, text: str, lang: str, tenant_id=None):
         self.calls.append((text, lang))
         # pierwsza wiadomość -> rezerwacja zajęć
         if "zapis" in text.lower() or "zaję" in text.lower():
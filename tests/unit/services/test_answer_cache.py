@@ -0,0 +1,84 @@
+from src.services.answer_cache import SemanticAnswerCache
+
+
+class FakeRepo:
+    enabled = True
+
+    def __init__(self):
+        self.versions = {}
+        self.entries = {}
+        self.version_reads = 0
+
+    def get_version(self, tenant_id, lang):
+        self.version_reads += 1
+        return self.versions.get((tenant_id, lang), 0)
+
+    def bump_version(self, tenant_id, lang):
+        self.versions[(tenant_id, lang)] = self.versions.get((tenant_id, lang), 0) + 1
+        return self.versions[(tenant_id, lang)]
+
+    def list_entries(self, tenant_id, lang, version, limit):
+        return list(reversed(self.entries.get((tenant_id, lang, version), [])))[:limit]
+
+    def put_entry(self, tenant_id, lang, version, vec, answer, ttl_seconds):
+        self.entries.setdefault((tenant_id, lang, version), []).append({"vec": vec, "answer": answer})
+
+
+def test_lookup_by_cosine_threshold_per_tenant_and_lang():
+    repo = FakeRepo()
+    cache = SemanticAnswerCache(repo=repo, version_ttl_seconds=0)
+    cache.store("t1", "pl", [1.0, 0.0, 0.0], "Otwarte 6-23")
+
+    assert cache.lookup("t1", "pl", [0.99, 0.05, 0.0], min_score=0.95) == "Otwarte 6-23"
+    assert cache.lookup("t1", "pl", [0.6, 0.8, 0.0], min_score=0.95) is None
+    assert cache.lookup("t1", "en", [1.0, 0.0, 0.0], min_score=0.95) is None
+    assert cache.lookup("t2", "pl", [1.0, 0.0, 0.0], min_score=0.95) is None
+
+    # inny kontener widzi wpis przez repo
+    other = SemanticAnswerCache(repo=repo, version_ttl_seconds=0)
+    assert other.lookup("t1", "pl-PL", [1.0, 0.0, 0.0], min_score=0.95) == "Otwarte 6-23"
+
+
+def test_invalidate_bumps_version_for_all_containers():
+    repo = FakeRepo()
+    writer = SemanticAnswerCache(repo=repo, version_ttl_seconds=0)
+    reader = SemanticAnswerCache(repo=repo, version_ttl_seconds=0)
+    writer.store("t1", "pl", [1.0, 0.0], "stara odpowiedź")
+    assert reader.lookup("t1", "pl", [1.0, 0.0], min_score=0.9) == "stara odpowiedź"
+
+    assert writer.invalidate("t1", "pl") == 1
+
+    assert reader.lookup("t1", "pl", [1.0, 0.0], min_score=0.9) is None
+    assert writer.lookup("t1", "pl", [1.0, 0.0], min_score=0.9) is None
+
+
+def test_disabled_without_table():
+    class NoTable(FakeRepo):
+        enabled = False
+
+    cache = SemanticAnswerCache(repo=NoTable())
+    cache.store("t1", "pl", [1.0], "x")
+    assert cache.lookup("t1", "pl", [1.0], min_score=0.5) is None
+
+
+def test_reloads_entries_stored_by_other_containers_within_same_version(monkeypatch):
+    from src.services import answer_cache as mod
+
+    now = [1000.0]
+    monkeypatch.setattr(mod.time, "time", lambda: now[0])
+    repo = FakeRepo()
+    reader = SemanticAnswerCache(repo=repo, version_ttl_seconds=600, reload_ttl_seconds=30)
+    writer = SemanticAnswerCache(repo=repo, version_ttl_seconds=600, reload_ttl_seconds=30)
+
+    assert reader.lookup("t1", "pl", [1.0, 0.0], min_score=0.9) is None
+    writer.store("t1", "pl", [1.0, 0.0], "Otwarte 6-23")
+
+    # przed upływem reload TTL reader nie widzi nowego wpisu
+    now[0] += 10
+    assert reader.lookup("t1", "pl", [1.0, 0.0], min_score=0.9) is None
+
+    # po reload TTL – widzi, bez ponownego sprawdzania wersji
+    now[0] += 25
+    reads = repo.version_reads
+    assert reader.lookup("t1", "pl", [1.0, 0.0], min_score=0.9) == "Otwarte 6-23"
+    assert repo.version_reads == reads
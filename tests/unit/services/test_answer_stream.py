@@ -0,0 +1,36 @@
+import json
+
+from src.services.answer_stream import AnswerStreamParser, first_segment_end
+
+
+def test_parser_decodes_field_split_across_chunks():
+    raw = json.dumps({"answer": 'Klub "Fit"\nczynny 8–20 💪', "x": 1})
+    parser = AnswerStreamParser("answer")
+    # rozcinamy w każdym miejscu, także w środku escape'ów i pary surogatów
+    out = "".join(parser.feed(ch) for ch in raw)
+    assert out == parser.text == 'Klub "Fit"\nczynny 8–20 💪'
+    assert parser.done
+    assert parser.feed("więcej") == ""
+
+
+def test_parser_waits_for_key():
+    parser = AnswerStreamParser("answer")
+    assert parser.feed('{"ans') == ""
+    assert parser.feed('wer": "Ok') == "Ok"
+    assert not parser.done
+
+
+def test_first_segment_end_prefers_paragraph_then_sentence():
+    assert first_segment_end("Krótko.", 20) is None
+    text = "Pierwszy akapit jest dość długi.\n\nDrugi akapit."
+    assert text[: first_segment_end(text, 40)] == "Pierwszy akapit jest dość długi."
+    text = "Zdanie pierwsze. Zdanie drugie jest dłuższe. Trzecie"
+    assert text[: first_segment_end(text, 20)] == "Zdanie pierwsze. Zdanie drugie jest dłuższe."
+
+
+def test_parser_keeps_invalid_escapes_as_text():
+    parser = AnswerStreamParser("answer")
+    raw = '{"answer": "ceny \\x20 i \\uZZ"}'
+    out = "".join(parser.feed(ch) for ch in raw)
+    assert out == "ceny \\x20 i \\uZZ"
+    assert parser.done
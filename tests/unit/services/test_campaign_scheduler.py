@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+
+from src.services.campaign_scheduler import CampaignScheduler, CampaignSlice
+
+
+def _at(hour, minute=0):
+    # 2026-01-15: zima, Europe/Warsaw = UTC+1, Asia/Dubai = UTC+4
+    return datetime(2026, 1, 15, hour, minute, tzinfo=timezone.utc)
+
+
+def make_scheduler(now, **kwargs):
+    kwargs.setdefault("tick_seconds", 900)
+    kwargs.setdefault("default_rps", 1)
+    return CampaignScheduler(now_fn=lambda: now, **kwargs)
+
+
+def test_window_respects_recipient_timezone():
+    s = make_scheduler(_at(7, 30))
+    campaign = {"send_from": "09:00", "send_to": "20:00"}
+
+    # 08:30 w Warszawie, 11:30 w Dubaju
+    assert s.is_open(campaign, "Europe/Warsaw") is False
+    assert s.is_open(campaign, "Asia/Dubai") is True
+    assert s.next_open_at(campaign, "Europe/Warsaw") == _at(8, 0)
+
+
+def test_overnight_window():
+    s = make_scheduler(_at(23, 30))
+    campaign = {"send_from": "20:00", "send_to": "02:00"}
+
+    # 00:30 w Warszawie -> zostało 1.5h
+    assert s.seconds_left(campaign, "Europe/Warsaw") == 90 * 60
+
+
+def test_bucket_by_timezone_uses_longest_prefix():
+    s = make_scheduler(_at(10))
+    buckets = s.bucket_by_timezone(["+48111", "whatsapp:+971500", "+1555", "", "+48222"])
+
+    assert buckets == {
+        "Europe/Warsaw": [0, 4],
+        "Asia/Dubai": [1],
+        "Europe/Berlin": [2, 3],
+    }
+
+
+def test_pacing_rate_uses_share_of_tenant_outbound_limit():
+    s = make_scheduler(_at(10), outbound_share=0.5)
+
+    assert s.pacing_rate({"limits": {"outbound": {"per_tenant_rps": 10}}}) == 5
+    assert s.pacing_rate({}) == 1
+
+
+def test_plan_shares_budget_and_skips_closed_windows():
+    s = make_scheduler(_at(7, 30), tick_seconds=10)
+    campaign = {"send_from": "09:00", "send_to": "20:00"}
+    buckets = {"Asia/Dubai": list(range(30)), "Europe/Warsaw": [30, 31]}
+
+    slices = s.plan(campaign, buckets, {"Asia/Dubai": 5}, rate=2)
+
+    # budżet 2 rps * 10 s = 20, Warszawa jeszcze zamknięta
+    assert slices == [CampaignSlice(timezone="Asia/Dubai", start=5, end=25)]
+
+
+def test_plan_does_not_delay_past_window_end():
+    s = make_scheduler(_at(18, 59), tick_seconds=900)
+    campaign = {"send_from": "09:00", "send_to": "20:00"}
+
+    # 19:59 w Warszawie -> 60 s okna, 1 rps
+    slices = s.plan(campaign, {"Europe/Warsaw": list(range(500))}, {}, rate=1)
+
+    assert slices == [CampaignSlice(timezone="Europe/Warsaw", start=0, end=60)]
+    assert s.delay_seconds(59, 1) == 59
+
+
+def test_next_run_time_until_done():
+    s = make_scheduler(_at(7, 30), tick_seconds=900)
+    campaign = {"send_from": "09:00", "send_to": "20:00"}
+    buckets = {"Europe/Warsaw": [0, 1]}
+
+    # okno zamknięte -> najbliższe otwarcie (08:00 UTC = 09:00 Europe/Berlin)
+    assert s.next_run_time(campaign, buckets, {}) == "2026-01-15T09:00:00"
+    assert s.next_run_time(campaign, buckets, {"Europe/Warsaw": 2}) is None
@@ -0,0 +1,50 @@
+from src.services.container import ServiceContainer
+from src.services.routing_service import RoutingService
+
+
+def test_container_builds_lazily_and_shares_dependencies():
+    c = ServiceContainer()
+    assert c.built() == []
+
+    kb = c.kb()
+    nlu = c.nlu()
+    flow = c.crm_flow()
+
+    # jeden TenantsRepo / OpenAIClient / ClientsFactory na proces
+    assert kb.tenants is c.tenants() is flow.tenants is c.tpl().tenants
+    assert kb._client is nlu.client is c.openai()
+    assert flow.crm is c.crm()
+    assert flow._clients_factory is kb._clients_factory is c.clients_factory()
+    assert c.kb() is kb
+    assert "ticketing" not in c.built()
+    assert set(c.init_timings()) == set(c.built())
+
+
+def test_routing_service_wires_components_on_first_use():
+    c = ServiceContainer()
+    router = RoutingService(container=c)
+    assert c.built() == []
+
+    assert router.language is c.language()
+    assert router.language.conv is router.conv
+    assert "kb" not in c.built() and "nlu" not in c.built()
+
+
+def test_routing_service_injected_dependency_is_used_by_derived_services():
+    class FakeConv:
+        pass
+
+    c = ServiceContainer()
+    conv = FakeConv()
+    router = RoutingService(conv=conv, container=c)
+
+    assert router.conv is conv
+    assert router.language.conv is conv
+    assert router.crm_flow.conv is conv
+    # serwisy niezależne od conv nadal idą z kontenera
+    assert router.crm is c.crm()
+    assert "language" not in c.built()
+
+    # przypisanie nadpisuje leniwy atrybut (testy/monkeypatch)
+    router.kb = "kb"
+    assert router.kb == "kb"
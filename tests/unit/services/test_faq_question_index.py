@@ -0,0 +1,35 @@
+from src.services.faq_question_index import FAQQuestionIndex, normalize_question
+
+FAQ = {
+    "entries": [
+        {"key": "hours", "questions": ["Jakie są godziny otwarcia?", "Do której otwarte?"], "answer": "6-23"},
+        {"key": "greeting", "questions": ["cześć"], "answer": "Cześć!", "category": "smalltalk"},
+        {"key": "a", "questions": ["cena"], "answer": "100 zł"},
+        {"key": "b", "questions": ["Cena!"], "answer": "120 zł"},
+    ]
+}
+
+
+def test_normalize_question_folds_case_punctuation_and_diacritics():
+    assert normalize_question("  Jakie SĄ godziny   otwarcia?? ") == "jakie sa godziny otwarcia"
+    assert normalize_question("Cześć, łódź!") == "czesc lodz"
+    assert normalize_question("?!") == ""
+
+
+def test_lookup_exact_and_near_exact_questions():
+    index = FAQQuestionIndex.build(FAQ)
+    assert index.lookup("Jakie są godziny otwarcia?") == "6-23"
+    assert index.lookup("jakie sa godziny otwarcia") == "6-23"
+    assert index.lookup("CZESC!!!") == "Cześć!"
+    assert index.lookup("Jakie są godziny otwarcia w niedzielę?") is None
+
+
+def test_ambiguous_questions_are_not_indexed():
+    index = FAQQuestionIndex.build(FAQ)
+    assert index.lookup("cena") is None
+    assert len(index) == 3
+
+
+def test_legacy_faq_has_no_question_index():
+    assert len(FAQQuestionIndex.build({"hours": "8-20"})) == 0
+    assert FAQQuestionIndex.build(None).lookup("hours") is None
@@ -0,0 +1,47 @@
+from src.services.intent_cache import IntentCache, normalize_for_cache
+
+
+class FakeRepo:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.items = {}
+
+    def get(self, pk):
+        return self.items.get(pk)
+
+    def put(self, pk, result, ttl_seconds):
+        self.items[pk] = dict(result)
+
+
+def test_normalize_for_cache_keeps_digits():
+    assert normalize_for_cache("  Godziny   otwarcia?? ") == "godziny otwarcia"
+    assert normalize_for_cache("rezerwuj 12") != normalize_for_cache("rezerwuj 13")
+
+
+def test_cache_hit_per_language_and_lru_bound():
+    cache = IntentCache(repo=FakeRepo(enabled=False), max_items=2, ttl_seconds=60, min_confidence=0.6)
+    result = {"intent": "faq", "confidence": 0.9, "slots": {"topic": "hours"}}
+
+    cache.put("Godziny otwarcia?", "pl", result)
+    hit, source = cache.get("godziny otwarcia", "pl")
+    assert hit == result and source == "memory"
+    assert cache.get("godziny otwarcia", "en") == (None, None)
+
+    # niska pewność nie trafia do cache
+    cache.put("hmm", "pl", {"intent": "clarify", "confidence": 0.3, "slots": {}})
+    assert cache.get("hmm", "pl") == (None, None)
+
+    cache.put("cennik", "pl", result)
+    cache.put("ok", "pl", result)
+    assert cache.get("godziny otwarcia", "pl") == (None, None)  # wypchnięte (max_items=2)
+
+
+def test_cache_falls_back_to_shared_repo():
+    repo = FakeRepo()
+    writer = IntentCache(repo=repo, ttl_seconds=60)
+    writer.put("cennik", "pl", {"intent": "faq", "confidence": 0.95, "slots": {}})
+
+    reader = IntentCache(repo=repo, ttl_seconds=60)  # inny kontener
+    hit, source = reader.get("Cennik!", "pl")
+    assert hit["intent"] == "faq" and source == "ddb"
+    assert reader.get("cennik", "pl")[1] == "memory"
@@ -0,0 +1,78 @@
+from src.services.intent_classifier import IntentModelStore, LocalIntentModel, model_key, normalize_text
+
+SAMPLES = [
+    ("ok", "ack"), ("ok dzięki", "ack"), ("dziękuję", "ack"), ("dzieki bardzo", "ack"), ("super, dzięki", "ack"),
+    ("jakie są dostępne zajęcia", "crm_available_classes"), ("pokaż dostępne zajęcia", "crm_available_classes"),
+    ("jakie zajęcia są jutro", "crm_available_classes"), ("lista zajęć na jutro", "crm_available_classes"),
+    ("jaki mam status umowy", "crm_contract_status"), ("status mojej umowy", "crm_contract_status"),
+    ("do kiedy mam umowę", "crm_contract_status"), ("czy moja umowa jest aktywna", "crm_contract_status"),
+    ("stop", "marketing_optout"), ("nie wysyłajcie mi wiadomości", "marketing_optout"),
+    ("wypisz mnie z wiadomości", "marketing_optout"), ("nie chcę sms", "marketing_optout"),
+    ("w jakich godzinach jest otwarty klub", "faq"), ("czy jest parking przy klubie", "faq"),
+    ("ile kosztuje karnet", "faq"), ("czy macie saunę", "faq"),
+]
+
+
+def test_normalize_text_strips_diacritics_and_digits():
+    assert normalize_text("  Zażółć  GĘŚLĄ 2024 ") == "zazolc gesla 0"
+
+
+def test_train_predict_and_roundtrip():
+    model = LocalIntentModel.train(SAMPLES)
+
+    assert model.predict("jakie są dostępne zajęcia jutro")[0] == "crm_available_classes"
+    assert model.predict("wypisz mnie z wiadomości")[0] == "marketing_optout"
+    intent, conf = model.predict("status umowy")
+    assert intent == "crm_contract_status" and 0.0 < conf <= 1.0
+
+    restored = LocalIntentModel.loads(model.dumps())
+    assert restored.intents == model.intents
+    assert restored.predict("status umowy")[0] == "crm_contract_status"
+    assert abs(restored.predict("status umowy")[1] - conf) < 1e-3
+    assert (restored.min_similarity, restored.min_margin) == (model.min_similarity, model.min_margin)
+
+
+def test_predict_rejects_short_and_out_of_domain_text():
+    model = LocalIntentModel.train(SAMPLES)
+
+    # softmax daje tu ~0.99, ale cosine do najbliższego centroidu jest niski
+    for text in ("nie", "stopa mnie boli, mogę ćwiczyć?", "jak anulować umowę"):
+        assert model.scores(text)[max(model.scores(text), key=model.scores(text).get)] > 0.9
+        assert model.predict(text) == (None, 0.0)
+
+    # jawne progi nadpisują te z modelu
+    assert model.predict("jak anulować umowę", min_similarity=0.0, min_margin=0.0)[0] == "crm_contract_status"
+
+
+def test_calibrate_picks_thresholds_meeting_target_precision():
+    model = LocalIntentModel.train(SAMPLES)
+    holdout = [
+        ("status umowy", "crm_contract_status"),
+        ("pokaż zajęcia na jutro", "crm_available_classes"),
+        ("ok dzięki", "ack"),
+        ("jak anulować umowę", "crm_cancel_contract"),
+        ("czy mogę zamrozić umowę", "crm_freeze_contract"),
+    ]
+
+    report = model.calibrate(holdout, intents={"ack", "crm_contract_status", "crm_available_classes"}, target_precision=1.0)
+
+    assert report["calibrated"] is True and report["precision"] == 1.0
+    for text, intent in holdout[:3]:
+        assert model.predict(text)[0] == intent
+    for text, _ in holdout[3:]:
+        assert model.predict(text)[0] is None
+
+
+def test_store_loads_tenant_model_then_default_and_caches(tmp_path):
+    model = LocalIntentModel.train(SAMPLES)
+    path = tmp_path / model_key("_default", "pl")
+    path.parent.mkdir(parents=True)
+    path.write_text(model.dumps(), encoding="utf-8")
+
+    store = IntentModelStore(bucket="", local_dir=str(tmp_path), ttl_seconds=60)
+    loaded = store.get("t1", "pl")
+    assert loaded is not None and loaded.intents == model.intents
+    assert store.get("t1", "en") is None
+
+    path.unlink()
+    assert store.get("t1", "pl") is loaded  # cache per proces
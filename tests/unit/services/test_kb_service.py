@@ -63,6 +63,71 @@ def test_load_tenant_faq_from_s3_and_cache(monkeypatch):
     assert dummy.calls == []
 
 
+def test_prime_loads_faq_and_builds_question_index_once(monkeypatch):
+    payload = json.dumps({"entries": [{"key": "hours", "questions": ["Godziny otwarcia?"], "answer": "6-23"}]})
+    dummy = DummyS3(payload)
+    monkeypatch.setattr(kb_mod, "s3_client", lambda: dummy)
+
+    svc = KBService(bucket="kb-bucket", openai_client=None)
+    assert svc.prime("tenant", "pl") == 1
+
+    # pierwsza wiadomość korzysta z gotowego indeksu, bez S3
+    dummy.calls.clear()
+    assert svc.exact_answer("godziny otwarcia", "tenant", "pl") == "6-23"
+    assert dummy.calls == []
+
+
+class VersionedS3:
+    """S3 z ETagiem i obsługą If-None-Match (304)."""
+
+    def __init__(self, payload: str):
+        self.payload = payload
+        self.calls = []
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        etag = f'"{hash(self.payload)}"'
+        self.calls.append(IfNoneMatch)
+        if IfNoneMatch == etag:
+            raise ClientError({"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject")
+        return {"Body": DummyBody(self.payload), "ETag": etag}
+
+
+def _faq(answer):
+    return json.dumps({"entries": [{"key": "price", "questions": ["Ile kosztuje karnet?"], "answer": answer}]})
+
+
+def test_question_index_expires_and_picks_up_faq_change(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(kb_mod.time, "monotonic", lambda: now[0])
+    monkeypatch.setenv("KB_FAQ_CACHE_TTL", "60")
+    s3 = VersionedS3(_faq("100 zl"))
+    monkeypatch.setattr(kb_mod, "s3_client", lambda: s3)
+
+    svc = KBService(bucket="kb-bucket", openai_client=None)
+    assert svc.exact_answer("ile kosztuje karnet", "tenant", "pl") == "100 zl"
+
+    # po TTL bez zmian – rewalidacja ETagiem (304), bez ponownego pobrania treści
+    now[0] += 61
+    assert svc.exact_answer("ile kosztuje karnet", "tenant", "pl") == "100 zl"
+    assert s3.calls[-1] is not None
+
+    s3.payload = _faq("150 zl")
+    assert svc.exact_answer("ile kosztuje karnet", "tenant", "pl") == "100 zl"  # jeszcze w TTL
+    now[0] += 61
+    assert svc.exact_answer("ile kosztuje karnet", "tenant", "pl") == "150 zl"
+
+
+def test_malformed_faq_json_falls_back_to_empty_index(monkeypatch):
+    dummy = DummyS3('{"entries": [')
+    monkeypatch.setattr(kb_mod, "s3_client", lambda: dummy)
+
+    svc = KBService(bucket="kb-bucket", openai_client=None)
+
+    assert svc._load_tenant_faq("tenant", "pl") is None
+    assert svc.exact_answer("ile kosztuje karnet", "tenant", "pl") is None
+    assert svc.prime("tenant", "pl") == 0
+
+
 def test_load_tenant_faq_no_such_key_sets_none(monkeypatch):
     monkeypatch.setattr(settings, "kb_bucket", "kb-bucket", raising=False)
     dummy = DummyS3("{}", raise_no_such_key=True)
@@ -128,3 +193,37 @@ def test_answer_ai_llm_failure_returns_none(monkeypatch):
     svc._client = DummyClient()
     ans = svc.answer_ai(question="q", tenant_id="t1")
     assert ans is None
+
+
+def test_smalltalk_classification_is_memoized_per_question():
+    kb_mod._smalltalk_only.cache_clear()
+    svc = KBService(bucket=None, openai_client=None)
+
+    assert svc._is_smalltalk_only("Cześć!") is True
+    assert svc._is_smalltalk_only("Cześć!") is True
+    assert svc._is_smalltalk_only("Cześć, jakie są godziny otwarcia") is False
+    assert svc._is_smalltalk_only("godziny?") is False
+    assert svc._is_smalltalk_only("  ") is False
+
+    info = kb_mod._smalltalk_only.cache_info()
+    assert info.hits == 1 and info.misses == 4
+
+    assert svc._norm("  Dzień   DOBRY!!! ") == "dzień dobry"
+
+
+def test_fastpath_answer_extraction():
+    assert kb_mod._fastpath_answer("Q: Godziny\nA: 8-20\ncodziennie") == "8-20\ncodziennie"
+    assert kb_mod._fastpath_answer("Q: Godziny a: 8-20") == "8-20"
+    assert kb_mod._fastpath_answer("Q: Godziny") == ""
+
+
+def test_faq_languages_lists_tenant_faq_files(monkeypatch):
+    class ListingS3:
+        def get_paginator(self, name):
+            assert name == "list_objects_v2"
+            keys = ["t1/faq_en.json", "t1/faq_pl.json", "t1/faq_pl.json.bak", "t1/faq_x/nested.json"]
+            return type("P", (), {"paginate": lambda self, **kw: [{"Contents": [{"Key": k} for k in keys]}]})()
+
+    monkeypatch.setattr(kb_mod, "s3_client", lambda: ListingS3())
+
+    assert KBService(bucket="kb-bucket", openai_client=None).faq_languages("t1") == ["en", "pl"]
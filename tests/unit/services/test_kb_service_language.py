@@ -26,7 +26,7 @@ def test_kb_service_uses_language_specific_faq(monkeypatch):
 
     # Ustaw bucket w env + w globalnym settings (Settings jest już zainicjalizowany)
     monkeypatch.setenv("KB_BUCKET", bucket_name)
-    settings.kb_bucket = bucket_name
+    monkeypatch.setattr(settings, "kb_bucket", bucket_name)
 
     # 2) Wrzucamy dwa różne pliki FAQ: PL i EN
     pl_faq = {"hours": "Godziny otwarcia: 6-22."}
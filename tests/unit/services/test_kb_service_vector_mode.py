@@ -1,4 +1,5 @@
 import json
+from src.services.tenant_config_service import TenantConfigService
 from tests.helpers.fakes_routing import (
     FakeTenantsRepo,
 )
@@ -69,6 +70,7 @@ def test_answer_ai_uses_vector_retrieval_when_enabled(monkeypatch):
     openai_client = DummyOpenAIClient()
     svc._client = openai_client
     svc.tenants = FakeTenantsRepo()
+    svc._tenant_cfg = TenantConfigService(repo=svc.tenants)
     
     # --- execute ---
     result = svc.answer_ai(
@@ -84,4 +86,283 @@ def test_answer_ai_uses_vector_retrieval_when_enabled(monkeypatch):
     assert openai_client.last_messages is not None
 
     system_prompt = openai_client.last_messages[0]["content"]
-    assert "Q: Hours" in system_prompt
\ No newline at end of file
+    assert "Q: Hours" in system_prompt
+
+def test_answer_ai_reuses_prefetched_retrieval(monkeypatch):
+    from src.services.kb_service import KBService
+
+    monkeypatch.setenv("KB_VECTOR_FASTPATH_MIN_SCORE", "0.5")
+
+    svc = KBService(bucket=None, openai_client=None)
+    svc.tenants = FakeTenantsRepo()
+    svc._tenant_cfg = TenantConfigService(repo=svc.tenants)
+
+    class DummyVector:
+        def __init__(self):
+            self.calls = 0
+
+        def enabled(self, tenant_id):
+            return True
+
+        def retrieve(self, *, tenant_id, language_code, question, category, top_k):
+            self.calls += 1
+            if category == "smalltalk":
+                return []
+            chunk = type("Chunk", (), {"chunk_id": "c1", "score": 0.9, "text": "Q: Hours\nA: 8-20", "faq_key": "Hours"})
+            return [chunk]
+
+    svc._vector = DummyVector()
+
+    prefetched = svc.retrieve_for_answer(question=" What are your hours? ", tenant_id="t1", language_code="pl")
+    assert svc._vector.calls == 2
+
+    ans = svc.answer_ai(question="What are your hours?", tenant_id="t1", language_code="pl", prefetched=prefetched)
+    assert ans == "8-20"
+    assert svc._vector.calls == 2  # brak ponownego embeddingu / zapytania do Pinecone
+
+    # prefetch dla innego języka jest ignorowany
+    svc.answer_ai(question="What are your hours?", tenant_id="t1", language_code="en", prefetched=prefetched)
+    assert svc._vector.calls == 4
+
+
+def test_answer_ai_uses_semantic_answer_cache_without_history(monkeypatch):
+    import json
+    from src.services.kb_service import KBService
+
+    class Cache:
+        enabled = True
+
+        def __init__(self):
+            self.stored = []
+
+        def lookup(self, tenant_id, language_code, vec, *, min_score):
+            assert min_score == 0.95
+            return self.stored[0][3] if self.stored else None
+
+        def store(self, tenant_id, language_code, vec, answer):
+            self.stored.append((tenant_id, language_code, vec, answer))
+
+    cache = Cache()
+    svc = KBService(bucket=None, openai_client=None, answer_cache=cache)
+    svc.tenants = FakeTenantsRepo()
+    svc._tenant_cfg = TenantConfigService(repo=svc.tenants)
+
+    class DummyVector:
+        def enabled(self, tenant_id):
+            return True
+
+        def retrieve(self, *, tenant_id, language_code, question, category, top_k):
+            if category == "smalltalk":
+                return []
+            return [type("Chunk", (), {"chunk_id": "c1", "score": 0.45, "text": "Q: Hours\nA: 8-20", "faq_key": "Hours"})]
+
+        def build_kb_prompt(self, chunks, language_code, strict_mode):
+            return "ctx"
+
+        def embed_question(self, question):
+            return [1.0, 0.0]
+
+    class Client:
+        calls = 0
+
+        def chat(self, messages, max_tokens=None):
+            Client.calls += 1
+            return json.dumps({"answer": "Czynne 8-20"})
+
+    svc._vector = DummyVector()
+    svc._client = Client()
+
+    assert svc.answer_ai(question="Kiedy otwarte?", tenant_id="t1", language_code="pl") == "Czynne 8-20"
+    assert svc.answer_ai(question="Kiedy jesteście otwarci?", tenant_id="t1", language_code="pl") == "Czynne 8-20"
+    assert Client.calls == 1
+    assert cache.stored == [("t1", "pl", [1.0, 0.0], "Czynne 8-20")]
+
+    # pytanie z kontekstem rozmowy omija cache
+    svc.answer_ai(question="A w sobotę?", tenant_id="t1", language_code="pl", history=[{"role": "user", "content": "Kiedy otwarte?"}])
+    assert Client.calls == 2
+
+
+def test_reindex_faq_invalidates_answer_cache():
+    from src.services.kb_service import KBService
+
+    class Cache:
+        enabled = True
+
+        def __init__(self):
+            self.invalidated = []
+
+        def invalidate(self, tenant_id, language_code):
+            self.invalidated.append((tenant_id, language_code))
+
+    class DummyVector:
+        def __init__(self, ok):
+            self.ok = ok
+
+        def enabled(self, tenant_id):
+            return True
+
+        def index_faq(self, *, tenant_id, language_code, faq, force=False):
+            return self.ok
+
+    cache = Cache()
+    svc = KBService(bucket="kb-bucket", openai_client=None, answer_cache=cache)
+    svc._cache[svc._cache_key("t1", "pl")] = {"hours": "8-20"}
+
+    svc._vector = DummyVector(ok=False)
+    assert svc.reindex_faq(tenant_id="t1", language_code="pl") is False
+    assert cache.invalidated == []
+
+    svc._vector = DummyVector(ok=True)
+    assert svc.reindex_faq(tenant_id="t1", language_code="pl") is True
+    assert cache.invalidated == [("t1", "pl")]
+
+
+def test_answer_ai_streams_first_segment(monkeypatch):
+    import json
+    from src.common.config import settings
+    from src.services.kb_service import KBService
+
+    monkeypatch.setattr(settings, "kb_stream_answers", True, raising=False)
+    monkeypatch.setattr(settings, "kb_stream_first_min_chars", 10, raising=False)
+
+    svc = KBService(bucket=None, openai_client=None)
+    svc.tenants = FakeTenantsRepo()
+    svc._tenant_cfg = TenantConfigService(repo=svc.tenants)
+
+    class DummyVector:
+        def enabled(self, tenant_id):
+            return True
+
+        def retrieve(self, *, tenant_id, language_code, question, category, top_k):
+            if category == "smalltalk":
+                return []
+            return [type("Chunk", (), {"chunk_id": "c1", "score": 0.45, "text": "Q: Hours\nA: 8-20", "faq_key": "Hours"})]
+
+        def build_kb_prompt(self, chunks, language_code, strict_mode):
+            return "ctx"
+
+    answer = "Klub jest czynny 8-20.\n\nW soboty 9-14."
+    raw = json.dumps({"answer": answer}, ensure_ascii=False)
+
+    class Client:
+        def chat_stream(self, messages, max_tokens=None):
+            for i in range(0, len(raw), 5):
+                yield raw[i:i + 5]
+
+    svc._vector = DummyVector()
+    svc._client = Client()
+
+    partials = []
+    ans = svc.answer_ai(question="Kiedy otwarte?", tenant_id="t1", language_code="pl", on_partial=partials.append)
+    assert partials == ["Klub jest czynny 8-20."]
+    assert ans == answer
+
+
+def test_answer_ai_prompt_respects_tenant_token_budget(monkeypatch):
+    import json
+    from src.services.kb_service import KBService
+
+    class Tenants(FakeTenantsRepo):
+        def get(self, tenant_id):
+            item = super().get(tenant_id)
+            item["kb_parameters"]["kb_prompt_max_tokens"] = 400
+            return item
+
+    svc = KBService(bucket=None, openai_client=None, tenant_config=TenantConfigService(repo=Tenants()))
+    svc.tenants = Tenants()
+
+    def chunk(i, text):
+        return type("Chunk", (), {"chunk_id": f"c{i}", "score": 0.45, "text": text, "faq_key": f"k{i}"})
+
+    long_answer = "Szczegóły oferty karnetów " * 60
+    chunks = [
+        chunk(1, "Q: Hours\nA: 8-20 w dni robocze"),
+        chunk(2, "Q: Hours\nA: 8-20 w dni robocze"),
+        chunk(3, "Q: Karnety\nA: " + long_answer),
+    ]
+
+    class DummyVector:
+        def enabled(self, tenant_id):
+            return True
+
+        def retrieve(self, *, tenant_id, language_code, question, category, top_k):
+            return [] if category == "smalltalk" else chunks
+
+        def build_kb_prompt(self, chunks, language_code, strict_mode):
+            return "KB:\n" + "\n\n".join(c.text for c in chunks)
+
+    class Client:
+        messages = None
+
+        def chat(self, messages, max_tokens=None):
+            Client.messages = messages
+            return json.dumps({"answer": "8-20"})
+
+    svc._vector = DummyVector()
+    svc._client = Client()
+
+    history = [{"role": "user", "content": f"stare pytanie {i} " * 30} for i in range(20)]
+    assert svc.answer_ai(question="Kiedy otwarte?", tenant_id="t1", language_code="pl", history=history) == "8-20"
+
+    system = Client.messages[0]["content"]
+    assert system.count("8-20 w dni robocze") == 1  # duplikat usunięty
+    assert long_answer not in system  # nie mieści się w budżecie
+    sent_history = Client.messages[1:-1]
+    assert sent_history and sent_history == history[-len(sent_history):]
+
+
+def test_answer_ai_resolves_kb_thresholds_once_from_cached_tenant_config():
+    from src.services.kb_service import KBService
+
+    class CountingTenants(FakeTenantsRepo):
+        reads = 0
+
+        def get(self, tenant_id):
+            CountingTenants.reads += 1
+            return super().get(tenant_id)
+
+    class NoThresholdReads(FakeTenantsRepo):
+        def __getattribute__(self, name):
+            if name.startswith("get_kb_"):
+                raise AssertionError(f"unexpected Tenants read: {name}")
+            return super().__getattribute__(name)
+
+    svc = KBService(bucket=None, openai_client=None, tenant_config=TenantConfigService(repo=CountingTenants()))
+    svc.tenants = NoThresholdReads()
+
+    class DummyVector:
+        def enabled(self, tenant_id):
+            return True
+
+        def retrieve(self, *, tenant_id, language_code, question, category, top_k):
+            if category == "smalltalk":
+                return []
+            return [type("Chunk", (), {"chunk_id": "c1", "score": 0.9, "text": "Q: Hours\nA: 8-20", "faq_key": "Hours"})]
+
+    svc._vector = DummyVector()
+
+    for _ in range(3):
+        assert svc.answer_ai(question="What are your hours?", tenant_id="t1", language_code="pl") == "8-20"
+    # TTL cache TenantConfigService: jeden odczyt rekordu na kilka pytań
+    assert CountingTenants.reads == 1
+
+
+def test_answer_ai_answers_known_faq_question_without_embedding():
+    from src.services.kb_service import KBService
+
+    svc = KBService(bucket="kb-bucket", openai_client=None)
+    svc._cache[svc._cache_key("t1", "pl")] = {
+        "entries": [{"key": "hours", "questions": ["Jakie są godziny otwarcia?"], "answer": "Codziennie 6-23"}]
+    }
+
+    class NoRetrieval:
+        def enabled(self, tenant_id):
+            return True
+
+        def retrieve(self, **kwargs):
+            raise AssertionError("exact FAQ question must not be embedded")
+
+    svc._vector = NoRetrieval()
+
+    assert svc.retrieve_for_answer(question="jakie sa godziny otwarcia", tenant_id="t1", language_code="pl") is None
+    assert svc.answer_ai(question="Jakie są godziny otwarcia??", tenant_id="t1", language_code="pl") == "Codziennie 6-23"
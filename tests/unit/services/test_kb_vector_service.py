@@ -15,7 +15,7 @@ class DummyOpenAI:
     def __init__(self):
         self.calls = []
 
-    def embed(self, texts, model=None, dimensions=None):
+    def embed(self, texts, model=None, dimensions=None, store=None):
         self.calls.append({"texts": texts, "model": model, "dimensions": dimensions})
         # stałe wektory 3D, łatwe do asercji
         return [[0.1, 0.2, 0.3] for _ in texts]
@@ -24,16 +24,21 @@ class DummyOpenAI:
 class DummyPinecone:
     def __init__(self):
         self.upserts: List[DummyUpsertCall] = []
+        self.deletes = []
         self.queries = []
         self._query_matches: List[PineconeMatch] = []
         self.index_host = "my-index.svc.test.pinecone.io"
         self.api_key = "x"
         self.enabled = True
 
-    def upsert(self, *, vectors, namespace):
+    def upsert(self, *, vectors, namespace, max_attempts=3):
         self.upserts.append(DummyUpsertCall(vectors=vectors, namespace=namespace))
         return True
 
+    def delete(self, *, ids, namespace):
+        self.deletes.append((namespace, list(ids)))
+        return True
+
     def query(self, *, vector, namespace, top_k, include_metadata, filter=None):
         self.queries.append(
             {
@@ -194,3 +199,187 @@ def test_kb_vector_retrieve_multi_segment_queries_and_dedup(monkeypatch):
     assert len(oa.calls[0]["texts"]) >= 2
     assert any("Location" in t for t in oa.calls[0]["texts"])
     assert len(pc.queries) == len(oa.calls[0]["texts"])
+
+
+def test_kb_vector_index_faq_embeds_in_batches_and_retries_failed_batch(monkeypatch):
+    import threading
+    from src.common.config import settings
+    from src.services import kb_vector_service as mod
+
+    monkeypatch.setattr(settings, "kb_vector_enabled", True, raising=False)
+    monkeypatch.setattr(settings, "embedding_dimensions", None, raising=False)
+    monkeypatch.setattr(settings, "kb_index_batch_size", 3, raising=False)
+    monkeypatch.setattr(settings, "kb_index_concurrency", 2, raising=False)
+    monkeypatch.setattr(mod.time, "sleep", lambda *_a, **_k: None)
+
+    class FlakyOpenAI(DummyOpenAI):
+        def __init__(self):
+            super().__init__()
+            self.lock = threading.Lock()
+            self.failed_once = False
+
+        def embed(self, texts, model=None, dimensions=None, store=None):
+            with self.lock:
+                self.calls.append({"texts": list(texts)})
+                if any("Q: k4" in t for t in texts) and not self.failed_once:
+                    self.failed_once = True
+                    raise RuntimeError("rate limited")
+            return [[0.1, 0.2, 0.3] for _ in texts]
+
+    oa = FlakyOpenAI()
+    pc = DummyPinecone()
+    svc = mod.KBVectorService(openai_client=oa, pinecone_client=pc)
+
+    faq = {f"k{i}": f"answer {i}" for i in range(8)}
+    assert svc.index_faq(tenant_id="t1", language_code="pl", faq=faq) is True
+
+    assert max(len(c["texts"]) for c in oa.calls) <= 3
+    assert len(oa.calls) == 4  # 3 batche + 1 ponowienie batcha z błędem
+    upserted = sorted(v["id"] for u in pc.upserts for v in u.vectors)
+    assert upserted == sorted(c.chunk_id for c in chunk_faq(faq))
+
+
+def test_kb_vector_index_faq_retries_only_failed_upsert(monkeypatch):
+    from src.common.config import settings
+    from src.services import kb_vector_service as mod
+
+    monkeypatch.setattr(settings, "kb_vector_enabled", True, raising=False)
+    monkeypatch.setattr(settings, "embedding_dimensions", None, raising=False)
+    monkeypatch.setattr(mod.time, "sleep", lambda *_a, **_k: None)
+
+    class FlakyPinecone(DummyPinecone):
+        def __init__(self):
+            super().__init__()
+            self.attempts = []
+
+        def upsert(self, *, vectors, namespace, max_attempts=3):
+            self.attempts.append(max_attempts)
+            if len(self.attempts) == 1:
+                return False
+            return super().upsert(vectors=vectors, namespace=namespace)
+
+    oa = DummyOpenAI()
+    pc = FlakyPinecone()
+    svc = mod.KBVectorService(openai_client=oa, pinecone_client=pc)
+
+    assert svc.index_faq(tenant_id="t1", language_code="pl", faq={"Hours": "8-20"}) is True
+
+    # upsert ponowiony bez ponownego embeddingu i bez wewnętrznych retry klienta
+    assert len(oa.calls) == 1
+    assert pc.attempts == [1, 1]
+    assert len(pc.upserts) == 1
+
+
+def test_kb_vector_index_faq_streams_chunks_into_batches(monkeypatch):
+    from src.common.config import settings
+    from src.services import kb_vector_service as mod
+
+    monkeypatch.setattr(settings, "kb_vector_enabled", True, raising=False)
+    monkeypatch.setattr(settings, "embedding_dimensions", None, raising=False)
+    monkeypatch.setattr(settings, "kb_index_batch_size", 2, raising=False)
+    monkeypatch.setattr(settings, "kb_index_concurrency", 1, raising=False)
+
+    produced = []
+    real_iter = mod.iter_faq_chunks
+
+    def counting_iter(faq, **kw):
+        for ch in real_iter(faq, **kw):
+            produced.append(ch.chunk_id)
+            yield ch
+
+    monkeypatch.setattr(mod, "iter_faq_chunks", counting_iter)
+
+    class RecordingOpenAI(DummyOpenAI):
+        def embed(self, texts, model=None, dimensions=None, store=None):
+            self.calls.append({"texts": list(texts), "produced": len(produced)})
+            return [[0.1, 0.2, 0.3] for _ in texts]
+
+    oa = RecordingOpenAI()
+    pc = DummyPinecone()
+    svc = mod.KBVectorService(openai_client=oa, pinecone_client=pc)
+
+    faq = {f"k{i}": f"answer {i}" for i in range(10)}
+    assert svc.index_faq(tenant_id="t1", language_code="pl", faq=faq) is True
+
+    # pierwszy batch jest embedowany, zanim drugi przebieg wygeneruje wszystkie chunki
+    assert oa.calls[0]["produced"] < 2 * len(faq)
+    assert len(oa.calls) == 5
+    assert sorted(v["id"] for u in pc.upserts for v in u.vectors) == sorted(c.chunk_id for c in chunk_faq(faq))
+
+
+def test_kb_vector_index_faq_splits_batches_by_token_limit(monkeypatch):
+    from src.common.config import settings
+    from src.services.kb_vector_service import KBVectorService
+
+    monkeypatch.setattr(settings, "kb_index_batch_size", 100, raising=False)
+    monkeypatch.setattr(settings, "kb_index_batch_max_tokens", 50, raising=False)
+    svc = KBVectorService(openai_client=DummyOpenAI(), pinecone_client=DummyPinecone())
+
+    chunks = chunk_faq({f"k{i}": "długa odpowiedź " * 10 for i in range(4)})
+    batches = list(svc._embed_batches(chunks))
+    assert len(batches) == 4
+    assert [c for b in batches for c in b] == chunks
+
+
+class MemoryManifests:
+    def __init__(self):
+        self.items = {}
+
+    def get(self, namespace):
+        return self.items.get(namespace)
+
+    def put(self, namespace, **manifest):
+        self.items[namespace] = {"namespace": namespace, **manifest}
+
+
+def test_kb_vector_index_faq_is_incremental_with_manifest(monkeypatch):
+    from src.common.config import settings
+    from src.services.kb_vector_service import KBVectorService
+
+    monkeypatch.setattr(settings, "kb_vector_enabled", True, raising=False)
+    monkeypatch.setattr(settings, "embedding_model", "text-embedding-3-small", raising=False)
+    monkeypatch.setattr(settings, "embedding_dimensions", None, raising=False)
+
+    oa, pc, manifests = DummyOpenAI(), DummyPinecone(), MemoryManifests()
+    svc = KBVectorService(openai_client=oa, pinecone_client=pc, manifest_repo=manifests)
+
+    faq = {"Hours": "8-20", "Location": "City center", "Parking": "Free"}
+    assert svc.index_faq(tenant_id="t1", language_code="pl", faq=faq) is True
+    assert svc.last_index_stats.upserted == 3
+
+    # bez zmian -> brak embeddingów i upsertów
+    oa.calls.clear()
+    pc.upserts.clear()
+    assert svc.index_faq(tenant_id="t1", language_code="pl", faq=faq) is True
+    assert svc.last_index_stats.unchanged
+    assert oa.calls == [] and pc.upserts == []
+
+    # jedna zmiana + jedno usunięcie -> embedding tylko zmienionego chunku, delete usuniętego
+    edited = {"Hours": "7-22", "Location": "City center"}
+    old_ids = {c.faq_key: c.chunk_id for c in chunk_faq(faq)}
+    new_ids = {c.faq_key: c.chunk_id for c in chunk_faq(edited)}
+    assert svc.index_faq(tenant_id="t1", language_code="pl", faq=edited) is True
+    assert [t for c in oa.calls for t in c["texts"]] == ["Q: Hours\nA: 7-22"]
+    assert [v["id"] for u in pc.upserts for v in u.vectors] == [new_ids["Hours"]]
+    assert [ns for ns, _ in pc.deletes] == ["kb:t1:pl"]
+    assert sorted(pc.deletes[0][1]) == sorted([old_ids["Hours"], old_ids["Parking"]])
+
+    # force -> pełna reindeksacja
+    pc.upserts.clear()
+    assert svc.index_faq(tenant_id="t1", language_code="pl", faq=edited, force=True) is True
+    assert sum(len(u.vectors) for u in pc.upserts) == 2
+
+
+def test_kb_vector_embed_question_uses_retrieval_embedding_config(monkeypatch):
+    from src.common.config import settings
+    from src.services.kb_vector_service import KBVectorService
+
+    monkeypatch.setattr(settings, "embedding_model", "text-embedding-3-small", raising=False)
+    monkeypatch.setattr(settings, "embedding_dimensions", 256, raising=False)
+
+    oa = DummyOpenAI()
+    svc = KBVectorService(openai_client=oa, pinecone_client=DummyPinecone())
+
+    assert svc.embed_question("  When open? ") == [0.1, 0.2, 0.3]
+    assert oa.calls == [{"texts": ["When open?"], "model": "text-embedding-3-small", "dimensions": 256}]
+    assert svc.embed_question("") == []
@@ -0,0 +1,46 @@
+import pytest
+
+from src.services.language_id import LanguageIdentifier
+
+
+@pytest.fixture(scope="module")
+def identifier():
+    return LanguageIdentifier(languages=["pl", "en", "de", "uk", "ar"])
+
+
+@pytest.mark.parametrize(
+    "text,code",
+    [
+        ("Jakie są godziny otwarcia w sobotę?", "pl"),
+        ("czy moge przyjsc jutro na silownie", "pl"),
+        ("What time do you open tomorrow?", "en"),
+        ("I want to cancel my membership", "en"),
+        ("Wann öffnet das Studio morgen?", "de"),
+        ("Коли відкривається клуб?", "uk"),
+        ("متى يفتح النادي غدا؟", "ar"),
+    ],
+)
+def test_detects_tenant_languages_with_high_confidence(identifier, text, code):
+    guess = identifier.detect(text)
+    assert guess.code == code
+    assert guess.confidence >= 0.75
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "ok",
+        "Hej",
+        "12345",
+        "Когда открывается клуб?",  # rosyjski – ta sama cyrylica, inny język
+        "¿A qué hora abre el gimnasio mañana?",
+        "Combien coûte l'abonnement mensuel?",
+    ],
+)
+def test_short_or_unknown_language_has_low_confidence(identifier, text):
+    assert identifier.detect(text).confidence < 0.75
+
+
+def test_language_outside_candidates_is_not_returned():
+    only_latin = LanguageIdentifier(languages=["pl", "en"])
+    assert only_latin.detect("متى يفتح النادي غدا؟").code is None
@@ -31,3 +31,89 @@ def test_nlu_classify_calls_openai_when_not_fast(monkeypatch):
     out = svc.classify_intent("hello", lang="en")
     assert out["intent"] == "faq"
     assert called["args"] == ("hello", "en")
+
+
+def test_nlu_local_model_short_circuits_openai_above_threshold(monkeypatch):
+    from src.services.nlu_service import NLUService
+
+    class Model:
+        def __init__(self, result):
+            self.result = result
+
+        def predict(self, text, **thresholds):
+            return self.result
+
+    class Store:
+        def __init__(self, model):
+            self.model = model
+            self.calls = []
+
+        def get(self, tenant_id, lang):
+            self.calls.append((tenant_id, lang))
+            return self.model
+
+    store = Store(Model(("crm_contract_status", 0.97)))
+    svc = NLUService(local_models=store)
+    monkeypatch.setattr(svc.client, "classify", lambda *a, **k: pytest.fail("OpenAI should not be called"))
+
+    out = svc.classify_intent("status umowy", lang="pl", tenant_id="t1")
+    assert out == {"intent": "crm_contract_status", "confidence": 0.97, "slots": {}}
+    assert store.calls == [("t1", "pl")]
+
+    # poniżej progu albo intencja spoza listy lokalnej -> OpenAI
+    openai = {"intent": "faq", "confidence": 0.9, "slots": {}}
+    monkeypatch.setattr(svc.client, "classify", lambda *a, **k: openai)
+    store.model = Model(("crm_contract_status", 0.5))
+    assert svc.classify_intent("status umowy", lang="pl", tenant_id="t1") is openai
+    store.model = Model(("faq", 0.99))
+    assert svc.classify_intent("godziny otwarcia", lang="pl", tenant_id="t1") is openai
+
+
+def test_nlu_cache_skips_openai_for_repeated_phrasing(monkeypatch):
+    from src.services.intent_cache import IntentCache
+    from src.services.nlu_service import NLUService
+
+    class Repo:
+        enabled = False
+
+    class Metrics:
+        def __init__(self):
+            self.names = []
+
+        def incr(self, name, **kwargs):
+            self.names.append(name)
+
+    metrics = Metrics()
+    svc = NLUService(cache=IntentCache(repo=Repo(), ttl_seconds=60), metrics=metrics)
+    svc.local_enabled = False
+    calls = []
+
+    def fake_classify(text, lang):
+        calls.append(text)
+        return {"intent": "faq", "confidence": 0.9, "slots": {}}
+
+    monkeypatch.setattr(svc.client, "classify", fake_classify)
+
+    assert svc.classify_intent("Godziny otwarcia?", lang="pl", tenant_id="t1")["intent"] == "faq"
+    assert svc.classify_intent("godziny  otwarcia", lang="pl", tenant_id="t1")["intent"] == "faq"
+    assert calls == ["Godziny otwarcia?"]
+    assert metrics.names == ["NLUCacheMiss", "NLUCacheHit"]
+    assert svc.cache_hit_ratio == 0.5
+
+
+def test_nlu_local_model_lets_out_of_domain_text_fall_through_to_openai(monkeypatch):
+    from src.services.intent_classifier import LocalIntentModel
+    from src.services.nlu_service import NLUService
+    from tests.unit.services.test_intent_classifier import SAMPLES
+
+    model = LocalIntentModel.train(SAMPLES)
+    svc = NLUService(local_models=type("Store", (), {"get": lambda self, tenant_id, lang: model})())
+    svc.cache_enabled = False
+    calls = []
+    monkeypatch.setattr(svc.client, "classify", lambda text, lang: calls.append(text) or {"intent": "faq", "confidence": 0.9, "slots": {}})
+
+    assert svc.classify_intent("jaki mam status umowy", lang="pl", tenant_id="t1")["intent"] == "crm_contract_status"
+    # krótkie/niezwiązane wiadomości i opt-out zawsze przez OpenAI
+    for text in ("nie", "stopa mnie boli, mogę ćwiczyć?", "jak anulować umowę", "wypisz mnie z wiadomości"):
+        svc.classify_intent(text, lang="pl", tenant_id="t1")
+    assert calls == ["nie", "stopa mnie boli, mogę ćwiczyć?", "jak anulować umowę", "wypisz mnie z wiadomości"]
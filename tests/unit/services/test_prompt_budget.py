@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+
+from src.services.prompt_budget import (
+    chunk_prompt_tokens,
+    count_message_tokens,
+    count_tokens,
+    dedupe_chunks,
+    fit_prompt,
+)
+
+
+@dataclass
+class Chunk:
+    chunk_id: str
+    text: str
+    score: float = 0.5
+
+
+def test_count_tokens_is_monotonic_and_handles_non_ascii():
+    assert count_tokens("") == 0
+    short = count_tokens("Klub jest czynny od 8 do 20.")
+    assert 5 <= short <= 20
+    assert count_tokens("Klub jest czynny od 8 do 20. " * 10) > 9 * short
+    # polskie znaki kosztują więcej niż ich odpowiedniki ASCII
+    assert count_tokens("zażółć gęślą jaźń") > count_tokens("zazolc gesla jazn")
+    assert count_message_tokens([{"content": "a"}, {"content": "b"}]) > count_tokens("ab")
+
+
+def test_dedupe_chunks_drops_repeats_and_overlaps():
+    a = Chunk("c1", "Q: Godziny otwarcia\nA: Klub jest czynny od 8 do 20 w dni robocze.")
+    a_again = Chunk("c1", "inny tekst, ale ten sam chunk")
+    overlap = Chunk("c2", "A: Klub jest czynny od 8 do 20 w dni robocze.")
+    other = Chunk("c3", "Q: Parking\nA: Parking jest bezpłatny dla klubowiczów.")
+    assert dedupe_chunks([a, a_again, overlap, other]) == [a, other]
+
+
+def test_fit_prompt_keeps_newest_history_and_best_chunks():
+    chunks = [Chunk(f"c{i}", f"Q: Pytanie {i}\nA: " + "odpowiedź " * 40) for i in range(5)]
+    history = [{"role": "user", "content": f"wiadomość numer {i} " * 5} for i in range(10)]
+    per_chunk = chunk_prompt_tokens(chunks[0], 1)
+
+    budget = fit_prompt(
+        base_tokens=100,
+        chunks=chunks,
+        history=history,
+        max_tokens=100 + 60 + 2 * per_chunk + 5,
+        history_max_tokens=60,
+    )
+
+    assert budget.history == history[-len(budget.history):]
+    assert 0 < len(budget.history) < len(history)
+    assert budget.chunks == chunks[:2]
+    assert budget.chunks_dropped == 3
+    assert budget.history_dropped == len(history) - len(budget.history)
+    assert budget.tokens_in <= budget.max_tokens
+
+
+def test_fit_prompt_always_keeps_first_chunk():
+    chunks = [Chunk("c1", "bardzo długi tekst " * 200)]
+    budget = fit_prompt(base_tokens=50, chunks=chunks, history=None, max_tokens=60, history_max_tokens=10)
+    assert budget.chunks == chunks
+    assert budget.history == []
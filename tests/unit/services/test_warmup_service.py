@@ -0,0 +1,164 @@
+import types
+
+from src.common.config import settings
+from src.services.warmup_service import WarmupService
+
+
+class FakeTpl:
+    def __init__(self):
+        self.calls = []
+
+    def prime(self, tenant_id, names, language_code):
+        self.calls.append((tenant_id, tuple(names), language_code))
+        return len(names)
+
+
+class FakeKB:
+    def __init__(self):
+        self.primed = []
+
+    def faq_languages(self, tenant_id):
+        return ["en", "pl"]
+
+    def prime(self, tenant_id, language_code):
+        if tenant_id == "broken":
+            raise RuntimeError("s3 down")
+        self.primed.append((tenant_id, language_code))
+        return 7
+
+
+class FakeMetrics:
+    def __init__(self):
+        self.timings = []
+
+    def timing_ms(self, name, duration_ms, **fields):
+        self.timings.append((name, fields.get("step")))
+
+
+class FakeTenantConfig:
+    def get(self, tenant_id):
+        langs = {"t-en": "en", "t-auto": "auto"}
+        return {"tenant_id": tenant_id, "language_code": langs.get(tenant_id)}
+
+
+def _container(tpl, kb, tenants=()):
+    obj = object()
+    return types.SimpleNamespace(
+        nlu=lambda: obj,
+        kb=lambda: kb,
+        tpl=lambda: tpl,
+        language=lambda: obj,
+        crm_flow=lambda: obj,
+        tenants=lambda: types.SimpleNamespace(list_all=lambda: [{"tenant_id": t} for t in tenants]),
+        metrics=lambda: FakeMetrics(),
+    )
+
+
+def test_prime_loads_config_templates_and_faq_per_tenant(monkeypatch):
+    monkeypatch.setenv("WARMUP_TEMPLATES", "clarify_generic,faq_no_info")
+    tpl, metrics = FakeTpl(), FakeMetrics()
+    svc = WarmupService(container=_container(tpl, FakeKB()), tenant_config=FakeTenantConfig(), metrics=metrics)
+
+    report = svc.prime(["t-en", "broken"], source="event")
+
+    assert [t["tenant_id"] for t in report["tenants"]] == ["t-en", "broken"]
+    assert report["tenants"][0] == {"tenant_id": "t-en", "langs": ["en"], "faq_questions": 7}
+    # brak language_code w konfiguracji -> domyślny język
+    assert tpl.calls[1] == ("broken", ("clarify_generic", "faq_no_info"), settings.get_default_language())
+    # błąd FAQ jednego tenanta nie przerywa primingu
+    assert report["errors"] == 1
+    assert {"peppers", "services", "tenant_config", "templates", "faq_index"} <= set(report["steps_ms"])
+    assert ("WarmupDurationMs", None) in metrics.timings
+    assert ("WarmupStepMs", "faq_index") in metrics.timings
+
+
+def test_prime_all_tenants_from_table_is_capped(monkeypatch):
+    monkeypatch.setenv("WARMUP_TENANTS", "*")
+    monkeypatch.setenv("WARMUP_MAX_TENANTS", "2")
+    svc = WarmupService(
+        container=_container(FakeTpl(), FakeKB(), tenants=("a", "b", "c")),
+        tenant_config=FakeTenantConfig(),
+        metrics=FakeMetrics(),
+    )
+
+    report = svc.prime()
+
+    assert [t["tenant_id"] for t in report["tenants"]] == ["a", "b"]
+
+
+def test_prime_stops_priming_tenants_after_budget(monkeypatch):
+    monkeypatch.setenv("WARMUP_BUDGET_S", "0")
+    svc = WarmupService(container=_container(FakeTpl(), FakeKB()), tenant_config=FakeTenantConfig(), metrics=FakeMetrics())
+
+    report = svc.prime(["a", "b"])
+
+    assert report["tenants"] == []
+    assert report["skipped_tenants"] == 2
+
+
+def test_prime_auto_language_tenant_uses_its_faq_languages():
+    tpl, kb = FakeTpl(), FakeKB()
+    svc = WarmupService(container=_container(tpl, kb), tenant_config=FakeTenantConfig(), metrics=FakeMetrics())
+
+    report = svc.prime(["t-auto"])
+
+    # "auto" to nie kod języka – primujemy języki, dla których tenant ma FAQ
+    assert report["tenants"] == [{"tenant_id": "t-auto", "langs": ["en", "pl"], "faq_questions": 14}]
+    assert kb.primed == [("t-auto", "en"), ("t-auto", "pl")]
+    assert [lang for _, _, lang in tpl.calls] == ["en", "pl"]
+
+
+def test_prime_checks_budget_before_each_language(monkeypatch):
+    from src.services import warmup_service
+
+    clock = {"now": 0.0}
+    monkeypatch.setattr(warmup_service.time, "perf_counter", lambda: clock["now"])
+    monkeypatch.setenv("WARMUP_BUDGET_S", "1")
+
+    class SlowKB(FakeKB):
+        def prime(self, tenant_id, language_code):
+            clock["now"] += 2.0  # pierwszy język zjada cały budżet
+            return super().prime(tenant_id, language_code)
+
+    kb = SlowKB()
+    svc = WarmupService(container=_container(FakeTpl(), kb), tenant_config=FakeTenantConfig(), metrics=FakeMetrics())
+
+    report = svc.prime(["t-auto", "t-en"])
+
+    # tenant "auto" nie primuje kolejnych języków po przekroczeniu budżetu
+    assert kb.primed == [("t-auto", "en")]
+    assert report["tenants"] == [{"tenant_id": "t-auto", "langs": ["en"], "faq_questions": 7}]
+    assert report["skipped_langs"] == 1
+    assert report["skipped_tenants"] == 1
+
+
+def test_prime_budget_starts_after_shared_steps(monkeypatch):
+    from src.services import warmup_service
+
+    clock = {"now": 0.0}
+    monkeypatch.setattr(warmup_service.time, "perf_counter", lambda: clock["now"])
+    monkeypatch.setenv("WARMUP_BUDGET_S", "1")
+
+    def slow_nlu():
+        clock["now"] += 5.0  # import SDK OpenAI itp. – dłużej niż cały budżet
+        return object()
+
+    container = _container(FakeTpl(), FakeKB())
+    container.nlu = slow_nlu
+    svc = WarmupService(container=container, tenant_config=FakeTenantConfig(), metrics=FakeMetrics())
+
+    report = svc.prime(["t-en"])
+
+    assert report["tenants"] == [{"tenant_id": "t-en", "langs": ["en"], "faq_questions": 7}]
+    assert "skipped_tenants" not in report
+
+
+def test_warmup_on_init_requires_explicit_tenants(monkeypatch):
+    from src.services.warmup_service import warmup_on_init_enabled
+
+    monkeypatch.setenv("WARMUP_ON_INIT", "true")
+    monkeypatch.setenv("WARMUP_TENANTS", "")
+    assert warmup_on_init_enabled() is False
+
+    monkeypatch.setenv("WARMUP_TENANTS", "tenantA")
+    assert warmup_on_init_enabled() is True
@@ -32,3 +32,37 @@ def test_chunk_faq_splits_long_text_into_multiple_chunks():
     # stabilność: dwa kolejne wywołania dają te same chunk_id w tej samej kolejności
     chunks2 = chunk_faq(faq, max_chars=200, overlap_chars=40)
     assert [c.chunk_id for c in chunks] == [c.chunk_id for c in chunks2]
+
+
+def test_iter_faq_chunks_is_lazy_and_matches_chunk_faq():
+    import types
+    from src.common.text_chunking import chunk_faq, iter_faq_chunks
+
+    faq = {
+        "entries": [
+            {"key": "Long", "questions": ["Q1", "Q2"], "answer": "Zdanie. " * 80},
+            {"key": "Short", "answer": "Krótko."},
+        ]
+    }
+    it = iter_faq_chunks(faq, max_chars=200, overlap_chars=40)
+    assert isinstance(it, types.GeneratorType)
+    assert next(it).faq_key == "Long"
+
+    streamed = list(iter_faq_chunks(faq, max_chars=200, overlap_chars=40))
+    assert streamed == chunk_faq(faq, max_chars=200, overlap_chars=40)
+    assert [c.faq_key for c in streamed][-1] == "Short"
+
+
+def test_hard_split_ids_use_question_and_piece():
+    import hashlib
+    from src.common.text_chunking import chunk_faq
+
+    # jedno "zdanie" bez granic – tylko twardy podział z overlapem
+    faq = {"Blob": "x" * 450}
+    chunks = chunk_faq(faq, max_chars=200, overlap_chars=50)
+
+    assert [len(c.text) for c in chunks] == [200, 200, 161]
+    assert chunks[0].text.startswith("Q: Blob")
+    assert chunks[1].text == ("Q: Blob\nA: " + "x" * 450)[150:350]
+    expected = hashlib.sha1(f"Blob|Blob|{chunks[1].text}".encode("utf-8")).hexdigest()
+    assert chunks[1].chunk_id == expected